@@ -0,0 +1,159 @@
+"""
+Adaptive question selection.
+
+GET /api/quiz/{id}/next serves a quiz one question at a time, moving up a
+level after a correct answer and down after a wrong one. Levels come from
+how people actually did, not only from the LLM's label: each question's
+correct rate is the measured one, smoothed towards a prior for its label
+so a question with three attempts isn't judged on those alone.
+
+Each worker keeps a QuestionIndex per quiz: the questions plus one bitmask
+of positions per level. Selecting is a couple of integer operations (free
+questions at the level = band & ~seen, take the lowest bit), with no
+database round-trip. Scored attempts update the counts in place and move a
+question to another band when its rate crosses a threshold. Indexes
+expire after QUIZ_CACHE_TTL_SECONDS and are rebuilt from question_stats,
+which picks up the attempts other workers have written.
+"""
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from attempts import QuizLRU, ScoredAttempt
+from config import settings
+from models import Question, QuestionStats, Quiz
+
+LEVELS = ("easy", "medium", "hard")
+
+# Expected share of correct answers before anyone has tried, by LLM label
+PRIOR_RATE = {"easy": 0.8, "medium": 0.6, "hard": 0.4}
+# How many attempts' worth of weight the prior carries
+PRIOR_WEIGHT = 8
+
+# Smoothed correct rate -> level
+EASY_FROM = 0.7
+HARD_BELOW = 0.5
+
+# Where to look when a level has nothing left, nearest first
+FALLBACK_ORDER = {0: (0, 1, 2), 1: (1, 0, 2), 2: (2, 1, 0)}
+
+
+def level_for(rate: float) -> int:
+    if rate >= EASY_FROM:
+        return 0
+    if rate < HARD_BELOW:
+        return 2
+    return 1
+
+
+def next_level(level: int, last_correct: Optional[bool]) -> int:
+    """One level harder after a correct answer, one easier after a wrong one"""
+    if last_correct is None:
+        return level
+    return min(level + 1, len(LEVELS) - 1) if last_correct else max(level - 1, 0)
+
+
+def seen_mask(positions: Sequence[int]) -> int:
+    mask = 0
+    for position in positions:
+        mask |= 1 << position
+    return mask
+
+
+class QuestionIndex:
+    """A quiz's questions banded by measured difficulty, as bitmasks over positions"""
+
+    def __init__(self, quiz_id: int, question_ids: Tuple[int, ...], questions: List[Dict],
+                 attempts: List[int], correct: List[int]):
+        self.quiz_id = quiz_id
+        self.question_ids = question_ids
+        self.questions = questions
+        self.all_mask = (1 << len(questions)) - 1
+        self._attempts = attempts
+        self._correct = correct
+        self._prior = [PRIOR_RATE.get(q["difficulty"], PRIOR_RATE["medium"]) for q in questions]
+        self._levels = [level_for(self.rate(p)) for p in range(len(questions))]
+        self._bands = [0] * len(LEVELS)
+        for position, level in enumerate(self._levels):
+            self._bands[level] |= 1 << position
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.questions)
+
+    def rate(self, position: int) -> float:
+        """Smoothed share of correct answers"""
+        return ((self._correct[position] + self._prior[position] * PRIOR_WEIGHT)
+                / (self._attempts[position] + PRIOR_WEIGHT))
+
+    def measured(self, position: int) -> Tuple[int, Optional[float]]:
+        """(attempts, raw correct rate) for a question"""
+        attempts = self._attempts[position]
+        return attempts, (round(self._correct[position] / attempts, 4) if attempts else None)
+
+    def record(self, attempt: ScoredAttempt) -> bool:
+        """Fold in a scored attempt. False if it was scored against other questions."""
+        if attempt.question_ids != self.question_ids:
+            return False
+        with self._lock:
+            for position, correct in enumerate(attempt.correct):
+                self._attempts[position] += 1
+                self._correct[position] += int(correct)
+                level = level_for(self.rate(position))
+                old = self._levels[position]
+                if level != old:
+                    bit = 1 << position
+                    self._bands[level] |= bit
+                    self._bands[old] &= ~bit
+                    self._levels[position] = level
+        return True
+
+    def select(self, seen: int, level: int) -> Optional[Tuple[int, int]]:
+        """
+        (position, level) of an unseen question at the level, or the nearest
+        level that still has one; None when everything has been seen.
+        Reads without the lock - a question moving bands mid-read is at
+        worst briefly in both or neither.
+        """
+        for candidate in FALLBACK_ORDER[level]:
+            free = self._bands[candidate] & ~seen
+            if free:
+                return (free & -free).bit_length() - 1, candidate
+        return None
+
+
+question_indexes = QuizLRU(settings.ADAPTIVE_INDEX_CACHE_SIZE, settings.QUIZ_CACHE_TTL_SECONDS)
+
+
+def load_index(db: Session, quiz_id: int) -> Optional[QuestionIndex]:
+    """The quiz's question index, or None if there is no such quiz"""
+    index = question_indexes.get(quiz_id)
+    if index is not None:
+        return index
+    rows = db.execute(
+        select(Question, QuestionStats.attempts, QuestionStats.correct)
+        .outerjoin(QuestionStats, QuestionStats.question_id == Question.id)
+        .where(Question.quiz_id == quiz_id)
+        .order_by(Question.position)
+    ).all()
+    if not rows and db.query(Quiz.id).filter(Quiz.id == quiz_id).first() is None:
+        return None
+    index = QuestionIndex(
+        quiz_id,
+        tuple(row.Question.id for row in rows),
+        [row.Question.to_dict() for row in rows],
+        [row.attempts or 0 for row in rows],
+        [row.correct or 0 for row in rows],
+    )
+    question_indexes.put(quiz_id, index)
+    return index
+
+
+def record_attempt(attempt: ScoredAttempt) -> None:
+    """Update the quiz's index, if this worker has one, with a scored attempt"""
+    index = question_indexes.get(attempt.quiz_id)
+    if index is not None and not index.record(attempt):
+        # Scored against a different version of the quiz
+        question_indexes.forget(attempt.quiz_id)
@@ -0,0 +1,378 @@
+"""
+Quiz attempts: server-side scoring and batched ingestion.
+
+POST /api/quiz/{id}/attempts scores the submitted answers against the
+stored questions and returns the result straight away; the attempt itself
+is only queued. AttemptWriter drains the queue on a background thread and
+writes each batch in one transaction: a bulk insert into quiz_attempts plus
+one upsert per touched question into question_stats and per quiz into
+quiz_attempt_stats. A classroom submitting all at once therefore costs a
+handful of transactions, not thousands, and the stats endpoint reads the
+running counts instead of scanning attempts.
+
+Answer keys (question id and correct answer per position) are kept in a
+small LRU per worker so scoring doesn't touch the database for hot quizzes.
+Like the quiz cache, entries expire after QUIZ_CACHE_TTL_SECONDS and are
+dropped on refresh or delete.
+
+Queued attempts live in memory: they are flushed at shutdown, but a worker
+that is killed loses whatever was still queued (at most
+ATTEMPT_FLUSH_SECONDS' worth under normal load).
+"""
+import atexit
+import logging
+import queue
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from config import settings
+from metrics import ATTEMPT_QUEUE_DEPTH, ATTEMPTS, stage
+from models import Question, QuestionBank, QuestionStats, Quiz, QuizAttempt, QuizAttemptStats
+
+logger = logging.getLogger(__name__)
+
+
+class AnswerKey(NamedTuple):
+    """Question ids and correct answers of a quiz, by position"""
+    quiz_id: int
+    question_ids: Tuple[int, ...]
+    answers: Tuple[str, ...]
+
+    @property
+    def total(self) -> int:
+        return len(self.answers)
+
+
+class ScoredAttempt(NamedTuple):
+    quiz_id: int
+    question_ids: Tuple[int, ...]
+    answers: List[Optional[str]]
+    correct: List[bool]
+    duration_ms: Optional[int]
+
+    @property
+    def score(self) -> int:
+        return sum(self.correct)
+
+
+class AttemptQueueFull(RuntimeError):
+    """The write queue is full - the database isn't keeping up"""
+
+
+class QuizLRU:
+    """Per-worker LRU of per-quiz data with a TTL"""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[int, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, quiz_id: int) -> Any:
+        with self._lock:
+            entry = self._entries.get(quiz_id)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[quiz_id]
+                return None
+            self._entries.move_to_end(quiz_id)
+            return value
+
+    def put(self, quiz_id: int, value: Any) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[quiz_id] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(quiz_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def forget(self, quiz_id: int) -> None:
+        with self._lock:
+            self._entries.pop(quiz_id, None)
+
+
+answer_keys = QuizLRU(settings.ATTEMPT_KEY_CACHE_SIZE, settings.QUIZ_CACHE_TTL_SECONDS)
+
+
+def load_answer_key(db: Session, quiz_id: int) -> Optional[AnswerKey]:
+    """The quiz's answer key, or None if there is no such quiz"""
+    key = answer_keys.get(quiz_id)
+    if key is not None:
+        return key
+    rows = db.execute(
+        select(Question.id, QuestionBank.answer)
+        .join(QuestionBank, QuestionBank.id == Question.bank_id)
+        .where(Question.quiz_id == quiz_id)
+        .order_by(Question.position)
+    ).all()
+    if not rows and db.query(Quiz.id).filter(Quiz.id == quiz_id).first() is None:
+        return None
+    key = AnswerKey(quiz_id, tuple(r.id for r in rows), tuple(r.answer for r in rows))
+    answer_keys.put(quiz_id, key)
+    return key
+
+
+def _same_answer(given: Optional[str], answer: str) -> bool:
+    return given is not None and given.strip() == answer.strip()
+
+
+def score_attempt(key: AnswerKey, answers: List[Optional[str]],
+                  duration_ms: Optional[int] = None) -> ScoredAttempt:
+    """
+    Score answers given by position. Missing trailing answers count as
+    skipped (wrong).
+
+    Raises:
+        ValueError: If there are more answers than questions
+    """
+    if len(answers) > key.total:
+        raise ValueError(f"Got {len(answers)} answers for a quiz with {key.total} questions")
+    answers = list(answers) + [None] * (key.total - len(answers))
+    correct = [_same_answer(given, answer) for given, answer in zip(answers, key.answers)]
+    return ScoredAttempt(key.quiz_id, key.question_ids, answers, correct, duration_ms)
+
+
+def _upsert_counts(conn, table, key_column: str, rows: List[Dict], counters: Iterable[str]) -> None:
+    """Add each row's counters to the stored ones, inserting missing rows"""
+    if not rows:
+        return
+    # Same order in every worker, so concurrent batches can't deadlock
+    rows = sorted(rows, key=lambda r: r[key_column])
+    dialect = conn.dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        stmt = insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[key_column],
+            set_={name: table.c[name] + stmt.excluded[name] for name in counters},
+        )
+        conn.execute(stmt, rows)
+        return
+    # Other databases: update, then insert what wasn't there
+    for row in rows:
+        updated = conn.execute(
+            table.update()
+            .where(table.c[key_column] == row[key_column])
+            .values({name: table.c[name] + row[name] for name in counters})
+        )
+        if updated.rowcount == 0:
+            conn.execute(table.insert(), [row])
+
+
+def write_attempts(conn, batch: List[ScoredAttempt]) -> None:
+    """Insert a batch of attempts and fold it into the running counts"""
+    conn.execute(QuizAttempt.__table__.insert(), [
+        {
+            "quiz_id": a.quiz_id,
+            "score": a.score,
+            "total": len(a.correct),
+            "answers": a.answers,
+            "duration_ms": a.duration_ms,
+        }
+        for a in batch
+    ])
+
+    per_question: Dict[int, Dict] = {}
+    per_quiz: Dict[int, Dict] = {}
+    for a in batch:
+        quiz = per_quiz.setdefault(a.quiz_id, {"quiz_id": a.quiz_id, "attempts": 0,
+                                               "score_total": 0, "question_total": 0})
+        quiz["attempts"] += 1
+        quiz["score_total"] += a.score
+        quiz["question_total"] += len(a.correct)
+        for question_id, correct in zip(a.question_ids, a.correct):
+            row = per_question.setdefault(question_id, {"question_id": question_id, "quiz_id": a.quiz_id,
+                                                        "attempts": 0, "correct": 0})
+            row["attempts"] += 1
+            row["correct"] += int(correct)
+
+    _upsert_counts(conn, QuestionStats.__table__, "question_id",
+                   list(per_question.values()), ("attempts", "correct"))
+    _upsert_counts(conn, QuizAttemptStats.__table__, "quiz_id",
+                   list(per_quiz.values()), ("attempts", "score_total", "question_total"))
+
+
+def _still_present(conn, batch: List[ScoredAttempt]) -> List[ScoredAttempt]:
+    """Drop attempts whose quiz or questions were deleted while they were queued"""
+    quiz_ids = {a.quiz_id for a in batch}
+    question_ids = {qid for a in batch for qid in a.question_ids}
+    live_quizzes = set(conn.execute(select(Quiz.id).where(Quiz.id.in_(quiz_ids))).scalars())
+    live_questions = set(conn.execute(select(Question.id).where(Question.id.in_(question_ids))).scalars())
+    return [a for a in batch
+            if a.quiz_id in live_quizzes and live_questions.issuperset(a.question_ids)]
+
+
+class AttemptWriter:
+    """
+    Bounded queue of scored attempts, written in batches of up to
+    ATTEMPT_BATCH_SIZE or every ATTEMPT_FLUSH_SECONDS, whichever comes
+    first. The thread starts with the first submitted attempt.
+    """
+
+    def __init__(self, queue_size: int, batch_size: int, flush_seconds: float, bind=None):
+        self.batch_size = max(1, batch_size)
+        self.flush_seconds = flush_seconds
+        self._bind = bind
+        self._queue: "queue.Queue[Optional[ScoredAttempt]]" = queue.Queue(maxsize=queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def submit(self, attempt: ScoredAttempt) -> None:
+        """Queue an attempt for writing. Raises AttemptQueueFull instead of blocking."""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(attempt)
+        except queue.Full:
+            ATTEMPTS.inc(outcome="rejected")
+            raise AttemptQueueFull(f"{self._queue.maxsize} attempts already waiting to be written")
+        ATTEMPTS.inc(outcome="accepted")
+
+    def drain(self) -> None:
+        """Block until everything queued so far has been written"""
+        if self._thread is not None:
+            self._queue.join()
+
+    def shutdown(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout=30)
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                thread = threading.Thread(target=self._run, name="attempt-writer", daemon=True)
+                thread.start()
+                atexit.register(self.shutdown)
+                self._thread = thread
+
+    def _run(self) -> None:
+        batch: List[ScoredAttempt] = []
+        deadline = time.monotonic() + self.flush_seconds
+        while True:
+            try:
+                item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                item = False
+            if item:
+                batch.append(item)
+            if item is None or len(batch) >= self.batch_size or time.monotonic() >= deadline:
+                if batch:
+                    self._write(batch)
+                    for _ in batch:
+                        self._queue.task_done()
+                    batch = []
+                deadline = time.monotonic() + self.flush_seconds
+            if item is None:
+                self._queue.task_done()
+                return
+
+    def _write(self, batch: List[ScoredAttempt]) -> None:
+        if self._bind is None:
+            from database import engine
+            self._bind = engine
+        try:
+            with stage("attempt_write"):
+                try:
+                    with self._bind.begin() as conn:
+                        write_attempts(conn, batch)
+                except IntegrityError:
+                    # A quiz was deleted (or refreshed shorter) while its
+                    # attempts were queued - write the rest
+                    with self._bind.begin() as conn:
+                        kept = _still_present(conn, batch)
+                        if kept:
+                            write_attempts(conn, kept)
+                    if len(kept) < len(batch):
+                        ATTEMPTS.inc(len(batch) - len(kept), outcome="dropped")
+                    batch = kept
+            ATTEMPTS.inc(len(batch), outcome="written")
+        except SQLAlchemyError as e:
+            ATTEMPTS.inc(len(batch), outcome="dropped")
+            logger.error(f"Failed to write {len(batch)} quiz attempts: {e}")
+
+
+attempt_writer = AttemptWriter(
+    settings.ATTEMPT_QUEUE_SIZE,
+    settings.ATTEMPT_BATCH_SIZE,
+    settings.ATTEMPT_FLUSH_SECONDS,
+)
+ATTEMPT_QUEUE_DEPTH.set_function(lambda: attempt_writer.depth)
+
+
+def reset_question_stats(db: Session, question_ids: List[int]) -> None:
+    """Forget the counts of rewritten questions (the caller commits)"""
+    if question_ids:
+        db.execute(delete(QuestionStats).where(QuestionStats.question_id.in_(question_ids)))
+
+
+def remove_quiz_attempts(db: Session, quiz_id: int) -> None:
+    """
+    Delete a quiz's attempts and counts (the caller commits). The foreign
+    keys cascade on PostgreSQL; SQLite doesn't enforce them.
+    """
+    answer_keys.forget(quiz_id)
+    for model in (QuestionStats, QuizAttemptStats, QuizAttempt):
+        db.execute(delete(model).where(model.quiz_id == quiz_id))
+
+
+def _rate(correct: int, attempts: int) -> Optional[float]:
+    return round(correct / attempts, 4) if attempts else None
+
+
+def attempt_stats(db: Session, quiz_id: int) -> Dict:
+    """Attempt count, mean score and correct rates per question and difficulty"""
+    totals = db.get(QuizAttemptStats, quiz_id)
+    rows = db.execute(
+        select(Question.position, QuestionBank.question, Question.difficulty,
+               func.coalesce(QuestionStats.attempts, 0).label("attempts"),
+               func.coalesce(QuestionStats.correct, 0).label("correct"))
+        .join(QuestionBank, QuestionBank.id == Question.bank_id)
+        .outerjoin(QuestionStats, QuestionStats.question_id == Question.id)
+        .where(Question.quiz_id == quiz_id)
+        .order_by(Question.position)
+    ).all()
+
+    by_difficulty: Dict[str, List[int]] = defaultdict(lambda: [0, 0])
+    for row in rows:
+        by_difficulty[row.difficulty][0] += row.attempts
+        by_difficulty[row.difficulty][1] += row.correct
+
+    attempts = totals.attempts if totals else 0
+    return {
+        "quiz_id": quiz_id,
+        "attempts": attempts,
+        "mean_score": _rate(totals.score_total, totals.question_total) if totals else None,
+        "questions": [
+            {
+                "position": row.position,
+                "question": row.question,
+                "difficulty": row.difficulty,
+                "attempts": row.attempts,
+                "correct": row.correct,
+                "correct_rate": _rate(row.correct, row.attempts),
+            }
+            for row in rows
+        ],
+        "difficulty": {
+            difficulty: {"attempts": a, "correct": c, "correct_rate": _rate(c, a)}
+            for difficulty, (a, c) in sorted(by_difficulty.items())
+        },
+    }
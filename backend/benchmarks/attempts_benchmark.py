@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Attempt ingestion benchmark.
+
+Seeds a scratch SQLite database with the sample quiz and simulates a
+classroom submitting at the end of a session.
+
+Part 1 pushes scored attempts through AttemptWriter with different batch
+sizes (1 = a transaction per attempt, what writing from the request would
+cost) and reports attempts written per second.
+
+Part 2 posts attempts to POST /api/quiz/{id}/attempts from many threads and
+reports request latency and how long the writer needed to catch up.
+
+    python benchmarks/attempts_benchmark.py
+    python benchmarks/attempts_benchmark.py --attempts 20000 --threads 32
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+SAMPLE = os.path.join(BACKEND_DIR, "..", "sample_data", "alan_turing_output.json")
+
+
+def random_answers(sample: dict, rng: random.Random):
+    return [rng.choice(q["options"]) for q in sample["quiz"]]
+
+
+def writer_table(quiz_ids, sample, args) -> None:
+    from attempts import AttemptWriter, load_answer_key, score_attempt
+    from database import SessionLocal, engine
+
+    db = SessionLocal()
+    keys = [load_answer_key(db, quiz_id) for quiz_id in quiz_ids]
+    db.close()
+    rng = random.Random(1)
+    scored = [score_attempt(rng.choice(keys), random_answers(sample, rng)) for _ in range(args.attempts)]
+
+    print(f"{'batch size':>10} {'attempts':>9} {'seconds':>8} {'attempts/s':>11}")
+    for batch_size in (1, 50, 500):
+        count = args.attempts if batch_size > 1 else min(args.attempts, 2000)
+        writer = AttemptWriter(count + 1, batch_size, flush_seconds=0.05, bind=engine)
+        start = time.perf_counter()
+        for attempt in scored[:count]:
+            writer.submit(attempt)
+        writer.drain()
+        elapsed = time.perf_counter() - start
+        writer.shutdown()
+        print(f"{batch_size:10d} {count:9d} {elapsed:8.2f} {count / elapsed:11.0f}")
+    print()
+
+
+def endpoint_table(quiz_ids, sample, args) -> None:
+    from fastapi.testclient import TestClient
+    import main
+
+    client = TestClient(main.app)
+    per_thread = args.attempts // args.threads
+    latencies, statuses = [], []
+    lock = threading.Lock()
+
+    def student(seed):
+        rng = random.Random(seed)
+        local, codes = [], []
+        for _ in range(per_thread):
+            body = {"answers": random_answers(sample, rng), "duration_ms": rng.randint(60_000, 600_000)}
+            start = time.perf_counter()
+            response = client.post(f"/api/quiz/{rng.choice(quiz_ids)}/attempts", json=body)
+            local.append((time.perf_counter() - start) * 1000)
+            codes.append(response.status_code)
+        with lock:
+            latencies.extend(local)
+            statuses.extend(codes)
+
+    threads = [threading.Thread(target=student, args=(i,)) for i in range(args.threads)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    submitted = time.perf_counter() - start
+    main.attempt_writer.drain()
+    written = time.perf_counter() - start
+
+    latencies.sort()
+    accepted = statuses.count(202)
+    print(f"{len(statuses)} POSTs from {args.threads} threads in {submitted:.2f}s "
+          f"({len(statuses) / submitted:.0f}/s), {accepted} accepted, {len(statuses) - accepted} rejected")
+    print(f"latency p50={statistics.median(latencies):.1f} ms  "
+          f"p99={latencies[int(len(latencies) * 0.99) - 1]:.1f} ms")
+    print(f"all attempts written {written - submitted:.2f}s after the last POST")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark batched quiz attempt ingestion")
+    parser.add_argument("--quizzes", type=int, default=20)
+    parser.add_argument("--attempts", type=int, default=5000)
+    parser.add_argument("--threads", type=int, default=16)
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix="wikiquiz-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(scratch, 'bench.db')}"
+    os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+    logging.basicConfig(level=logging.CRITICAL)
+
+    from database import SessionLocal, engine
+    from migrate import run_migrations
+    from models import Quiz
+
+    run_migrations(engine)
+    with open(SAMPLE, encoding="utf-8") as f:
+        sample = json.load(f)
+    db = SessionLocal()
+    quizzes = [
+        Quiz(url=f"{sample['url']}_{i}", title=sample["title"], summary=sample["summary"],
+             key_entities=sample["key_entities"], sections=sample["sections"],
+             quiz=sample["quiz"], related_topics=sample["related_topics"])
+        for i in range(args.quizzes)
+    ]
+    db.add_all(quizzes)
+    db.commit()
+    quiz_ids = [q.id for q in quizzes]
+    db.close()
+
+    writer_table(quiz_ids, sample, args)
+    endpoint_table(quiz_ids, sample, args)
+
+
+if __name__ == "__main__":
+    main()
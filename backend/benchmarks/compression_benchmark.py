@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Response compression benchmark.
+
+Part 1 compresses the sample quiz and a history page with every available
+codec at the per-request (live) and stored levels, reporting size and CPU
+per call.
+
+Part 2 seeds a scratch SQLite database and fetches GET /api/quiz/{id}
+(served from precompressed copies once hot) and GET /api/history (compressed
+per request) with different Accept-Encoding headers, reporting bytes on the
+wire and process CPU per request.
+
+    python benchmarks/compression_benchmark.py
+    python benchmarks/compression_benchmark.py --history 1000 --requests 500
+
+brotli and zstandard rows only appear if those packages are installed.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+SAMPLE = os.path.join(BACKEND_DIR, "..", "sample_data", "alan_turing_output.json")
+
+
+def varied(sample: dict, i: int) -> dict:
+    """The sample quiz with a shuffled summary and its own title, so history rows differ like real ones"""
+    words = sample["summary"].split()
+    random.Random(i).shuffle(words)
+    return {
+        "url": f"{sample['url']}_{i}",
+        "title": f"{sample['title']} {i}",
+        "summary": " ".join(words),
+    }
+
+
+def cpu_per_call(fn, repeat: int) -> float:
+    start = time.process_time()
+    for _ in range(repeat):
+        fn()
+    return (time.process_time() - start) / repeat
+
+
+def codec_table(quiz_body: bytes, history_body: bytes, repeat: int) -> None:
+    from compression import LIVE_LEVELS, STORED_LEVELS, available_encodings, compress
+
+    print(f"{'payload':<10} {'encoding':<9} {'level':>5} {'bytes':>9} {'ratio':>6} {'cpu/call':>10}")
+    for label, body in (("quiz", quiz_body), ("history", history_body)):
+        print(f"{label:<10} {'identity':<9} {'-':>5} {len(body):9d} {1.0:6.2f} {'-':>10}")
+        for encoding in available_encodings():
+            for mode, level in (("live", LIVE_LEVELS[encoding]), ("stored", STORED_LEVELS[encoding])):
+                data = compress(body, encoding, level)
+                reps = max(1, repeat // 20) if mode == "stored" else repeat
+                cpu = cpu_per_call(lambda: compress(body, encoding, level), reps)
+                print(f"{label:<10} {encoding:<9} {level:5d} {len(data):9d} "
+                      f"{len(body) / len(data):6.2f} {cpu * 1e6:8.0f} us")
+    print()
+
+
+def endpoint_table(args) -> None:
+    from fastapi.testclient import TestClient
+    from compression import available_encodings
+    from database import SessionLocal, engine
+    from migrate import run_migrations
+    from models import Quiz
+
+    run_migrations(engine)
+    with open(SAMPLE, encoding="utf-8") as f:
+        sample = json.load(f)
+    db = SessionLocal()
+    for i in range(args.history):
+        db.add(Quiz(
+            **varied(sample, i), key_entities=sample["key_entities"], sections=sample["sections"],
+            quiz=sample["quiz"], related_topics=sample["related_topics"],
+        ))
+    db.commit()
+    quiz_id = db.query(Quiz.id).first()[0]
+    db.close()
+
+    import main
+
+    client = TestClient(main.app)
+    print(f"{'endpoint':<16} {'accept':<9} {'wire bytes':>10} {'cpu/req':>10}")
+    for path in (f"/api/quiz/{quiz_id}", "/api/history"):
+        for accept in ["identity"] + available_encodings():
+            headers = {"Accept-Encoding": accept}
+            client.get(path, headers=headers)  # warm the cache
+            wire = 0
+            start = time.process_time()
+            for _ in range(args.requests):
+                response = client.get(path, headers=headers)
+                wire = response.num_bytes_downloaded
+            cpu = (time.process_time() - start) / args.requests
+            label = "/api/quiz/{id}" if path != "/api/history" else path
+            print(f"{label:<16} {accept:<9} {wire:10d} {cpu * 1e3:7.2f} ms")
+    print("\ncpu/req is the whole in-process round trip (client included); "
+          "compare rows against identity.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark response compression")
+    parser.add_argument("--history", type=int, default=200, help="Quizzes in the history list")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per endpoint and encoding")
+    parser.add_argument("--repeat", type=int, default=200, help="Compressions per codec row")
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix="wikiquiz-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(scratch, 'bench.db')}"
+    os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+
+    from schemas import QuizHistoryItem
+    with open(SAMPLE, encoding="utf-8") as f:
+        sample = json.load(f)
+    quiz_body = json.dumps({"id": 1, **sample}).encode("utf-8")
+    items = [
+        QuizHistoryItem.model_validate({**sample, **varied(sample, i), "id": i + 1,
+                                        "created_at": f"2024-01-01T00:{i // 60 % 60:02d}:{i % 60:02d}"})
+        for i in range(args.history)
+    ]
+    history_body = ("[" + ",".join(item.model_dump_json() for item in items) + "]").encode("utf-8")
+
+    codec_table(quiz_body, history_body, args.repeat)
+    endpoint_table(args)
+
+
+if __name__ == "__main__":
+    main()
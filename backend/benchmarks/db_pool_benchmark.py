@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Concurrent-read benchmark for GET /api/quiz/{id}.
+
+Seeds a scratch SQLite database, then hammers the endpoint from many
+threads (optionally with a writer inserting quizzes in the background) and
+reports throughput, latency and connection pool checkout waits.
+
+    python benchmarks/db_pool_benchmark.py                 # current settings
+    python benchmarks/db_pool_benchmark.py --matrix        # compare configs
+
+Any DB_* / SQLITE_* setting can be overridden through the environment.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+SAMPLE = os.path.join(BACKEND_DIR, "..", "sample_data", "alan_turing_output.json")
+
+# Configurations compared by --matrix
+MATRIX = {
+    "tuned (defaults)": {},
+    "pre-ping on": {"DB_POOL_PRE_PING": "true"},
+    "rollback journal + FULL sync": {"SQLITE_JOURNAL_MODE": "DELETE", "SQLITE_SYNCHRONOUS": "FULL"},
+    "old defaults": {
+        "DB_POOL_PRE_PING": "true", "DB_POOL_SIZE": "5",
+        "SQLITE_JOURNAL_MODE": "DELETE", "SQLITE_SYNCHRONOUS": "FULL", "SQLITE_MMAP_SIZE": "0",
+    },
+}
+
+
+def run(args):
+    if "DATABASE_URL" not in os.environ:
+        scratch = tempfile.mkdtemp(prefix="wikiquiz-bench-")
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(scratch, 'bench.db')}"
+    os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+
+    from fastapi.testclient import TestClient
+    from database import SessionLocal, engine, pool_status
+    from migrate import run_migrations
+    from models import Quiz
+
+    run_migrations(engine)
+    with open(SAMPLE, encoding="utf-8") as f:
+        sample = json.load(f)
+
+    db = SessionLocal()
+    for i in range(args.quizzes):
+        db.add(Quiz(
+            url=f"{sample['url']}_{i}", title=sample["title"], summary=sample["summary"],
+            key_entities=sample["key_entities"], sections=sample["sections"],
+            quiz=sample["quiz"], related_topics=sample["related_topics"],
+        ))
+    db.commit()
+    ids = [row[0] for row in db.query(Quiz.id).all()]
+    db.close()
+
+    import main  # noqa: F401 - imported after seeding so the schema check passes
+
+    stop = threading.Event()
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def reader():
+        client = TestClient(main.app)
+        local = []
+        rng = random.Random()
+        for _ in range(args.requests):
+            start = time.perf_counter()
+            response = client.get(f"/api/quiz/{rng.choice(ids)}")
+            local.append((time.perf_counter() - start) * 1000)
+            if response.status_code != 200:
+                errors.append(response.status_code)
+        with lock:
+            latencies.extend(local)
+
+    def writer():
+        n = 0
+        while not stop.is_set():
+            session = SessionLocal()
+            session.add(Quiz(
+                url=f"{sample['url']}_w{n}", title=sample["title"], summary=sample["summary"],
+                sections=[], quiz=sample["quiz"][:2], related_topics=[],
+            ))
+            session.commit()
+            session.close()
+            n += 1
+            time.sleep(args.write_interval)
+
+    writers = [threading.Thread(target=writer) for _ in range(args.writers)]
+    readers = [threading.Thread(target=reader) for _ in range(args.threads)]
+    for t in writers:
+        t.start()
+    start = time.perf_counter()
+    for t in readers:
+        t.start()
+    for t in readers:
+        t.join()
+    elapsed = time.perf_counter() - start
+    stop.set()
+    for t in writers:
+        t.join()
+
+    latencies.sort()
+    status = pool_status()["primary"]
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "rps": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies),
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1],
+        "pool_wait_ms_avg": status["wait_ms_avg"],
+        "pool_wait_ms_max": status["wait_seconds_max"] * 1000,
+        "pool_timeouts": status["timeouts"],
+    }
+
+
+def report(label, result):
+    print(f"{label:<30} {result['rps']:8.1f} req/s  p50={result['p50_ms']:6.2f} ms  "
+          f"p99={result['p99_ms']:7.2f} ms  pool wait avg={result['pool_wait_ms_avg']:.3f} ms "
+          f"max={result['pool_wait_ms_max']:.1f} ms  errors={result['errors']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark concurrent quiz reads")
+    parser.add_argument("--quizzes", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=100, help="Requests per thread")
+    parser.add_argument("--writers", type=int, default=2, help="Background writer threads")
+    parser.add_argument("--write-interval", type=float, default=0.0, help="Seconds between writes")
+    parser.add_argument("--matrix", action="store_true", help="Compare several configurations")
+    parser.add_argument("--json", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if not args.matrix:
+        result = run(args)
+        if args.json:
+            print("RESULT " + json.dumps(result))
+        else:
+            report("current settings", result)
+        return
+
+    passthrough = [a for a in sys.argv[1:] if a != "--matrix"]
+    for label, overrides in MATRIX.items():
+        env = dict(os.environ, **overrides)
+        env.pop("DATABASE_URL", None)
+        out = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--json", *passthrough],
+            env=env, capture_output=True, text=True, check=True,
+        ).stdout
+        line = next(l for l in out.splitlines() if l.startswith("RESULT "))
+        report(label, json.loads(line[len("RESULT "):]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Parse check for dump_ingest.py against the sample dump in sample_data/.
+
+Reads the fixture with read_dump() and runs every page through
+parse_page(), then compares titles, sections and skipped pages with what
+the fixture holds: the redirect and the Talk page never come out of the
+reader, the stub is dropped by parse_page(), and the two articles keep
+their sections minus the boilerplate ones. Exits with status 1 on any
+mismatch, so it can run in CI:
+
+    python benchmarks/dump_parse_check.py
+
+No database or API key is needed.
+"""
+import os
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from dump_ingest import read_dump, parse_page
+
+SAMPLE_DUMP = os.path.join(os.path.dirname(BACKEND_DIR), "sample_data", "wikipedia_dump_sample.xml.bz2")
+
+# Pages in the fixture that are articles (namespace 0, not redirects)
+EXPECTED_PAGES = ["Alan Turing", "Bletchley Park", "Hut 8"]
+
+# What parse_page() keeps of them; None for pages too short for a quiz
+EXPECTED = {
+    "Alan Turing": {
+        "url": "https://en.wikipedia.org/wiki/Alan_Turing",
+        "revision_id": 1187654321,
+        "sections": ["Early life and education", "Cryptanalysis", "Later life"],
+    },
+    "Bletchley Park": {
+        "url": "https://en.wikipedia.org/wiki/Bletchley_Park",
+        "revision_id": 1190000000,
+        "sections": ["History", "Museum"],
+    },
+    "Hut 8": None,
+}
+
+# Headings dropped as boilerplate, and markup that must not survive parsing
+BOILERPLATE = ("See also", "References", "External links")
+MARKUP = ("{{", "}}", "[[", "]]", "<ref", "'''")
+
+
+def check(path: str):
+    """Mismatches between the parsed fixture and EXPECTED, as messages"""
+    failures = []
+    pages = list(read_dump(path))
+    titles = [page.title for page in pages]
+    if titles != EXPECTED_PAGES:
+        failures.append(f"read_dump titles: expected {EXPECTED_PAGES}, got {titles}")
+
+    for page in pages:
+        data = parse_page(page)
+        expected = EXPECTED.get(page.title)
+        if expected is None:
+            if data is not None:
+                failures.append(f"{page.title}: expected to be skipped, got {len(data['full_content'])} chars")
+            continue
+        if data is None:
+            failures.append(f"{page.title}: skipped, expected an article")
+            continue
+
+        print(f"{page.title}: {len(data['full_content'])} chars, sections {data['sections']}")
+        for key in ("url", "revision_id", "sections"):
+            if data[key] != expected[key]:
+                failures.append(f"{page.title}: {key} expected {expected[key]!r}, got {data[key]!r}")
+        if data["title"] != page.title or data["language"] != "en":
+            failures.append(f"{page.title}: title/language came out as {data['title']!r}/{data['language']!r}")
+        if not data["summary"]:
+            failures.append(f"{page.title}: empty summary")
+        if set(data["section_content"]) - {"General"} != set(expected["sections"]):
+            failures.append(f"{page.title}: section_content has {sorted(data['section_content'])}")
+        for heading in BOILERPLATE:
+            if heading in data["section_content"]:
+                failures.append(f"{page.title}: boilerplate section {heading!r} kept")
+        for token in MARKUP:
+            if token in data["full_content"]:
+                failures.append(f"{page.title}: wikitext {token!r} left in the content")
+    return failures
+
+
+def main():
+    failures = check(SAMPLE_DUMP)
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if not failures:
+        print("OK")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
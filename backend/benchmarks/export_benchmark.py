@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Bulk export benchmark.
+
+Fills a scratch SQLite database with synthetic quizzes (seven banked
+questions each, plus a raw_html page of --html-kb) and reports rows/sec
+for:
+
+- the old way: one ORM load and QuizResponse serialization per quiz, what
+  /api/history followed by /api/quiz/{id} costs the server per quiz
+  (measured on a sample, without the HTTP round trips)
+- export.py as NDJSON and as Parquet, with and without raw_html
+
+plus the bytes written and the peak Python heap during each export, which
+should not grow with --quizzes (Arrow's own buffers are not counted).
+
+    python benchmarks/export_benchmark.py
+    python benchmarks/export_benchmark.py --quizzes 100000 --html-kb 100
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+QUESTIONS_PER_QUIZ = 7
+WORDS = ("turing machine computation cipher enigma bletchley park mathematics logic theory "
+         "intelligence morphogenesis manchester cambridge princeton codebreaking").split()
+
+
+def _text(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def _page(rng: random.Random, corpus: str, chars: int) -> str:
+    start = rng.randrange(max(1, len(corpus) - chars))
+    return f"<div class='mw-parser-output'><p>{corpus[start:start + chars]}</p></div>"
+
+
+def seed(engine, quizzes: int, html_kb: int, batch: int = 1000) -> None:
+    from sqlalchemy import text
+
+    rng = random.Random(1)
+    # Each page is a different slice of a long text, so Parquet can't dedupe them
+    corpus = _text(rng, 256 * 1024)
+    html_chars = html_kb * 1024
+    bank_id = question_id = 0
+    with engine.begin() as conn:
+        for offset in range(0, quizzes, batch):
+            quiz_rows, bank_rows, question_rows = [], [], []
+            for quiz_id in range(offset + 1, min(quizzes, offset + batch) + 1):
+                quiz_rows.append({
+                    "id": quiz_id,
+                    "url": f"https://en.wikipedia.org/wiki/Article_{quiz_id}",
+                    "title": f"Article {quiz_id}",
+                    "summary": _text(rng, 60),
+                    "key_entities": json.dumps({"people": [_text(rng, 2)], "organizations": [_text(rng, 2)],
+                                                "locations": [_text(rng, 1)]}),
+                    "sections": json.dumps([_text(rng, 2) for _ in range(6)]),
+                    "related_topics": json.dumps([_text(rng, 2) for _ in range(5)]),
+                    "raw_html": _page(rng, corpus, html_chars),
+                })
+                for position in range(QUESTIONS_PER_QUIZ):
+                    bank_id += 1
+                    question_id += 1
+                    answer = _text(rng, 2)
+                    bank_rows.append({
+                        "id": bank_id,
+                        "question": _text(rng, 12) + "?",
+                        "options": json.dumps([answer] + [_text(rng, 2) for _ in range(3)]),
+                        "answer": answer,
+                        "explanation": _text(rng, 25),
+                    })
+                    question_rows.append({"id": question_id, "quiz_id": quiz_id, "position": position,
+                                          "difficulty": rng.choice(["easy", "medium", "hard"]),
+                                          "section": "General", "bank_id": bank_id})
+            conn.execute(text(
+                "INSERT INTO quizzes (id, url, language, title, summary, key_entities, sections, "
+                "related_topics, quiz, raw_html, created_at) VALUES (:id, :url, 'en', :title, :summary, "
+                ":key_entities, :sections, :related_topics, '[]', :raw_html, CURRENT_TIMESTAMP)"
+            ), quiz_rows)
+            conn.execute(text(
+                "INSERT INTO question_bank (id, language, question, options, answer, explanation, created_at) "
+                "VALUES (:id, 'en', :question, :options, :answer, :explanation, CURRENT_TIMESTAMP)"
+            ), bank_rows)
+            conn.execute(text(
+                "INSERT INTO questions (id, quiz_id, position, difficulty, section, bank_id) "
+                "VALUES (:id, :quiz_id, :position, :difficulty, :section, :bank_id)"
+            ), question_rows)
+
+
+def per_quiz(sample: int):
+    """The N+1 pattern: list the quizzes, then load and serialize each one"""
+    from database import SessionLocal
+    from models import Quiz
+    from schemas import QuizResponse
+
+    db = SessionLocal()
+    try:
+        start = time.perf_counter()
+        ids = [quiz_id for (quiz_id,) in db.query(Quiz.id).order_by(Quiz.id).limit(sample)]
+        written = 0
+        for quiz_id in ids:
+            quiz = db.query(Quiz).filter(Quiz.id == quiz_id).first()
+            written += len(QuizResponse.model_validate(quiz).model_dump_json())
+            db.expunge_all()
+        return len(ids), written, time.perf_counter() - start
+    finally:
+        db.close()
+
+
+def run_export(engine, export_format: str, include_raw_html: bool, batch_size: int, trace: bool):
+    from export import export_chunks
+
+    if trace:
+        tracemalloc.start()
+    start = time.perf_counter()
+    written = 0
+    for chunk in export_chunks(engine, export_format, include_raw_html=include_raw_html,
+                               batch_size=batch_size):
+        written += len(chunk)
+    elapsed = time.perf_counter() - start
+    peak = 0
+    if trace:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return written, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark bulk quiz export")
+    parser.add_argument("--quizzes", type=int, default=20000)
+    parser.add_argument("--html-kb", type=int, default=50, help="Size of each quiz's raw_html")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--sample", type=int, default=2000, help="Quizzes loaded one by one for the baseline")
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix="wikiquiz-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(scratch, 'bench.db')}"
+    logging.basicConfig(level=logging.CRITICAL)
+
+    from database import engine
+    from export import parquet_available
+    from migrate import run_migrations
+
+    run_migrations(engine)
+    start = time.perf_counter()
+    seed(engine, args.quizzes, args.html_kb)
+    print(f"seeded {args.quizzes:,} quizzes ({args.html_kb} KB raw_html each) in {time.perf_counter() - start:.1f}s")
+    print()
+
+    print(f"{'method':<34} {'rows/s':>10} {'MB out':>9} {'MB/s':>8} {'peak heap MB':>13}")
+    rows, written, elapsed = per_quiz(args.sample)
+    print(f"{'per-quiz load + serialize':<34} {rows / elapsed:10,.0f} {written / 1e6:9.1f} "
+          f"{written / 1e6 / elapsed:8.1f} {'-':>13}")
+
+    formats = ["ndjson"] + (["parquet"] if parquet_available() else [])
+    for export_format in formats:
+        for include_raw_html in (False, True):
+            written, elapsed, _ = run_export(engine, export_format, include_raw_html,
+                                             args.batch_size, trace=False)
+            # A second pass under tracemalloc for memory - it slows things down too much to time
+            _, _, peak = run_export(engine, export_format, include_raw_html, args.batch_size, trace=True)
+            label = f"export {export_format}" + (" + raw_html" if include_raw_html else "")
+            print(f"{label:<34} {args.quizzes / elapsed:10,.0f} {written / 1e6:9.1f} "
+                  f"{written / 1e6 / elapsed:8.1f} {peak / 1e6:13.1f}")
+    if "parquet" not in formats:
+        print("(parquet skipped - pyarrow is not installed)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark: how long `import main` takes in a fresh interpreter.
+
+Runs `python -X importtime -c "import main"` a few times and reports the
+median total, the modules it pulls in that cost the most (cumulative)
+and whether any module that should load lazily - langchain, the Gemini
+client, pyarrow - was imported anyway. Exits with status 1 on a lazy
+module being imported or the median going over --max-ms, so it can run
+in CI:
+
+    python benchmarks/importtime_benchmark.py
+    python benchmarks/importtime_benchmark.py --runs 10 --max-ms 1500
+
+No database or API key is needed; importing must not touch either.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Imported on first use only - seeing them at import time is a regression
+LAZY_MODULES = ("langchain", "langchain_core", "langchain_google_genai", "google.generativeai", "pyarrow")
+
+PROBE = (
+    "import sys, {target}; "
+    "print('\\n'.join(m for m in sys.modules if m in {lazy} or m.split('.')[0] in {lazy}))"
+)
+
+
+def import_once(target: str, env: dict):
+    """
+    (cumulative microseconds of the target and of each module it imports
+    directly, lazy modules that got imported anyway)
+    """
+    probe = PROBE.format(target=target, lazy=repr(set(LAZY_MODULES)))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", probe],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        errors = [line for line in result.stderr.splitlines() if not line.startswith("import time:")]
+        sys.exit(f"FAIL: import {target} failed without a database or API key:\n" + "\n".join(errors[-5:]))
+    modules = {}
+    for line in result.stderr.splitlines():
+        # "import time:   self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Nesting shows as two spaces per level after the separator's own one
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 0 and name.strip() == target or depth == 1:
+            modules[name.strip()] = int(cumulative)
+    return modules, [m for m in result.stdout.split() if m]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure backend import time")
+    parser.add_argument("--module", default="main", help="Module to import")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="Slowest imports to list")
+    parser.add_argument("--max-ms", type=float, default=None, help="Fail if the median is above this")
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix="wikiquiz-bench-")
+    env = {
+        **os.environ,
+        "DATABASE_URL": f"sqlite:///{os.path.join(scratch, 'bench.db')}",
+    }
+    env["GEMINI_API_KEY"] = "x"
+
+    # One throwaway run so .pyc files are written and the OS cache is warm
+    import_once(args.module, env)
+    totals, per_module, lazy = [], defaultdict(list), set()
+    for _ in range(args.runs):
+        modules, loaded = import_once(args.module, env)
+        totals.append(modules.get(args.module, 0) / 1000)
+        for name, micros in modules.items():
+            per_module[name].append(micros / 1000)
+        lazy.update(loaded)
+
+    median = statistics.median(totals)
+    print(f"import {args.module}: median {median:.0f} ms, min {min(totals):.0f} ms over {args.runs} runs")
+    print(f"{'slowest imports of ' + args.module:<40} {'ms':>8}")
+    ranked = sorted(((statistics.median(v), k) for k, v in per_module.items() if k != args.module), reverse=True)
+    for ms, name in ranked[:args.top]:
+        print(f"{name:<40} {ms:8.1f}")
+
+    failed = False
+    if lazy:
+        print(f"\nFAIL: imported at startup but meant to load lazily: {', '.join(sorted(lazy))}")
+        failed = True
+    if args.max_ms is not None and median > args.max_ms:
+        print(f"\nFAIL: median {median:.0f} ms is over the {args.max_ms:.0f} ms budget")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
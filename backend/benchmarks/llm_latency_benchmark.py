@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Tail latency of quiz generation with model fallback and hedging.
+
+Runs QuizGenerator.generate_quiz against the local stub backend
+(llm_stub.py) with a primary model that has a slow tail and occasional
+quota errors, and a faster fallback model. Compares:
+
+- primary only      - today's behaviour: wait out timeouts, surface errors
+- fallback chain    - fail over on ResourceExhausted / timeouts
+- chain + hedging   - also re-send slow calls after the primary's p95
+
+    python benchmarks/llm_latency_benchmark.py
+    python benchmarks/llm_latency_benchmark.py --calls 1000 --slow-rate 0.1
+
+No API key or network needed.
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ["LLM_BACKEND"] = "stub"
+
+
+def _article() -> str:
+    """Text that supports the stub's canned answers, so no call goes to question repair"""
+    path = os.path.join(BACKEND_DIR, "..", "sample_data", "alan_turing_output.json")
+    with open(path, encoding="utf-8") as f:
+        quiz = json.load(f)["quiz"]
+    facts = " ".join(f"{q['explanation']} The answer is {q['answer']}." for q in quiz)
+    return (facts + " Alan Turing was an English mathematician and computer scientist." * 200)[:12000]
+
+
+ARTICLE = _article()
+
+
+def run(label, models, hedge, args):
+    from config import settings
+    from llm import QuizGenerator
+    from metrics import LLM_FAILOVERS, LLM_HEDGES
+
+    settings.LLM_HEDGE_ENABLED = hedge
+    settings.LLM_HEDGE_DELAY_SECONDS = args.latency_ms / 1000 * 3
+    settings.LLM_HEDGE_MIN_DELAY_SECONDS = args.latency_ms / 1000
+    generator = QuizGenerator(models=models)
+
+    fired_before = LLM_HEDGES.value(outcome="fired")
+    won_before = LLM_HEDGES.value(outcome="won")
+    failovers_before = sum(
+        LLM_FAILOVERS.value(model=m.name, reason=r)
+        for m in models for r in ("ResourceExhausted", "DeadlineExceeded")
+    )
+
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    per_thread = args.calls // args.threads
+
+    def worker():
+        local, failed = [], 0
+        for _ in range(per_thread):
+            start = time.perf_counter()
+            try:
+                generator.generate_quiz("Alan Turing", ARTICLE, ["Early life"])
+            except Exception:
+                failed += 1
+            local.append((time.perf_counter() - start) * 1000)
+        with lock:
+            latencies.extend(local)
+            errors.append(failed)
+
+    threads = [threading.Thread(target=worker) for _ in range(args.threads)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    latencies.sort()
+    failovers = sum(
+        LLM_FAILOVERS.value(model=m.name, reason=r)
+        for m in models for r in ("ResourceExhausted", "DeadlineExceeded")
+    ) - failovers_before
+    print(f"{label:<16} p50={statistics.median(latencies):7.0f} ms  "
+          f"p95={latencies[int(len(latencies) * 0.95) - 1]:7.0f} ms  "
+          f"p99={latencies[int(len(latencies) * 0.99) - 1]:7.0f} ms  "
+          f"errors={sum(errors):3d}/{len(latencies)}  failovers={failovers:3.0f}  "
+          f"hedges={LLM_HEDGES.value(outcome='fired') - fired_before:.0f} "
+          f"(won {LLM_HEDGES.value(outcome='won') - won_before:.0f})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark LLM fallback and hedging on the stub backend")
+    parser.add_argument("--calls", type=int, default=400)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--latency-ms", type=float, default=100, help="Typical primary latency")
+    parser.add_argument("--slow-rate", type=float, default=0.05, help="Primary calls hitting the slow tail")
+    parser.add_argument("--error-rate", type=float, default=0.02, help="Primary calls out of quota")
+    parser.add_argument("--timeout", type=float, default=1.5, help="Per-model timeout in seconds")
+    args = parser.parse_args()
+
+    # Failover warnings and the primary-only errors would drown the table
+    logging.basicConfig(level=logging.CRITICAL)
+
+    from llm import ModelClient
+    from llm_stub import StubChatModel
+
+    def chain(with_fallback):
+        primary = ModelClient("stub-flash", args.timeout, StubChatModel(
+            "stub-flash", timeout=args.timeout, latency_ms=args.latency_ms,
+            slow_rate=args.slow_rate, error_rate=args.error_rate, seed=1))
+        if not with_fallback:
+            return [primary]
+        lite = ModelClient("stub-flash-lite", args.timeout, StubChatModel(
+            "stub-flash-lite", timeout=args.timeout, latency_ms=args.latency_ms * 0.7,
+            slow_rate=args.slow_rate / 5, error_rate=0.0, seed=2))
+        return [primary, lite]
+
+    print(f"{args.calls} generations, {args.threads} threads, primary {args.latency_ms:.0f} ms typical, "
+          f"{args.slow_rate:.0%} slow (x20), {args.error_rate:.0%} quota errors, {args.timeout}s timeout")
+    run("primary only", chain(False), False, args)
+    run("fallback chain", chain(True), False, args)
+    run("chain + hedging", chain(True), True, args)
+
+
+if __name__ == "__main__":
+    main()
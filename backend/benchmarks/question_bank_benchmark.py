@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Question bank benchmark.
+
+Builds a synthetic corpus of quiz questions in which a share are
+near-duplicates of earlier ones (the same question reworded slightly, as
+the LLM does for overlapping articles), banks it in a scratch SQLite
+database and reports:
+
+Part 1 - dedupe and storage: how many bank entries the corpus needs, how
+many near-duplicates were linked to their original (recall) and how many
+links went to an unrelated question (false links), and the bytes stored
+with one copy per question (the old questions columns, stored in a side
+table for comparison) against the bank plus its LSH index, both as pages
+used in the database file.
+
+Part 2 - lookup latency: find_similar() for one quiz's questions against
+the full index, the query link_questions() runs on every save.
+
+    python benchmarks/question_bank_benchmark.py
+    python benchmarks/question_bank_benchmark.py --questions 1000000
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+QUIZ_SIZE = 7
+TEMPLATES = [
+    "What year did {a} {verb} the {b}?",
+    "Which {b} is {a} best known for?",
+    "Where did {a} {verb} the {b} of {c}?",
+    "Who worked with {a} on the {b}?",
+    "What was the name of the {b} {a} built in {c}?",
+    "Why did {a} leave {c} after the {b}?",
+]
+VERBS = ["publish", "design", "found", "discover", "describe", "complete", "propose", "lead"]
+FILLERS = ["exactly", "first", "originally", "eventually", "actually"]
+
+
+def _vocabulary(rng: random.Random, size: int):
+    syllables = ["ba", "ko", "ri", "tu", "men", "sar", "lo", "vi", "den", "gra", "ul", "pha", "zo", "ne"]
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(syllables) for _ in range(rng.randint(2, 4))).capitalize())
+    return sorted(words)
+
+
+def _reword(rng: random.Random, question: str) -> str:
+    """A near-duplicate: an extra word, a dropped article or changed case/punctuation"""
+    words = question.rstrip("?").split()
+    change = rng.randrange(3)
+    if change == 0:
+        words.insert(rng.randrange(1, len(words)), rng.choice(FILLERS))
+    elif change == 1 and "the" in words:
+        words.remove("the")
+    else:
+        words = [w.lower() for w in words]
+    return " ".join(words) + rng.choice(["?", " ?", ""])
+
+
+def corpus(count: int, duplicate_share: float, seed: int = 1):
+    """(question dicts, index of the original each near-duplicate rewords, or None)"""
+    rng = random.Random(seed)
+    names = _vocabulary(rng, 20000)
+    questions, sources = [], []
+    for i in range(count):
+        if questions and rng.random() < duplicate_share:
+            source = rng.randrange(len(questions))
+            original = questions[sources[source] if sources[source] is not None else source]
+            questions.append({**original, "question": _reword(rng, original["question"])})
+            sources.append(sources[source] if sources[source] is not None else source)
+            continue
+        a, b, c = rng.sample(names, 3)
+        answer = str(rng.randint(1800, 2020)) if rng.random() < 0.3 else f"University of {rng.choice(names)}"
+        options = [answer] + [f"University of {name}" for name in rng.sample(names, 3)]
+        rng.shuffle(options)
+        questions.append({
+            "question": rng.choice(TEMPLATES).format(a=a, b=b.lower(), c=c, verb=rng.choice(VERBS)),
+            "options": options,
+            "answer": answer,
+            "difficulty": rng.choice(["easy", "medium", "hard"]),
+            "explanation": f"According to the article, {a} and {c} are linked by the {b.lower()}, "
+                           f"which {a} worked on for several years before it was {rng.choice(VERBS)}ed.",
+        })
+        sources.append(None)
+    return questions, sources
+
+
+def bank_corpus(engine, questions, batch_size: int):
+    """Bank the corpus batch by batch; returns the bank id of each question and the time taken"""
+    from sqlalchemy import text
+    from question_bank import band_keys, find_similar, normalize, pack_signature, signature, similarity
+    from config import settings
+
+    bank_ids = []
+    threshold = settings.QUESTION_BANK_SIMILARITY
+    start = time.perf_counter()
+    with engine.connect() as conn:
+        conn.execute(text(
+            "CREATE TABLE naive_questions (id INTEGER PRIMARY KEY, question TEXT, options JSON, "
+            "answer TEXT, explanation TEXT)"
+        ))
+        next_id = 1
+        for offset in range(0, len(questions), batch_size):
+            rows = questions[offset:offset + batch_size]
+            sigs = [signature(q["question"], q["answer"]) for q in rows]
+            matches = find_similar(conn, [(sig, "en", q["answer"]) for sig, q in zip(sigs, rows)])
+            entries, bands, pending = [], [], []
+            for q, sig, bank_id in zip(rows, sigs, matches):
+                answer = normalize(q["answer"])
+                if bank_id is None:
+                    bank_id = next((b for s, a, b in pending if a == answer and similarity(sig, s) >= threshold), None)
+                if bank_id is None:
+                    bank_id, next_id = next_id, next_id + 1
+                    entries.append({"id": bank_id, "question": q["question"], "options": json.dumps(q["options"]),
+                                    "answer": q["answer"], "explanation": q["explanation"],
+                                    "signature": pack_signature(sig)})
+                    keys = set(band_keys(sig, "en", q["answer"]))
+                    bands.extend({"band": key, "bank_id": bank_id} for key in keys)
+                    pending.append((sig, answer, bank_id))
+                bank_ids.append(bank_id)
+            if entries:
+                conn.execute(text(
+                    "INSERT INTO question_bank (id, language, question, options, answer, explanation, signature) "
+                    "VALUES (:id, 'en', :question, :options, :answer, :explanation, :signature)"
+                ), entries)
+                conn.execute(text("INSERT INTO question_bank_bands (band, bank_id) VALUES (:band, :bank_id)"), bands)
+            conn.execute(text(
+                "INSERT INTO naive_questions (question, options, answer, explanation) "
+                "VALUES (:question, :options, :answer, :explanation)"
+            ), [{**q, "options": json.dumps(q["options"])} for q in rows])
+            conn.commit()
+            if offset and offset % 100000 < batch_size:
+                print(f"  banked {offset:,} questions ({time.perf_counter() - start:.0f}s)", flush=True)
+    return bank_ids, time.perf_counter() - start
+
+
+def dedupe_table(engine, questions, sources, bank_ids, elapsed) -> None:
+    from sqlalchemy import text
+
+    duplicates = [i for i, s in enumerate(sources) if s is not None]
+    linked = sum(bank_ids[i] == bank_ids[sources[i]] for i in duplicates)
+    originals = {}
+    for i, s in enumerate(sources):
+        originals.setdefault(bank_ids[i], set()).add(i if s is None else s)
+    false_links = sum(len(group) - 1 for group in originals.values())
+
+    with engine.connect() as conn:
+        entries = conn.execute(text("SELECT count(*) FROM question_bank")).scalar()
+        # Pages used by each table and its indexes
+        usage = dict(conn.execute(text(
+            "SELECT CASE WHEN name LIKE 'naive%' THEN 'naive' "
+            "WHEN name LIKE '%bands%' THEN 'index' ELSE 'bank' END, sum(pgsize - unused) "
+            "FROM dbstat WHERE name LIKE '%question%' AND name NOT LIKE '%entities%' GROUP BY 1"
+        )).all())
+    naive = usage["naive"]
+    # Band rows plus the 64-byte signature on each entry
+    index = usage["index"] + entries * 64
+    # Plus the bank_id each questions row now carries
+    banked = usage["bank"] + usage["index"] + len(questions) * 8
+
+    print(f"{len(questions):,} questions ({len(duplicates):,} near-duplicates) banked in {elapsed:.1f}s "
+          f"({len(questions) / elapsed:,.0f}/s)")
+    print(f"bank entries {entries:,}  (distinct questions {len(questions) - len(duplicates):,})")
+    print(f"near-duplicates linked {linked / max(1, len(duplicates)):.1%}, false links {false_links}")
+    print(f"{'storage':<30} {'MB':>8}")
+    print(f"{'one copy per question':<30} {naive / 1e6:8.1f}")
+    print(f"{'bank + index + links':<30} {banked / 1e6:8.1f}  (of which index {index / 1e6:.1f})")
+    print(f"saved {1 - banked / naive:.1%}")
+    print()
+
+
+def lookup_table(engine, questions, args) -> None:
+    from question_bank import find_similar, signature
+
+    rng = random.Random(3)
+    latencies = []
+    with engine.connect() as conn:
+        for _ in range(args.lookups):
+            # Half the quiz repeats banked questions, half is new text
+            quiz = [rng.choice(questions) for _ in range(QUIZ_SIZE)]
+            quiz = [q if i % 2 else {**q, "question": _reword(rng, q["question"]) + " today"}
+                    for i, q in enumerate(quiz)]
+            start = time.perf_counter()
+            find_similar(conn, [(signature(q["question"], q["answer"]), "en", q["answer"]) for q in quiz])
+            latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    print(f"lookup of one {QUIZ_SIZE}-question quiz against {len(questions):,} questions, "
+          f"{len(latencies)} lookups:")
+    print(f"p50={statistics.median(latencies):.2f} ms  p99={latencies[int(len(latencies) * 0.99) - 1]:.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the question bank")
+    parser.add_argument("--questions", type=int, default=100000)
+    parser.add_argument("--duplicates", type=float, default=0.3, help="Share of near-duplicate questions")
+    parser.add_argument("--batch", type=int, default=1000, help="Questions banked per transaction")
+    parser.add_argument("--lookups", type=int, default=2000)
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix="wikiquiz-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(scratch, 'bench.db')}"
+    os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+    logging.basicConfig(level=logging.CRITICAL)
+
+    from database import engine
+    from migrate import run_migrations
+
+    run_migrations(engine)
+    questions, sources = corpus(args.questions, args.duplicates)
+    bank_ids, elapsed = bank_corpus(engine, questions, args.batch)
+    dedupe_table(engine, questions, sources, bank_ids, elapsed)
+    lookup_table(engine, questions, args)
+
+
+if __name__ == "__main__":
+    main()
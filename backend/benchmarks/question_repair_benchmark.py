@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Tokens and LLM calls per quiz when some generated questions are broken.
+
+Runs QuizGenerator.generate_quiz against the local stub backend
+(llm_stub.py) with a share of the questions spoiled - an option missing,
+or an answer that is not one of them - and compares:
+
+- retry whole quiz  - a quiz with any bad question is thrown away and
+                      generated again (what users did when the saved quiz
+                      failed validation), up to --max-attempts times
+- repair            - bad questions are sent back on their own in one small
+                      call (LLM_REPAIR_ENABLED, the default)
+
+    python benchmarks/question_repair_benchmark.py
+    python benchmarks/question_repair_benchmark.py --quizzes 500 --invalid-rate 0.2
+
+No API key or network needed.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ["LLM_BACKEND"] = "stub"
+
+SAMPLE_QUIZ = os.path.join(BACKEND_DIR, "..", "sample_data", "alan_turing_output.json")
+
+
+def article_text(target_chars: int = 8000) -> str:
+    """Article text that supports the stub's canned answers, about as long as a prompt's"""
+    with open(SAMPLE_QUIZ, encoding="utf-8") as f:
+        sample = json.load(f)
+    facts = " ".join(f"{q['explanation']} The answer is {q['answer']}." for q in sample["quiz"])
+    filler = sample.get("summary") or "Alan Turing was an English mathematician."
+    text = facts
+    while len(text) < target_chars:
+        text += " " + filler
+    return text[:target_chars]
+
+
+def run(label: str, repair: bool, args, article: str):
+    from config import settings
+    from llm import ModelClient, QuizGenerator
+    from llm_stub import StubChatModel
+    from usage import collect_usage
+
+    settings.LLM_REPAIR_ENABLED = repair
+    model = StubChatModel("stub", latency_ms=0, invalid_rate=args.invalid_rate, seed=7)
+    generator = QuizGenerator(models=[ModelClient("stub", 60, model)])
+
+    tokens = calls = retried = failed = questions = 0
+    for _ in range(args.quizzes):
+        with collect_usage() as usage:
+            for attempt in range(args.max_attempts):
+                try:
+                    quiz = generator.generate_quiz("Alan Turing", article, ["General"])["quiz"]
+                except ValueError:
+                    quiz = []
+                # Without repair, a quiz missing questions is one that had bad ones
+                if repair or len(quiz) == args.expected:
+                    break
+                if attempt + 1 < args.max_attempts:
+                    retried += attempt == 0
+            else:
+                failed += 1
+                quiz = []
+        questions += len(quiz)
+        calls += len(usage)
+        tokens += sum(c["input_tokens"] + c["output_tokens"] for c in usage)
+
+    n = args.quizzes
+    print(f"{label:<20} {tokens / n:10,.0f} {calls / n:10.2f} {retried / n:9.1%} "
+          f"{failed / n:8.1%} {questions / n:10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark repair of invalid quiz questions")
+    parser.add_argument("--quizzes", type=int, default=300)
+    parser.add_argument("--invalid-rate", type=float, default=0.1, help="Share of questions spoiled")
+    parser.add_argument("--max-attempts", type=int, default=5, help="Whole-quiz attempts before giving up")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.CRITICAL)
+    with open(SAMPLE_QUIZ, encoding="utf-8") as f:
+        args.expected = len(json.load(f)["quiz"])
+    article = article_text()
+
+    print(f"{args.quizzes} quizzes of {args.expected} questions, {args.invalid_rate:.0%} of questions broken")
+    print(f"{'mode':<20} {'tokens/quiz':>10} {'calls/quiz':>10} {'retried':>9} {'failed':>8} {'questions':>10}")
+    run("retry whole quiz", False, args, article)
+    run("repair", True, args, article)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Hot quiz cache benchmark for GET /api/quiz/{id}.
+
+Seeds a scratch SQLite database and replays a Zipf-distributed read
+workload (a few quizzes get most of the traffic, like real sharing does)
+with the cache on and off, reporting throughput, latency and hit ratio.
+
+    python benchmarks/quiz_cache_benchmark.py
+    python benchmarks/quiz_cache_benchmark.py --quizzes 5000 --zipf 1.2
+
+Any QUIZ_CACHE_* / DB_* setting can be overridden through the environment.
+"""
+import argparse
+import bisect
+import itertools
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+SAMPLE = os.path.join(BACKEND_DIR, "..", "sample_data", "alan_turing_output.json")
+
+CONFIGS = {
+    "cache off": {"QUIZ_CACHE_MAX_BYTES": "0"},
+    "cache on (defaults)": {},
+    "cache on, 512 KB": {"QUIZ_CACHE_MAX_BYTES": str(512 * 1024)},
+}
+
+
+def zipf_sampler(n: int, s: float, seed: int):
+    """Draw ranks 0..n-1 with P(rank k) proportional to 1 / (k + 1) ** s"""
+    cumulative = list(itertools.accumulate(1.0 / (k + 1) ** s for k in range(n)))
+    total = cumulative[-1]
+    rng = random.Random(seed)
+    return lambda: bisect.bisect_left(cumulative, rng.random() * total)
+
+
+def run(args):
+    scratch = tempfile.mkdtemp(prefix="wikiquiz-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(scratch, 'bench.db')}"
+    os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+
+    from fastapi.testclient import TestClient
+    from cache import quiz_cache
+    from database import SessionLocal, engine
+    from migrate import run_migrations
+    from models import Quiz
+
+    run_migrations(engine)
+    with open(SAMPLE, encoding="utf-8") as f:
+        sample = json.load(f)
+
+    db = SessionLocal()
+    for i in range(args.quizzes):
+        db.add(Quiz(
+            url=f"{sample['url']}_{i}", title=sample["title"], summary=sample["summary"],
+            key_entities=sample["key_entities"], sections=sample["sections"],
+            quiz=sample["quiz"], related_topics=sample["related_topics"],
+        ))
+    db.commit()
+    ids = [row[0] for row in db.query(Quiz.id).order_by(Quiz.id).all()]
+    db.close()
+
+    import main  # noqa: F401 - imported after seeding so the schema check passes
+
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def reader(seed):
+        client = TestClient(main.app)
+        pick = zipf_sampler(len(ids), args.zipf, seed)
+        local = []
+        for _ in range(args.requests):
+            start = time.perf_counter()
+            response = client.get(f"/api/quiz/{ids[pick()]}")
+            local.append((time.perf_counter() - start) * 1000)
+            if response.status_code != 200:
+                errors.append(response.status_code)
+        with lock:
+            latencies.extend(local)
+
+    readers = [threading.Thread(target=reader, args=(i,)) for i in range(args.threads)]
+    start = time.perf_counter()
+    for t in readers:
+        t.start()
+    for t in readers:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    stats = quiz_cache.stats()
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "rps": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies),
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1],
+        "hit_ratio": stats["hit_ratio"],
+        "cache_mb": stats["bytes"] / (1024 * 1024),
+        "evictions": stats["evictions"],
+    }
+
+
+def report(label, result):
+    print(f"{label:<22} {result['rps']:8.1f} req/s  p50={result['p50_ms']:6.2f} ms  "
+          f"p99={result['p99_ms']:7.2f} ms  hit ratio={result['hit_ratio']:.3f}  "
+          f"cache={result['cache_mb']:.1f} MB  evictions={result['evictions']}  "
+          f"errors={result['errors']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the hot quiz cache")
+    parser.add_argument("--quizzes", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=500, help="Requests per thread")
+    parser.add_argument("--zipf", type=float, default=1.1, help="Zipf exponent of the workload")
+    parser.add_argument("--json", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.json:
+        print("RESULT " + json.dumps(run(args)))
+        return
+
+    for label, overrides in CONFIGS.items():
+        env = dict(os.environ, **overrides)
+        out = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--json", *sys.argv[1:]],
+            env=env, capture_output=True, text=True, check=True,
+        ).stdout
+        line = next(l for l in out.splitlines() if l.startswith("RESULT "))
+        report(label, json.loads(line[len("RESULT "):]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Overhead of the per-client rate limits.
+
+Reports, in microseconds per request:
+
+- RateLimiter.hit() on its own, let through and refused, for a few
+  numbers of distinct clients (up to RATE_LIMIT_MAX_CLIENTS, where the
+  oldest buckets start being dropped)
+- RateLimitMiddleware in front of an empty ASGI app, against the bare app,
+  for a limited path (POST /api/generate) and one it lets through
+  untouched (GET /api/history)
+
+plus, for RATE_LIMIT_SHARED, how long one background sync takes on a
+scratch SQLite database - that runs off the request path.
+
+    python benchmarks/rate_limit_benchmark.py
+    python benchmarks/rate_limit_benchmark.py --requests 500000 --clients 100000
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def _limiter(per_minute: float, burst: int, max_clients: int, shared: bool = False, bind=None):
+    from rate_limit import Budget, RateLimiter
+
+    budgets = {"generate": Budget("generate", per_minute, burst)}
+    # A sync interval long enough that the thread never runs during the timing
+    return RateLimiter(budgets, max_clients, shared=shared, sync_seconds=3600, bind=bind)
+
+
+def time_hits(limiter, clients: list, requests: int) -> float:
+    """Microseconds per hit() call, RateLimited included"""
+    from rate_limit import RateLimited
+
+    count = len(clients)
+    start = time.perf_counter()
+    for i in range(requests):
+        try:
+            limiter.hit("generate", clients[i % count])
+        except RateLimited:
+            pass
+    return (time.perf_counter() - start) / requests * 1e6
+
+
+async def _empty_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+def time_asgi(app, method: str, path: str, clients: int, requests: int) -> float:
+    """Microseconds per request through an ASGI app, from distinct client addresses"""
+    scopes = [{"type": "http", "method": method, "path": path, "headers": [(b"host", b"localhost")],
+               "client": (f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}", 40000)} for i in range(clients)]
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    async def run():
+        start = time.perf_counter()
+        for i in range(requests):
+            await app(scopes[i % clients], receive, send)
+        return time.perf_counter() - start
+
+    return asyncio.run(run()) / requests * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the rate limiter's overhead")
+    parser.add_argument("--requests", type=int, default=200000)
+    parser.add_argument("--clients", type=int, default=10000, help="Distinct clients in the mixed runs")
+    parser.add_argument("--max-clients", type=int, default=100000, help="RATE_LIMIT_MAX_CLIENTS")
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix="wikiquiz-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(scratch, 'bench.db')}"
+    logging.basicConfig(level=logging.CRITICAL)
+
+    from database import engine
+    from migrate import run_migrations
+    from rate_limit import RateLimitMiddleware
+
+    run_migrations(engine)
+
+    print(f"{'RateLimiter.hit()':<44} {'us/request':>10}")
+    for clients in (1, args.clients, args.max_clients * 2):
+        names = [f"ip:10.0.{i >> 8 & 255}.{i & 255}/{i}" for i in range(clients)]
+        allowed = _limiter(1e9, 10 ** 9, args.max_clients)
+        refused = _limiter(1e-9, 1, args.max_clients)
+        time_hits(refused, names, min(clients, args.max_clients))  # use up every bucket first
+        label = f"{clients:,} client(s)"
+        if clients > args.max_clients:
+            # Every bucket is dropped before its client comes back, so nothing is refused
+            print(f"  {label + ', over max clients':<42} {time_hits(allowed, names, args.requests):10.2f}")
+            continue
+        print(f"  {label + ', let through':<42} {time_hits(allowed, names, args.requests):10.2f}")
+        print(f"  {label + ', refused':<42} {time_hits(refused, names, args.requests):10.2f}")
+
+    print()
+    print(f"{'ASGI request, ' + format(args.clients, ',') + ' clients':<44} {'us/request':>10} {'overhead':>9}")
+    bare = time_asgi(_empty_app, "POST", "/api/generate", args.clients, args.requests)
+    print(f"  {'no middleware':<42} {bare:10.2f} {'-':>9}")
+    for label, method, path, limiter in (
+        ("POST /api/generate, let through", "POST", "/api/generate", _limiter(1e9, 10 ** 9, args.max_clients)),
+        ("POST /api/generate, refused (429)", "POST", "/api/generate", _limiter(1e-9, 1, args.max_clients)),
+        ("GET /api/history, not limited", "GET", "/api/history", _limiter(1e9, 10 ** 9, args.max_clients)),
+    ):
+        app = RateLimitMiddleware(_empty_app, limiter)
+        per_request = time_asgi(app, method, path, args.clients, args.requests)
+        print(f"  {label:<42} {per_request:10.2f} {per_request - bare:9.2f}")
+
+    print()
+    print(f"{'RATE_LIMIT_SHARED sync (background)':<44} {'ms/sync':>10}")
+    for clients in (100, args.clients):
+        limiter = _limiter(1e9, 10 ** 9, args.max_clients, shared=True, bind=engine)
+        names = [f"ip:10.1.{i >> 8 & 255}.{i & 255}" for i in range(clients)]
+        time_hits(limiter, names, clients)
+        start = time.perf_counter()
+        limiter.sync()
+        first = time.perf_counter() - start
+        time_hits(limiter, names, clients)
+        start = time.perf_counter()
+        limiter.sync()
+        again = time.perf_counter() - start
+        print(f"  {f'{clients:,} clients, new rows':<42} {first * 1000:10.1f}")
+        print(f"  {f'{clients:,} clients, existing rows':<42} {again * 1000:10.1f}")
+
+
+if __name__ == "__main__":
+    main()
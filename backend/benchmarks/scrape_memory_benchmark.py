@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Peak memory of fetching and parsing an article, whole page vs streamed.
+
+Pages shaped like the largest Wikipedia articles (long list articles:
+a big head and language menu, a long body of tables and references, a
+stack of navboxes, footer and scripts) are served from a local HTTP
+server and scraped four ways:
+
+- whole page        - response.text parsed whole and kept as raw_html, the
+                      tree left to the garbage collector (how scrape()
+                      worked before streaming)
+- streamed          - read until the article ends (ArticleEndScanner),
+                      SCRAPE_MAX_BYTES off
+- streamed, capped  - the same with the SCRAPE_MAX_BYTES default
+- no raw_html       - capped, with SCRAPE_KEEP_RAW_HTML off
+
+Reports bytes read, peak Python heap during the scrape (tracemalloc),
+heap still held by the result dict, time, and the article text length
+to show what the cap costs.
+
+    python benchmarks/scrape_memory_benchmark.py
+    python benchmarks/scrape_memory_benchmark.py --sizes 1 4 16
+    python benchmarks/scrape_memory_benchmark.py --url https://en.wikipedia.org/wiki/List_of_lists_of_lists
+
+--url fetches real articles instead (needs network).
+"""
+import argparse
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+
+def synthetic_page(body_mb: float, navboxes: int = 8, languages: int = 250) -> bytes:
+    """A rendered article of about body_mb MB of body plus the usual chrome around it"""
+    head = ('<!DOCTYPE html><html lang="en"><head><meta charset="UTF-8"><title>List of things</title>'
+            '<script>RLCONF={"wgRevisionId":1234567890,"wgTitle":"List of things"};'
+            + "var x=1;" * 8000 + "</script></head><body>")
+    menu = ('<div id="p-lang" class="vector-menu"><ul>'
+            + "".join(f'<li class="interlanguage-link"><a href="https://l{i}.wikipedia.org/wiki/X" '
+                      f'title="Liste {i}" lang="l{i}">Language {i}</a></li>' for i in range(languages))
+            + "</ul></div>")
+    parts = [head, menu, '<h1 id="firstHeading" class="firstHeading">List of things</h1>',
+             '<div id="mw-content-text" class="mw-body-content">'
+             '<div class="mw-content-ltr mw-parser-output" lang="en" dir="ltr">',
+             '<p>The <b>list of things</b> covers things that were listed, with the year, the place '
+             'and the people involved.<sup class="reference"><a href="#cite_note-1">[1]</a></sup></p>']
+    size, section = 0, 0
+    while size < body_mb * 1e6:
+        section += 1
+        chunk = (f'<h2><span class="mw-headline" id="S{section}">Part {section}</span></h2>'
+                 + "".join(f'<p>Thing {section}.{i} was listed in {1900 + i} at <a href="/wiki/P{i}">'
+                           f'Place {i}</a> by <a href="/wiki/N{i}">Person {i}</a>.'
+                           f'<sup class="reference"><a href="#cite_note-{i}">[{i}]</a></sup></p>'
+                           for i in range(20))
+                 + '<table class="wikitable sortable"><tbody>'
+                 + "".join(f'<tr><td><a href="/wiki/T{section}_{i}">Thing {section}.{i}</a></td>'
+                           f'<td>{1900 + i}</td><td><a href="/wiki/P{i}">Place {i}</a></td></tr>'
+                           for i in range(60))
+                 + "</tbody></table>")
+        parts.append(chunk)
+        size += len(chunk)
+    parts.append('<h2><span class="mw-headline" id="References">References</span></h2>'
+                 '<div class="reflist"><ol class="references">'
+                 + "".join(f'<li id="cite_note-{i}"><cite>Source {i}, page {i}.</cite></li>' for i in range(2000))
+                 + "</ol></div>")
+    for n in range(navboxes):
+        parts.append('<div class="navbox-styles"><style>.navbox{}</style></div>'
+                     f'<div role="navigation" class="navbox" aria-labelledby="nb{n}"><table class="nowraplinks">'
+                     + "".join(f'<tr><td><div><a href="/wiki/Nav_{n}_{i}">Navbox {n} link {i}</a></div></td></tr>'
+                               for i in range(800))
+                     + "</table></div>")
+    parts.append("</div></div>")
+    parts.append('<div class="printfooter">Retrieved from https://en.wikipedia.org/wiki/List_of_things</div>'
+                 '<div id="catlinks" class="catlinks"><ul>'
+                 + "".join(f'<li><a href="/wiki/Category:C{i}">Category {i}</a></li>' for i in range(40))
+                 + "</ul></div>" + "<script>var y=2;" + "y++;" * 40000 + "</script></body></html>")
+    return "".join(parts).encode("utf-8")
+
+
+def serve(pages: dict) -> str:
+    """Serve pages from a local HTTP server; returns its base URL"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = pages[self.path]
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=UTF-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            try:
+                self.wfile.write(body)
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # the streamed scraper hung up early
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def whole_page(scraper, url: str, article):
+    """The old path: whole response, whole tree, left for the garbage collector"""
+    import requests
+    from bs4 import BeautifulSoup
+    from languages import profile_for
+
+    response = requests.get(url, headers=scraper.headers, timeout=scraper.timeout)
+    response.raise_for_status()
+    html = response.text
+    soup = BeautifulSoup(html, "html.parser")
+    data = scraper._extract(soup, html, article, profile_for(article.language))
+    return data, len(response.content)
+
+
+def streamed(scraper, url: str, article):
+    html = scraper._fetch(url)
+    read = len(html.encode("utf-8"))
+    return scraper.parse(html, article), read
+
+
+def measure(run, scraper, url: str, article):
+    """(bytes read, peak heap, heap held by the result, seconds, article chars)"""
+    start = time.perf_counter()
+    data, read = run(scraper, url, article)
+    elapsed = time.perf_counter() - start
+    del data
+
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    data, _ = run(scraper, url, article)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return read, peak - baseline, current - baseline, elapsed, len(data["full_content"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark peak memory of article scraping")
+    parser.add_argument("--sizes", type=float, nargs="+", default=[0.5, 2, 8],
+                        help="Body sizes of the synthetic articles, MB")
+    parser.add_argument("--url", action="append", help="Scrape this real article instead (repeatable)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+    from config import settings
+    from languages import canonicalize_url
+    from scraper import WikipediaScraper
+
+    if args.url:
+        targets = [(url, url) for url in args.url]
+    else:
+        pages = {f"/{size}": synthetic_page(size) for size in args.sizes}
+        base = serve(pages)
+        targets = [(f"{len(pages[f'/{size}']) / 1e6:.1f} MB page", base + f"/{size}") for size in args.sizes]
+    article = canonicalize_url("https://en.wikipedia.org/wiki/List_of_things")
+
+    modes = [
+        ("whole page", whole_page, WikipediaScraper(max_bytes=0, keep_raw_html=True)),
+        ("streamed", streamed, WikipediaScraper(max_bytes=0, keep_raw_html=True)),
+        (f"streamed, capped {settings.SCRAPE_MAX_BYTES / 1e6:.1f} MB", streamed,
+         WikipediaScraper(keep_raw_html=True)),
+        ("capped, no raw_html", streamed, WikipediaScraper(keep_raw_html=False)),
+    ]
+    print(f"{'page / mode':<34} {'read MB':>8} {'peak MB':>8} {'kept MB':>8} {'ms':>7} {'text chars':>11}")
+    for label, url in targets:
+        print(label)
+        page = canonicalize_url(url) if args.url else article
+        for name, run, scraper in modes:
+            read, peak, kept, elapsed, chars = measure(run, scraper, url, page)
+            print(f"  {name:<32} {read / 1e6:8.1f} {peak / 1e6:8.1f} {kept / 1e6:8.1f} "
+                  f"{elapsed * 1000:7.0f} {chars:11,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Search latency benchmark.
+
+Seeds a throwaway SQLite database with synthetic quizzes, builds the search
+index and times typical /api/search queries.
+
+    python benchmarks/search_benchmark.py --quizzes 100000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# Point the app at a scratch database before anything imports config
+SCRATCH_DIR = tempfile.mkdtemp(prefix="wikiquiz-bench-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(SCRATCH_DIR, 'bench.db')}"
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+
+from database import SessionLocal, engine  # noqa: E402
+from migrate import run_migrations  # noqa: E402
+from models import Quiz  # noqa: E402
+from search import index_quiz, search_quizzes  # noqa: E402
+
+# Pseudo-words drawn with a Zipf-like skew so common terms match many
+# quizzes and rare ones only a few, like real article text
+SYLLABLES = ["ka", "lo", "mi", "ren", "tus", "bar", "quo", "vel", "ni", "dor", "sa", "pex"]
+WORDS = sorted({a + b + c for a in SYLLABLES for b in SYLLABLES for c in SYLLABLES})
+PEOPLE = [f"Person {i}" for i in range(2000)]
+PLACES = [f"Place {i}" for i in range(500)]
+SECTIONS = ["History", "Early life", "Career", "Legacy", "Geography", "Culture", "General"]
+
+
+def _word(rng):
+    return WORDS[min(int(rng.paretovariate(1.1)) - 1, len(WORDS) - 1)]
+
+
+def _sentence(rng, n):
+    return " ".join(_word(rng) for _ in range(n))
+
+
+def seed(count: int, rng: random.Random) -> None:
+    db = SessionLocal()
+    try:
+        for start in range(0, count, 1000):
+            batch = []
+            for i in range(start, min(start + 1000, count)):
+                questions = [
+                    {
+                        "question": _sentence(rng, 12) + "?",
+                        "options": [_sentence(rng, 2) for _ in range(4)],
+                        "answer": "",
+                        "difficulty": rng.choice(["easy", "medium", "hard"]),
+                        "explanation": _sentence(rng, 15),
+                        "section": rng.choice(SECTIONS),
+                    }
+                    for _ in range(8)
+                ]
+                for q in questions:
+                    q["answer"] = q["options"][0]
+                batch.append(Quiz(
+                    url=f"https://en.wikipedia.org/wiki/Bench_{i}",
+                    title=f"{_sentence(rng, 2).title()} {i}",
+                    summary=_sentence(rng, 60),
+                    key_entities={
+                        "people": rng.sample(PEOPLE, 3),
+                        "organizations": [],
+                        "locations": rng.sample(PLACES, 2),
+                    },
+                    sections=SECTIONS,
+                    quiz=questions,
+                    related_topics=[],
+                ))
+            db.add_all(batch)
+            db.commit()
+            for quiz in batch:
+                index_quiz(db, quiz, commit=False)
+            db.commit()
+            db.expunge_all()
+    finally:
+        db.close()
+
+
+def time_query(label, runs, **kwargs):
+    db = SessionLocal()
+    try:
+        timings = []
+        total = 0
+        for _ in range(runs):
+            start = time.perf_counter()
+            total = search_quizzes(db, **kwargs)["total"]
+            timings.append((time.perf_counter() - start) * 1000)
+    finally:
+        db.close()
+    timings.sort()
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(f"{label:<34} hits={total:<7} p50={statistics.median(timings):7.2f} ms  p95={p95:7.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark quiz search")
+    parser.add_argument("--quizzes", type=int, default=100_000)
+    parser.add_argument("--runs", type=int, default=50)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    run_migrations(engine)
+
+    start = time.perf_counter()
+    seed(args.quizzes, rng)
+    print(f"Seeded and indexed {args.quizzes} quizzes in {time.perf_counter() - start:.1f}s")
+
+    time_query("newest first (no query)", args.runs)
+    time_query("common term", args.runs, query=WORDS[1])
+    time_query("rare term", args.runs, query=WORDS[400])
+    time_query("two terms + prefix", args.runs, query=f"{WORDS[20]} {WORDS[60][:4]}")
+    time_query("term + difficulty facet", args.runs, query=WORDS[20], filters={"difficulty": "hard"})
+    time_query("entity facet only", args.runs, filters={"entity": "Person 7"})
+    time_query("deep page (page 50)", args.runs, query=WORDS[5], page=50)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Size and lookup speed of the local title index (title_index.py).
+
+Builds an index in a scratch directory, from synthetic titles or from a
+real all-titles dump, then reports build time, file size and microseconds
+per lookup for:
+
+- exact       - the title as stored
+- folded      - different case and accents
+- qualifier   - with a "(...)" qualifier the stored title doesn't have
+- fuzzy       - a typo near the end
+- miss        - not a title; the bloom filter turns most of these away
+- 5 topics    - resolve_topics() on a typical related_topics list
+
+    python benchmarks/title_index_benchmark.py
+    python benchmarks/title_index_benchmark.py --titles 5000000
+    python benchmarks/title_index_benchmark.py --dump enwiki-latest-all-titles-in-ns0.gz
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+SYLLABLES = ["an", "ber", "cal", "dor", "el", "fen", "gar", "hol", "is", "jun", "kar", "lin", "mor",
+             "nes", "ol", "per", "quin", "ros", "sal", "tur", "ul", "ven", "wal", "xen", "yor", "zel"]
+
+
+def synthetic_titles(count: int, seed: int = 7):
+    rng = random.Random(seed)
+    words = sorted({"".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))) for _ in range(50000)})
+    for _ in range(count):
+        title = " ".join(rng.choice(words) for _ in range(rng.randint(1, 4))).capitalize()
+        if rng.random() < 0.05:
+            title += f" ({rng.choice(words)})"
+        yield title
+
+
+def per_lookup(fn, items, repeat: int = 3) -> float:
+    """Microseconds per call, best of a few passes"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for item in items:
+            fn(item)
+        best = min(best, (time.perf_counter() - start) / len(items))
+    return best * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the local title index")
+    parser.add_argument("--titles", type=int, default=2000000, help="Synthetic titles to index")
+    parser.add_argument("--dump", help="Index this all-titles dump instead")
+    parser.add_argument("--lookups", type=int, default=2000)
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix="wikiquiz-bench-")
+    os.environ["TITLE_INDEX_DIR"] = scratch
+    logging.basicConfig(level=logging.ERROR)
+
+    from title_index import build_index, index_for, index_path, read_titles, resolve_title, resolve_topics
+
+    if args.dump:
+        source = list(read_titles(args.dump))
+    else:
+        source = list(synthetic_titles(args.titles))
+    path = index_path("en")
+    start = time.perf_counter()
+    count = build_index(source, path)
+    built = time.perf_counter() - start
+    size = os.path.getsize(path)
+    print(f"{count:,} titles, built in {built:.1f}s, {size / 1e6:,.1f} MB ({size / count:.0f} bytes/title)")
+
+    start = time.perf_counter()
+    index_for("en")
+    print(f"opened in {(time.perf_counter() - start) * 1000:.2f} ms (mmap - pages load on use)")
+
+    rng = random.Random(1)
+    sample = [t for t in rng.sample(source, min(args.lookups, len(source))) if "(" not in t and len(t) > 8]
+    cases = {
+        "exact": sample,
+        "folded": [t.upper().replace("o", "ö") for t in sample],
+        "qualifier": [f"{t} (topic)" for t in sample],
+        "fuzzy": [t[:-1] + ("x" if t[-1] != "x" else "y") for t in sample],
+        "miss": [f"Qq{t}zz" for t in sample],
+    }
+    print()
+    print(f"{'lookup':<12} {'us/lookup':>10} {'resolved':>9}")
+    for name, topics in cases.items():
+        found = sum(resolve_title(topic, "en")[0] is not None for topic in topics)
+        micros = per_lookup(lambda topic: resolve_title(topic, "en"), topics)
+        print(f"{name:<12} {micros:10.1f} {found / len(topics):9.1%}")
+    batches = [[rng.choice(cases[name]) for name in cases] for _ in range(len(sample) // 5)]
+    micros = per_lookup(lambda topics: resolve_topics(topics, "en"), batches)
+    print(f"{'5 topics':<12} {micros:10.1f}")
+
+
+if __name__ == "__main__":
+    main()
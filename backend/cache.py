@@ -0,0 +1,318 @@
+"""
+In-process cache of serialized quiz responses.
+
+Popular quizzes get read over and over, and each read costs a DB round-trip
+plus Pydantic validation and JSON encoding of the whole quiz. This keeps the
+final JSON bytes in memory instead, keyed by quiz id with an article ->
+id index, so a hit is a dict lookup and a socket write. Articles are keyed
+by (language, title) - see languages.article_key - so every form of an
+article's URL finds the same quiz. Each entry also holds the
+precompressed copies of the JSON (see compression.py), which count towards
+the byte budget.
+
+Two tiers:
+- Local LRU per worker, bounded by total payload bytes
+- Optional shared tier in a tmpfs directory (e.g. /dev/shm/wikiquiz) so all
+  uvicorn workers on a host share each other's hits
+
+Entries are invalidated when a quiz is deleted or refreshed. A copy is
+served for QUIZ_CACHE_TTL_SECONDS after it was first cached at the
+latest, in either tier - a local copy taken from the shared tier keeps
+the shared file's age - so a change that missed an invalidation (another
+worker, a lost race) is never served for longer than that.
+"""
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from compression import Payload
+from config import settings
+from languages import article_key
+
+logger = logging.getLogger(__name__)
+
+# Precompressed copies the shared tier looks for next to each quiz
+VARIANT_ENCODINGS = ("zstd", "br", "gzip")
+
+
+class SharedDirTier:
+    """
+    Payloads stored as files in a memory-backed directory, shared by every
+    worker on the host. Writes are atomic (temp file + rename), so readers
+    never see half a payload. A payload's age is the JSON file's mtime,
+    which the rename makes the time it was written.
+    """
+
+    def __init__(self, directory: str, max_entries: int = 10000):
+        self.directory = directory
+        self.max_entries = max_entries
+        os.makedirs(directory, exist_ok=True)
+
+    def _quiz_path(self, quiz_id: int, encoding: Optional[str] = None) -> str:
+        name = f"quiz-{quiz_id}.json" if encoding is None else f"quiz-{quiz_id}.json.{encoding}"
+        return os.path.join(self.directory, name)
+
+    def _article_path(self, key: str) -> str:
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"article-{digest}")
+
+    def _write(self, path: str, data: bytes) -> None:
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except OSError:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+
+    def _read(self, path: str) -> Optional[bytes]:
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def get(self, quiz_id: int, max_age: Optional[float] = None) -> Optional[Tuple[Payload, float]]:
+        """(payload, seconds since it was written), or None if missing or older than max_age"""
+        try:
+            with open(self._quiz_path(quiz_id), "rb") as f:
+                age = time.time() - os.fstat(f.fileno()).st_mtime
+                if max_age is not None and age >= max_age:
+                    return None
+                body = f.read()
+        except OSError:
+            return None
+        variants = {}
+        for encoding in VARIANT_ENCODINGS:
+            data = self._read(self._quiz_path(quiz_id, encoding))
+            if data is not None:
+                variants[encoding] = data
+        return Payload(body, variants), max(0.0, age)
+
+    def lookup_article(self, key: str) -> Optional[int]:
+        try:
+            with open(self._article_path(key), "rb") as f:
+                return int(f.read())
+        except (OSError, ValueError):
+            return None
+
+    def put(self, quiz_id: int, key: str, payload: Payload) -> None:
+        try:
+            # Variants first, so a reader that finds the JSON finds them too
+            for encoding, data in payload.variants.items():
+                self._write(self._quiz_path(quiz_id, encoding), data)
+            self._write(self._quiz_path(quiz_id), payload.body)
+            self._write(self._article_path(key), str(quiz_id).encode())
+        except OSError as e:
+            logger.warning(f"Shared quiz cache write failed: {e}")
+
+    def invalidate(self, quiz_id: int, key: Optional[str] = None) -> None:
+        paths = [self._quiz_path(quiz_id)] + [self._quiz_path(quiz_id, e) for e in VARIANT_ENCODINGS]
+        if key:
+            paths.append(self._article_path(key))
+        for path in paths:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+    def prune(self) -> None:
+        """
+        Drop the oldest payloads once the directory holds too many, and the
+        oldest article pointers likewise - every article ever cached leaves
+        one, and on tmpfs each costs a page of memory
+        """
+        try:
+            quizzes, articles = [], []
+            for entry in os.scandir(self.directory):
+                if entry.name.startswith("quiz-") and entry.name.endswith(".json"):
+                    quizzes.append(entry)
+                elif entry.name.startswith("article-"):
+                    articles.append(entry)
+        except OSError:
+            return
+        for entries, variants in ((quizzes, VARIANT_ENCODINGS), (articles, ())):
+            if len(entries) <= self.max_entries:
+                continue
+            entries.sort(key=self._mtime)
+            for entry in entries[:len(entries) - self.max_entries]:
+                for path in [entry.path] + [f"{entry.path}.{e}" for e in variants]:
+                    try:
+                        os.unlink(path)
+                    except OSError:
+                        pass
+
+    @staticmethod
+    def _mtime(entry) -> float:
+        # Another worker may have pruned it since the scan
+        try:
+            return entry.stat().st_mtime
+        except OSError:
+            return 0.0
+
+
+class QuizCache:
+    """Byte-bounded LRU of serialized quiz responses (with their compressed copies)"""
+
+    def __init__(self, max_bytes: int, ttl_seconds: float = 300,
+                 shared: Optional[SharedDirTier] = None):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.shared = shared
+        self._lock = threading.Lock()
+        # quiz id -> (payload, article key if known, stored at)
+        self._entries: "OrderedDict[int, Tuple[Payload, Optional[str], float]]" = OrderedDict()
+        self._by_article: Dict[str, int] = {}
+        self._bytes = 0
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._puts = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def get(self, quiz_id: int, url: Optional[str] = None) -> Optional[Payload]:
+        return self._get(quiz_id, article_key(url) if url else None)
+
+    def _get(self, quiz_id: int, key: Optional[str]) -> Optional[Payload]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(quiz_id)
+            if entry is not None:
+                payload, entry_key, stored_at = entry
+                if time.monotonic() - stored_at < self.ttl_seconds:
+                    self._entries.move_to_end(quiz_id)
+                    self.hits += 1
+                    return payload
+                self._remove(quiz_id)
+                key = key or entry_key
+
+        if self.shared is not None:
+            found = self.shared.get(quiz_id, max_age=self.ttl_seconds)
+            if found is not None:
+                payload, age = found
+                # Keep a local copy so the next hit skips the file read -
+                # as old as the shared one, so the TTL still counts from
+                # when the quiz was first cached
+                self._put(quiz_id, key, payload, share=False, age=age)
+                with self._lock:
+                    self.shared_hits += 1
+                return payload
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def get_by_url(self, url: str) -> Optional[Payload]:
+        """Look a quiz up by any URL form of its article"""
+        if not self.enabled:
+            return None
+        key = article_key(url)
+        with self._lock:
+            quiz_id = self._by_article.get(key)
+        if quiz_id is None and self.shared is not None:
+            quiz_id = self.shared.lookup_article(key)
+        if quiz_id is None:
+            with self._lock:
+                self.misses += 1
+            return None
+        return self._get(quiz_id, key)
+
+    def put(self, quiz_id: int, url: Optional[str], payload: Payload, share: bool = True) -> None:
+        self._put(quiz_id, article_key(url) if url else None, payload, share)
+
+    def _put(self, quiz_id: int, key: Optional[str], payload: Payload, share: bool = True,
+             age: float = 0.0) -> None:
+        if not self.enabled or payload.size > self.max_bytes:
+            return
+        with self._lock:
+            self._remove(quiz_id)
+            self._entries[quiz_id] = (payload, key, time.monotonic() - age)
+            if key:
+                self._by_article[key] = quiz_id
+            self._bytes += payload.size
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+            self._puts += 1
+            prune = self._puts % 100 == 0
+
+        if share and key and self.shared is not None:
+            self.shared.put(quiz_id, key, payload)
+            if prune:
+                self.shared.prune()
+
+    def invalidate(self, quiz_id: int, url: Optional[str] = None) -> None:
+        key = article_key(url) if url else None
+        with self._lock:
+            entry = self._entries.get(quiz_id)
+            if entry is not None and key is None:
+                key = entry[1]
+            self._remove(quiz_id)
+            if key is not None and self._by_article.get(key) == quiz_id:
+                del self._by_article[key]
+        if self.shared is not None:
+            self.shared.invalidate(quiz_id, key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._by_article.clear()
+            self._bytes = 0
+
+    def _remove(self, quiz_id: int) -> None:
+        """Drop a local entry. Caller holds the lock."""
+        entry = self._entries.pop(quiz_id, None)
+        if entry is not None:
+            payload, key, _ = entry
+            self._bytes -= payload.size
+            if key and self._by_article.get(key) == quiz_id:
+                del self._by_article[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.shared_hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round((self.hits + self.shared_hits) / lookups, 4) if lookups else 0.0,
+                "shared_tier": self.shared.directory if self.shared else None,
+            }
+
+
+def _build_cache() -> QuizCache:
+    shared = None
+    if settings.QUIZ_CACHE_SHARED_DIR:
+        try:
+            shared = SharedDirTier(settings.QUIZ_CACHE_SHARED_DIR)
+        except OSError as e:
+            logger.warning(f"Shared quiz cache disabled, can't use {settings.QUIZ_CACHE_SHARED_DIR}: {e}")
+    return QuizCache(
+        max_bytes=settings.QUIZ_CACHE_MAX_BYTES,
+        ttl_seconds=settings.QUIZ_CACHE_TTL_SECONDS,
+        shared=shared,
+    )
+
+
+# Create a global instance we can use
+quiz_cache = _build_cache()
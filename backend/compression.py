@@ -0,0 +1,279 @@
+"""
+Response compression.
+
+Quiz JSON is verbose - the same keys on every question, long explanations -
+and compresses 4-6x. CompressionMiddleware negotiates zstd, brotli or gzip
+from Accept-Encoding and compresses JSON/text responses above
+COMPRESSION_MIN_BYTES on the fly.
+
+Quiz documents are compressed once instead: when a quiz is written, the
+serialized JSON goes into the hot cache with a copy per encoding made by
+precompress() at a higher level than we could afford per request, and the
+quiz endpoints send the copy that matches the client (pick()). The middleware leaves responses that already
+have a Content-Encoding alone.
+
+brotli and zstandard are optional; without them only gzip is offered.
+"""
+import gzip
+import time
+import zlib
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from config import settings
+from metrics import COMPRESSION_SECONDS, RESPONSE_BYTES
+
+
+try:
+    import brotli
+except ImportError:  # optional
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # optional
+    zstandard = None
+
+# Per-request levels favour speed, stored copies favour size
+LIVE_LEVELS = {"zstd": 3, "br": 4, "gzip": 6}
+STORED_LEVELS = {"zstd": 12, "br": 11, "gzip": 9}
+
+STREAM_FLUSH_BYTES = 64 * 1024
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+
+
+def available_encodings() -> List[str]:
+    """COMPRESSION_ENCODINGS in preference order, minus codecs that aren't installed"""
+    if not settings.COMPRESSION_ENABLED:
+        return []
+    installed = {"gzip": True, "br": brotli is not None, "zstd": zstandard is not None}
+    wanted = [e.strip().lower() for e in settings.COMPRESSION_ENCODINGS.split(",")]
+    return [e for e in wanted if installed.get(e)]
+
+
+def negotiate(accept_encoding: Optional[str], offered: Optional[List[str]] = None) -> Optional[str]:
+    """
+    Pick an encoding from an Accept-Encoding header. Highest q-value wins;
+    on a tie, our preference order does. None means send it uncompressed.
+    """
+    if not accept_encoding:
+        return None
+    if offered is None:
+        offered = available_encodings()
+    if not offered:
+        return None
+
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            weights[name] = q
+
+    best, best_q = None, 0.0
+    for encoding in offered:
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def compress(data: bytes, encoding: str, level: Optional[int] = None) -> bytes:
+    if level is None:
+        level = LIVE_LEVELS[encoding]
+    if encoding == "gzip":
+        # mtime=0 keeps the output byte-identical across workers
+        return gzip.compress(data, compresslevel=level, mtime=0)
+    if encoding == "br":
+        return brotli.compress(data, quality=level)
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    raise ValueError(f"Unknown encoding {encoding!r}")
+
+
+class StreamCompressor:
+    """
+    Incremental compressor for streamed bodies. Output is flushed every
+    STREAM_FLUSH_BYTES of input - flushing each small chunk would cost more
+    than it saves - so the client still sees a long stream make progress.
+    """
+
+    def __init__(self, encoding: str):
+        level = LIVE_LEVELS[encoding]
+        self.encoding = encoding
+        self._unflushed = 0
+        if encoding == "gzip":
+            self._obj = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        elif encoding == "br":
+            self._obj = brotli.Compressor(quality=level)
+        elif encoding == "zstd":
+            self._obj = zstandard.ZstdCompressor(level=level).compressobj()
+        else:
+            raise ValueError(f"Unknown encoding {encoding!r}")
+
+    def compress(self, chunk: bytes, final: bool = False) -> bytes:
+        self._unflushed += len(chunk)
+        flush = final or self._unflushed >= STREAM_FLUSH_BYTES
+        if flush:
+            self._unflushed = 0
+        if self.encoding == "gzip":
+            out = self._obj.compress(chunk)
+            if flush:
+                out += self._obj.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+            return out
+        if self.encoding == "br":
+            out = self._obj.process(chunk)
+            if flush:
+                out += self._obj.finish() if final else self._obj.flush()
+            return out
+        out = self._obj.compress(chunk)
+        if flush:
+            out += self._obj.flush() if final else self._obj.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        return out
+
+
+class Payload(NamedTuple):
+    """A serialized response body plus precompressed copies of it"""
+    body: bytes
+    variants: Dict[str, bytes]
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + sum(len(v) for v in self.variants.values())
+
+    def pick(self, accept_encoding: Optional[str]) -> Tuple[bytes, Optional[str]]:
+        """The body to send for this Accept-Encoding, and its Content-Encoding"""
+        encoding = negotiate(accept_encoding, [e for e in available_encodings() if e in self.variants])
+        if encoding is None:
+            return self.body, None
+        return self.variants[encoding], encoding
+
+
+def precompress(body: bytes, thorough: bool = True) -> Payload:
+    """
+    Compress a body once per encoding (small bodies stay as they are).
+    thorough uses the stored levels - worth it at write time, but too slow
+    for refilling the cache on a read miss, which uses the live levels.
+    """
+    levels = STORED_LEVELS if thorough else LIVE_LEVELS
+    variants: Dict[str, bytes] = {}
+    if len(body) >= settings.COMPRESSION_MIN_BYTES:
+        for encoding in available_encodings():
+            start = time.process_time()
+            variants[encoding] = compress(body, encoding, levels[encoding])
+            COMPRESSION_SECONDS.observe(time.process_time() - start, encoding=encoding, mode="stored")
+    return Payload(body, variants)
+
+
+def _compressible(headers: Dict[bytes, bytes]) -> bool:
+    if b"content-encoding" in headers:
+        return False
+    content_type = headers.get(b"content-type", b"").decode("latin-1").lower()
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+def vary_accept_encoding(headers: List[Tuple[bytes, bytes]]) -> List[Tuple[bytes, bytes]]:
+    """Add Accept-Encoding to the Vary header so shared caches keep variants apart"""
+    for i, (key, value) in enumerate(headers):
+        if key.lower() == b"vary":
+            if b"accept-encoding" not in value.lower():
+                headers[i] = (key, value + b", Accept-Encoding")
+            return headers
+    return headers + [(b"vary", b"Accept-Encoding")]
+
+
+def _counting(send):
+    """Count the body bytes that go out, by Content-Encoding"""
+    encoding = "identity"
+
+    async def wrapped(message):
+        nonlocal encoding
+        if message["type"] == "http.response.start":
+            encoding = "identity"
+            for key, value in message.get("headers", []):
+                if key.lower() == b"content-encoding":
+                    encoding = value.decode("latin-1")
+        elif message["type"] == "http.response.body":
+            RESPONSE_BYTES.inc(len(message.get("body", b"")), encoding=encoding)
+        await send(message)
+    return wrapped
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing JSON and text responses on the fly. Whole
+    bodies under COMPRESSION_MIN_BYTES go out as they are; streamed bodies
+    are compressed chunk by chunk.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        send = _counting(send)
+        accept = dict(scope["headers"]).get(b"accept-encoding", b"").decode("latin-1")
+        encoding = negotiate(accept)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        streamer: Optional[StreamCompressor] = None
+
+        async def send_compressed(message):
+            nonlocal start_message, streamer
+            if message["type"] == "http.response.start":
+                headers = {k.lower(): v for k, v in message.get("headers", [])}
+                if _compressible(headers):
+                    # Hold the headers until we know how big the body is
+                    start_message = message
+                else:
+                    await send(message)
+                return
+            if start_message is None or message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            headers = [(k, v) for k, v in start_message.get("headers", []) if k.lower() != b"content-length"]
+
+            if streamer is None and not more_body:
+                # The whole body in one message - compress it if it's worth it
+                if len(body) < settings.COMPRESSION_MIN_BYTES:
+                    await send(start_message)
+                    await send(message)
+                    return
+                started = time.process_time()
+                data = compress(body, encoding)
+                COMPRESSION_SECONDS.observe(time.process_time() - started, encoding=encoding, mode="live")
+                start_message["headers"] = vary_accept_encoding(headers + [
+                    (b"content-encoding", encoding.encode()),
+                    (b"content-length", str(len(data)).encode()),
+                ])
+                await send(start_message)
+                await send({"type": "http.response.body", "body": data})
+                return
+
+            if streamer is None:
+                streamer = StreamCompressor(encoding)
+                start_message["headers"] = vary_accept_encoding(headers + [(b"content-encoding", encoding.encode())])
+                await send(start_message)
+            started = time.process_time()
+            data = streamer.compress(body, final=not more_body)
+            COMPRESSION_SECONDS.observe(time.process_time() - started, encoding=encoding, mode="live")
+            if data or not more_body:
+                await send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
@@ -1,25 +1,143 @@
 """
 Database configuration and session management.
 """
-from sqlalchemy import create_engine
+import threading
+import time
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import QueuePool
 from config import settings
 
-# Create database engine
-engine = create_engine(
-    settings.DATABASE_URL,
-    connect_args={"check_same_thread": False} if "sqlite" in settings.DATABASE_URL else {},
-    pool_pre_ping=True,  # Verify connections before using
-    echo=False  # Set to True for SQL query logging
-)
 
-# Create session factory
+class PoolStats:
+    """Running totals for connection checkouts - how often and how long we wait"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def record(self, waited: float, timed_out: bool = False) -> None:
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_seconds_total += waited
+            self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_seconds_total": round(self.wait_seconds_total, 6),
+                "wait_seconds_max": round(self.wait_seconds_max, 6),
+                "wait_ms_avg": round(1000 * self.wait_seconds_total / self.checkouts, 3) if self.checkouts else 0.0,
+            }
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a connection"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except Exception:
+            self.stats.record(time.perf_counter() - start, timed_out=True)
+            raise
+        self.stats.record(time.perf_counter() - start)
+        return connection
+
+
+def _engine_kwargs(database_url: str) -> dict:
+    """Engine and pool options for this kind of database"""
+    url = make_url(database_url)
+    kwargs = {
+        "echo": settings.DB_ECHO,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+
+    if url.get_backend_name() == "sqlite":
+        kwargs["connect_args"] = {"check_same_thread": False}
+        # In-memory databases live in a single connection - keep SQLAlchemy's default pool
+        if url.database in (None, "", ":memory:"):
+            return kwargs
+    elif url.get_backend_name() == "postgresql" and settings.DB_STATEMENT_TIMEOUT_MS:
+        kwargs["connect_args"] = {"options": f"-c statement_timeout={settings.DB_STATEMENT_TIMEOUT_MS}"}
+
+    kwargs.update(
+        poolclass=InstrumentedQueuePool,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+    )
+    return kwargs
+
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """Tune every new SQLite connection for concurrent reads"""
+    cursor = dbapi_connection.cursor()
+    # Only takes effect on a new database, or at the next full VACUUM
+    cursor.execute(f"PRAGMA auto_vacuum={settings.SQLITE_AUTO_VACUUM}")
+    cursor.execute(f"PRAGMA journal_mode={settings.SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+    cursor.execute(f"PRAGMA mmap_size={int(settings.SQLITE_MMAP_SIZE)}")
+    cursor.close()
+
+
+def _create_engine(database_url: str):
+    new_engine = create_engine(database_url, **_engine_kwargs(database_url))
+    if new_engine.dialect.name == "sqlite":
+        event.listen(new_engine, "connect", _apply_sqlite_pragmas)
+    return new_engine
+
+
+# Create database engines - reads go to the replica when one is configured
+engine = _create_engine(settings.DATABASE_URL)
+read_engine = _create_engine(settings.DATABASE_REPLICA_URL) if settings.DATABASE_REPLICA_URL else engine
+
+# Create session factories
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
 
 # Base class for declarative models
 Base = declarative_base()
 
 
+def _pool_status(pool) -> dict:
+    status = {"pool_class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update(
+            size=pool.size(),
+            checked_out=pool.checkedout(),
+            checked_in=pool.checkedin(),
+            overflow=pool.overflow(),
+        )
+    if isinstance(pool, InstrumentedQueuePool):
+        status.update(pool.stats.snapshot())
+    return status
+
+
+def pool_status() -> dict:
+    """Current pool occupancy plus checkout wait totals, per engine"""
+    status = {"primary": _pool_status(engine.pool)}
+    if read_engine is not engine:
+        status["replica"] = _pool_status(read_engine.pool)
+    return status
+
+
 def get_db():
     """
     Dependency function to get database session.
@@ -30,3 +148,37 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def read_session(prefer_primary: bool = False):
+    """
+    Yields a session for read-only work: on the replica, unless there is
+    none or prefer_primary is set (read-your-writes, see main.get_read_db).
+    Closes it, and any primary_fallback() session, when done.
+    """
+    if read_engine is engine or prefer_primary:
+        db = SessionLocal()
+    else:
+        db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        fallback = db.info.pop("primary", None)
+        if fallback is not None:
+            fallback.close()
+        db.close()
+
+
+def primary_fallback(db):
+    """
+    Primary-bound session to retry a read that missed on the replica, or
+    None if db already talks to the primary. A quiz created moments ago may
+    not have replicated yet, so a miss on the replica is not conclusive.
+    The session is closed together with db by read_session.
+    """
+    if db.get_bind() is engine:
+        return None
+    if "primary" not in db.info:
+        db.info["primary"] = SessionLocal()
+    return db.info["primary"]
+
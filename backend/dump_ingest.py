@@ -0,0 +1,546 @@
+#!/usr/bin/env python3
+"""
+Offline ingestion of Wikipedia dumps for bulk quiz building.
+
+Fetching pages one by one through the scraper is slow for a whole catalog
+and hard on Wikipedia. This reads a local dump instead and turns each
+article into the same dict WikipediaScraper.scrape() returns, then runs it
+through the generation pipeline (entities, question bank, LLM, save).
+
+Two dump formats are understood, plain or compressed (.bz2, .gz):
+
+- XML "pages-articles" dumps (enwiki-latest-pages-articles.xml.bz2). Pages
+  are read with an iterative parser that drops each page once handled, so
+  memory stays flat however big the dump is. Wikitext is reduced to plain
+  paragraphs and section headings here, with the language's boilerplate
+  headings skipped as on the scraped HTML.
+- Enterprise HTML dumps: NDJSON with one article per line, or the .tar.gz
+  they ship as. Each article's HTML goes through the scraper's own parser.
+
+Parsing runs in a pool of worker processes, at most --window pages ahead
+of the pipeline. Progress is written to a checkpoint file next to the dump
+every --checkpoint-every pages; running the same command again continues
+from there (the dump is still decompressed from the start - bz2 can't seek
+- but pages before the checkpoint aren't parsed or generated again).
+Articles that already have a quiz are skipped.
+
+    python dump_ingest.py enwiki-latest-pages-articles.xml.bz2 --limit 500
+    python dump_ingest.py enwiki-NS0-ENTERPRISE-HTML.json.tar.gz --workers 4
+    python dump_ingest.py ../sample_data/wikipedia_dump_sample.xml.bz2 --parse-only
+"""
+import argparse
+import bz2
+import gzip
+import html
+import json
+import logging
+import multiprocessing
+import os
+import re
+import sys
+import tarfile
+import time
+import xml.etree.ElementTree as ET
+from collections import deque
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+from urllib.parse import quote
+
+# Add backend directory to path
+sys.path.insert(0, os.path.dirname(__file__))
+
+from languages import URL_SAFE_CHARS, canonicalize_url, profile_for
+
+logger = logging.getLogger(__name__)
+
+# Articles shorter than this (stubs, list pages) make poor quizzes
+MIN_CONTENT_CHARS = 1000
+
+# Lead paragraphs used as the summary, as in the scraper
+SUMMARY_PARAGRAPHS = 5
+
+# Questions that don't name a known section belong to the article lead
+DEFAULT_SECTION = "General"
+
+XML_LANG = "{http://www.w3.org/XML/1998/namespace}lang"
+
+
+class RawPage(NamedTuple):
+    """One article as read from the dump, before parsing"""
+    title: str
+    language: str
+    revision_id: Optional[int]
+    markup: str
+    format: str  # "wikitext" or "html"
+
+
+# ---------------------------------------------------------------------------
+# Reading dumps
+# ---------------------------------------------------------------------------
+
+def _open(path: str):
+    if path.endswith(".bz2"):
+        return bz2.open(path, "rb")
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+
+def _local(tag: str) -> str:
+    """Tag name without the export schema namespace"""
+    return tag.rsplit("}", 1)[-1]
+
+
+def _child_text(elem, name: str) -> Optional[str]:
+    for child in elem:
+        if _local(child.tag) == name:
+            return child.text
+    return None
+
+
+def read_xml(stream, language: Optional[str] = None) -> Iterator[RawPage]:
+    """Articles (namespace 0, not redirects) of a pages-articles XML dump"""
+    context = ET.iterparse(stream, events=("start", "end"))
+    _, root = next(context)
+    language = language or root.get(XML_LANG) or "en"
+    for event, elem in context:
+        if event != "end" or _local(elem.tag) != "page":
+            continue
+        ns = _child_text(elem, "ns")
+        redirect = any(_local(child.tag) == "redirect" for child in elem)
+        revision = next((child for child in elem if _local(child.tag) == "revision"), None)
+        if ns == "0" and not redirect and revision is not None:
+            revision_id = _child_text(revision, "id")
+            yield RawPage(
+                title=_child_text(elem, "title") or "",
+                language=language,
+                revision_id=int(revision_id) if revision_id else None,
+                markup=_child_text(revision, "text") or "",
+                format="wikitext",
+            )
+        # Pages are done with once read - this is what keeps memory flat
+        root.clear()
+
+
+def _read_ndjson_lines(lines, language: Optional[str]) -> Iterator[RawPage]:
+    for line in lines:
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        if (record.get("namespace") or {}).get("identifier", 0) != 0:
+            continue
+        body = (record.get("article_body") or {}).get("html")
+        if not body:
+            continue
+        yield RawPage(
+            title=record.get("name", ""),
+            language=language or (record.get("in_language") or {}).get("identifier") or "en",
+            revision_id=(record.get("version") or {}).get("identifier"),
+            markup=body,
+            format="html",
+        )
+
+
+def read_html_dump(path: str, language: Optional[str] = None) -> Iterator[RawPage]:
+    """Articles of an Enterprise HTML dump: NDJSON, or a tarball of NDJSON files"""
+    if path.endswith((".tar.gz", ".tgz", ".tar")):
+        # Stream mode: members are read in order, never all at once
+        with tarfile.open(path, "r|*") as archive:
+            for member in archive:
+                if member.isfile():
+                    # Binary lines - json takes bytes, and a text wrapper would try to seek the stream
+                    yield from _read_ndjson_lines(archive.extractfile(member), language)
+        return
+    with _open(path) as stream:
+        yield from _read_ndjson_lines(stream, language)
+
+
+def read_dump(path: str, language: Optional[str] = None) -> Iterator[RawPage]:
+    """Articles of a dump in either format, in dump order"""
+    if path.endswith((".tar.gz", ".tgz", ".tar")):
+        yield from read_html_dump(path, language)
+        return
+    with _open(path) as stream:
+        first = stream.peek(1)[:1] if hasattr(stream, "peek") else b""
+    if first == b"{":
+        yield from read_html_dump(path, language)
+    else:
+        with _open(path) as stream:
+            yield from read_xml(stream, language)
+
+
+# ---------------------------------------------------------------------------
+# Turning pages into scraper dicts (runs in the worker processes)
+# ---------------------------------------------------------------------------
+
+_COMMENT = re.compile(r"<!--.*?-->", re.DOTALL)
+_REF = re.compile(r"<ref[^>/]*/>|<ref[^>]*>.*?</ref>", re.DOTALL | re.IGNORECASE)
+_DROPPED_TAGS = re.compile(r"<(gallery|math|syntaxhighlight|timeline|score)[^>]*>.*?</\1>", re.DOTALL | re.IGNORECASE)
+_TEMPLATE = re.compile(r"\{\{[^{}]*\}\}")
+_TABLE = re.compile(r"\{\|(?:(?!\{\||\|\}).)*\|\}", re.DOTALL)
+_LINK = re.compile(r"\[\[([^\[\]]*)\]\]")
+_EXTERNAL_LINK = re.compile(r"\[(?:https?:)?//[^\s\]]+\s*([^\]]*)\]")
+_HTML_TAG = re.compile(r"<[^>]+>")
+_EMPHASIS = re.compile(r"'{2,}")
+_HEADING = re.compile(r"^(={2,6})\s*(.+?)\s*\1\s*$")
+# List items, indents, tables and magic words aren't paragraph text
+_NON_PROSE = ("*", "#", ":", ";", "|", "!", "{", "}", "__")
+
+
+def _strip_nested(pattern, text: str, replacement: str = "") -> str:
+    """Remove innermost matches until none are left, so nesting unwinds"""
+    while True:
+        text, count = pattern.subn(replacement, text)
+        if not count:
+            return text
+
+
+def _plain(text: str, profile) -> str:
+    """Inline wikitext to plain text: links to their labels, markup dropped"""
+    def link(match):
+        target, _, label = match.group(1).partition("|")
+        if profile.is_namespace(target.lstrip(":")):
+            return ""  # files, categories and the like
+        return (label or target).split("|")[-1]
+
+    text = _strip_nested(_LINK, text, link)
+    text = _EXTERNAL_LINK.sub(r"\1", text)
+    text = _HTML_TAG.sub("", text)
+    text = _EMPHASIS.sub("", text)
+    return " ".join(html.unescape(text).split())
+
+
+def parse_wikitext(title: str, markup: str, language: str, revision_id: Optional[int] = None) -> Dict:
+    """
+    Scraper-shaped dict for a page's wikitext. Only level-2 headings start a
+    section, and only paragraphs count as content, as with the HTML.
+    """
+    profile = profile_for(language)
+    text = _COMMENT.sub("", markup)
+    text = _REF.sub("", text)
+    text = _DROPPED_TAGS.sub("", text)
+    text = _strip_nested(_TEMPLATE, text)
+    text = _strip_nested(_TABLE, text)
+
+    sections: List[str] = []
+    paragraphs: List[Tuple[str, str]] = []  # (section, text)
+    lead: List[str] = []
+    current, in_lead, block = DEFAULT_SECTION, True, []
+
+    def end_paragraph():
+        paragraph = _plain(" ".join(block), profile)
+        block.clear()
+        if not paragraph:
+            return
+        paragraphs.append((current, paragraph))
+        if in_lead and not profile.is_summary_noise(paragraph):
+            lead.append(paragraph)
+
+    for line in text.splitlines():
+        line = line.strip()
+        heading = _HEADING.match(line)
+        if heading:
+            end_paragraph()
+            in_lead = False
+            if len(heading.group(1)) == 2:
+                current = _plain(heading.group(2), profile) or current
+                if not profile.is_boilerplate(current):
+                    sections.append(current)
+        elif not line or line.startswith(_NON_PROSE):
+            end_paragraph()
+        else:
+            block.append(line)
+    end_paragraph()
+
+    # Boilerplate sections hold references and links, not article text
+    paragraphs = [(section, text) for section, text in paragraphs if not profile.is_boilerplate(section)]
+    section_content: Dict[str, List[str]] = {}
+    for section, paragraph in paragraphs:
+        section_content.setdefault(section, []).append(paragraph)
+
+    return {
+        "url": article_url(title, language),
+        "language": language,
+        "title": title,
+        "summary": " ".join(lead[:SUMMARY_PARAGRAPHS]),
+        "sections": sections,
+        "full_content": " ".join(paragraph for _, paragraph in paragraphs),
+        "section_content": {heading: " ".join(texts) for heading, texts in section_content.items()},
+        "revision_id": revision_id,
+        # The wikitext isn't HTML - nothing to keep
+        "raw_html": None,
+    }
+
+
+_BODY = re.compile(r"<body[^>]*>(.*)</body>", re.DOTALL | re.IGNORECASE)
+_SECTION_TAG = re.compile(r"</?section[^>]*>", re.IGNORECASE)
+
+
+def parse_html_page(title: str, markup: str, language: str, revision_id: Optional[int] = None) -> Dict:
+    """
+    Scraper-shaped dict for a page of an HTML dump. Dump HTML is the bare
+    article body with each section wrapped in <section>; it is put into the
+    layout of a rendered page so WikipediaScraper.parse() reads it as usual.
+    """
+    from scraper import WikipediaScraper
+
+    body = _BODY.search(markup)
+    content = _SECTION_TAG.sub("", body.group(1) if body else markup)
+    page = (f'<h1 id="firstHeading">{html.escape(title)}</h1>'
+            f'<div class="mw-parser-output">{content}</div>')
+    data = WikipediaScraper().parse(page, canonicalize_url(article_url(title, language)))
+    data["revision_id"] = data.get("revision_id") or revision_id
+    return data
+
+
+def article_url(title: str, language: str) -> str:
+    """Canonical URL of an article, the same one the scraper stores quizzes under"""
+    url = f"https://{language}.wikipedia.org/wiki/{quote(title.replace(' ', '_'), safe=URL_SAFE_CHARS)}"
+    return canonicalize_url(url).url
+
+
+def parse_page(page: RawPage, min_chars: int = MIN_CONTENT_CHARS) -> Optional[Dict]:
+    """The page as a scraper dict, or None if it isn't worth a quiz"""
+    try:
+        if page.format == "html":
+            data = parse_html_page(page.title, page.markup, page.language, page.revision_id)
+        else:
+            data = parse_wikitext(page.title, page.markup, page.language, page.revision_id)
+    except ValueError as e:
+        logger.debug(f"Skipping {page.title}: {e}")
+        return None
+    if len(data["full_content"]) < min_chars:
+        return None
+    return data
+
+
+def _init_worker():
+    # Workers only parse; their per-page log lines would drown the output
+    logging.getLogger().setLevel(logging.WARNING)
+
+
+def parsed_pages(pages: Iterator[RawPage], workers: int, window: int, start: int = 0,
+                 min_chars: int = MIN_CONTENT_CHARS) -> Iterator[Tuple[int, RawPage, Optional[Dict]]]:
+    """
+    (position, page, parsed dict or None) for every page from `start` on,
+    in dump order. With workers > 0 pages are parsed in a process pool, no
+    more than `window` ahead of the consumer; pages before `start` are read
+    past without being parsed.
+    """
+    if workers <= 0:
+        for position, page in enumerate(pages):
+            if position >= start:
+                yield position, page, parse_page(page, min_chars)
+        return
+
+    with multiprocessing.Pool(workers, initializer=_init_worker) as pool:
+        in_flight = deque()
+        for position, page in enumerate(pages):
+            if position < start:
+                continue
+            # The page's markup already went to the worker; keep just the title
+            in_flight.append((position, page._replace(markup=""),
+                              pool.apply_async(parse_page, (page, min_chars))))
+            if len(in_flight) >= window:
+                position, page, result = in_flight.popleft()
+                yield position, page, result.get()
+        while in_flight:
+            position, page, result = in_flight.popleft()
+            yield position, page, result.get()
+
+
+# ---------------------------------------------------------------------------
+# Checkpoints
+# ---------------------------------------------------------------------------
+
+def load_checkpoint(path: str) -> Dict:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_checkpoint(path: str, state: Dict) -> None:
+    """Write-then-rename, so a crash never leaves a half-written checkpoint"""
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+
+# ---------------------------------------------------------------------------
+# Generation
+# ---------------------------------------------------------------------------
+
+def build_quiz(db, data: Dict):
+    """
+    Run a parsed page through the generation pipeline and save the quiz.
+    Returns the new Quiz, or None if the article already has one (archived
+    ones count - they come back on their first read). Raises
+    TokenBudgetExceeded when today's budget is spent, and the LLM layer's
+    errors; LLM calls made before a failure are still recorded.
+    """
+    from llm import extract_entities_from_content, generate_quiz_from_content
+    from metrics import stage
+    from models import ArchivedQuiz, Quiz
+    from question_bank import banked_questions_for, link_questions
+    from refresh import hash_sections
+    from search import index_quiz
+    from title_index import resolve_topics
+    from usage import check_budget, collect_usage, save_usage
+
+    if db.query(Quiz.id).filter(Quiz.url == data["url"]).first() is not None:
+        return None
+    if db.query(ArchivedQuiz.id).filter(ArchivedQuiz.url == data["url"]).first() is not None:
+        return None
+    check_budget(db)
+
+    with collect_usage() as calls:
+        try:
+            try:
+                entities = extract_entities_from_content(data["full_content"])
+            except Exception as e:
+                # Not critical, the same as for scraped articles
+                logger.warning(f"Entity extraction failed for {data['title']}, continuing anyway: {e}")
+                entities = {"people": [], "organizations": [], "locations": []}
+            quiz_data = generate_quiz_from_content(
+                title=data["title"],
+                content=data["full_content"],
+                sections=data["sections"],
+                language=data["language"],
+                known_questions=banked_questions_for(db, data["title"], data["language"]),
+            )
+            if not quiz_data.get("quiz"):
+                raise ValueError("LLM generated an empty quiz")
+
+            quiz = Quiz(
+                url=data["url"],
+                language=data["language"],
+                title=data["title"],
+                summary=data["summary"],
+                key_entities=entities,
+                sections=data["sections"],
+                quiz=link_questions(db, quiz_data["quiz"], data["language"], data["title"], entities),
+                related_topics=resolve_topics(quiz_data.get("related_topics", []), data["language"],
+                                              data["title"]),
+                raw_html=data.get("raw_html"),
+                revision_id=data.get("revision_id"),
+                section_hashes=hash_sections(data.get("section_content", {})),
+            )
+            with stage("db_write"):
+                db.add(quiz)
+                db.flush()
+                save_usage(db, quiz.id)
+                index_quiz(db, quiz, commit=False)
+                db.commit()
+                calls.clear()
+                db.refresh(quiz)
+            return quiz
+        except Exception:
+            db.rollback()
+            if calls:
+                # Failed after the LLM was already billed - keep the record
+                save_usage(db, calls=calls)
+                db.commit()
+            raise
+
+
+def ingest(path: str, workers: int, window: int, checkpoint_path: str, checkpoint_every: int,
+           limit: Optional[int] = None, language: Optional[str] = None,
+           min_chars: int = MIN_CONTENT_CHARS) -> Dict[str, int]:
+    """Generate quizzes for a dump's articles, resuming from the checkpoint. Returns counters."""
+    from database import SessionLocal
+    from usage import TokenBudgetExceeded
+
+    state = load_checkpoint(checkpoint_path)
+    if state and state.get("dump") != os.path.abspath(path):
+        raise ValueError(f"{checkpoint_path} belongs to {state.get('dump')}, not {path} - "
+                         f"pass --checkpoint or --restart")
+    start = state.get("position", 0)
+    stats = {"read": 0, "skipped": 0, "existing": 0, "generated": 0, "failed": 0, **state.get("stats", {})}
+    if start:
+        logger.info(f"Resuming {path} at page {start} (after {state.get('title')!r})")
+
+    def checkpoint(position: int, title: str):
+        save_checkpoint(checkpoint_path, {"dump": os.path.abspath(path), "position": position,
+                                          "title": title, "stats": stats})
+
+    db = SessionLocal()
+    done = 0
+    last = None
+    began = time.perf_counter()
+    try:
+        for position, page, data in parsed_pages(read_dump(path, language), workers, window, start, min_chars):
+            stats["read"] += 1
+            last = (position, page.title)
+            if data is None:
+                stats["skipped"] += 1
+            else:
+                try:
+                    stats["generated" if build_quiz(db, data) else "existing"] += 1
+                except TokenBudgetExceeded as e:
+                    logger.warning(f"{e} - stopping, run again tomorrow to continue")
+                    # This page wasn't done; resume at it
+                    checkpoint(position, page.title)
+                    break
+                except Exception as e:
+                    stats["failed"] += 1
+                    logger.error(f"Failed to generate a quiz for {page.title}: {e}")
+                done += 1
+            if (position + 1) % checkpoint_every == 0:
+                checkpoint(position + 1, page.title)
+                rate = stats["read"] / (time.perf_counter() - began)
+                logger.info(f"Page {position + 1}: {stats} ({rate:.1f} pages/s)")
+            if limit is not None and done >= limit:
+                checkpoint(position + 1, page.title)
+                break
+        else:
+            if last is not None:
+                checkpoint(last[0] + 1, last[1])
+    finally:
+        db.close()
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build quizzes from a local Wikipedia dump")
+    parser.add_argument("dump", help="pages-articles XML (.xml, .xml.bz2) or Enterprise HTML dump (.ndjson, .tar.gz)")
+    parser.add_argument("--language", default=None, help="Language edition (default: from the dump)")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) - 1),
+                        help="Parsing processes (0 parses in this process)")
+    parser.add_argument("--window", type=int, default=64, help="Pages parsed ahead of generation")
+    parser.add_argument("--limit", type=int, default=None, help="Stop after this many articles")
+    parser.add_argument("--min-chars", type=int, default=MIN_CONTENT_CHARS,
+                        help="Skip articles with less text than this")
+    parser.add_argument("--checkpoint", default=None, help="Checkpoint file (default: <dump>.checkpoint.json)")
+    parser.add_argument("--checkpoint-every", type=int, default=50, help="Pages between checkpoints")
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and start from the top")
+    parser.add_argument("--parse-only", action="store_true",
+                        help="Print the parsed articles as NDJSON instead of generating quizzes")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.parse_only:
+        pages = parsed_pages(read_dump(args.dump, args.language), args.workers, args.window,
+                             min_chars=args.min_chars)
+        for count, (_, _, data) in enumerate((p for p in pages if p[2] is not None), 1):
+            data.pop("raw_html", None)
+            print(json.dumps(data, ensure_ascii=False))
+            if args.limit is not None and count >= args.limit:
+                break
+        return
+
+    checkpoint_path = args.checkpoint or f"{args.dump}.checkpoint.json"
+    if args.restart and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    try:
+        stats = ingest(args.dump, args.workers, args.window, checkpoint_path, args.checkpoint_every,
+                       limit=args.limit, language=args.language, min_chars=args.min_chars)
+    except ValueError as e:
+        parser.error(str(e))
+    print(f"Read {stats['read']} articles: {stats['generated']} quizzes generated, "
+          f"{stats['existing']} already there, {stats['skipped']} skipped, {stats['failed']} failed")
+
+
+if __name__ == "__main__":
+    main()
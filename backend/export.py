@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+Bulk export of quizzes as NDJSON or Parquet.
+
+Analytics and backup jobs used to list /api/history and then fetch
+/api/quiz/{id} one by one. This streams every quiz - or those in a
+created_at or id range - in one pass instead:
+
+- Quizzes are read with yield_per (a server-side cursor on PostgreSQL), a
+  batch at a time, and the questions of each batch come from one more
+  query joined with the question bank. Two queries per batch, whatever
+  the table size, and memory holds one batch at most.
+- NDJSON is one quiz per line, in the shape of /api/quiz/{id} plus the
+  revision and timestamps. Parquet has one row group per batch with the
+  questions as a nested list column and needs pyarrow (optional).
+- raw_html is left out unless asked for; it is most of the table's bytes.
+
+Served as GET /api/export, or from the command line:
+    python export.py --output quizzes.ndjson.gz
+    python export.py --format parquet --output quizzes.parquet --since 2024-01-01
+"""
+import argparse
+import gzip
+import json
+import logging
+import os
+import sys
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional
+
+from sqlalchemy import select
+
+# Add backend directory to path
+sys.path.insert(0, os.path.dirname(__file__))
+
+from config import settings
+from models import Question, QuestionBank, Quiz
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("ndjson", "parquet")
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "parquet": "application/vnd.apache.parquet"}
+ENTITY_KINDS = ("people", "organizations", "locations")
+
+# What gets exported - the legacy quiz column and section hashes are internal
+QUIZ_COLUMNS = ("id", "url", "language", "title", "summary", "key_entities", "sections",
+                "related_topics", "revision_id", "created_at", "updated_at")
+
+
+class ExportFilter:
+    """Which quizzes to export: created_at in [since, until) and id in [min_id, max_id]"""
+
+    def __init__(self, since: Optional[datetime] = None, until: Optional[datetime] = None,
+                 min_id: Optional[int] = None, max_id: Optional[int] = None):
+        self.since = since
+        self.until = until
+        self.min_id = min_id
+        self.max_id = max_id
+
+    def apply(self, query):
+        if self.since is not None:
+            query = query.where(Quiz.created_at >= self.since)
+        if self.until is not None:
+            query = query.where(Quiz.created_at < self.until)
+        if self.min_id is not None:
+            query = query.where(Quiz.id >= self.min_id)
+        if self.max_id is not None:
+            query = query.where(Quiz.id <= self.max_id)
+        return query
+
+
+def _utc(value: Optional[datetime]) -> Optional[datetime]:
+    # SQLite hands back naive datetimes; they were written as UTC
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def _strings(value) -> List[str]:
+    return [str(item) for item in value] if isinstance(value, list) else []
+
+
+def _entities(value) -> Optional[Dict[str, List[str]]]:
+    if not isinstance(value, dict):
+        return None
+    return {kind: _strings(value.get(kind)) for kind in ENTITY_KINDS}
+
+
+def _questions_by_quiz(conn, quiz_ids: List[int]) -> Dict[int, List[dict]]:
+    """The questions of a batch of quizzes, in one query"""
+    rows = conn.execute(
+        select(Question.quiz_id, Question.difficulty, Question.section, QuestionBank.question,
+               QuestionBank.options, QuestionBank.answer, QuestionBank.explanation)
+        .select_from(Question)
+        .outerjoin(QuestionBank, QuestionBank.id == Question.bank_id)
+        .where(Question.quiz_id.in_(quiz_ids))
+        .order_by(Question.quiz_id, Question.position)
+    )
+    questions: Dict[int, List[dict]] = {}
+    for row in rows:
+        questions.setdefault(row.quiz_id, []).append({
+            "question": row.question or "",
+            "options": _strings(row.options),
+            "answer": row.answer or "",
+            "difficulty": row.difficulty,
+            "explanation": row.explanation,
+            "section": row.section,
+        })
+    return questions
+
+
+def export_batches(conn, filters: Optional[ExportFilter] = None, include_raw_html: bool = False,
+                   batch_size: Optional[int] = None) -> Iterator[List[dict]]:
+    """Quizzes in id order as lists of plain dicts, batch_size at a time"""
+    batch_size = batch_size or settings.EXPORT_BATCH_SIZE
+    columns = [getattr(Quiz, name) for name in QUIZ_COLUMNS]
+    if include_raw_html:
+        columns.append(Quiz.raw_html)
+    query = (filters or ExportFilter()).apply(select(*columns)).order_by(Quiz.id)
+
+    result = conn.execute(query.execution_options(yield_per=batch_size))
+    for rows in result.partitions():
+        questions = _questions_by_quiz(conn, [row.id for row in rows])
+        batch = []
+        for row in rows:
+            quiz = row._asdict()
+            quiz["key_entities"] = _entities(quiz["key_entities"])
+            quiz["sections"] = _strings(quiz["sections"])
+            quiz["related_topics"] = _strings(quiz["related_topics"])
+            quiz["created_at"] = _utc(quiz["created_at"])
+            quiz["updated_at"] = _utc(quiz["updated_at"])
+            quiz["quiz"] = questions.get(row.id, [])
+            batch.append(quiz)
+        yield batch
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def ndjson_chunks(batches: Iterator[List[dict]]) -> Iterator[bytes]:
+    """One encoded chunk per batch, a quiz per line"""
+    for batch in batches:
+        yield "".join(
+            json.dumps(quiz, ensure_ascii=False, default=_json_default) + "\n" for quiz in batch
+        ).encode("utf-8")
+
+
+def parquet_schema(include_raw_html: bool = False):
+    import pyarrow as pa
+
+    timestamp = pa.timestamp("us", tz="UTC")
+    fields = [
+        ("id", pa.int64()),
+        ("url", pa.string()),
+        ("language", pa.string()),
+        ("title", pa.string()),
+        ("summary", pa.string()),
+        ("key_entities", pa.struct([(kind, pa.list_(pa.string())) for kind in ENTITY_KINDS])),
+        ("sections", pa.list_(pa.string())),
+        ("related_topics", pa.list_(pa.string())),
+        ("revision_id", pa.int64()),
+        ("created_at", timestamp),
+        ("updated_at", timestamp),
+        ("quiz", pa.list_(pa.struct([
+            ("question", pa.string()),
+            ("options", pa.list_(pa.string())),
+            ("answer", pa.string()),
+            ("difficulty", pa.string()),
+            ("explanation", pa.string()),
+            ("section", pa.string()),
+        ]))),
+    ]
+    if include_raw_html:
+        fields.append(("raw_html", pa.string()))
+    return pa.schema(fields)
+
+
+class _ChunkSink:
+    """Write-only file for ParquetWriter that hands back what was written so far"""
+
+    closed = False
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def take(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def parquet_chunks(batches: Iterator[List[dict]], include_raw_html: bool = False) -> Iterator[bytes]:
+    """A Parquet file written a row group per batch, yielded as it is written"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = parquet_schema(include_raw_html)
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    try:
+        for batch in batches:
+            writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+            yield sink.take()
+    finally:
+        writer.close()
+    yield sink.take()
+
+
+def parquet_available() -> bool:
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def export_chunks(engine, export_format: str = "ndjson", filters: Optional[ExportFilter] = None,
+                  include_raw_html: bool = False, batch_size: Optional[int] = None) -> Iterator[bytes]:
+    """
+    The encoded export, chunk by chunk. Opens its own connection, so it can
+    outlive the request's session while a streaming response is sent.
+    """
+    if export_format not in FORMATS:
+        raise ValueError(f"Unknown export format {export_format!r}, expected one of {', '.join(FORMATS)}")
+    with engine.connect() as conn:
+        batches = export_batches(conn, filters, include_raw_html, batch_size)
+        if export_format == "parquet":
+            yield from parquet_chunks(batches, include_raw_html)
+        else:
+            yield from ndjson_chunks(batches)
+
+
+def _date(value: str) -> datetime:
+    parsed = datetime.fromisoformat(value)
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+if __name__ == "__main__":
+    from database import read_engine
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Export quizzes as NDJSON or Parquet")
+    parser.add_argument("--format", choices=FORMATS, default="ndjson")
+    parser.add_argument("--output", default="-",
+                        help="File to write, - for stdout (NDJSON only); a .gz name is gzipped")
+    parser.add_argument("--since", type=_date, help="Created on or after (ISO date or datetime, UTC)")
+    parser.add_argument("--until", type=_date, help="Created before (ISO date or datetime, UTC)")
+    parser.add_argument("--min-id", type=int)
+    parser.add_argument("--max-id", type=int)
+    parser.add_argument("--include-raw-html", action="store_true")
+    parser.add_argument("--batch-size", type=int, default=settings.EXPORT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    if args.format == "parquet" and args.output == "-":
+        parser.error("Parquet needs an --output file")
+    if args.format == "parquet" and not parquet_available():
+        parser.error("Parquet export needs pyarrow: pip install pyarrow")
+
+    filters = ExportFilter(args.since, args.until, args.min_id, args.max_id)
+    chunks = export_chunks(read_engine, args.format, filters, args.include_raw_html, args.batch_size)
+    if args.output == "-":
+        out = sys.stdout.buffer
+    elif args.output.endswith(".gz"):
+        out = gzip.open(args.output, "wb")
+    else:
+        out = open(args.output, "wb")
+    written = 0
+    try:
+        for chunk in chunks:
+            out.write(chunk)
+            written += len(chunk)
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+    logger.info(f"Exported {written:,} bytes")
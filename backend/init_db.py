@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 """
 Database initialization script for WikiQuiz AI.
-Creates all necessary tables and optionally seeds sample data.
+Checks the connection and applies schema migrations (same as migrate.py).
 """
 import sys
 import os
@@ -9,8 +9,8 @@ import os
 # Add backend directory to path
 sys.path.insert(0, os.path.dirname(__file__))
 
-from database import Base, engine
-from models import Quiz
+from database import engine
+from migrate import run_migrations
 import logging
 
 logging.basicConfig(level=logging.INFO)
@@ -18,16 +18,18 @@ logger = logging.getLogger(__name__)
 
 
 def init_db():
-    """Initialize database tables."""
-    logger.info("Creating database tables...")
+    """Bring the database schema up to date (see migrate.py)."""
+    logger.info("Applying database migrations...")
     
     try:
-        Base.metadata.create_all(bind=engine)
-        logger.info("✅ Database tables created successfully!")
-        logger.info("Tables created: quizzes")
+        applied = run_migrations(engine)
+        if applied:
+            logger.info(f"✅ Applied migrations: {', '.join(applied)}")
+        else:
+            logger.info("✅ Database schema already up to date")
         return True
     except Exception as e:
-        logger.error(f"❌ Error creating tables: {e}")
+        logger.error(f"❌ Error migrating database: {e}")
         return False
 
 
@@ -57,7 +59,7 @@ if __name__ == "__main__":
     if not check_db_connection():
         sys.exit(1)
     
-    # Initialize tables
+    # Create or upgrade tables
     if not init_db():
         sys.exit(1)
     
@@ -0,0 +1,232 @@
+"""
+Wikipedia language editions: URL canonicalization and scraper profiles.
+
+Any xx.wikipedia.org article is accepted (mobile xx.m.wikipedia.org links
+too). canonicalize_url() reduces a link to its (language, title) key and a
+single canonical URL, which is what quizzes are stored and cached under, so
+"https://en.m.wikipedia.org/wiki/alan_Turing#Early_life" and
+"https://en.wikipedia.org/wiki/Alan_Turing" are the same quiz.
+
+Each language has a profile telling the scraper which section headings are
+boilerplate ("References", "Einzelnachweise", ...), which lead paragraphs
+are noise (coordinates) and which title prefixes are namespaces rather
+than articles. Profiles are compiled once at import - a frozenset and one
+regex each - so extraction costs the same however many languages there are.
+Languages without a profile get one merged from all the others.
+"""
+import re
+from typing import Dict, FrozenSet, NamedTuple, Pattern, Tuple
+from urllib.parse import quote, unquote, urlparse
+
+# MediaWiki leaves these unescaped in article URLs (see wfUrlencode)
+URL_SAFE_CHARS = ";@$!*(),/~:"
+
+# Language subdomains: "en", "de", "zh-yue", "be-tarask", plus "simple"
+LANGUAGE_CODE = re.compile(r"^(?:[a-z]{2,3}(?:-[a-z0-9]+)*|simple)$")
+
+# Not language editions, even though they look like one
+NON_LANGUAGE_HOSTS = {"www", "m", "meta", "commons", "species", "incubator", "test"}
+
+# English namespace names work on every edition
+CANONICAL_NAMESPACES = (
+    "Talk", "User", "User talk", "Wikipedia", "Wikipedia talk", "File", "File talk",
+    "MediaWiki", "Template", "Template talk", "Help", "Category", "Category talk",
+    "Portal", "Draft", "Module", "Special", "Media", "Image", "Project", "WP",
+)
+
+# code: (English name, boilerplate headings, coordinate labels, local namespaces)
+_PROFILE_DATA: Dict[str, Tuple[str, Tuple[str, ...], Tuple[str, ...], Tuple[str, ...]]] = {
+    "en": ("English",
+           ("Contents", "References", "External links", "Notes", "See also", "Further reading",
+            "Bibliography", "Sources", "Citations", "Footnotes", "Notes and references"),
+           ("Coordinates",),
+           ()),
+    "de": ("German",
+           ("Inhaltsverzeichnis", "Einzelnachweise", "Weblinks", "Literatur", "Siehe auch",
+            "Anmerkungen", "Quellen", "Belege"),
+           ("Koordinaten",),
+           ("Diskussion", "Benutzer", "Datei", "Vorlage", "Hilfe", "Kategorie", "Spezial")),
+    "fr": ("French",
+           ("Sommaire", "Notes et références", "Références", "Notes", "Liens externes",
+            "Voir aussi", "Bibliographie", "Articles connexes"),
+           ("Coordonnées",),
+           ("Discussion", "Utilisateur", "Fichier", "Modèle", "Aide", "Catégorie", "Portail", "Spécial")),
+    "es": ("Spanish",
+           ("Índice", "Referencias", "Notas", "Enlaces externos", "Véase también",
+            "Bibliografía", "Bibliografía adicional"),
+           ("Coordenadas",),
+           ("Discusión", "Usuario", "Archivo", "Plantilla", "Ayuda", "Categoría", "Especial", "Anexo")),
+    "it": ("Italian",
+           ("Indice", "Note", "Bibliografia", "Voci correlate", "Collegamenti esterni", "Altri progetti"),
+           ("Coordinate",),
+           ("Discussione", "Utente", "File", "Template", "Aiuto", "Categoria", "Speciale", "Portale")),
+    "pt": ("Portuguese",
+           ("Índice", "Referências", "Notas", "Ligações externas", "Ver também", "Bibliografia"),
+           ("Coordenadas",),
+           ("Discussão", "Usuário", "Utilizador", "Ficheiro", "Arquivo", "Predefinição", "Ajuda",
+            "Categoria", "Especial", "Portal")),
+    "nl": ("Dutch",
+           ("Inhoud", "Referenties", "Bronnen", "Noten", "Externe links", "Zie ook", "Literatuur"),
+           ("Coördinaten",),
+           ("Overleg", "Gebruiker", "Bestand", "Sjabloon", "Help", "Categorie", "Speciaal")),
+    "pl": ("Polish",
+           ("Spis treści", "Przypisy", "Bibliografia", "Linki zewnętrzne", "Zobacz też", "Uwagi"),
+           ("Współrzędne",),
+           ("Dyskusja", "Wikipedysta", "Plik", "Szablon", "Pomoc", "Kategoria", "Specjalna")),
+    "sv": ("Swedish",
+           ("Innehåll", "Referenser", "Noter", "Källor", "Externa länkar", "Se även"),
+           ("Koordinater",),
+           ("Diskussion", "Användare", "Fil", "Mall", "Hjälp", "Kategori", "Special")),
+    "ru": ("Russian",
+           ("Содержание", "Примечания", "Литература", "Ссылки", "См. также", "Источники"),
+           ("Координаты",),
+           ("Обсуждение", "Участник", "Файл", "Шаблон", "Справка", "Категория", "Служебная", "Портал")),
+    "uk": ("Ukrainian",
+           ("Зміст", "Примітки", "Література", "Посилання", "Див. також", "Джерела"),
+           ("Координати",),
+           ("Обговорення", "Користувач", "Файл", "Шаблон", "Довідка", "Категорія", "Спеціальна")),
+    "ja": ("Japanese",
+           ("目次", "脚注", "出典", "参考文献", "関連項目", "外部リンク"),
+           ("座標",),
+           ("ノート", "利用者", "ファイル", "画像", "テンプレート", "ヘルプ", "カテゴリ", "特別")),
+    "zh": ("Chinese",
+           ("目录", "目錄", "参考文献", "參考文獻", "参考资料", "參考資料", "注释", "註釋",
+            "外部链接", "外部連結", "参见", "參見", "延伸阅读", "延伸閱讀"),
+           ("坐标", "座標"),
+           ("讨论", "討論", "用户", "用戶", "文件", "檔案", "模板", "帮助", "幫助", "分类", "分類", "特殊")),
+    "ar": ("Arabic",
+           ("المحتويات", "المراجع", "مراجع", "وصلات خارجية", "انظر أيضا", "انظر أيضًا", "ملاحظات"),
+           ("الإحداثيات",),
+           ("نقاش", "مستخدم", "ملف", "قالب", "مساعدة", "تصنيف", "خاص", "بوابة")),
+}
+
+
+def _fold(text: str) -> str:
+    """Case- and whitespace-insensitive form used for all profile lookups"""
+    return " ".join(text.replace("_", " ").split()).casefold()
+
+
+class LanguageProfile(NamedTuple):
+    code: str
+    name: str
+    skip_sections: FrozenSet[str]
+    coordinates: Pattern
+    namespaces: FrozenSet[str]
+
+    def is_boilerplate(self, heading: str) -> bool:
+        """References, external links and the like - not article content"""
+        return _fold(heading) in self.skip_sections
+
+    def is_summary_noise(self, paragraph: str) -> bool:
+        """Lead paragraphs that aren't prose (the coordinates line)"""
+        return bool(self.coordinates.match(paragraph))
+
+    def is_namespace(self, title: str) -> bool:
+        """True if the title is e.g. "Category:..." rather than an article"""
+        prefix, sep, _ = title.partition(":")
+        return bool(sep) and _fold(prefix) in self.namespaces
+
+
+def _compile(code: str, name: str, headings, coordinates, namespaces) -> LanguageProfile:
+    labels = "|".join(re.escape(label) for label in sorted(set(coordinates), key=len, reverse=True))
+    return LanguageProfile(
+        code=code,
+        name=name,
+        skip_sections=frozenset(_fold(h) for h in headings),
+        coordinates=re.compile(rf"^\s*(?:{labels})\s*[:：]", re.IGNORECASE),
+        namespaces=frozenset(_fold(n) for n in CANONICAL_NAMESPACES + tuple(namespaces)),
+    )
+
+
+PROFILES: Dict[str, LanguageProfile] = {
+    code: _compile(code, *data) for code, data in _PROFILE_DATA.items()
+}
+
+# For editions without their own profile: every known boilerplate heading
+# and label. A heading like "Notes" is boilerplate in any language.
+FALLBACK_PROFILE = _compile(
+    "",
+    "",
+    [h for data in _PROFILE_DATA.values() for h in data[1]],
+    [c for data in _PROFILE_DATA.values() for c in data[2]],
+    [n for data in _PROFILE_DATA.values() for n in data[3]],
+)
+
+
+def profile_for(language: str) -> LanguageProfile:
+    profile = PROFILES.get(language)
+    if profile is None:
+        return FALLBACK_PROFILE._replace(code=language, name=language)
+    return profile
+
+
+def language_name(language: str) -> str:
+    """English name of the language, for prompts ("German"); the code if unknown"""
+    profile = PROFILES.get(language)
+    return profile.name if profile else f"the language with code '{language}'"
+
+
+class ArticleRef(NamedTuple):
+    language: str
+    title: str  # underscores, first letter upper-cased, as in the canonical URL
+    url: str
+
+    @property
+    def key(self) -> str:
+        """Stable "lang:Title" key for caches"""
+        return f"{self.language}:{self.title}"
+
+    @property
+    def api_host(self) -> str:
+        return f"{self.language}.wikipedia.org"
+
+
+def canonicalize_url(url: str) -> ArticleRef:
+    """
+    Parse a Wikipedia article URL into its canonical form.
+
+    Raises:
+        ValueError: If it isn't an article URL on a Wikipedia language edition
+    """
+    parsed = urlparse((url or "").strip())
+    if parsed.scheme not in ("http", "https"):
+        raise ValueError("URL must start with http:// or https://")
+
+    host = (parsed.hostname or "").lower()
+    parts = host.split(".")
+    if parts[-2:] != ["wikipedia", "org"] or len(parts) > 4:
+        raise ValueError("Not a Wikipedia URL")
+    if len(parts) == 2 or parts[0] == "www":
+        language = "en"  # wikipedia.org/wiki/X has always meant English
+    elif len(parts) == 4 and parts[1] != "m":
+        raise ValueError("Not a Wikipedia URL")
+    else:
+        language = parts[0]
+    if language in NON_LANGUAGE_HOSTS or not LANGUAGE_CODE.match(language):
+        raise ValueError(f"Not a Wikipedia language edition: {host}")
+
+    if not parsed.path.startswith("/wiki/"):
+        raise ValueError("Not a Wikipedia article URL")
+    # Spaces and runs of underscores are the same title
+    title = unquote(parsed.path[len("/wiki/"):]).replace(" ", "_")
+    title = "_".join(part for part in title.split("_") if part)
+    if not title:
+        raise ValueError("Wikipedia URL has no article title")
+    if profile_for(language).is_namespace(title):
+        raise ValueError("URL points to a Wikipedia special or namespace page, not an article")
+    # Wikipedia titles always start with a capital letter ("ß" has no
+    # single-letter capital, so leave those alone)
+    first = title[0].upper()
+    if len(first) == 1:
+        title = first + title[1:]
+
+    canonical = f"https://{language}.wikipedia.org/wiki/{quote(title, safe=URL_SAFE_CHARS)}"
+    return ArticleRef(language, title, canonical)
+
+
+def article_key(url: str) -> str:
+    """(language, title) cache key for a URL; non-article URLs key as themselves"""
+    try:
+        return canonicalize_url(url).key
+    except ValueError:
+        return url
@@ -1,18 +1,55 @@
 """
 LLM stuff for quiz generation using Gemini
 This is where the magic happens - turning Wikipedia articles into quizzes
+
+langchain and the Gemini client take over a second to import, so they are
+imported on first use and the shared QuizGenerator is built lazily by
+get_quiz_generator(). Importing this module (and so starting a worker)
+needs neither the libraries loaded nor an API key.
 """
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.prompts import PromptTemplate
-from langchain.output_parsers import PydanticOutputParser
 from pydantic import BaseModel, Field
-from typing import List
+from typing import Dict, List, Optional, Tuple
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, TimeoutError as FutureTimeout, wait
 from config import settings
+from google.api_core.exceptions import DeadlineExceeded, ResourceExhausted, ServiceUnavailable
+from languages import language_name
+from logging_setup import log_payload
+from metrics import (
+    INVALID_QUESTIONS,
+    JSON_REPAIR_FALLBACKS,
+    LLM_CALL_SECONDS,
+    LLM_FAILOVERS,
+    LLM_HEDGES,
+    QUESTION_REPAIRS,
+    RESOURCE_EXHAUSTED,
+    stage,
+)
+from question_check import ArticleText, blocking, check_question, describe, split_questions
+from tracing import span
+from usage import add_calls, collect_usage, record_call, save_unattached_usage
+import contextvars
 import json
 import logging
+import re
+import threading
+import time
 
 logger = logging.getLogger(__name__)
 
+# Errors that mean "try the next model" rather than "this prompt is bad"
+FAILOVER_ERRORS = (ResourceExhausted, DeadlineExceeded, ServiceUnavailable, TimeoutError)
+
+# Recent successful latencies kept per model for the hedge delay
+LATENCY_WINDOW = 200
+MIN_LATENCY_SAMPLES = 20
+
+# Threads for hedged calls - the request thread waits, these do the calls.
+# Two per thread of FastAPI's threadpool (40), so with every request
+# generating a primary and its backup still start without queueing
+HEDGE_THREADS = 80
+_hedge_executor = ThreadPoolExecutor(max_workers=HEDGE_THREADS, thread_name_prefix="llm-hedge")
+
 
 # Define what we want the quiz questions to look like
 class QuizQuestionOutput(BaseModel):
@@ -31,6 +68,11 @@ class QuizOutput(BaseModel):
     related_topics: List[str] = Field(description="5 related Wikipedia topics for further reading")
 
 
+class QuestionBatchOutput(BaseModel):
+    """Just questions - used when regenerating part of an existing quiz"""
+    quiz: List[QuizQuestionOutput] = Field(description="The requested quiz questions")
+
+
 class EntityOutput(BaseModel):
     """Entities extracted from the article"""
     people: List[str] = Field(description="Names of people mentioned")
@@ -38,28 +80,388 @@ class EntityOutput(BaseModel):
     locations: List[str] = Field(description="Locations mentioned")
 
 
+def parse_model_chain(spec: str, default_timeout: float) -> List[Tuple[str, float]]:
+    """Turn "model:timeout,model" into [(model, timeout), ...]"""
+    chain = []
+    for entry in spec.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        name, _, timeout = entry.partition(":")
+        chain.append((name.strip(), float(timeout) if timeout.strip() else default_timeout))
+    if not chain:
+        raise ValueError("LLM_MODEL_CHAIN must name at least one model")
+    return chain
+
+
+def _build_llm(model: str, timeout: float):
+    if settings.LLM_BACKEND == "stub":
+        from llm_stub import StubChatModel
+        return StubChatModel(model, timeout=timeout)
+    if not settings.GEMINI_API_KEY:
+        raise RuntimeError("GEMINI_API_KEY is not set - add it to .env, or use LLM_BACKEND=stub")
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    
+    # Using lower temperature for more factual responses
+    return ChatGoogleGenerativeAI(
+        model=model,
+        google_api_key=settings.GEMINI_API_KEY,
+        temperature=0.1,
+        max_output_tokens=4096,
+        timeout=timeout,
+        max_retries=settings.LLM_MAX_RETRIES,
+        model_kwargs={"response_mime_type": "application/json"}
+    )
+
+
+class ModelClient:
+    """One model in the fallback chain, with its own timeout and latency history"""
+    
+    def __init__(self, name: str, timeout: float, llm):
+        self.name = name
+        self.timeout = timeout
+        self.llm = llm
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._lock = threading.Lock()
+    
+    def observe(self, seconds: float) -> None:
+        with self._lock:
+            self._latencies.append(seconds)
+    
+    def p95(self) -> Optional[float]:
+        with self._lock:
+            if len(self._latencies) < MIN_LATENCY_SAMPLES:
+                return None
+            ordered = sorted(self._latencies)
+        return ordered[int(len(ordered) * 0.95) - 1]
+    
+    def hedge_delay(self) -> float:
+        """How long to wait before hedging: the recent p95, within sane bounds"""
+        p95 = self.p95()
+        delay = settings.LLM_HEDGE_DELAY_SECONDS if p95 is None else p95
+        return min(max(delay, settings.LLM_HEDGE_MIN_DELAY_SECONDS), self.timeout)
+
+
+def _language_rule(language: str) -> str:
+    """Extra prompt rule for non-English articles (empty for English)"""
+    if language == "en":
+        return ""
+    name = language_name(language)
+    return (f"\nLANGUAGE: The article is written in {name}. Write every question, option, "
+            f"explanation and related topic in {name}, and copy section titles exactly as "
+            f"they appear in the article.\n")
+
+
+def _bank_rule(known_questions: Optional[List[dict]]) -> str:
+    """Prompt block offering questions we already have on this subject"""
+    if not known_questions:
+        return ""
+    lines = "\n".join(json.dumps(q, ensure_ascii=False) for q in known_questions)
+    return (
+        "\nEXISTING QUESTIONS (from our question bank, about this subject):\n"
+        f"{lines}\n"
+        "- If the article content supports one of these, include it unchanged (same question, "
+        "options, answer and explanation) instead of writing a new question about the same fact\n"
+        "- Leave out any the article does not support\n"
+    )
+
+
+def _usable(response) -> bool:
+    """Worth returning to the caller - a hedge shouldn't win with an empty answer"""
+    content = getattr(response, "content", None)
+    return isinstance(content, str) and "{" in content
+
+
 class QuizGenerator:
     """
     Handles all the LLM interactions for quiz generation.
     Using Gemini because it's free and works pretty well for this.
+    
+    Calls go to the first model in LLM_MODEL_CHAIN and fail over down the
+    chain on quota errors and timeouts, optionally hedging slow calls.
     """
     
-    def __init__(self):
-        # Setup Gemini - using lower temperature for more factual responses
-        self.llm = ChatGoogleGenerativeAI(
-            model="models/gemini-2.5-flash",
-            google_api_key=settings.GEMINI_API_KEY,
-            temperature=0.1,
-            max_output_tokens=4096,
-            timeout=60,
-            model_kwargs={"response_mime_type": "application/json"}
-        )
+    def __init__(self, models: Optional[List[ModelClient]] = None):
+        from langchain.output_parsers import PydanticOutputParser
+        
+        if models is None:
+            models = [
+                ModelClient(name, timeout, _build_llm(name, timeout))
+                for name, timeout in parse_model_chain(settings.LLM_MODEL_CHAIN, settings.LLM_TIMEOUT_SECONDS)
+            ]
+        self.models = models
         
         # These parsers help us get structured JSON back
         self.quiz_parser = PydanticOutputParser(pydantic_object=QuizOutput)
+        self.question_parser = PydanticOutputParser(pydantic_object=QuestionBatchOutput)
         self.entity_parser = PydanticOutputParser(pydantic_object=EntityOutput)
     
-    def generate_quiz(self, title: str, content: str, sections: List[str]) -> dict:
+    def _invoke(self, prompt: str, stage_name: str, truncated_chars: int = 0):
+        """
+        Get a response for the prompt from the model chain, timed under the
+        given pipeline stage. truncated_chars is how much article text was
+        cut from the prompt to fit.
+        """
+        with stage(stage_name):
+            for i, client in enumerate(self.models):
+                fallback = self.models[i + 1] if i + 1 < len(self.models) else None
+                try:
+                    if settings.LLM_HEDGE_ENABLED:
+                        return self._hedged_call(client, fallback or client, prompt, stage_name, truncated_chars)
+                    return self._call(client, prompt, stage_name, truncated_chars)
+                except FAILOVER_ERRORS as e:
+                    if fallback is None:
+                        raise
+                    reason = type(e).__name__
+                    LLM_FAILOVERS.inc(model=client.name, reason=reason)
+                    logger.warning(f"{client.name} failed with {reason}, falling back to {fallback.name}")
+    
+    def _call(self, client: ModelClient, prompt: str, stage_name: str, truncated_chars: int):
+        """One call to one model, with its latency and token usage recorded"""
+        start = time.perf_counter()
+        response = None
+        outcome = "error"
+        try:
+            with span("llm_call", attributes={"llm.model": client.name}):
+                response = client.llm.invoke(prompt)
+            outcome = "ok"
+            client.observe(time.perf_counter() - start)
+            return response
+        except ResourceExhausted:
+            RESOURCE_EXHAUSTED.inc(stage=stage_name)
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            LLM_CALL_SECONDS.observe(elapsed, model=client.name, outcome=outcome)
+            record_call(stage_name, client.name, response, elapsed,
+                        prompt_chars=len(prompt), truncated_chars=truncated_chars)
+    
+    def _hedged_call(self, primary: ModelClient, backup: ModelClient, prompt: str,
+                     stage_name: str, truncated_chars: int):
+        """
+        Call the primary model; if it hasn't answered within its recent p95
+        of starting, send the same prompt to the backup and return whichever
+        usable answer arrives first. The slower call can't be cancelled - it
+        finishes in the background, and its usage is written on its own
+        once it does, since the request may have saved its usage by then.
+        """
+        attempts = []
+        
+        def submit(client):
+            calls, started = [], []
+            begun = threading.Event()
+            
+            def run():
+                started.append(time.perf_counter())
+                begun.set()
+                with collect_usage(calls):
+                    return self._call(client, prompt, stage_name, truncated_chars)
+            
+            # Each call gets its own copy of the request context (trace)
+            future = _hedge_executor.submit(contextvars.copy_context().run, run)
+            attempts.append((future, calls))
+            return future, begun, started
+        
+        try:
+            first, begun, started = submit(primary)
+            # Time the hedge from when the call starts, not from the queue
+            begun.wait()
+            delay = primary.hedge_delay()
+            try:
+                return first.result(timeout=max(0.0, started[0] + delay - time.perf_counter()))
+            except FutureTimeout:
+                pass
+            
+            LLM_HEDGES.inc(outcome="fired")
+            logger.info(f"{primary.name} slower than {delay:.1f}s, hedging with {backup.name}")
+            second, _, _ = submit(backup)
+            pending = {first, second}
+            errors = []
+            fallback_response = None
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        response = future.result()
+                    except Exception as e:
+                        errors.append(e)
+                        continue
+                    if _usable(response):
+                        if future is second:
+                            LLM_HEDGES.inc(outcome="won")
+                        return response
+                    fallback_response = response
+            
+            if fallback_response is not None:
+                return fallback_response
+            raise errors[0]
+        finally:
+            for future, calls in attempts:
+                if future.done():
+                    add_calls(calls)
+                else:
+                    future.add_done_callback(lambda _, calls=calls: save_unattached_usage(calls))
+    
+    def _parse_json(self, response_text: str):
+        """Pull a JSON object out of a raw LLM response (timed as the json_repair stage)"""
+        with stage("json_repair"):
+            return self._repair_json(response_text)
+    
+    def _repair_json(self, response_text: str):
+        """
+        Handles markdown code fences, stray newlines, trailing commas and,
+        as a last resort, json_repair.
+        """
+        # Try to find JSON inside code blocks first
+        json_match = re.search(r'```(?:json)?\s*(\{.*?\})\s*```', response_text, re.DOTALL)
+        if json_match:
+            response_text = json_match.group(1)
+        else:
+            # If no code blocks, look for the first { and last }
+            start_idx = response_text.find('{')
+            end_idx = response_text.rfind('}')
+            if start_idx != -1 and end_idx != -1:
+                response_text = response_text[start_idx:end_idx+1]
+        
+        # Clean up the JSON - fix common LLM issues
+        # This is aggressive but necessary for bad LLM output
+        # Replace literal newlines in the middle of strings
+        response_text = response_text.replace('\r\n', ' ').replace('\n', ' ').replace('\r', ' ')
+        # Collapse multiple spaces
+        response_text = re.sub(r'\s+', ' ', response_text)
+        
+        try:
+            return json.loads(response_text)
+        except json.JSONDecodeError:
+            # Last resort: try to fix common issues
+            # Remove trailing commas before closing braces/brackets
+            response_text = re.sub(r',\s*}', '}', response_text)
+            response_text = re.sub(r',\s*]', ']', response_text)
+            try:
+                parsed = json.loads(response_text)
+                JSON_REPAIR_FALLBACKS.inc(method="trailing_commas")
+                return parsed
+            except json.JSONDecodeError:
+                # Ultimate fallback: try json_repair
+                try:
+                    from json_repair import repair_json
+                    repaired = repair_json(response_text)
+                    quiz_output = json.loads(repaired)
+                    JSON_REPAIR_FALLBACKS.inc(method="json_repair")
+                    logger.info("LLM JSON repaired with json_repair")
+                    return quiz_output
+                except ImportError:
+                    logger.error(f"JSON still invalid. Installing json_repair might help.")
+                    raise
+                except:
+                    logger.error(f"JSON repair failed: {response_text[:500]}")
+                    raise
+    
+    def _validate_questions(self, title: str, content: str, questions: list,
+                            language: str = "en") -> Tuple[List[dict], int]:
+        """
+        Keep the questions that pass question_check, send the rest back in
+        one small repair call and slot the fixed ones into their old place.
+        Questions still invalid after that are dropped, never saved.
+        Returns the questions and how many were dropped.
+        """
+        article = ArticleText(content)
+        strict = settings.LLM_REQUIRE_ANSWER_SUPPORT
+        kept, invalid, flagged = split_questions(questions, article, strict)
+        for position, problems in flagged.items():
+            for problem in problems:
+                INVALID_QUESTIONS.inc(problem=problem)
+            logger.info(f"Keeping question #{position + 1} anyway: {describe(problems)}")
+        if not invalid:
+            return kept, 0
+        for _, problems in invalid.values():
+            for problem in problems:
+                INVALID_QUESTIONS.inc(problem=problem)
+        logger.warning(f"{len(invalid)} of {len(questions)} generated questions are invalid: " +
+                       ", ".join(f"#{i + 1} {describe(p)}" for i, (_, p) in invalid.items()))
+        
+        repaired = []
+        if settings.LLM_REPAIR_ENABLED:
+            try:
+                repaired = self.repair_questions(title, article, list(invalid.values()), language)
+            except ResourceExhausted:
+                # Out of quota - the valid questions are still worth keeping
+                logger.warning("Question repair skipped, quota exceeded")
+            except Exception as e:
+                logger.warning(f"Question repair failed: {e}")
+        
+        for n, position in enumerate(invalid):
+            fixed, problems = check_question(repaired[n], article) if n < len(repaired) else (None, ["missing"])
+            if blocking(problems, strict):
+                QUESTION_REPAIRS.inc(outcome="dropped")
+            else:
+                QUESTION_REPAIRS.inc(outcome="repaired")
+                kept[position] = fixed
+        valid = [q for q in kept if q is not None]
+        if len(valid) < len(questions):
+            logger.warning(f"Dropped {len(questions) - len(valid)} of {len(questions)} questions "
+                           f"still invalid after repair")
+        return valid, len(questions) - len(valid)
+    
+    def repair_questions(self, title: str, article: ArticleText,
+                         invalid: List[Tuple[dict, List[str]]], language: str = "en") -> List[dict]:
+        """
+        Ask for fixed versions of just the invalid questions, in order. The
+        prompt carries the questions, what is wrong with each and only the
+        article passages about them, so it costs a fraction of a full call.
+        """
+        from langchain.prompts import PromptTemplate
+        
+        questions = [q for q, _ in invalid]
+        listing = "\n".join(
+            f"{n}. {json.dumps(q, ensure_ascii=False)} - problem: {describe(problems)}"
+            for n, (q, problems) in enumerate(invalid, start=1)
+        )
+        repair_prompt = PromptTemplate(
+            template="""You are fixing questions in a quiz about the Wikipedia article "{title}". The questions below failed validation.
+
+RULES:
+1. Return EXACTLY {count} questions, one for each question below, in the same order
+2. Fix each question's problem and keep it about the same fact if the article text supports it; otherwise write a new question from the article text
+3. Each question must have exactly 4 distinct options
+4. The answer must be copied exactly from one of the 4 options
+5. The answer must be supported by the article text below
+6. Keep each question's difficulty and section
+{language_rule}
+Questions to fix:
+{questions}
+
+Article text:
+{evidence}
+
+{format_instructions}
+
+IMPORTANT: Return ONLY valid JSON matching the schema. No additional text.
+JSON FORMATTING: All text fields must be on a single line. Do NOT use newlines within string values.""",
+            input_variables=["title", "count", "questions", "evidence"],
+            partial_variables={
+                "format_instructions": self.question_parser.get_format_instructions(),
+                "language_rule": _language_rule(language),
+            }
+        )
+        prompt_value = repair_prompt.format(
+            title=title,
+            count=len(invalid),
+            questions=listing,
+            evidence=article.evidence(questions, settings.LLM_REPAIR_EVIDENCE_CHARS),
+        )
+        logger.info(f"Asking the LLM to repair {len(invalid)} question(s)")
+        response = self._invoke(prompt_value, "repair_llm")
+        if not response or not response.content:
+            raise ValueError("LLM returned empty response")
+        output = self._parse_json(response.content.strip())
+        repaired = output.get('quiz') if isinstance(output, dict) else None
+        if not isinstance(repaired, list):
+            raise ValueError("LLM response missing 'quiz' list")
+        return repaired
+    
+    def generate_quiz(self, title: str, content: str, sections: List[str], language: str = "en",
+                      known_questions: Optional[List[dict]] = None) -> dict:
         """
         Main quiz generation function.
         
@@ -67,6 +469,7 @@ class QuizGenerator:
         1. Only uses info from the article (no making stuff up)
         2. Creates questions at different difficulty levels
         3. Gives us proper explanations
+        4. Writes in the article's language
         
         Raises:
             ValueError: If LLM response cannot be parsed or is invalid
@@ -82,6 +485,8 @@ class QuizGenerator:
             sections = ["General"]  # Fallback if no sections
         
         # This is the prompt that does all the work
+        from langchain.prompts import PromptTemplate
+        
         quiz_prompt = PromptTemplate(
             template="""You are an expert educational quiz generator. Your task is to create a high-quality quiz based STRICTLY on the provided Wikipedia article content.
 
@@ -115,13 +520,17 @@ RELATED TOPICS (exactly 5):
 - Suggest 5 related Wikipedia topics for further reading
 - Topics should be naturally related to the article subject
 - Use proper Wikipedia article naming conventions
-
+{bank_rule}{language_rule}
 {format_instructions}
 
 IMPORTANT: Return ONLY valid JSON matching the schema. No additional text.
 JSON FORMATTING: All text fields must be on a single line. Do NOT use newlines within string values.""",
             input_variables=["title", "content", "sections"],
-            partial_variables={"format_instructions": self.quiz_parser.get_format_instructions()}
+            partial_variables={
+                "format_instructions": self.quiz_parser.get_format_instructions(),
+                "language_rule": _language_rule(language),
+                "bank_rule": _bank_rule(known_questions),
+            }
         )
         
         try:
@@ -132,14 +541,18 @@ JSON FORMATTING: All text fields must be on a single line. Do NOT use newlines w
                 sections=", ".join(sections)
             )
             
-            print(f"Calling Gemini API for quiz generation...")
-            response = self.llm.invoke(prompt_value)
+            logger.info("Calling Gemini API for quiz generation")
+            response = self._invoke(prompt_value, "quiz_llm",
+                                    truncated_chars=max(0, len(content) - 8000))
             
             if not response or not response.content:
                 raise ValueError("LLM returned empty response")
             
+        except ResourceExhausted:
+            # Let the API layer turn quota errors into a 429
+            raise
         except Exception as e:
-            print(f"Error calling Gemini API: {e}")
+            logger.error(f"Error calling Gemini API: {e}")
             raise Exception(f"Failed to call AI service: {str(e)}")
         
         # Parse the response - sometimes Gemini wraps it in markdown code blocks
@@ -149,63 +562,10 @@ JSON FORMATTING: All text fields must be on a single line. Do NOT use newlines w
             if not response_text:
                 raise ValueError("LLM returned empty content")
             
-            # Log the raw response for debugging
-            print(f"Raw LLM Response (first 500 chars): {response_text[:500]}")
-            
-            print(f"Cleaned response (first 500 chars): {response_text[:500]}")
-            
-            # Robust JSON extraction
-            import re
-            
-            # Try to find JSON inside code blocks first
-            json_match = re.search(r'```(?:json)?\s*(\{.*?\})\s*```', response_text, re.DOTALL)
-            if json_match:
-                response_text = json_match.group(1)
-            else:
-                # If no code blocks, look for the first { and last }
-                start_idx = response_text.find('{')
-                end_idx = response_text.rfind('}')
-                if start_idx != -1 and end_idx != -1:
-                    response_text = response_text[start_idx:end_idx+1]
-            
-            # Clean up the JSON - fix common LLM issues
-            # Replace newlines within strings (but preserve structure)
-            def clean_json_string(text):
-                # This is aggressive but necessary for bad LLM output
-                # Replace literal newlines in the middle of strings
-                cleaned = text.replace('\r\n', ' ').replace('\n', ' ').replace('\r', ' ')
-                # Collapse multiple spaces
-                cleaned = re.sub(r'\s+', ' ', cleaned)
-                return cleaned
-            
-            response_text = clean_json_string(response_text)
+            # Raw responses are big - only a sample of them get logged
+            log_payload(logger, "Raw LLM response", response_text)
             
-            try:
-                quiz_output = json.loads(response_text)
-            except json.JSONDecodeError as e:
-                # Last resort: try to fix common issues
-                # Remove trailing commas before closing braces/brackets
-                response_text = re.sub(r',\s*}', '}', response_text)
-                response_text = re.sub(r',\s*]', ']', response_text)
-                try:
-                    quiz_output = json.loads(response_text)
-                except json.JSONDecodeError:
-                    # Ultimate fallback: try json_repair
-                    try:
-                        from json_repair import repair_json
-                        repaired = repair_json(response_text)
-                        quiz_output = json.loads(repaired)
-                        print("✅ JSON repaired successfully!")
-                    except ImportError:
-                        # json_repair not installed, manual fix
-                        # Try to escape unescaped quotes
-                        logger.error(f"JSON still invalid. Installing json_repair might help.")
-                        logger.error(f"Bad JSON around char 4428: {response_text[4420:4440]}")
-                        raise
-                    except:
-                        logger.error(f"JSON repair failed: {response_text[:500]}")
-                        raise
-
+            quiz_output = self._parse_json(response_text)
             
             # Validate the output
             if not isinstance(quiz_output, dict):
@@ -224,52 +584,115 @@ JSON FORMATTING: All text fields must be on a single line. Do NOT use newlines w
             if len(quiz_output['quiz']) == 0:
                 raise ValueError("LLM generated empty quiz")
             
-            # Validate each question
-            for i, q in enumerate(quiz_output['quiz']):
-                if not isinstance(q, dict):
-                    continue # Skip invalid ones?
-                
-                # Check required fields
-                # Auto-fix difficulties if needed
-                if 'difficulty' in q:
-                    q['difficulty'] = q['difficulty'].lower()
-                    if q['difficulty'] not in ['easy', 'medium', 'hard']:
-                        q['difficulty'] = 'medium' # Default
-                        
-                # Ensure options is a list
-                if 'options' not in q or not isinstance(q['options'], list):
-                    q['options'] = ["True", "False"] # Emergency fallback
-                
-                # Ensure answer is in options
-                if 'answer' in q and q['answer'] not in q['options']:
-                     # Just add it
-                     q['options'].append(q['answer'])
+            quiz_output['quiz'], quiz_output['dropped_questions'] = self._validate_questions(
+                title, content, quiz_output['quiz'], language)
+            if not quiz_output['quiz']:
+                raise ValueError("LLM generated no valid questions")
 
             # Ensure related_topics exists
             if 'related_topics' not in quiz_output:
                 quiz_output['related_topics'] = []
             
-            print(f"Successfully generated {len(quiz_output['quiz'])} questions")
+            logger.info(f"Successfully generated {len(quiz_output['quiz'])} questions")
             return quiz_output
             
         except json.JSONDecodeError as e:
-            print(f"JSON parsing error: {e}")
-            logger.error(f"Failed JSON content: {response.content}")
-            with open("bad_response.txt", "w", encoding="utf-8") as f:
-                 f.write(response.content)
+            logger.error(f"JSON parsing error: {e}. Response ({len(response.content)} chars) "
+                         f"started with: {response.content[:500]}")
             raise ValueError(f"Failed to parse LLM response as JSON: {str(e)}")
         except ValueError as e:
-            print(f"Validation error: {e}")
+            logger.warning(f"Validation error: {e}")
             raise
         except Exception as e:
-            print(f"Uh oh, parsing error: {e}")
+            logger.error(f"Uh oh, parsing error: {e}")
             raise ValueError(f"Failed to parse LLM response: {str(e)}")
     
+    def regenerate_questions(self, title: str, section_content: Dict[str, str],
+                             counts: Dict[str, int], language: str = "en") -> List[dict]:
+        """
+        Generate replacement questions for just the sections that changed.
+        
+        Much cheaper than a full generate_quiz call - the prompt only carries
+        the changed sections and asks for exactly as many questions as we
+        are replacing.
+        
+        Raises:
+            ValueError: If LLM response cannot be parsed or is invalid
+            Exception: For API errors
+        """
+        wanted = {section: n for section, n in counts.items() if n > 0}
+        if not wanted:
+            return []
+        
+        # Share the same 8000 char budget as a full generation
+        budget = 8000 // len(wanted)
+        blocks = []
+        truncated = 0
+        for section, n in wanted.items():
+            text = section_content.get(section, "")
+            truncated += max(0, len(text) - budget)
+            blocks.append(f"Section: {section}\nQuestions needed: {n}\n{text[:budget]}")
+        
+        from langchain.prompts import PromptTemplate
+        
+        question_prompt = PromptTemplate(
+            template="""You are an expert educational quiz generator. Parts of the Wikipedia article "{title}" have been updated and some quiz questions need to be replaced.
+
+CRITICAL RULES:
+1. ALL questions MUST be answerable from the provided section content
+2. DO NOT add information not present in the sections
+3. Generate EXACTLY the number of questions requested for each section
+4. Each question must have exactly 4 options
+5. The correct answer must be one of the 4 options
+6. Set the 'section' field to the section heading the question is about
+7. Use a mix of easy, medium and hard questions
+{language_rule}
+Updated sections:
+
+{sections}
+
+{format_instructions}
+
+IMPORTANT: Return ONLY valid JSON matching the schema. No additional text.
+JSON FORMATTING: All text fields must be on a single line. Do NOT use newlines within string values.""",
+            input_variables=["title", "sections"],
+            partial_variables={
+                "format_instructions": self.question_parser.get_format_instructions(),
+                "language_rule": _language_rule(language),
+            }
+        )
+        
+        try:
+            prompt_value = question_prompt.format(title=title, sections="\n\n".join(blocks))
+            response = self._invoke(prompt_value, "quiz_llm", truncated_chars=truncated)
+            if not response or not response.content:
+                raise ValueError("LLM returned empty response")
+        except ResourceExhausted:
+            raise
+        except Exception as e:
+            logger.error(f"Error calling Gemini API: {e}")
+            raise Exception(f"Failed to call AI service: {str(e)}")
+        
+        try:
+            output = self._parse_json(response.content.strip())
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Failed to parse LLM response as JSON: {str(e)}")
+        
+        questions = output.get('quiz') if isinstance(output, dict) else None
+        if not isinstance(questions, list):
+            raise ValueError("LLM response missing 'quiz' list")
+        
+        content = " ".join(section_content.get(section, "") for section in wanted)
+        valid, _ = self._validate_questions(title, content, questions, language)
+        return valid
+    
     def extract_entities(self, content: str) -> dict:
         """
         Pull out the important people, places, and organizations from the article.
         """
         
+        from langchain.prompts import PromptTemplate
+        
         entity_prompt = PromptTemplate(
             template="""Extract key entities from the following Wikipedia article content.
             
@@ -290,10 +713,10 @@ Return ONLY valid JSON matching the schema.""",
         
         try:
             prompt_value = entity_prompt.format(content=content[:4000])
-            response = self.llm.invoke(prompt_value)
+            response = self._invoke(prompt_value, "entity_llm",
+                                    truncated_chars=max(0, len(content) - 4000))
             
             response_text = response.content.strip()
-            import re
             json_match = re.search(r'```(?:json)?\s*(\{.*?\})\s*```', response_text, re.DOTALL)
             if json_match:
                 response_text = json_match.group(1)
@@ -306,25 +729,48 @@ Return ONLY valid JSON matching the schema.""",
             entities = json.loads(response_text)
             return entities
         except Exception as e:
-            print(f"Entity extraction failed: {e}")
+            logger.warning(f"Entity extraction failed: {e}")
             # Just return empty lists if it doesn't work
             return {"people": [], "organizations": [], "locations": []}
 
 
-# Create a global instance we can use
-quiz_generator = QuizGenerator()
+# The shared instance, built on first use
+_quiz_generator: Optional[QuizGenerator] = None
+_quiz_generator_lock = threading.Lock()
 
 
-def generate_quiz_from_content(title: str, content: str, sections: List[str]) -> dict:
+def get_quiz_generator() -> QuizGenerator:
+    """
+    The shared QuizGenerator. The first call imports the LLM libraries and
+    builds the model clients; it raises if they can't be (no API key).
+    """
+    global _quiz_generator
+    if _quiz_generator is None:
+        with _quiz_generator_lock:
+            if _quiz_generator is None:
+                _quiz_generator = QuizGenerator()
+    return _quiz_generator
+
+
+def generate_quiz_from_content(title: str, content: str, sections: List[str], language: str = "en",
+                               known_questions: Optional[List[dict]] = None) -> dict:
     """
     Helper function to generate a quiz.
     Just wraps the QuizGenerator class for easier importing.
     """
-    return quiz_generator.generate_quiz(title, content, sections)
+    return get_quiz_generator().generate_quiz(title, content, sections, language, known_questions)
+
+
+def regenerate_questions_for_sections(title: str, section_content: Dict[str, str],
+                                      counts: Dict[str, int], language: str = "en") -> List[dict]:
+    """
+    Helper function to regenerate questions for changed sections.
+    """
+    return get_quiz_generator().regenerate_questions(title, section_content, counts, language)
 
 
 def extract_entities_from_content(content: str) -> dict:
     """
     Helper function to extract entities.
     """
-    return quiz_generator.extract_entities(content)
+    return get_quiz_generator().extract_entities(content)
@@ -0,0 +1,118 @@
+"""
+Local stand-in for the Gemini chat model.
+
+Set LLM_BACKEND=stub to run the whole pipeline without an API key or
+network access - handy for load tests and for exercising the fallback
+chain and hedging in llm.py. Answers are canned (built from the bundled
+sample quiz) and latency, slow tails and quota errors are simulated:
+
+- LLM_STUB_LATENCY_MS   typical response time
+- LLM_STUB_SLOW_RATE    share of calls that take 20x longer
+- LLM_STUB_ERROR_RATE   share of calls rejected with ResourceExhausted
+- LLM_STUB_INVALID_RATE share of questions returned broken (an option
+                        missing, or an answer that isn't one of them)
+
+Calls slower than the model's timeout raise DeadlineExceeded after the
+timeout, like the real client does.
+"""
+import json
+import os
+import random
+import re
+import time
+from typing import Optional
+
+from google.api_core.exceptions import DeadlineExceeded, ResourceExhausted
+from langchain_core.messages import AIMessage
+
+from config import settings
+
+SAMPLE_QUIZ = os.path.join(os.path.dirname(__file__), "..", "sample_data", "alan_turing_output.json")
+
+# Rough chars-per-token for the fake usage numbers
+CHARS_PER_TOKEN = 4
+
+_sample: Optional[dict] = None
+
+
+def _load_sample() -> dict:
+    global _sample
+    if _sample is None:
+        try:
+            with open(SAMPLE_QUIZ, encoding="utf-8") as f:
+                _sample = json.load(f)
+        except OSError:
+            _sample = {"quiz": [], "related_topics": [], "key_entities": {}}
+    return _sample
+
+
+class StubChatModel:
+    """Quacks like ChatGoogleGenerativeAI.invoke() for the prompts llm.py sends"""
+
+    def __init__(self, model: str, timeout: float = 60, latency_ms: Optional[float] = None,
+                 slow_rate: Optional[float] = None, error_rate: Optional[float] = None,
+                 invalid_rate: Optional[float] = None, seed: Optional[int] = None):
+        self.model = model
+        self.timeout = timeout
+        self.latency_ms = settings.LLM_STUB_LATENCY_MS if latency_ms is None else latency_ms
+        self.slow_rate = settings.LLM_STUB_SLOW_RATE if slow_rate is None else slow_rate
+        self.error_rate = settings.LLM_STUB_ERROR_RATE if error_rate is None else error_rate
+        self.invalid_rate = settings.LLM_STUB_INVALID_RATE if invalid_rate is None else invalid_rate
+        self._rng = random.Random(seed)
+
+    def _latency(self) -> float:
+        # Log-normal around the typical latency, with an occasional slow tail
+        seconds = self.latency_ms / 1000 * self._rng.lognormvariate(0, 0.25)
+        if self._rng.random() < self.slow_rate:
+            seconds *= 20
+        return seconds
+
+    def _break(self, questions: list) -> list:
+        """Spoil a share of the questions the way real responses sometimes are"""
+        spoiled = []
+        for q in questions:
+            q = dict(q)
+            if self._rng.random() < self.invalid_rate:
+                if self._rng.random() < 0.5:
+                    q["options"] = list(q.get("options") or [])[:3]
+                else:
+                    q["answer"] = f"{q.get('answer', '')} (approximately)"
+            spoiled.append(q)
+        return spoiled
+
+    def _answer(self, prompt: str) -> str:
+        sample = _load_sample()
+        if "Extract key entities" in prompt:
+            return json.dumps(sample.get("key_entities") or {"people": [], "organizations": [], "locations": []})
+
+        questions = sample.get("quiz") or []
+        wanted = [int(n) for n in re.findall(r"Questions needed: (\d+)", prompt)]
+        if "Questions to fix:" in prompt:
+            # Repair - one question back for each listed
+            wanted = [len(re.findall(r"^\d+\. \{", prompt, re.MULTILINE))]
+        if wanted:
+            # Partial regeneration - exactly as many questions as asked for
+            picked = [dict(questions[i % len(questions)]) for i in range(sum(wanted))] if questions else []
+            return json.dumps({"quiz": self._break(picked)})
+
+        return json.dumps({"quiz": self._break(questions), "related_topics": sample.get("related_topics") or []})
+
+    def invoke(self, prompt: str) -> AIMessage:
+        if self._rng.random() < self.error_rate:
+            time.sleep(min(0.05, self.latency_ms / 1000))
+            raise ResourceExhausted(f"Stub quota exceeded for {self.model}")
+
+        latency = self._latency()
+        if latency > self.timeout:
+            time.sleep(self.timeout)
+            raise DeadlineExceeded(f"Stub {self.model} timed out after {self.timeout}s")
+        time.sleep(latency)
+
+        content = self._answer(prompt)
+        input_tokens = len(prompt) // CHARS_PER_TOKEN
+        output_tokens = len(content) // CHARS_PER_TOKEN
+        return AIMessage(content=content, usage_metadata={
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+        })
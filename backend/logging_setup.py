@@ -0,0 +1,156 @@
+"""
+Logging for the API process.
+
+- Every record carries the request id and trace/span ids of the request
+  that produced it, so lines from concurrent requests can be told apart
+- Handlers run on a background thread behind a bounded queue: a request
+  only pays for building the record, never for stdout or file I/O. If the
+  queue fills up, records are dropped rather than blocking the request
+- Verbose payload dumps (raw LLM responses etc.) go through log_payload(),
+  which samples them at LOG_PAYLOAD_SAMPLE_RATE
+
+LOG_FORMAT=json switches to one JSON object per line for log shippers.
+"""
+import atexit
+import contextvars
+import json
+import logging
+import queue
+import random
+import sys
+import uuid
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+from config import settings
+from tracing import SPAN_KIND_SERVER, current_span, parse_traceparent, span
+
+request_id_var: contextvars.ContextVar[str] = contextvars.ContextVar("request_id", default="-")
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s"
+
+_listener: Optional[QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "request_id": getattr(record, "request_id", "-"),
+        }
+        if getattr(record, "trace_id", None):
+            entry["trace_id"] = record.trace_id
+            entry["span_id"] = record.span_id
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class ContextQueueHandler(QueueHandler):
+    """
+    Stamps request context on the record in the calling thread (contextvars
+    don't cross into the listener thread), then hands it off without
+    formatting - that happens on the listener thread.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.request_id = request_id_var.get()
+        ctx = current_span()
+        record.trace_id = ctx.trace_id if ctx else None
+        record.span_id = ctx.span_id if ctx else None
+        # Resolve %-args now; the objects may change before the listener runs
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup_logging() -> None:
+    """Route the root logger through the queue. Safe to call more than once."""
+    global _listener
+    if _listener is not None:
+        return
+
+    output = logging.StreamHandler(sys.stderr)
+    if settings.LOG_FORMAT.lower() == "json":
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+    log_queue: queue.Queue = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+    root = logging.getLogger()
+    root.handlers = [ContextQueueHandler(log_queue)]
+    root.setLevel(settings.LOG_LEVEL.upper())
+
+    _listener = QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+def log_payload(log: logging.Logger, label: str, payload: str, limit: int = 500) -> None:
+    """Log a (truncated) payload at DEBUG, for a sample of calls only"""
+    if not log.isEnabledFor(logging.DEBUG):
+        return
+    if random.random() >= settings.LOG_PAYLOAD_SAMPLE_RATE:
+        return
+    log.debug(f"{label} (first {limit} chars): {payload[:limit]}")
+
+
+class RequestContextMiddleware:
+    """
+    ASGI middleware that gives every HTTP request a request id (taken from
+    X-Request-ID if the client sent one) and a server span, and echoes the
+    id back in the response headers.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        request_id = headers.get(b"x-request-id", b"").decode("latin-1")[:64] or uuid.uuid4().hex
+        parent = parse_traceparent(headers.get(b"traceparent", b"").decode("latin-1"))
+        status_code = 500
+
+        async def send_with_request_id(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-request-id", request_id.encode("latin-1"))
+                ]
+            await send(message)
+
+        token = request_id_var.set(request_id)
+        try:
+            with span(f"{scope['method']} {scope['path']}", kind=SPAN_KIND_SERVER, parent=parent,
+                      attributes={"http.request.method": scope["method"], "request.id": request_id}) as current:
+                try:
+                    await self.app(scope, receive, send_with_request_id)
+                finally:
+                    # Name the span after the route template, not the raw path
+                    route = scope.get("route")
+                    if route is not None and hasattr(route, "path"):
+                        current.name = f"{scope['method']} {route.path}"
+                        current.attributes["http.route"] = route.path
+                    current.attributes["http.response.status_code"] = status_code
+        finally:
+            request_id_var.reset(token)
@@ -2,59 +2,276 @@
 WikiQuiz Generator - Main API
 Built with FastAPI for the DeepKlarity assignment
 """
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, Header, HTTPException, Query, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import SQLAlchemyError
-from typing import List
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import List, Optional
+import asyncio
 import logging
-import traceback
+import threading
+import time
+import requests
 
 from config import settings
-from database import engine, get_db, Base
+from database import (
+    engine,
+    get_db,
+    pool_status,
+    primary_fallback,
+    read_engine,
+    read_session,
+)
+from migrate import verify_schema
 from google.api_core.exceptions import ResourceExhausted
-from models import Quiz
+from models import Quiz, Question
 from schemas import (
+    AttemptResult,
+    AttemptSubmit,
+    QuizAttemptStatsResponse,
     QuizGenerateRequest,
     QuizResponse,
+    QuizQuestion,
     QuizHistoryItem,
+    SearchResponse,
     ErrorResponse,
-    KeyEntities
+    KeyEntities,
+    NextQuestionResponse
 )
 from scraper import scrape_wikipedia
-from llm import generate_quiz_from_content, extract_entities_from_content
-
-# Setup logging - helps with debugging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+from llm import extract_entities_from_content, generate_quiz_from_content, get_quiz_generator
+from refresh import hash_sections, refresh_quiz
+from cache import quiz_cache
+from languages import canonicalize_url
+from compression import CompressionMiddleware, Payload, precompress
+from export import MEDIA_TYPES, ExportFilter, export_chunks, parquet_available
+from logging_setup import RequestContextMiddleware, setup_logging
+from maintenance import read_tracker, restore_quiz
+from metrics import (
+    ARTICLE_LOOKUPS,
+    GENERATIONS,
+    GENERATIONS_IN_FLIGHT,
+    GENERATIONS_PENDING,
+    CallbackCounter,
+    registry,
+    render as render_metrics,
+    stage,
+    track_generation,
+)
+from adaptive import LEVELS, load_index, next_level, question_indexes, record_attempt, seen_mask
+from attempts import (
+    AttemptQueueFull,
+    attempt_stats,
+    attempt_writer,
+    load_answer_key,
+    remove_quiz_attempts,
+    score_attempt,
 )
+from question_bank import banked_questions_for, link_questions
+from rate_limit import RateLimited, RateLimitMiddleware, rate_limiter
+from search import index_quiz, remove_from_index, search_quizzes
+from title_index import resolve_topics
+from usage import (
+    TokenBudgetExceeded,
+    check_budget,
+    clear_usage,
+    collect_usage,
+    quiz_usage,
+    save_unattached_usage,
+    save_usage,
+    usage_stats,
+)
+
+# Setup logging - request ids on every line, written off the request path
+setup_logging()
 logger = logging.getLogger(__name__)
 
-# Make sure DB tables exist
-try:
-    Base.metadata.create_all(bind=engine)
-    logger.info("Database tables created successfully")
-except Exception as e:
-    logger.error(f"Failed to create database tables: {e}")
-    raise
+
+
+def _warm_up_llm() -> None:
+    """Load the LLM libraries and clients ahead of the first generation"""
+    try:
+        get_quiz_generator()
+        logger.info("LLM client ready")
+    except Exception as e:
+        # Generations will fail with the same error; everything else works
+        logger.warning(f"LLM client not available: {e}")
+
+
+async def _drain_generations(timeout: float) -> None:
+    """
+    Wait for generations still running in worker threads. The server has
+    already waited for their requests; these are the ones whose request
+    was cut off, and the LLM calls they are waiting on are paid for either
+    way, so let them finish and save the quiz.
+    """
+    deadline = time.monotonic() + timeout
+    running = int(GENERATIONS_IN_FLIGHT.value())
+    if running:
+        logger.info(f"Waiting up to {timeout:.0f}s for {running} generation(s) to finish")
+    while GENERATIONS_IN_FLIGHT.value() > 0 and time.monotonic() < deadline:
+        await asyncio.sleep(0.2)
+    if GENERATIONS_IN_FLIGHT.value() > 0:
+        logger.warning(f"Shutting down with {int(GENERATIONS_IN_FLIGHT.value())} generation(s) unfinished")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Startup and shutdown work - kept out of import so that importing this
+    module (tests, scripts, worker boot) stays cheap.
+    """
+    # Make sure `python migrate.py` has been run - workers never run DDL themselves
+    try:
+        verify_schema(engine)
+        logger.info("Database schema is up to date")
+    except Exception as e:
+        logger.error(f"Database schema check failed: {e}")
+        raise
+    # In the background, so the worker takes traffic straight away
+    if settings.LLM_WARM_UP:
+        threading.Thread(target=_warm_up_llm, name="llm-warm-up", daemon=True).start()
+    yield
+    await _drain_generations(settings.SERVER_GRACEFUL_SHUTDOWN_SECONDS)
+    # Write out attempts still queued before the worker goes away
+    attempt_writer.shutdown()
+    rate_limiter.shutdown()
+    read_tracker.shutdown()
+
 
 # Create the FastAPI app
 app = FastAPI(
     title="WikiQuiz AI - Smart Trivia Generator",
     description="Generate AI-powered quizzes from Wikipedia articles",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 
+# Set on newly generated quizzes: how many questions failed validation and
+# were left out
+QUESTIONS_DROPPED_HEADER = "X-Questions-Dropped"
+
+# Per-client rate limits - added before CORS so they run inside it and
+# browsers can read the 429
+app.add_middleware(RateLimitMiddleware)
 # Setup CORS so frontend can talk to us
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
+    allow_origins=settings.cors_origins_list,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[QUESTIONS_DROPPED_HEADER],
 )
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(RequestContextMiddleware)
+
+
+@app.middleware("http")
+async def count_generate_requests(request: Request, call_next):
+    """Track generate requests from arrival to response, queueing included"""
+    if request.method != "POST" or request.url.path != "/api/generate":
+        return await call_next(request)
+    
+    GENERATIONS_PENDING.inc()
+    with collect_usage() as llm_calls:
+        failed = True
+        try:
+            response = await call_next(request)
+            failed = response.status_code >= 400
+        except Exception:
+            GENERATIONS.inc(outcome="server_error")
+            raise
+        finally:
+            GENERATIONS_PENDING.dec()
+            if failed and llm_calls:
+                # No quiz to attach them to, but the tokens were still billed
+                await run_in_threadpool(save_unattached_usage, llm_calls)
+    
+    if response.status_code == 429:
+        outcome = "rate_limited"
+    elif response.status_code >= 500:
+        outcome = "server_error"
+    elif response.status_code >= 400:
+        outcome = "client_error"
+    else:
+        outcome = "ok"
+    GENERATIONS.inc(outcome=outcome)
+    return response
+
+
+def _budget_exceeded(e: TokenBudgetExceeded) -> HTTPException:
+    logger.warning(str(e))
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail="Daily AI budget reached. Please try again tomorrow.",
+        headers={"Retry-After": str(e.retry_after)}
+    )
+
+
+def _rate_limited(e: RateLimited) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail=e.detail,
+        headers={"Retry-After": str(e.retry_after)}
+    )
+
+
+def generation_slot():
+    """Counts the request as in flight once it actually has a worker thread"""
+    with track_generation():
+        yield
+
+
+# Cookie recording when this client last wrote, for read-your-writes. The
+# frontend sends it cross-origin (fetch with credentials: 'include').
+LAST_WRITE_COOKIE = "wq_last_write"
+
+
+def _wrote_recently(request: Request) -> bool:
+    try:
+        last_write = float(request.cookies.get(LAST_WRITE_COOKIE, 0))
+    except ValueError:
+        return False
+    return time.time() - last_write < settings.DB_READ_YOUR_WRITES_SECONDS
+
+
+def get_read_db(request: Request):
+    """
+    Dependency for read-only endpoints. Uses the replica, unless there is
+    none or this client wrote something a moment ago (read-your-writes).
+    """
+    yield from read_session(prefer_primary=_wrote_recently(request))
+
+
+def mark_recent_write(response: Response) -> None:
+    """Route this client's reads to the primary for the next few seconds"""
+    if read_engine is engine:
+        return
+    response.set_cookie(
+        LAST_WRITE_COOKIE,
+        str(time.time()),
+        max_age=settings.DB_READ_YOUR_WRITES_SECONDS,
+        httponly=True,
+        samesite="lax",
+    )
+
+
+registry.register(CallbackCounter(
+    "wikiquiz_quiz_cache_lookups",
+    "Hot quiz cache lookups by result",
+    ["result"],
+    lambda: {
+        ("hit",): quiz_cache.hits,
+        ("shared_hit",): quiz_cache.shared_hits,
+        ("miss",): quiz_cache.misses,
+    },
+))
 
 
 # --- Global Error Handlers ---
@@ -84,13 +301,13 @@ async def http_exception_handler(request, exc):
             detail=str(exc.detail),
             timestamp=None
         ).model_dump(exclude_none=True),
+        headers=getattr(exc, "headers", None),
     )
 
 @app.exception_handler(Exception)
 async def global_exception_handler(request, exc):
     """Catch-all for any unhandled server errors"""
-    logger.error(f"Global exception: {exc}")
-    logger.error(traceback.format_exc())
+    logger.error(f"Global exception: {exc}", exc_info=exc)
     
     # Specific message for Google API rate limits if they bubble up
     if "ResourceExhausted" in str(exc) or "429" in str(exc):
@@ -120,25 +337,116 @@ async def root():
         "endpoints": {
             "generate": "/api/generate",
             "history": "/api/history",
+            "export": "/api/export",
+            "search": "/api/search",
             "quiz": "/api/quiz/{id}",
+            "questions": "/api/quiz/{id}/questions",
             "preview": "/api/preview",
+            "refresh": "/api/quiz/{id}/refresh",
+            "stats": "/api/stats",
             "docs": "/docs"
         }
     }
 
 
+def _quiz_payload(quiz: Quiz, just_written: bool = False) -> Payload:
+    """
+    Serialize a quiz the way response_model would, and keep it in the hot
+    cache along with precompressed copies - compressed harder when the quiz
+    was just written than when a read refills the cache
+    """
+    body = QuizResponse.model_validate(quiz).model_dump_json().encode("utf-8")
+    if not quiz_cache.enabled:
+        # Not kept anywhere, so compressing it up front would be wasted work
+        return Payload(body, {})
+    payload = precompress(body, thorough=just_written)
+    quiz_cache.put(quiz.id, quiz.url, payload)
+    return payload
+
+
+def _json_payload_response(payload: Payload, accept_encoding: Optional[str] = None,
+                           sub_response: Optional[Response] = None) -> Response:
+    """
+    Send already-serialized JSON as-is, precompressed if the client takes
+    one of the stored encodings. Returning a Response skips FastAPI's own
+    validation and encoding, so cookies set on the injected response have
+    to be copied over by hand.
+    """
+    body, encoding = payload.pick(accept_encoding)
+    result = Response(content=body, media_type="application/json")
+    if encoding is not None:
+        result.headers["content-encoding"] = encoding
+    if payload.variants:
+        result.headers.add_vary_header("Accept-Encoding")
+    if sub_response is not None:
+        for key, value in sub_response.headers.raw:
+            if key == b"set-cookie":
+                result.headers.raw.append((key, value))
+    return result
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Prometheus scrape endpoint"""
+    return Response(content=render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/api/stats")
+def stats(days: int = Query(14, ge=1, le=365), db: Session = Depends(get_read_db)):
+    """LLM token usage: totals, per day, per stage, and estimated savings"""
+    cache_hits = quiz_cache.hits + quiz_cache.shared_hits + ARTICLE_LOOKUPS.value(result="hit")
+    try:
+        return usage_stats(db, days=days, cache_hits=int(cache_hits))
+    except SQLAlchemyError as e:
+        logger.error(f"Database error computing usage stats: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to compute usage stats"
+        )
+
+
+@app.get("/api/quiz/{quiz_id}/usage")
+def get_quiz_usage(quiz_id: int, db: Session = Depends(get_read_db)):
+    """Token usage of every LLM call made for one quiz"""
+    try:
+        return quiz_usage(db, quiz_id)
+    except SQLAlchemyError as e:
+        logger.error(f"Database error fetching usage for quiz {quiz_id}: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to fetch quiz usage"
+        )
+
+
+@app.get("/api/health/cache")
+def cache_health():
+    """Hot quiz cache size and hit ratio"""
+    return quiz_cache.stats()
+
+
+@app.get("/api/health/db")
+def db_health():
+    """Connection pool occupancy and checkout wait times - for tuning DB_POOL_*"""
+    return pool_status()
+
+
 @app.post(
     "/api/generate",
     response_model=QuizResponse,
     status_code=status.HTTP_200_OK,
+    dependencies=[Depends(generation_slot)],
     responses={
         400: {"model": ErrorResponse, "description": "Invalid URL or scraping error"},
+        429: {"model": ErrorResponse, "description": "Rate limit or daily AI budget reached"},
         500: {"model": ErrorResponse, "description": "Server error"}
     }
 )
 def generate_quiz(
     request: QuizGenerateRequest,
-    db: Session = Depends(get_db)
+    response: Response,
+    read_db: Session = Depends(get_read_db),
+    db: Session = Depends(get_db),
+    accept_encoding: Optional[str] = Header(None, include_in_schema=False)
 ):
     """
     Main endpoint - takes a Wikipedia URL and generates a quiz from it.
@@ -150,14 +458,41 @@ def generate_quiz(
     4. Generates quiz questions with the LLM
     5. Saves everything to the database
     """
-    url_str = str(request.url)
+    # One canonical URL per (language, title), however the link was written
+    try:
+        article = canonicalize_url(str(request.url))
+    except ValueError as e:
+        logger.warning(f"Invalid Wikipedia URL: {request.url} - {e}")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid Wikipedia URL: {str(e)}"
+        )
+    url_str = article.url
+    
+    cached = quiz_cache.get_by_url(url_str)
+    if cached is not None:
+        logger.info(f"Found existing quiz for {url_str} in the hot cache")
+        read_tracker.touch(url=url_str)
+        return _json_payload_response(cached, accept_encoding)
     
     try:
-        # Check if we already have this one - no point doing the work twice
-        existing_quiz = db.query(Quiz).filter(Quiz.url == url_str).first()
+        # Check if we already have this one - no point doing the work twice.
+        # A miss on the replica is re-checked on the primary, since the quiz
+        # may have been created a moment ago and not replicated yet.
+        existing_quiz = read_db.query(Quiz).filter(Quiz.url == url_str).first()
+        if not existing_quiz and read_db.get_bind() is not db.get_bind():
+            existing_quiz = db.query(Quiz).filter(Quiz.url == url_str).first()
+        ARTICLE_LOOKUPS.inc(result="hit" if existing_quiz else "miss")
         if existing_quiz:
             logger.info(f"Found existing quiz for {url_str}, returning cached version")
-            return existing_quiz
+            read_tracker.touch(quiz_id=existing_quiz.id)
+            return _json_payload_response(_quiz_payload(existing_quiz), accept_encoding)
+        
+        # Archived for going unread - bringing it back beats generating it again
+        restored = restore_quiz(db, url=url_str)
+        if restored:
+            mark_recent_write(response)
+            return _json_payload_response(_quiz_payload(restored, just_written=True), accept_encoding, response)
     except SQLAlchemyError as e:
         logger.error(f"Database error while checking for existing quiz: {e}")
         raise HTTPException(
@@ -165,14 +500,22 @@ def generate_quiz(
             detail="Database error occurred while checking cache"
         )
     
+    # Everything from here costs a scrape and LLM calls
+    try:
+        rate_limiter.hit("cold")
+    except RateLimited as e:
+        raise _rate_limited(e)
+    
+    try:
+        check_budget(db)
+    except TokenBudgetExceeded as e:
+        raise _budget_exceeded(e)
+    
     try:
         # Step 1: Grab the Wikipedia content
-        print(f"DEBUG: Processing URL: {url_str}", flush=True)
         logger.info(f"Starting to scrape: {url_str}")
         try:
-            print("DEBUG: Calling scrape_wikipedia...", flush=True)
             scraped_data = scrape_wikipedia(url_str)
-            print("DEBUG: Scrape successful!", flush=True)
         except ValueError as e:
             # Invalid URL format
             logger.warning(f"Invalid Wikipedia URL: {url_str} - {e}")
@@ -208,13 +551,22 @@ def generate_quiz(
             logger.warning(f"Entity extraction failed, continuing anyway: {e}")
             entities = {"people": [], "organizations": [], "locations": []}
         
+        # Questions we already have about this subject - the LLM may reuse them
+        try:
+            known_questions = banked_questions_for(read_db, scraped_data['title'], article.language)
+        except SQLAlchemyError as e:
+            logger.warning(f"Question bank lookup failed, continuing without it: {e}")
+            known_questions = []
+        
         # Step 3: Generate the actual quiz questions
         logger.info("Generating quiz questions with Gemini...")
         try:
             quiz_data = generate_quiz_from_content(
                 title=scraped_data['title'],
                 content=scraped_data['full_content'],
-                sections=scraped_data['sections']
+                sections=scraped_data['sections'],
+                language=article.language,
+                known_questions=known_questions
             )
         except ValueError as e:
             # LLM parsing error
@@ -249,23 +601,42 @@ def generate_quiz(
         # Step 4: Save it all to the database
         logger.info("Saving to database...")
         try:
+            # Near-duplicates of banked questions link to them instead of
+            # being stored again
+            questions = link_questions(db, quiz_data['quiz'], article.language,
+                                       scraped_data['title'], entities)
             new_quiz = Quiz(
                 url=url_str,
+                language=article.language,
                 title=scraped_data['title'],
                 summary=scraped_data['summary'],
                 key_entities=entities,
                 sections=scraped_data['sections'],
-                quiz=quiz_data['quiz'],
-                related_topics=quiz_data.get('related_topics', []),
-                raw_html=scraped_data['raw_html']
+                quiz=questions,
+                related_topics=resolve_topics(quiz_data.get('related_topics', []), article.language,
+                                              scraped_data['title']),
+                raw_html=scraped_data['raw_html'],
+                revision_id=scraped_data.get('revision_id'),
+                section_hashes=hash_sections(scraped_data.get('section_content', {}))
             )
             
-            db.add(new_quiz)
-            db.commit()
-            db.refresh(new_quiz)
+            with stage("db_write"):
+                db.add(new_quiz)
+                db.flush()
+                save_usage(db, new_quiz.id)
+                # Same transaction, so a quiz is never saved without its
+                # search entry (or reported as failed after being saved)
+                index_quiz(db, new_quiz, commit=False)
+                db.commit()
+                clear_usage()
+                db.refresh(new_quiz)
+            mark_recent_write(response)
             
             logger.info(f"Successfully generated quiz for: {scraped_data['title']}")
-            return new_quiz
+            result = _json_payload_response(_quiz_payload(new_quiz, just_written=True), accept_encoding, response)
+            # Questions still invalid after repair - the quiz is that much shorter
+            result.headers[QUESTIONS_DROPPED_HEADER] = str(quiz_data.get('dropped_questions', 0))
+            return result
             
         except SQLAlchemyError as e:
             db.rollback()
@@ -280,8 +651,7 @@ def generate_quiz(
         raise
     except Exception as e:
         # Catch-all for unexpected errors
-        logger.error(f"Unexpected error generating quiz: {e}")
-        logger.error(traceback.format_exc())
+        logger.exception(f"Unexpected error generating quiz: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="An unexpected error occurred. Please try again later."
@@ -293,15 +663,13 @@ def generate_quiz(
     response_model=List[QuizHistoryItem],
     status_code=status.HTTP_200_OK
 )
-def get_history(db: Session = Depends(get_db)):
+def get_history(db: Session = Depends(get_read_db)):
     """
     Get all the quizzes we've generated so far.
     Returns them newest first.
     """
     try:
-        print("DEBUG: Fetching history...", flush=True)
         quizzes = db.query(Quiz).order_by(Quiz.created_at.desc()).all()
-        print(f"DEBUG: Found {len(quizzes)} quizzes", flush=True)
         logger.info(f"Retrieved {len(quizzes)} quizzes from history")
         return quizzes
     except SQLAlchemyError as e:
@@ -311,14 +679,86 @@ def get_history(db: Session = Depends(get_db)):
             detail="Failed to fetch quiz history from database"
         )
     except Exception as e:
-        logger.error(f"Unexpected error fetching history: {e}")
-        logger.error(traceback.format_exc())
+        logger.exception(f"Unexpected error fetching history: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="An unexpected error occurred while fetching history"
         )
 
 
+@app.get(
+    "/api/export",
+    status_code=status.HTTP_200_OK,
+    response_class=StreamingResponse,
+    responses={
+        200: {"content": {media_type: {} for media_type in MEDIA_TYPES.values()},
+              "description": "Quizzes as NDJSON (one per line) or a Parquet file"},
+        400: {"model": ErrorResponse, "description": "Format not available"}
+    }
+)
+def export_quizzes(
+    format: str = Query("ndjson", pattern="^(ndjson|parquet)$"),
+    since: Optional[datetime] = Query(None, description="Created at or after"),
+    until: Optional[datetime] = Query(None, description="Created before"),
+    min_id: Optional[int] = Query(None, ge=1),
+    max_id: Optional[int] = Query(None, ge=1),
+    include_raw_html: bool = False
+):
+    """
+    Stream all quizzes - or a created_at / id range - in one response,
+    instead of /api/history followed by a request per quiz. Reads a batch
+    at a time from the replica, so memory stays flat however many there are.
+    """
+    if format == "parquet" and not parquet_available():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Parquet export is not available on this server (pyarrow is not installed)"
+        )
+    filters = ExportFilter(since, until, min_id, max_id)
+    logger.info(f"Exporting quizzes as {format} (raw_html={'yes' if include_raw_html else 'no'})")
+    # The generator opens its own connection - a request session would be
+    # closed before the body is streamed
+    return StreamingResponse(
+        export_chunks(read_engine, format, filters, include_raw_html),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="quizzes.{format}"'}
+    )
+
+
+@app.get(
+    "/api/search",
+    response_model=SearchResponse,
+    status_code=status.HTTP_200_OK
+)
+def search(
+    q: str = Query("", max_length=200, description="Free-text query"),
+    difficulty: Optional[str] = Query(None, pattern="^(easy|medium|hard)$"),
+    section: Optional[str] = None,
+    entity: Optional[str] = None,
+    page: int = Query(1, ge=1),
+    page_size: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Search quizzes by title, summary, question text and key entities.
+    Results are ranked by relevance (newest first without a query) and can
+    be narrowed by difficulty, section or entity facets.
+    """
+    filters = {
+        facet: value
+        for facet, value in (("difficulty", difficulty), ("section", section), ("entity", entity))
+        if value
+    }
+    try:
+        return search_quizzes(db, query=q, filters=filters, page=page, page_size=page_size)
+    except SQLAlchemyError as e:
+        logger.error(f"Database error searching quizzes: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to search quizzes"
+        )
+
+
 @app.get(
     "/api/quiz/{quiz_id}",
     response_model=QuizResponse,
@@ -327,7 +767,12 @@ def get_history(db: Session = Depends(get_db)):
         404: {"model": ErrorResponse, "description": "Quiz not found"}
     }
 )
-def get_quiz(quiz_id: int, db: Session = Depends(get_db)):
+def get_quiz(
+    quiz_id: int,
+    response: Response,
+    db: Session = Depends(get_read_db),
+    accept_encoding: Optional[str] = Header(None, include_in_schema=False)
+):
     """
     Get a specific quiz by its ID.
     Used when someone clicks "Details" in the history tab.
@@ -339,9 +784,26 @@ def get_quiz(quiz_id: int, db: Session = Depends(get_db)):
             detail="Invalid quiz ID. Must be a positive integer."
         )
     
+    cached = quiz_cache.get(quiz_id)
+    if cached is not None:
+        read_tracker.touch(quiz_id=quiz_id)
+        return _json_payload_response(cached, accept_encoding)
+    
     try:
         quiz = db.query(Quiz).filter(Quiz.id == quiz_id).first()
         
+        # Might just not have reached the replica yet
+        primary = primary_fallback(db) if not quiz else None
+        if primary is not None:
+            quiz = primary.query(Quiz).filter(Quiz.id == quiz_id).first()
+        
+        if not quiz:
+            # Or archived for going unread
+            quiz = restore_quiz(primary or db, quiz_id=quiz_id)
+            if quiz:
+                mark_recent_write(response)
+                return _json_payload_response(_quiz_payload(quiz, just_written=True), accept_encoding, response)
+        
         if not quiz:
             logger.warning(f"Quiz with ID {quiz_id} not found")
             raise HTTPException(
@@ -350,7 +812,8 @@ def get_quiz(quiz_id: int, db: Session = Depends(get_db)):
             )
         
         logger.info(f"Retrieved quiz {quiz_id}: {quiz.title}")
-        return quiz
+        read_tracker.touch(quiz_id=quiz_id)
+        return _json_payload_response(_quiz_payload(quiz), accept_encoding)
         
     except HTTPException:
         raise
@@ -361,14 +824,322 @@ def get_quiz(quiz_id: int, db: Session = Depends(get_db)):
             detail="Failed to fetch quiz from database"
         )
     except Exception as e:
-        logger.error(f"Unexpected error fetching quiz {quiz_id}: {e}")
-        logger.error(traceback.format_exc())
+        logger.exception(f"Unexpected error fetching quiz {quiz_id}: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="An unexpected error occurred while fetching quiz"
         )
 
 
+@app.get(
+    "/api/quiz/{quiz_id}/questions",
+    response_model=List[QuizQuestion],
+    status_code=status.HTTP_200_OK,
+    responses={
+        404: {"model": ErrorResponse, "description": "Quiz not found"}
+    }
+)
+def get_quiz_questions(
+    quiz_id: int,
+    difficulty: Optional[str] = Query(None, pattern="^(easy|medium|hard)$"),
+    section: Optional[str] = None,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=100),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Get some of a quiz's questions, optionally filtered by difficulty or
+    section. Filtering happens in SQL, so the rest of the quiz is never loaded.
+    """
+    if quiz_id <= 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid quiz ID. Must be a positive integer."
+        )
+    
+    try:
+        if not db.query(Quiz.id).filter(Quiz.id == quiz_id).first():
+            # Might just not have reached the replica yet
+            db = primary_fallback(db) or db
+        if not db.query(Quiz.id).filter(Quiz.id == quiz_id).first():
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Quiz with ID {quiz_id} not found"
+            )
+        
+        query = db.query(Question).filter(Question.quiz_id == quiz_id)
+        if difficulty:
+            query = query.filter(Question.difficulty == difficulty)
+        if section:
+            query = query.filter(Question.section == section)
+        questions = query.order_by(Question.position).offset(offset).limit(limit).all()
+        return [q.to_dict() for q in questions]
+        
+    except HTTPException:
+        raise
+    except SQLAlchemyError as e:
+        logger.error(f"Database error fetching questions for quiz {quiz_id}: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to fetch questions from database"
+        )
+
+
+@app.post(
+    "/api/quiz/{quiz_id}/attempts",
+    response_model=AttemptResult,
+    status_code=status.HTTP_202_ACCEPTED,
+    responses={
+        404: {"model": ErrorResponse, "description": "Quiz not found"},
+        503: {"model": ErrorResponse, "description": "Too many attempts waiting to be saved"}
+    }
+)
+def submit_attempt(quiz_id: int, attempt: AttemptSubmit, db: Session = Depends(get_read_db)):
+    """
+    Score a quiz attempt. The score comes back right away; the attempt is
+    saved in the background with the next batch, so it shows up in
+    /api/quiz/{id}/stats a moment later.
+    """
+    if quiz_id <= 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid quiz ID. Must be a positive integer."
+        )
+    
+    try:
+        key = load_answer_key(db, quiz_id)
+        if key is None:
+            # Might just not have reached the replica yet
+            primary = primary_fallback(db)
+            if primary is not None:
+                key = load_answer_key(primary, quiz_id)
+        if key is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Quiz with ID {quiz_id} not found"
+            )
+        
+        scored = score_attempt(key, attempt.answers, attempt.duration_ms)
+        attempt_writer.submit(scored)
+        read_tracker.touch(quiz_id=quiz_id)
+        record_attempt(scored)
+        return {
+            "quiz_id": quiz_id,
+            "score": scored.score,
+            "total": key.total,
+            "results": [
+                {"position": position, "correct": correct, "answer": answer}
+                for position, (correct, answer) in enumerate(zip(scored.correct, key.answers))
+            ],
+        }
+        
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except AttemptQueueFull as e:
+        logger.warning(f"Rejected attempt for quiz {quiz_id}: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many quiz attempts are being saved right now. Please submit again in a moment.",
+            headers={"Retry-After": "1"}
+        )
+    except SQLAlchemyError as e:
+        logger.error(f"Database error scoring attempt for quiz {quiz_id}: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to score quiz attempt"
+        )
+
+
+@app.get(
+    "/api/quiz/{quiz_id}/next",
+    response_model=NextQuestionResponse,
+    status_code=status.HTTP_200_OK,
+    responses={
+        404: {"model": ErrorResponse, "description": "Quiz not found"}
+    }
+)
+def next_question(
+    quiz_id: int,
+    seen: str = Query("", pattern=r"^[0-9,]*$", description="Positions already served, comma-separated"),
+    level: str = Query("medium", pattern="^(easy|medium|hard)$", description="Level of the last question"),
+    correct: Optional[bool] = Query(None, description="Whether the last question was answered correctly"),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Serve a quiz adaptively, one question at a time. Send back the positions
+    served so far, the level of the last question and whether it was
+    answered correctly; the next question is one level harder after a
+    correct answer and one easier after a wrong one. Levels come from
+    measured correct rates (see adaptive.py).
+    """
+    if quiz_id <= 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid quiz ID. Must be a positive integer."
+        )
+    positions = [int(p) for p in seen.split(",") if p]
+    if any(p >= 100 for p in positions):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid question position in 'seen'"
+        )
+    
+    try:
+        index = load_index(db, quiz_id)
+        if index is None:
+            # Might just not have reached the replica yet
+            primary = primary_fallback(db)
+            if primary is not None:
+                index = load_index(primary, quiz_id)
+        if index is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Quiz with ID {quiz_id} not found"
+            )
+    except HTTPException:
+        raise
+    except SQLAlchemyError as e:
+        logger.error(f"Database error loading question index for quiz {quiz_id}: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to load quiz questions"
+        )
+    
+    mask = seen_mask(positions)
+    target = next_level(LEVELS.index(level), correct)
+    picked = index.select(mask, target)
+    if picked is None:
+        return {"quiz_id": quiz_id, "level": LEVELS[target], "remaining": 0}
+    
+    position, found = picked
+    attempts, rate = index.measured(position)
+    return {
+        "quiz_id": quiz_id,
+        "position": position,
+        "level": LEVELS[found],
+        "remaining": bin(index.all_mask & ~mask).count("1") - 1,
+        "question": index.questions[position],
+        "attempts": attempts,
+        "correct_rate": rate,
+    }
+
+
+@app.get(
+    "/api/quiz/{quiz_id}/stats",
+    response_model=QuizAttemptStatsResponse,
+    status_code=status.HTTP_200_OK,
+    responses={
+        404: {"model": ErrorResponse, "description": "Quiz not found"}
+    }
+)
+def get_quiz_attempt_stats(quiz_id: int, db: Session = Depends(get_read_db)):
+    """
+    How people did on a quiz: attempts, mean score, and the share of
+    correct answers per question and per difficulty. Read from running
+    counts, so it costs the same however many attempts there are.
+    """
+    if quiz_id <= 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid quiz ID. Must be a positive integer."
+        )
+    
+    try:
+        if not db.query(Quiz.id).filter(Quiz.id == quiz_id).first():
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Quiz with ID {quiz_id} not found"
+            )
+        return attempt_stats(db, quiz_id)
+        
+    except HTTPException:
+        raise
+    except SQLAlchemyError as e:
+        logger.error(f"Database error fetching attempt stats for quiz {quiz_id}: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to fetch quiz stats"
+        )
+
+
+@app.post(
+    "/api/quiz/{quiz_id}/refresh",
+    response_model=QuizResponse,
+    status_code=status.HTTP_200_OK,
+    responses={
+        404: {"model": ErrorResponse, "description": "Quiz not found"},
+        429: {"model": ErrorResponse, "description": "Rate limit or daily AI budget reached"}
+    }
+)
+def refresh_quiz_endpoint(quiz_id: int, response: Response, db: Session = Depends(get_db)):
+    """
+    Bring a quiz up to date with the current Wikipedia article.
+    Only questions from sections that changed are regenerated, so this is
+    much cheaper than deleting the quiz and generating it again.
+    """
+    if quiz_id <= 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid quiz ID. Must be a positive integer."
+        )
+    
+    try:
+        quiz = db.query(Quiz).filter(Quiz.id == quiz_id).first()
+        if not quiz:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Quiz with ID {quiz_id} not found"
+            )
+        
+        check_budget(db)
+        if refresh_quiz(db, quiz):
+            mark_recent_write(response)
+            logger.info(f"Refreshed quiz {quiz_id}: {quiz.title}")
+        else:
+            logger.info(f"Quiz {quiz_id} is already up to date")
+        return quiz
+        
+    except HTTPException:
+        raise
+    except TokenBudgetExceeded as e:
+        raise _budget_exceeded(e)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Could not refresh quiz: {str(e)}"
+        )
+    except ResourceExhausted as e:
+        logger.warning(f"Gemini Request Limit Exceeded: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="AI Service Busy (Quota Exceeded). Please wait a minute and try again."
+        )
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Network error while refreshing quiz {quiz_id}: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail=f"Failed to fetch Wikipedia article: {str(e)}"
+        )
+    except SQLAlchemyError as e:
+        db.rollback()
+        logger.error(f"Database error refreshing quiz {quiz_id}: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to save refreshed quiz"
+        )
+    except Exception as e:
+        logger.exception(f"Unexpected error refreshing quiz {quiz_id}: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="An unexpected error occurred while refreshing quiz"
+        )
+
+
 @app.get("/api/preview")
 def preview_url(url: str):
     """
@@ -407,8 +1178,7 @@ def preview_url(url: str):
             detail=f"Failed to fetch Wikipedia article: {str(e)}"
         )
     except Exception as e:
-        logger.error(f"Unexpected error previewing URL {url}: {e}")
-        logger.error(traceback.format_exc())
+        logger.exception(f"Unexpected error previewing URL {url}: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="An unexpected error occurred while previewing URL"
@@ -416,7 +1186,7 @@ def preview_url(url: str):
 
 
 @app.delete("/api/quiz/{quiz_id}")
-def delete_quiz(quiz_id: int, db: Session = Depends(get_db)):
+def delete_quiz(quiz_id: int, response: Response, db: Session = Depends(get_db)):
     """
     Delete a quiz - in case someone wants to clean up their history.
     """
@@ -438,8 +1208,13 @@ def delete_quiz(quiz_id: int, db: Session = Depends(get_db)):
             )
         
         quiz_title = quiz.title
+        quiz_cache.invalidate(quiz_id, quiz.url)
+        remove_from_index(db, quiz_id, commit=False)
+        remove_quiz_attempts(db, quiz_id)
+        question_indexes.forget(quiz_id)
         db.delete(quiz)
         db.commit()
+        mark_recent_write(response)
         
         logger.info(f"Deleted quiz {quiz_id}: {quiz_title}")
         return {"message": f"Quiz '{quiz_title}' deleted successfully"}
@@ -454,8 +1229,7 @@ def delete_quiz(quiz_id: int, db: Session = Depends(get_db)):
             detail="Failed to delete quiz from database"
         )
     except Exception as e:
-        logger.error(f"Unexpected error deleting quiz {quiz_id}: {e}")
-        logger.error(traceback.format_exc())
+        logger.exception(f"Unexpected error deleting quiz {quiz_id}: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="An unexpected error occurred while deleting quiz"
@@ -463,5 +1237,6 @@ def delete_quiz(quiz_id: int, db: Session = Depends(get_db)):
 
 
 if __name__ == "__main__":
+    # Single process for local runs; serve.py is the production entry point
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    uvicorn.run(app, host=settings.SERVER_HOST, port=settings.SERVER_PORT)
@@ -0,0 +1,522 @@
+#!/usr/bin/env python3
+"""
+Retention and compaction for the quizzes table.
+
+Quizzes were kept forever with their raw_html inline, so the table only
+grew and every scan of it - /api/history reads all of it - got slower.
+This job, run from cron, does three things:
+
+1. Archives quizzes nobody has read for ARCHIVE_UNREAD_DAYS. Each one is
+   written to archived_quizzes as compressed JSON (zstd if installed,
+   otherwise gzip): the export shape plus raw_html, section hashes and
+   attempt counts. Then it is removed from quizzes, questions, the search
+   index and the attempt tables. It keeps its id and URL, and the next
+   /api/quiz/{id} or /api/generate for it restores it (restore_quiz) at
+   the cost of one small insert instead of a new generation. Individual
+   attempts are not kept, only the counts. /api/history and /api/export
+   list hot quizzes only.
+2. Drops raw_html from quizzes unchanged for RAW_HTML_RETENTION_DAYS. It
+   is most of the table's bytes, and only the export still reads it.
+3. Compacts: VACUUM (ANALYZE) on PostgreSQL. On SQLite, incremental_vacuum
+   hands free pages back to the OS and ANALYZE refreshes the planner stats.
+   SQLite databases created before SQLITE_AUTO_VACUUM existed need one
+   --full-vacuum to switch to incremental mode. It rewrites the whole file
+   and blocks writers while it runs.
+
+It prints the database size and the latency of a few hot queries before
+and after, plus the space reclaimed.
+
+Reads are recorded in quizzes.last_read_at by ReadTracker, in the
+background and at most once per QUIZ_READ_TOUCH_SECONDS per quiz and
+worker; quizzes never read since are judged by when they last changed.
+
+    python maintenance.py                    # all three, with the configured windows
+    python maintenance.py --dry-run          # only count what would go
+    python maintenance.py --archive-days 90 --raw-html-days 7
+    python maintenance.py --full-vacuum      # once, on an old SQLite database
+    python maintenance.py --restore 123
+
+From cron, nightly:
+    30 3 * * * cd /srv/wikiquiz/backend && python maintenance.py >> maintenance.log 2>&1
+"""
+import argparse
+import atexit
+import gzip
+import json
+import logging
+import os
+import statistics
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Set
+
+from sqlalchemy import delete, func, select, text, update
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.orm import Session
+
+# Add backend directory to path
+sys.path.insert(0, os.path.dirname(__file__))
+
+from adaptive import question_indexes
+from attempts import remove_quiz_attempts
+from cache import quiz_cache
+from compression import STORED_LEVELS, compress, zstandard
+from config import settings
+from export import ExportFilter, _json_default, export_batches
+from metrics import ARCHIVE_RESTORES, stage
+from models import ArchivedQuiz, Question, QuestionStats, Quiz, QuizAttemptStats
+from question_bank import link_questions
+from search import index_quiz, remove_from_index
+
+logger = logging.getLogger(__name__)
+
+# How often the read tracker writes what it has seen
+READ_FLUSH_SECONDS = 60.0
+# Ids per UPDATE ... IN (...) - well under SQLite's variable limit
+UPDATE_CHUNK = 500
+# Timed runs per query in the before/after report
+PROBE_RUNS = 5
+
+
+class ReadTracker:
+    """
+    Notes reads of quizzes by id or URL and writes them to last_read_at in
+    the background, one UPDATE per flush. A quiz is noted at most once per
+    touch_seconds per worker, so hot quizzes cost nothing after the first
+    read. The thread starts with the first read.
+    """
+
+    def __init__(self, touch_seconds: float, flush_seconds: float = READ_FLUSH_SECONDS, bind=None):
+        self.touch_seconds = touch_seconds
+        self.flush_seconds = flush_seconds
+        self._bind = bind
+        # Quiz id or URL -> when it was last noted (monotonic)
+        self._noted: Dict[object, float] = {}
+        self._ids: Set[int] = set()
+        self._urls: Set[str] = set()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def touch(self, quiz_id: Optional[int] = None, url: Optional[str] = None) -> None:
+        key = quiz_id if quiz_id is not None else url
+        if self.touch_seconds <= 0 or key is None:
+            return
+        now = time.monotonic()
+        with self._lock:
+            noted = self._noted.get(key)
+            if noted is not None and now - noted < self.touch_seconds:
+                return
+            self._noted[key] = now
+            if quiz_id is not None:
+                self._ids.add(quiz_id)
+            else:
+                self._urls.add(url)
+        self._ensure_started()
+
+    def flush(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            ids, self._ids = self._ids, set()
+            urls, self._urls = self._urls, set()
+            self._noted = {k: t for k, t in self._noted.items() if now - t < self.touch_seconds}
+        if not ids and not urls:
+            return
+        if self._bind is None:
+            from database import engine
+            self._bind = engine
+        read_at = datetime.now(timezone.utc)
+        try:
+            with self._bind.begin() as conn:
+                for column, keys in ((Quiz.id, sorted(ids)), (Quiz.url, sorted(urls))):
+                    for start in range(0, len(keys), UPDATE_CHUNK):
+                        # updated_at is for content changes - keep it as it was
+                        conn.execute(
+                            update(Quiz)
+                            .where(column.in_(keys[start:start + UPDATE_CHUNK]))
+                            .values(last_read_at=read_at, updated_at=Quiz.updated_at)
+                        )
+        except SQLAlchemyError as e:
+            # Worst case a quiz is archived early and restored on its next read
+            logger.error(f"Failed to record reads of {len(ids) + len(urls)} quizzes: {e}")
+
+    def shutdown(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            self._stop.set()
+            self._thread.join(timeout=10)
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                thread = threading.Thread(target=self._run, name="read-tracker", daemon=True)
+                thread.start()
+                atexit.register(self.shutdown)
+                self._thread = thread
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.flush_seconds):
+            self.flush()
+        self.flush()
+
+
+read_tracker = ReadTracker(settings.QUIZ_READ_TOUCH_SECONDS)
+
+
+class _QuizIds(ExportFilter):
+    """Export filter for an exact set of quizzes"""
+
+    def __init__(self, ids: List[int]):
+        super().__init__()
+        self.ids = ids
+
+    def apply(self, query):
+        return query.where(Quiz.id.in_(self.ids))
+
+
+def _archive_encoding() -> str:
+    return "zstd" if zstandard is not None else "gzip"
+
+
+def _decompress(data: bytes, encoding: str) -> bytes:
+    if encoding == "gzip":
+        return gzip.decompress(data)
+    if encoding == "zstd":
+        if zstandard is None:
+            raise RuntimeError("This quiz was archived with zstd - pip install zstandard to restore it")
+        return zstandard.ZstdDecompressor().decompress(data)
+    raise ValueError(f"Unknown archive encoding {encoding!r}")
+
+
+def _attempt_counts(db: Session, ids: List[int]) -> Dict[int, dict]:
+    """Attempt totals per quiz and counts per question position, to keep in the archive"""
+    counts: Dict[int, dict] = {}
+    for row in db.query(QuizAttemptStats).filter(QuizAttemptStats.quiz_id.in_(ids)):
+        counts[row.quiz_id] = {"attempts": row.attempts, "score_total": row.score_total,
+                               "question_total": row.question_total, "questions": {}}
+    rows = db.execute(
+        select(Question.quiz_id, Question.position, QuestionStats.attempts, QuestionStats.correct)
+        .join(QuestionStats, QuestionStats.question_id == Question.id)
+        .where(Question.quiz_id.in_(ids))
+    )
+    for row in rows:
+        quiz = counts.setdefault(row.quiz_id, {"attempts": 0, "score_total": 0,
+                                               "question_total": 0, "questions": {}})
+        quiz["questions"][str(row.position)] = [row.attempts, row.correct]
+    return counts
+
+
+def archive_quizzes(db: Session, ids: List[int]) -> Dict[str, int]:
+    """
+    Move quizzes into archived_quizzes (the caller commits). Returns the
+    JSON and compressed byte counts.
+    """
+    encoding = _archive_encoding()
+    conn = db.connection()
+    quizzes = [quiz for batch in export_batches(conn, _QuizIds(ids), include_raw_html=True,
+                                                batch_size=len(ids)) for quiz in batch]
+    hashes = dict(db.execute(select(Quiz.id, Quiz.section_hashes).where(Quiz.id.in_(ids))).all())
+    counts = _attempt_counts(db, ids)
+
+    stats = {"quizzes": 0, "json_bytes": 0, "stored_bytes": 0}
+    for quiz in quizzes:
+        quiz["section_hashes"] = hashes.get(quiz["id"])
+        quiz["attempt_counts"] = counts.get(quiz["id"])
+        body = json.dumps(quiz, ensure_ascii=False, default=_json_default).encode("utf-8")
+        payload = compress(body, encoding, STORED_LEVELS[encoding])
+        db.add(ArchivedQuiz(id=quiz["id"], url=quiz["url"], language=quiz["language"], title=quiz["title"],
+                            encoding=encoding, payload=payload, original_bytes=len(body)))
+        remove_from_index(db, quiz["id"], commit=False)
+        remove_quiz_attempts(db, quiz["id"])
+        stats["quizzes"] += 1
+        stats["json_bytes"] += len(body)
+        stats["stored_bytes"] += len(payload)
+
+    archived = [quiz["id"] for quiz in quizzes]
+    db.execute(delete(Question).where(Question.quiz_id.in_(archived)))
+    db.execute(delete(Quiz).where(Quiz.id.in_(archived)))
+    return stats
+
+
+def _last_seen():
+    return func.coalesce(Quiz.last_read_at, Quiz.updated_at, Quiz.created_at)
+
+
+def archive_unread(db: Session, days: int, batch_size: Optional[int] = None,
+                   dry_run: bool = False) -> Dict[str, int]:
+    """Archive every quiz not read (or changed) in the last `days` days, a batch per transaction"""
+    stats = {"quizzes": 0, "json_bytes": 0, "stored_bytes": 0}
+    if days <= 0:
+        return stats
+    batch_size = batch_size or settings.MAINTENANCE_BATCH_SIZE
+    cutoff = datetime.now(timezone.utc) - timedelta(days=days)
+    if dry_run:
+        stats["quizzes"] = db.query(func.count(Quiz.id)).filter(_last_seen() < cutoff).scalar()
+        return stats
+
+    while True:
+        rows = db.execute(
+            select(Quiz.id, Quiz.url).where(_last_seen() < cutoff).order_by(Quiz.id).limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        with stage("archive_write"):
+            batch = archive_quizzes(db, [row.id for row in rows])
+            db.commit()
+        for row in rows:
+            quiz_cache.invalidate(row.id, row.url)
+            question_indexes.forget(row.id)
+        for key, value in batch.items():
+            stats[key] += value
+        logger.info(f"Archived {stats['quizzes']} quizzes so far")
+    return stats
+
+
+def strip_raw_html(db: Session, days: int, batch_size: Optional[int] = None,
+                   dry_run: bool = False) -> Dict[str, int]:
+    """Drop raw_html from quizzes unchanged for `days` days. Returns the count and bytes dropped."""
+    stats = {"quizzes": 0, "bytes": 0}
+    if days <= 0:
+        return stats
+    batch_size = batch_size or settings.MAINTENANCE_BATCH_SIZE
+    cutoff = datetime.now(timezone.utc) - timedelta(days=days)
+    last_id = 0
+    while True:
+        rows = db.execute(
+            select(Quiz.id, func.length(Quiz.raw_html))
+            .where(Quiz.raw_html.isnot(None), func.coalesce(Quiz.updated_at, Quiz.created_at) < cutoff,
+                   Quiz.id > last_id)
+            .order_by(Quiz.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        stats["quizzes"] += len(rows)
+        stats["bytes"] += sum(length or 0 for _, length in rows)
+        if dry_run:
+            continue
+        # updated_at stays - dropping the copy doesn't change the quiz
+        db.execute(
+            update(Quiz)
+            .where(Quiz.id.in_([quiz_id for quiz_id, _ in rows]))
+            .values(raw_html=None, updated_at=Quiz.updated_at)
+        )
+        db.commit()
+    return stats
+
+
+def vacuum(engine, full: bool = False) -> str:
+    """Compact the database and refresh planner statistics. Returns what ran."""
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if conn.dialect.name == "postgresql":
+            statement = "VACUUM (FULL, ANALYZE)" if full else "VACUUM (ANALYZE)"
+            conn.exec_driver_sql(statement)
+            return statement
+        if conn.dialect.name != "sqlite":
+            return "nothing (unsupported database)"
+
+        if full:
+            # Also switches the file to SQLITE_AUTO_VACUUM, set on every connection
+            conn.exec_driver_sql("VACUUM")
+            ran = "VACUUM"
+        elif conn.exec_driver_sql("PRAGMA auto_vacuum").scalar() == 2:
+            # Frees one page per step, and the driver only steps once;
+            # executescript runs it to the end
+            conn.connection.driver_connection.executescript("PRAGMA incremental_vacuum;")
+            ran = "incremental_vacuum"
+        else:
+            logger.warning("auto_vacuum is off for this database, so free pages are reused but the file "
+                           "never shrinks - run once with --full-vacuum to switch it to incremental")
+            ran = "no vacuum"
+        conn.exec_driver_sql("ANALYZE")
+        # Fold the WAL back in, so the space shows up on disk
+        conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+        return f"{ran} + ANALYZE"
+
+
+def database_size(engine) -> Dict[str, int]:
+    """Bytes used by the database, and by the quizzes table where the database can tell"""
+    with engine.connect() as conn:
+        if conn.dialect.name == "postgresql":
+            return {
+                "database": conn.execute(text("SELECT pg_database_size(current_database())")).scalar(),
+                "quizzes": conn.execute(text("SELECT pg_total_relation_size('quizzes')")).scalar(),
+            }
+        if conn.dialect.name == "sqlite":
+            page_size = conn.exec_driver_sql("PRAGMA page_size").scalar()
+            return {
+                "database": conn.exec_driver_sql("PRAGMA page_count").scalar() * page_size,
+                "free": conn.exec_driver_sql("PRAGMA freelist_count").scalar() * page_size,
+            }
+    return {}
+
+
+def measure_queries(engine, runs: int = PROBE_RUNS) -> Dict[str, float]:
+    """Median milliseconds of the queries that scan or probe the quizzes table"""
+    quizzes = Quiz.__table__
+    with engine.connect() as conn:
+        url = conn.execute(select(quizzes.c.url).order_by(quizzes.c.id.desc()).limit(1)).scalar() or ""
+        probes = {
+            "history (every row, newest first)": select(quizzes).order_by(quizzes.c.created_at.desc()),
+            "history columns only": select(quizzes.c.id, quizzes.c.url, quizzes.c.title, quizzes.c.created_at)
+                                    .order_by(quizzes.c.created_at.desc()),
+            "lookup by URL": select(quizzes.c.id).where(quizzes.c.url == url),
+            "count": select(func.count()).select_from(quizzes),
+        }
+        timings = {}
+        for name, query in probes.items():
+            samples = []
+            for _ in range(runs):
+                start = time.perf_counter()
+                conn.execute(query).all()
+                samples.append((time.perf_counter() - start) * 1000)
+            timings[name] = statistics.median(samples)
+    return timings
+
+
+def restore_quiz(db: Session, quiz_id: Optional[int] = None, url: Optional[str] = None) -> Optional[Quiz]:
+    """
+    Move an archived quiz back into the hot tables, by id or canonical URL.
+    Returns the quiz, or None if no such quiz is archived. db must be
+    bound to the primary.
+    """
+    query = db.query(ArchivedQuiz)
+    if quiz_id is not None:
+        archived = query.filter(ArchivedQuiz.id == quiz_id).first()
+    else:
+        archived = query.filter(ArchivedQuiz.url == url).first()
+    if archived is None:
+        return None
+
+    archived_id = archived.id
+    data = json.loads(_decompress(archived.payload, archived.encoding))
+    restore_id = archived_id
+    if db.query(Quiz.id).filter(Quiz.id == archived_id).first() is not None:
+        # Before migration 0012 SQLite could give an archived quiz's id to
+        # a new quiz - that one keeps it, and this comes back under a new id
+        logger.warning(f"Archived quiz {archived_id} ({data['url']}) restored under a new id, "
+                       f"its id was reused")
+        restore_id = None
+    with stage("archive_restore"):
+        quiz = Quiz(
+            id=restore_id,
+            url=data["url"],
+            language=data["language"],
+            title=data["title"],
+            summary=data["summary"],
+            key_entities=data.get("key_entities"),
+            sections=data.get("sections"),
+            related_topics=data.get("related_topics"),
+            raw_html=data.get("raw_html"),
+            revision_id=data.get("revision_id"),
+            section_hashes=data.get("section_hashes"),
+            created_at=datetime.fromisoformat(data["created_at"]) if data.get("created_at") else None,
+            updated_at=datetime.fromisoformat(data["updated_at"]) if data.get("updated_at") else None,
+            last_read_at=datetime.now(timezone.utc),
+        )
+        # The bank entries are usually still there and get linked again
+        quiz.quiz = link_questions(db, data.get("quiz") or [], quiz.language, quiz.title, quiz.key_entities)
+        try:
+            db.add(quiz)
+            db.delete(archived)
+            db.flush()
+            counts = data.get("attempt_counts")
+            if counts:
+                db.add(QuizAttemptStats(quiz_id=quiz.id, attempts=counts["attempts"],
+                                        score_total=counts["score_total"],
+                                        question_total=counts["question_total"]))
+                for question in quiz.questions:
+                    attempts, correct = counts["questions"].get(str(question.position), (0, 0))
+                    if attempts:
+                        db.add(QuestionStats(question_id=question.id, quiz_id=quiz.id,
+                                             attempts=attempts, correct=correct))
+            index_quiz(db, quiz, commit=False)
+            db.commit()
+        except IntegrityError:
+            # Another worker restored it first - or the article has a new
+            # quiz already. Either way the hot row for this URL is the one.
+            db.rollback()
+            return db.query(Quiz).filter(Quiz.url == data["url"]).first()
+    ARCHIVE_RESTORES.inc(by="id" if quiz_id is not None else "url")
+    logger.info(f"Restored archived quiz {quiz.id}: {quiz.title}")
+    return quiz
+
+
+def _mb(value: Optional[float]) -> str:
+    return f"{value / 1e6:,.1f} MB" if value is not None else "-"
+
+
+def run_maintenance(args) -> None:
+    from database import SessionLocal, engine
+
+    size_before = database_size(engine)
+    latency_before = measure_queries(engine)
+
+    db = SessionLocal()
+    try:
+        archived = archive_unread(db, args.archive_days, args.batch_size, args.dry_run)
+        stripped = strip_raw_html(db, args.raw_html_days, args.batch_size, args.dry_run)
+    finally:
+        db.close()
+
+    if args.archive_days > 0:
+        verb = "Would archive" if args.dry_run else "Archived"
+        print(f"{verb} {archived['quizzes']:,} quizzes unread for {args.archive_days} days"
+              + (f" ({_mb(archived['json_bytes'])} of JSON stored as {_mb(archived['stored_bytes'])})"
+                 if archived["json_bytes"] else ""))
+    if args.raw_html_days > 0:
+        verb = "Would drop" if args.dry_run else "Dropped"
+        print(f"{verb} raw_html from {stripped['quizzes']:,} quizzes unchanged for {args.raw_html_days} days "
+              f"({_mb(stripped['bytes'])})")
+    if args.dry_run:
+        if archived["quizzes"] and stripped["quizzes"]:
+            print("(quizzes that get archived are counted in both)")
+        return
+    if not args.skip_vacuum:
+        print(f"Ran {vacuum(engine, full=args.full_vacuum)}")
+
+    size_after = database_size(engine)
+    latency_after = measure_queries(engine)
+    print()
+    print(f"{'':<36} {'before':>12} {'after':>12}")
+    for name in size_before:
+        print(f"{name + ' size':<36} {_mb(size_before[name]):>12} {_mb(size_after.get(name)):>12}")
+    for name in latency_before:
+        print(f"{name:<36} {latency_before[name]:>9.2f} ms {latency_after[name]:>9.2f} ms")
+    if "database" in size_before:
+        print(f"\nReclaimed {_mb(size_before['database'] - size_after['database'])}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Archive unread quizzes, drop old raw_html and compact the database")
+    parser.add_argument("--archive-days", type=int, default=settings.ARCHIVE_UNREAD_DAYS,
+                        help="Archive quizzes unread for this many days (0 = don't archive)")
+    parser.add_argument("--raw-html-days", type=int, default=settings.RAW_HTML_RETENTION_DAYS,
+                        help="Drop raw_html from quizzes unchanged for this many days (0 = keep it)")
+    parser.add_argument("--batch-size", type=int, default=settings.MAINTENANCE_BATCH_SIZE)
+    parser.add_argument("--skip-vacuum", action="store_true")
+    parser.add_argument("--full-vacuum", action="store_true",
+                        help="Rewrite the whole database (VACUUM FULL on PostgreSQL); blocks writes while it runs")
+    parser.add_argument("--dry-run", action="store_true", help="Only count what would be archived or dropped")
+    parser.add_argument("--restore", type=int, metavar="QUIZ_ID", help="Restore one archived quiz and exit")
+    args = parser.parse_args()
+
+    if args.restore is not None:
+        from database import SessionLocal
+
+        db = SessionLocal()
+        try:
+            quiz = restore_quiz(db, quiz_id=args.restore)
+        finally:
+            db.close()
+        if quiz is None:
+            parser.exit(1, f"Quiz {args.restore} is not archived\n")
+        print(f"Restored quiz {args.restore}")
+    else:
+        run_maintenance(args)
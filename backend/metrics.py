@@ -0,0 +1,340 @@
+"""
+Prometheus-style metrics for the quiz pipeline.
+
+Everything that times a stage of /api/generate goes through stage(), so the
+scraper, the LLM layer and the DB code all report into the same histogram
+(and the same trace, see tracing.py):
+
+    with stage("scrape_fetch"):
+        response = requests.get(...)
+
+GET /metrics renders every metric in the Prometheus text format. Metrics
+are per process - with several uvicorn workers, scrape each one (or accept
+that a scrape through a shared port sees one worker at a time).
+"""
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from tracing import span
+
+# Seconds - from a fast DB write up to a slow LLM call hitting its timeout
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str]) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        """(suffix, formatted labels, value) for every series"""
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, labels, value in self.samples():
+            lines.append(f"{self.name}{suffix}{labels} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """Monotonic count, optionally split by labels"""
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [("_total", _format_labels(self.labelnames, key), value) for key, value in items]
+
+
+class Gauge(_Metric):
+    """Value that goes up and down"""
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str):
+        super().__init__(name, documentation)
+        self._value = 0.0
+        self._function: Optional[Callable[[], float]] = None
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        self.inc(-amount)
+
+    def set(self, value: float) -> None:
+        with self._lock:
+            self._value = value
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        """Compute the value at scrape time instead"""
+        self._function = function
+
+    def value(self) -> float:
+        if self._function is not None:
+            return self._function()
+        with self._lock:
+            return self._value
+
+    def samples(self):
+        return [("", "", self.value())]
+
+
+class Histogram(_Metric):
+    """Observations counted into cumulative buckets, plus their sum and count"""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # label values -> (per-bucket counts, sum)
+        self._series: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._series.setdefault(key, ([0] * len(self.buckets), [0.0]))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            total[0] += value
+
+    def samples(self):
+        out = []
+        with self._lock:
+            series = sorted((key, list(counts), total[0]) for key, (counts, total) in self._series.items())
+        for key, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                out.append(("_bucket", _format_labels(self.labelnames + ("le",), key + (_format_value(bound),)), cumulative))
+            out.append(("_sum", _format_labels(self.labelnames, key), total))
+            out.append(("_count", _format_labels(self.labelnames, key), cumulative))
+        return out
+
+
+class CallbackCounter(_Metric):
+    """
+    Counter whose values live somewhere else (e.g. the quiz cache's own hit
+    counts) and are read at scrape time, so nothing is counted twice.
+    """
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str],
+                 function: Callable[[], Dict[LabelValues, float]]):
+        super().__init__(name, documentation, labelnames)
+        self._function = function
+
+    def samples(self):
+        return [
+            ("_total", _format_labels(self.labelnames, key), value)
+            for key, value in sorted(self._function().items())
+        ]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+
+registry = Registry()
+
+STAGE_SECONDS = registry.register(Histogram(
+    "wikiquiz_stage_duration_seconds",
+    "Time spent in each stage of quiz generation",
+    ["stage", "outcome"],
+))
+RESOURCE_EXHAUSTED = registry.register(Counter(
+    "wikiquiz_llm_resource_exhausted",
+    "LLM calls rejected with ResourceExhausted (quota or rate limit)",
+    ["stage"],
+))
+LLM_CALL_SECONDS = registry.register(Histogram(
+    "wikiquiz_llm_call_duration_seconds",
+    "Latency of individual model calls, including hedges and failed attempts",
+    ["model", "outcome"],
+))
+LLM_FAILOVERS = registry.register(Counter(
+    "wikiquiz_llm_failovers",
+    "Calls handed to the next model in the chain",
+    ["model", "reason"],
+))
+LLM_HEDGES = registry.register(Counter(
+    "wikiquiz_llm_hedges",
+    "Hedged requests fired, and how many the hedge won",
+    ["outcome"],
+))
+LLM_TOKENS = registry.register(Counter(
+    "wikiquiz_llm_tokens",
+    "Tokens billed by the LLM, by stage and input/output",
+    ["stage", "kind"],
+))
+JSON_REPAIR_FALLBACKS = registry.register(Counter(
+    "wikiquiz_llm_json_repair_fallbacks",
+    "LLM responses that only parsed after cleanup or json_repair",
+    ["method"],
+))
+INVALID_QUESTIONS = registry.register(Counter(
+    "wikiquiz_llm_invalid_questions",
+    "Generated questions that failed validation, by problem",
+    ["problem"],
+))
+QUESTION_REPAIRS = registry.register(Counter(
+    "wikiquiz_llm_question_repairs",
+    "Invalid questions sent back to the LLM, by whether the fix passed validation",
+    ["outcome"],
+))
+GENERATIONS = registry.register(Counter(
+    "wikiquiz_generations",
+    "Finished generate requests by outcome",
+    ["outcome"],
+))
+SCRAPE_STOPS = registry.register(Counter(
+    "wikiquiz_scrape_stops",
+    "Article fetches by where reading stopped: article end, navbox, byte cap or end of page",
+    ["reason"],
+))
+ARTICLE_LOOKUPS = registry.register(Counter(
+    "wikiquiz_stored_quiz_lookups",
+    "Generate requests answered from a stored quiz (hit) or needing a new one (miss)",
+    ["result"],
+))
+RESPONSE_BYTES = registry.register(Counter(
+    "wikiquiz_response_body_bytes",
+    "Response body bytes sent, by Content-Encoding (identity = uncompressed)",
+    ["encoding"],
+))
+COMPRESSION_SECONDS = registry.register(Histogram(
+    "wikiquiz_compression_cpu_seconds",
+    "CPU time spent compressing a body, per request (live) or once per stored quiz (stored)",
+    ["encoding", "mode"],
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1),
+))
+ATTEMPTS = registry.register(Counter(
+    "wikiquiz_quiz_attempts",
+    "Quiz attempts accepted, rejected (queue full), written or dropped by the batch writer",
+    ["outcome"],
+))
+ATTEMPT_QUEUE_DEPTH = registry.register(Gauge(
+    "wikiquiz_quiz_attempt_queue_depth",
+    "Scored attempts waiting to be written",
+))
+QUESTION_BANK_LINKS = registry.register(Counter(
+    "wikiquiz_question_bank_links",
+    "Saved questions that reused a bank entry (near-duplicate) or needed a new one",
+    ["result"],
+))
+RELATED_TOPICS = registry.register(Counter(
+    "wikiquiz_related_topics",
+    "LLM related topics by how they matched an article title (unchecked = no index for the language)",
+    ["result"],
+))
+ARCHIVE_RESTORES = registry.register(Counter(
+    "wikiquiz_archive_restores",
+    "Archived quizzes moved back on access, by what they were looked up by",
+    ["by"],
+))
+RATE_LIMITED = registry.register(Counter(
+    "wikiquiz_rate_limited_requests",
+    "Requests refused with a 429 by a per-client rate limit, by budget",
+    ["budget"],
+))
+RATE_LIMIT_CLIENTS = registry.register(Gauge(
+    "wikiquiz_rate_limit_clients",
+    "Client buckets held by this worker (at most RATE_LIMIT_MAX_CLIENTS)",
+))
+GENERATIONS_IN_FLIGHT = registry.register(Gauge(
+    "wikiquiz_generations_in_flight",
+    "Generate requests currently running in a worker thread",
+))
+GENERATIONS_PENDING = Gauge(
+    "wikiquiz_generations_pending",
+    "Generate requests accepted by the server and not finished yet",
+)
+GENERATIONS_QUEUED = registry.register(Gauge(
+    "wikiquiz_generations_queued",
+    "Generate requests waiting for a free worker thread",
+))
+GENERATIONS_QUEUED.set_function(
+    lambda: max(0.0, GENERATIONS_PENDING.value() - GENERATIONS_IN_FLIGHT.value())
+)
+
+
+@contextmanager
+def stage(name: str):
+    """Time a block, record it under the given stage name and trace it as a span"""
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        with span(name):
+            yield
+        outcome = "ok"
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=name, outcome=outcome)
+
+
+@contextmanager
+def track_generation():
+    """Count a generate request as in flight for the duration of the block"""
+    GENERATIONS_IN_FLIGHT.inc()
+    try:
+        yield
+    finally:
+        GENERATIONS_IN_FLIGHT.dec()
+
+
+def render() -> str:
+    return registry.render()
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Versioned schema migrations for WikiQuiz AI.
+
+Run once per deploy, before starting the API workers:
+    python migrate.py            # apply pending migrations
+    python migrate.py --status   # show current and latest version
+
+Workers never create or alter tables themselves - they only call
+verify_schema() at startup, which is a single cheap query.
+
+Each migration is a module in migrations/ named NNNN_description.py with:
+- upgrade(conn): does the work on a SQLAlchemy Connection
+- TRANSACTIONAL (optional, default True): set to False for steps that can't
+  run inside a transaction, like CREATE INDEX CONCURRENTLY on PostgreSQL
+
+Migrations must not use the ORM models - those describe the latest schema,
+not the one the migration is upgrading from.
+"""
+import argparse
+import importlib
+import logging
+import os
+import pkgutil
+import sys
+from typing import List, Optional, Tuple
+
+# Add backend directory to path
+sys.path.insert(0, os.path.dirname(__file__))
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_PACKAGE = "migrations"
+
+# Arbitrary key for the PostgreSQL advisory lock that serializes migrate runs
+ADVISORY_LOCK_KEY = 727_379_969
+
+
+class SchemaVersionError(RuntimeError):
+    """The database schema doesn't match what this code expects"""
+
+
+def discover_migrations() -> List[Tuple[int, str, object]]:
+    """All migration modules as (version, name, module), oldest first"""
+    package = importlib.import_module(MIGRATIONS_PACKAGE)
+    found = []
+    for info in pkgutil.iter_modules(package.__path__):
+        prefix = info.name.split("_", 1)[0]
+        if not prefix.isdigit():
+            continue
+        module = importlib.import_module(f"{MIGRATIONS_PACKAGE}.{info.name}")
+        found.append((int(prefix), info.name, module))
+    found.sort(key=lambda m: m[0])
+    return found
+
+
+def latest_version() -> int:
+    migrations = discover_migrations()
+    return migrations[-1][0] if migrations else 0
+
+
+def current_version(conn: Connection) -> Optional[int]:
+    """Applied schema version, or None if migrations were never run"""
+    if not inspect(conn).has_table("schema_migrations"):
+        return None
+    return conn.execute(text("SELECT MAX(version) FROM schema_migrations")).scalar() or 0
+
+
+def _record(conn: Connection, version: int, name: str) -> None:
+    conn.execute(
+        text("INSERT INTO schema_migrations (version, name) VALUES (:version, :name)"),
+        {"version": version, "name": name},
+    )
+
+
+def _create_version_table(conn: Connection) -> None:
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version INTEGER PRIMARY KEY, "
+        "name VARCHAR(255) NOT NULL, "
+        "applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"
+    ))
+
+
+def _bootstrap(conn: Connection, migrations) -> None:
+    """
+    First run against a database. A brand new database gets the latest
+    schema in one go; one created by the old create_all() at startup is
+    marked as version 1 so the remaining migrations upgrade it.
+    """
+    from database import Base
+    import models  # noqa: F401 - registers the tables on Base
+    from search import ensure_search_index
+
+    fresh = not inspect(conn).has_table("quizzes")
+    _create_version_table(conn)
+
+    if fresh:
+        logger.info("Empty database - creating the latest schema")
+        Base.metadata.create_all(bind=conn)
+        ensure_search_index(conn)
+        for version, name, _ in migrations:
+            _record(conn, version, name)
+    else:
+        logger.info("Existing pre-migration database - starting from the baseline schema")
+        version, name, _ = migrations[0]
+        _record(conn, version, name)
+
+
+def run_migrations(engine: Engine) -> List[str]:
+    """Apply every pending migration. Returns the names of those applied."""
+    migrations = discover_migrations()
+    applied = []
+
+    with engine.connect() as lock_conn:
+        # Only one migrate run at a time, even if two deploys overlap
+        if engine.dialect.name == "postgresql":
+            lock_conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": ADVISORY_LOCK_KEY})
+            lock_conn.commit()
+        try:
+            with engine.begin() as conn:
+                if current_version(conn) is None:
+                    _bootstrap(conn, migrations)
+
+            for version, name, module in migrations:
+                with engine.connect() as conn:
+                    if version <= current_version(conn):
+                        continue
+
+                logger.info(f"Applying migration {name}")
+                if getattr(module, "TRANSACTIONAL", True):
+                    with engine.begin() as conn:
+                        module.upgrade(conn)
+                        _record(conn, version, name)
+                else:
+                    with engine.connect() as conn:
+                        conn = conn.execution_options(isolation_level="AUTOCOMMIT")
+                        module.upgrade(conn)
+                        _record(conn, version, name)
+                applied.append(name)
+        finally:
+            if engine.dialect.name == "postgresql":
+                lock_conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": ADVISORY_LOCK_KEY})
+                lock_conn.commit()
+
+    return applied
+
+
+def verify_schema(engine: Engine) -> int:
+    """
+    Startup check for API workers: make sure `python migrate.py` has been
+    run for this version of the code. Raises SchemaVersionError if not.
+    """
+    expected = latest_version()
+    with engine.connect() as conn:
+        version = current_version(conn)
+
+    if version is None or version < expected:
+        raise SchemaVersionError(
+            f"Database schema is at version {version or 0}, this code needs {expected}. "
+            f"Run `python migrate.py` before starting the server."
+        )
+    if version > expected:
+        logger.warning(f"Database schema version {version} is newer than this code ({expected})")
+    return version
+
+
+# --- Helpers for migration modules ---
+
+def add_column_if_missing(conn: Connection, table: str, column: str, ddl_type: str) -> None:
+    """ALTER TABLE ... ADD COLUMN, skipped if the column is already there"""
+    existing = {c["name"] for c in inspect(conn).get_columns(table)}
+    if column not in existing:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl_type}"))
+
+
+def create_index_online(conn: Connection, name: str, table: str, columns: str,
+                        unique: bool = False) -> None:
+    """
+    Create an index without blocking writes.
+
+    On PostgreSQL this uses CREATE INDEX CONCURRENTLY, so the migration
+    module must set TRANSACTIONAL = False. A concurrent build that failed
+    half way leaves an INVALID index behind; that one is dropped and rebuilt.
+    SQLite has no concurrent builds - it just creates the index.
+    """
+    unique_sql = "UNIQUE " if unique else ""
+    if conn.dialect.name == "postgresql":
+        invalid = conn.execute(text(
+            "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE c.relname = :name AND NOT i.indisvalid"
+        ), {"name": name}).first()
+        if invalid:
+            conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+        conn.execute(text(
+            f"CREATE {unique_sql}INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} ({columns})"
+        ))
+    else:
+        conn.execute(text(f"CREATE {unique_sql}INDEX IF NOT EXISTS {name} ON {table} ({columns})"))
+
+
+if __name__ == "__main__":
+    from database import engine
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    parser = argparse.ArgumentParser(description="Apply database schema migrations")
+    parser.add_argument("--status", action="store_true", help="Show schema version and exit")
+    args = parser.parse_args()
+
+    if args.status:
+        with engine.connect() as conn:
+            version = current_version(conn)
+        print(f"Database version: {version if version is not None else 'not initialized'}")
+        print(f"Latest version:   {latest_version()}")
+        sys.exit(0)
+
+    applied = run_migrations(engine)
+    if applied:
+        print(f"Applied {len(applied)} migration(s): {', '.join(applied)}")
+    else:
+        print("Database is up to date")
@@ -0,0 +1,10 @@
+"""
+Baseline: the quizzes table as created by the original create_all() call.
+
+Nothing to do - migrate.py marks pre-migration databases as being at this
+version, and builds brand new databases straight from the latest models.
+"""
+
+
+def upgrade(conn):
+    pass
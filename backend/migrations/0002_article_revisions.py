@@ -0,0 +1,9 @@
+"""
+Track the Wikipedia revision and per-section hashes of each quiz's article.
+"""
+from migrate import add_column_if_missing
+
+
+def upgrade(conn):
+    add_column_if_missing(conn, "quizzes", "revision_id", "BIGINT")
+    add_column_if_missing(conn, "quizzes", "section_hashes", "JSON")
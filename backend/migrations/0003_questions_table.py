@@ -0,0 +1,67 @@
+"""
+Move quiz questions out of the quizzes.quiz JSON column into their own
+indexed table. The old column is left holding an empty list.
+"""
+import json
+
+from sqlalchemy import (
+    JSON, Column, ForeignKey, Index, Integer, MetaData, String, Table, Text, text,
+)
+
+BATCH_SIZE = 200
+
+# Snapshot of the table at this version - not the live model
+metadata = MetaData()
+questions = Table(
+    "questions", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("quiz_id", Integer, ForeignKey("quizzes.id", ondelete="CASCADE"), nullable=False),
+    Column("position", Integer, nullable=False),
+    Column("difficulty", String(16), nullable=False),
+    Column("section", String, nullable=True),
+    Column("question", Text, nullable=False),
+    Column("options", JSON, nullable=False),
+    Column("answer", Text, nullable=False),
+    Column("explanation", Text, nullable=True),
+    Index("ix_questions_quiz_position", "quiz_id", "position", unique=True),
+    Index("ix_questions_difficulty", "difficulty"),
+    Index("ix_questions_section", "section"),
+)
+# Only needed so the foreign key resolves
+Table("quizzes", metadata, Column("id", Integer, primary_key=True))
+
+
+def _load(value):
+    return json.loads(value) if isinstance(value, str) else (value or [])
+
+
+def upgrade(conn):
+    questions.create(conn, checkfirst=True)
+
+    last_id = 0
+    while True:
+        rows = conn.execute(text(
+            "SELECT id, quiz FROM quizzes WHERE id > :last ORDER BY id LIMIT :limit"
+        ), {"last": last_id, "limit": BATCH_SIZE}).all()
+        if not rows:
+            break
+
+        for quiz_id, blob in rows:
+            items = [q for q in _load(blob) if isinstance(q, dict)]
+            if items:
+                conn.execute(questions.insert(), [
+                    {
+                        "quiz_id": quiz_id,
+                        "position": position,
+                        "difficulty": q.get("difficulty") or "medium",
+                        "section": q.get("section") or "General",
+                        "question": q.get("question", ""),
+                        "options": list(q.get("options") or []),
+                        "answer": q.get("answer", ""),
+                        "explanation": q.get("explanation"),
+                    }
+                    for position, q in enumerate(items)
+                ])
+                conn.execute(text("UPDATE quizzes SET quiz = :empty WHERE id = :id"),
+                             {"empty": "[]", "id": quiz_id})
+        last_id = rows[-1][0]
@@ -0,0 +1,109 @@
+"""
+Full-text search index and the quiz_facets table, backfilled from
+existing quizzes.
+"""
+import json
+from collections import defaultdict
+
+from sqlalchemy import Column, ForeignKey, Index, Integer, MetaData, String, Table, text
+
+BATCH_SIZE = 200
+
+# Snapshot of the tables at this version - not the live models
+metadata = MetaData()
+quiz_facets = Table(
+    "quiz_facets", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("quiz_id", Integer, ForeignKey("quizzes.id", ondelete="CASCADE"), nullable=False),
+    Column("facet", String(32), nullable=False),
+    Column("value", String, nullable=False),
+    Index("ix_quiz_facets_facet_value", "facet", "value", "quiz_id"),
+    Index("ix_quiz_facets_quiz", "quiz_id", "facet", "value"),
+)
+Table("quizzes", metadata, Column("id", Integer, primary_key=True))
+
+
+def _load(value):
+    return json.loads(value) if isinstance(value, str) else value
+
+
+def _create_text_index(conn):
+    if conn.dialect.name == "sqlite":
+        conn.execute(text(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS quiz_search USING fts5("
+            "title, summary, questions, entities, tokenize='porter unicode61')"
+        ))
+    elif conn.dialect.name == "postgresql":
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS quiz_search ("
+            "quiz_id INTEGER PRIMARY KEY REFERENCES quizzes(id) ON DELETE CASCADE, "
+            "document TSVECTOR NOT NULL)"
+        ))
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_quiz_search_document "
+            "ON quiz_search USING GIN (document)"
+        ))
+
+
+def _index_quiz(conn, quiz_id, title, summary, key_entities, questions):
+    """The search index entry and facets for one quiz, as search.py wrote them at this version"""
+    entities = [name for group in ("people", "organizations", "locations")
+                for name in (key_entities or {}).get(group) or [] if name]
+    fields = {
+        "id": quiz_id,
+        "title": title or "",
+        "summary": summary or "",
+        "questions": " ".join(
+            " ".join([q["question"] or "", q["answer"] or "", q["explanation"] or ""]) for q in questions
+        ),
+        "entities": " ".join(entities),
+    }
+    if conn.dialect.name == "sqlite":
+        conn.execute(text(
+            "INSERT INTO quiz_search (rowid, title, summary, questions, entities) "
+            "VALUES (:id, :title, :summary, :questions, :entities)"
+        ), fields)
+    elif conn.dialect.name == "postgresql":
+        conn.execute(text(
+            "INSERT INTO quiz_search (quiz_id, document) VALUES (:id, "
+            "setweight(to_tsvector('english', :title), 'A') || "
+            "setweight(to_tsvector('english', :entities), 'B') || "
+            "setweight(to_tsvector('english', :summary), 'C') || "
+            "setweight(to_tsvector('english', :questions), 'D'))"
+        ), fields)
+
+    facets = {("section", q["section"] or "General") for q in questions}
+    facets.update(("difficulty", q["difficulty"]) for q in questions if q["difficulty"])
+    facets.update(("entity", name) for name in entities)
+    if facets:
+        conn.execute(quiz_facets.insert(), [
+            {"quiz_id": quiz_id, "facet": facet, "value": value} for facet, value in facets
+        ])
+
+
+def upgrade(conn):
+    quiz_facets.create(conn, checkfirst=True)
+    _create_text_index(conn)
+
+    last_id = 0
+    while True:
+        rows = conn.execute(text(
+            "SELECT id, title, summary, key_entities FROM quizzes "
+            "WHERE id > :last ORDER BY id LIMIT :limit"
+        ), {"last": last_id, "limit": BATCH_SIZE}).all()
+        if not rows:
+            break
+
+        by_quiz = defaultdict(list)
+        for quiz_id, question, answer, explanation, difficulty, section in conn.execute(text(
+            "SELECT quiz_id, question, answer, explanation, difficulty, section FROM questions "
+            "WHERE quiz_id > :last AND quiz_id <= :upto ORDER BY quiz_id, position"
+        ), {"last": last_id, "upto": rows[-1][0]}):
+            by_quiz[quiz_id].append({
+                "question": question, "answer": answer, "explanation": explanation,
+                "difficulty": difficulty, "section": section,
+            })
+
+        for quiz_id, title, summary, key_entities in rows:
+            _index_quiz(conn, quiz_id, title, summary, _load(key_entities), by_quiz[quiz_id])
+        last_id = rows[-1][0]
@@ -0,0 +1,11 @@
+"""
+Index quizzes.created_at for newest-first history and search listings.
+Built online so a large quizzes table stays writable during the deploy.
+"""
+from migrate import create_index_online
+
+TRANSACTIONAL = False
+
+
+def upgrade(conn):
+    create_index_online(conn, "ix_quizzes_created_at", "quizzes", "created_at")
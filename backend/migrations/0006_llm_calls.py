@@ -0,0 +1,27 @@
+"""
+llm_calls table: token usage and latency of every LLM call.
+"""
+from sqlalchemy import Column, DateTime, ForeignKey, Index, Integer, MetaData, String, Table
+from sqlalchemy.sql import func
+
+metadata = MetaData()
+Table("quizzes", metadata, Column("id", Integer, primary_key=True))
+llm_calls = Table(
+    "llm_calls", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("quiz_id", Integer, ForeignKey("quizzes.id", ondelete="SET NULL"), nullable=True),
+    Column("stage", String(32), nullable=False),
+    Column("model", String(64), nullable=False),
+    Column("input_tokens", Integer, nullable=False, default=0),
+    Column("output_tokens", Integer, nullable=False, default=0),
+    Column("latency_ms", Integer, nullable=False, default=0),
+    Column("prompt_chars", Integer, nullable=False, default=0),
+    Column("truncated_chars", Integer, nullable=False, default=0),
+    Column("created_at", DateTime(timezone=True), server_default=func.now(), nullable=False),
+    Index("ix_llm_calls_created_at", "created_at"),
+    Index("ix_llm_calls_quiz", "quiz_id"),
+)
+
+
+def upgrade(conn):
+    llm_calls.create(conn, checkfirst=True)
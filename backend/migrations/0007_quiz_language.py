@@ -0,0 +1,88 @@
+"""
+Record each quiz's Wikipedia language edition and store its URL in
+canonical form (https://<lang>.wikipedia.org/wiki/<Title>), which is what
+new quizzes are looked up by. A URL whose canonical form already belongs
+to another quiz is left as it is.
+"""
+import re
+from typing import Optional, Tuple
+from urllib.parse import quote, unquote, urlparse
+
+from sqlalchemy import text
+
+from migrate import add_column_if_missing
+
+BATCH_SIZE = 500
+
+# URL rules of languages.py at this version, copied so that replaying this
+# migration gives the same URLs whatever that module becomes
+URL_SAFE_CHARS = ";@$!*(),/~:"
+LANGUAGE_CODE = re.compile(r"^(?:[a-z]{2,3}(?:-[a-z0-9]+)*|simple)$")
+NON_LANGUAGE_HOSTS = {"www", "m", "meta", "commons", "species", "incubator", "test"}
+NAMESPACES = frozenset(name.casefold() for name in (
+    "Talk", "User", "User talk", "Wikipedia", "Wikipedia talk", "File", "File talk",
+    "MediaWiki", "Template", "Template talk", "Help", "Category", "Category talk",
+    "Portal", "Draft", "Module", "Special", "Media", "Image", "Project", "WP",
+))
+
+
+def canonicalize(url: str) -> Optional[Tuple[str, str]]:
+    """(language, canonical URL) of an article URL, or None if it isn't one"""
+    parsed = urlparse((url or "").strip())
+    if parsed.scheme not in ("http", "https"):
+        return None
+    parts = (parsed.hostname or "").lower().split(".")
+    if parts[-2:] != ["wikipedia", "org"] or len(parts) > 4:
+        return None
+    if len(parts) == 2 or parts[0] == "www":
+        language = "en"
+    elif len(parts) == 4 and parts[1] != "m":
+        return None
+    else:
+        language = parts[0]
+    if language in NON_LANGUAGE_HOSTS or not LANGUAGE_CODE.match(language):
+        return None
+    if not parsed.path.startswith("/wiki/"):
+        return None
+    title = unquote(parsed.path[len("/wiki/"):]).replace(" ", "_")
+    title = "_".join(part for part in title.split("_") if part)
+    if not title:
+        return None
+    # Quizzes from before this migration are English articles, so the
+    # English namespace names are the ones to skip
+    prefix, sep, _ = title.partition(":")
+    if sep and " ".join(prefix.replace("_", " ").split()).casefold() in NAMESPACES:
+        return None
+    first = title[0].upper()
+    if len(first) == 1:
+        title = first + title[1:]
+    return language, f"https://{language}.wikipedia.org/wiki/{quote(title, safe=URL_SAFE_CHARS)}"
+
+
+def upgrade(conn):
+    add_column_if_missing(conn, "quizzes", "language", "VARCHAR(16) NOT NULL DEFAULT 'en'")
+
+    taken = {row[0] for row in conn.execute(text("SELECT url FROM quizzes"))}
+    last_id = 0
+    while True:
+        rows = conn.execute(text(
+            "SELECT id, url FROM quizzes WHERE id > :last ORDER BY id LIMIT :limit"
+        ), {"last": last_id, "limit": BATCH_SIZE}).all()
+        if not rows:
+            break
+
+        for quiz_id, url in rows:
+            article = canonicalize(url)
+            if article is None:
+                continue
+            language, canonical = article
+            new_url = url
+            if canonical != url and canonical not in taken:
+                taken.discard(url)
+                taken.add(canonical)
+                new_url = canonical
+            conn.execute(
+                text("UPDATE quizzes SET language = :language, url = :url WHERE id = :id"),
+                {"language": language, "url": new_url, "id": quiz_id},
+            )
+        last_id = rows[-1][0]
@@ -0,0 +1,41 @@
+"""
+Quiz attempts and their running aggregates: quiz_attempts, question_stats
+and quiz_attempt_stats.
+"""
+from sqlalchemy import JSON, Column, DateTime, ForeignKey, Index, Integer, MetaData, Table
+from sqlalchemy.sql import func
+
+metadata = MetaData()
+Table("quizzes", metadata, Column("id", Integer, primary_key=True))
+Table("questions", metadata, Column("id", Integer, primary_key=True))
+quiz_attempts = Table(
+    "quiz_attempts", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("quiz_id", Integer, ForeignKey("quizzes.id", ondelete="CASCADE"), nullable=False),
+    Column("score", Integer, nullable=False),
+    Column("total", Integer, nullable=False),
+    Column("answers", JSON, nullable=False),
+    Column("duration_ms", Integer, nullable=True),
+    Column("created_at", DateTime(timezone=True), server_default=func.now(), nullable=False),
+    Index("ix_quiz_attempts_quiz_created", "quiz_id", "created_at"),
+)
+question_stats = Table(
+    "question_stats", metadata,
+    Column("question_id", Integer, ForeignKey("questions.id", ondelete="CASCADE"), primary_key=True),
+    Column("quiz_id", Integer, ForeignKey("quizzes.id", ondelete="CASCADE"), nullable=False),
+    Column("attempts", Integer, nullable=False, default=0),
+    Column("correct", Integer, nullable=False, default=0),
+    Index("ix_question_stats_quiz", "quiz_id"),
+)
+quiz_attempt_stats = Table(
+    "quiz_attempt_stats", metadata,
+    Column("quiz_id", Integer, ForeignKey("quizzes.id", ondelete="CASCADE"), primary_key=True),
+    Column("attempts", Integer, nullable=False, default=0),
+    Column("score_total", Integer, nullable=False, default=0),
+    Column("question_total", Integer, nullable=False, default=0),
+)
+
+
+def upgrade(conn):
+    for table in (quiz_attempts, question_stats, quiz_attempt_stats):
+        table.create(conn, checkfirst=True)
@@ -0,0 +1,215 @@
+"""
+Question bank: move question text, options, answer and explanation out of
+the questions table into question_bank, one entry per distinct question.
+Near-duplicates across quizzes (see question_bank.py) end up sharing an
+entry; questions keeps position, difficulty and section plus bank_id.
+
+Needs SQLite 3.35+ for DROP COLUMN.
+"""
+import json
+import re
+import struct
+import zlib
+from typing import List, Optional, Sequence, Tuple
+
+from sqlalchemy import (
+    JSON, BigInteger, Column, DateTime, ForeignKey, Integer, LargeBinary, MetaData, String, Table, Text,
+    bindparam, inspect, text,
+)
+from sqlalchemy.sql import func
+
+from migrate import add_column_if_missing
+
+BATCH_SIZE = 500
+MOVED_COLUMNS = ("question", "options", "answer", "explanation")
+
+# The MinHash / LSH scheme of question_bank.py at this version, copied so
+# this migration keeps writing the same keys whatever that module becomes
+SHINGLE_SIZE = 5
+SIGNATURE_SIZE = 32
+BANDS = 8
+ROWS = SIGNATURE_SIZE // BANDS
+SIMILARITY = 0.75  # the QUESTION_BANK_SIMILARITY default
+MIN_ENTITY_LENGTH = 3
+_BIN_MASK = 0xFFFF
+_MASK64 = (1 << 64) - 1
+_SIGNATURE_FORMAT = f"<{SIGNATURE_SIZE}H"
+
+# Snapshot of the tables at this version - not the live models
+metadata = MetaData()
+question_bank = Table(
+    "question_bank", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("language", String(16), nullable=False, default="en"),
+    Column("question", Text, nullable=False),
+    Column("options", JSON, nullable=False),
+    Column("answer", Text, nullable=False),
+    Column("explanation", Text, nullable=True),
+    Column("signature", LargeBinary, nullable=True),
+    Column("created_at", DateTime(timezone=True), server_default=func.now(), nullable=False),
+)
+question_bank_bands = Table(
+    "question_bank_bands", metadata,
+    Column("band", BigInteger, primary_key=True),
+    Column("bank_id", Integer, ForeignKey("question_bank.id", ondelete="CASCADE"), primary_key=True),
+    sqlite_with_rowid=False,
+)
+question_bank_entities = Table(
+    "question_bank_entities", metadata,
+    Column("entity", String(255), primary_key=True),
+    Column("bank_id", Integer, ForeignKey("question_bank.id", ondelete="CASCADE"), primary_key=True),
+)
+
+
+def _load(value):
+    return json.loads(value) if isinstance(value, str) else value
+
+
+def normalize(text: str) -> str:
+    return " ".join(re.findall(r"\w+", (text or "").casefold()))
+
+
+def _hash64(data: bytes) -> int:
+    return (zlib.crc32(data) * 0x9E3779B97F4A7C15) & _MASK64
+
+
+def signature(question: str, answer: str) -> Optional[Tuple[int, ...]]:
+    """One-permutation MinHash over character 5-grams, densified"""
+    folded = normalize(f"{question} {answer}")
+    if len(folded) <= SHINGLE_SIZE:
+        grams = {folded} if folded else set()
+    else:
+        grams = {folded[i:i + SHINGLE_SIZE] for i in range(len(folded) - SHINGLE_SIZE + 1)}
+    if not grams:
+        return None
+    bins: List[Optional[int]] = [None] * SIGNATURE_SIZE
+    for gram in grams:
+        h = _hash64(gram.encode("utf-8"))
+        slot, value = (h >> 32) % SIGNATURE_SIZE, h & 0xFFFFFFFF
+        if bins[slot] is None or value < bins[slot]:
+            bins[slot] = value
+    filled = [(i, v) for i, v in enumerate(bins) if v is not None]
+    out = []
+    for i, value in enumerate(bins):
+        if value is None:
+            j, source = next(((j, v) for j, v in filled if j > i), filled[0])
+            value = source * 0x9E3779B1 + (j - i) % SIGNATURE_SIZE
+        out.append(value & _BIN_MASK)
+    return tuple(out)
+
+
+def similarity(a: Sequence[int], b: Sequence[int]) -> float:
+    return sum(x == y for x, y in zip(a, b)) / SIGNATURE_SIZE
+
+
+def band_keys(sig: Sequence[int], language: str, answer: str) -> List[int]:
+    scope = f"{language}\0{normalize(answer)}".encode("utf-8")
+    keys = []
+    for band in range(BANDS):
+        chunk = sig[band * ROWS:(band + 1) * ROWS]
+        key = zlib.crc32(scope, zlib.crc32(struct.pack(f"<B{ROWS}H", band, *chunk)))
+        keys.append(key - (1 << 32) if key >= 1 << 31 else key)
+    return keys
+
+
+_CANDIDATES = text(
+    "SELECT DISTINCT b.bank_id, q.language, q.answer, q.signature "
+    "FROM question_bank_bands b JOIN question_bank q ON q.id = b.bank_id "
+    "WHERE b.band IN :bands"
+).bindparams(bindparam("bands", expanding=True))
+
+
+def find_similar(conn, items) -> List[Optional[int]]:
+    """Most similar banked entry with the same language and answer for each (signature, language, answer)"""
+    keys = {key for sig, language, answer in items if sig for key in band_keys(sig, language, answer)}
+    if not keys:
+        return [None] * len(items)
+    candidates = [
+        (row[0], row[1], normalize(row[2]), struct.unpack(_SIGNATURE_FORMAT, row[3]))
+        for row in conn.execute(_CANDIDATES, {"bands": sorted(keys)})
+        if row[3]
+    ]
+    matches = []
+    for sig, language, answer in items:
+        best, best_score = None, SIMILARITY
+        if sig:
+            answer = normalize(answer)
+            for bank_id, bank_language, bank_answer, bank_sig in candidates:
+                if bank_language != language or bank_answer != answer:
+                    continue
+                score = similarity(sig, bank_sig)
+                if score >= best_score:
+                    best, best_score = bank_id, score
+        matches.append(best)
+    return matches
+
+
+def entity_tags(text: str, title: str, key_entities) -> set:
+    """The article's subject, plus the extracted entities the text mentions"""
+    folded = normalize(text)
+    tags = {normalize(title)}
+    for group in ("people", "organizations", "locations"):
+        for entity in (key_entities or {}).get(group) or []:
+            name = normalize(entity)
+            if len(name) >= MIN_ENTITY_LENGTH and f" {name} " in f" {folded} ":
+                tags.add(name)
+    return {tag[:255] for tag in tags if tag}
+
+
+def _bank_batch(conn, rows) -> None:
+    """Link a batch of questions to new or near-duplicate bank entries"""
+    sigs = [signature(row.question, row.answer) for row in rows]
+    matches = find_similar(conn, [(sig, row.language, row.answer) for sig, row in zip(sigs, rows)])
+    pending = []
+    for row, sig, bank_id in zip(rows, sigs, matches):
+        if bank_id is None and sig:
+            key = (row.language, normalize(row.answer))
+            bank_id = next((b for s, k, b in pending if k == key and similarity(sig, s) >= SIMILARITY), None)
+        if bank_id is None:
+            bank_id = conn.execute(question_bank.insert().values(
+                language=row.language,
+                question=row.question,
+                options=_load(row.options) or [],
+                answer=row.answer,
+                explanation=row.explanation,
+                signature=struct.pack(_SIGNATURE_FORMAT, *sig) if sig else b"",
+            )).inserted_primary_key[0]
+            if sig:
+                keys = set(band_keys(sig, row.language, row.answer))
+                conn.execute(question_bank_bands.insert(), [{"band": key, "bank_id": bank_id} for key in keys])
+                pending.append((sig, (row.language, normalize(row.answer)), bank_id))
+            tags = entity_tags(f"{row.question} {row.answer}", row.title, _load(row.key_entities))
+            if tags:
+                conn.execute(question_bank_entities.insert(),
+                             [{"entity": tag, "bank_id": bank_id} for tag in tags])
+        conn.execute(text("UPDATE questions SET bank_id = :bank_id WHERE id = :id"),
+                     {"bank_id": bank_id, "id": row.id})
+
+
+def upgrade(conn):
+    for table in (question_bank, question_bank_bands, question_bank_entities):
+        table.create(conn, checkfirst=True)
+    add_column_if_missing(conn, "questions", "bank_id", "INTEGER REFERENCES question_bank(id)")
+    # bank_id is new and empty, so an ordinary index build is quick
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_questions_bank ON questions (bank_id)"))
+
+    existing = {c["name"] for c in inspect(conn).get_columns("questions")}
+    if "question" not in existing:
+        return
+
+    last_id = 0
+    while True:
+        rows = conn.execute(text(
+            "SELECT q.id, q.question, q.options, q.answer, q.explanation, "
+            "z.language, z.title, z.key_entities "
+            "FROM questions q JOIN quizzes z ON z.id = q.quiz_id "
+            "WHERE q.id > :last ORDER BY q.id LIMIT :limit"
+        ), {"last": last_id, "limit": BATCH_SIZE}).all()
+        if not rows:
+            break
+        _bank_batch(conn, rows)
+        last_id = rows[-1].id
+
+    for column in MOVED_COLUMNS:
+        if column in existing:
+            conn.execute(text(f"ALTER TABLE questions DROP COLUMN {column}"))
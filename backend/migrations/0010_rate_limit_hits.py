@@ -0,0 +1,19 @@
+"""
+rate_limit_hits table: requests let through per client, budget and clock
+minute, summed across workers when RATE_LIMIT_SHARED is on.
+"""
+from sqlalchemy import Column, Integer, MetaData, PrimaryKeyConstraint, String, Table
+
+metadata = MetaData()
+rate_limit_hits = Table(
+    "rate_limit_hits", metadata,
+    Column("window_start", Integer, nullable=False),
+    Column("budget", String(16), nullable=False),
+    Column("client", String(64), nullable=False),
+    Column("hits", Integer, nullable=False, default=0),
+    PrimaryKeyConstraint("window_start", "budget", "client"),
+)
+
+
+def upgrade(conn):
+    rate_limit_hits.create(conn, checkfirst=True)
@@ -0,0 +1,28 @@
+"""
+Retention: quizzes.last_read_at (when a quiz was last served, recorded
+coarsely) and archived_quizzes, where maintenance.py moves quizzes nobody
+has read for a long time, compressed.
+"""
+from sqlalchemy import Column, DateTime, Integer, LargeBinary, MetaData, String, Table
+from sqlalchemy.sql import func
+
+from migrate import add_column_if_missing
+
+metadata = MetaData()
+archived_quizzes = Table(
+    "archived_quizzes", metadata,
+    Column("id", Integer, primary_key=True, autoincrement=False),
+    Column("url", String, unique=True, nullable=False),
+    Column("language", String(16), nullable=False),
+    Column("title", String, nullable=False),
+    Column("encoding", String(8), nullable=False),
+    Column("payload", LargeBinary, nullable=False),
+    Column("original_bytes", Integer, nullable=False),
+    Column("archived_at", DateTime(timezone=True), server_default=func.now(), nullable=False),
+)
+
+
+def upgrade(conn):
+    timestamp = "TIMESTAMP WITH TIME ZONE" if conn.dialect.name == "postgresql" else "DATETIME"
+    add_column_if_missing(conn, "quizzes", "last_read_at", timestamp)
+    archived_quizzes.create(conn, checkfirst=True)
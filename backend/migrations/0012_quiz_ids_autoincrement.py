@@ -0,0 +1,68 @@
+"""
+Never hand out a quiz id twice. On SQLite, quizzes.id was a plain rowid,
+so archiving the newest quiz let the next new quiz take its id, and
+restoring the archived one then found its id taken. The table is rebuilt
+with AUTOINCREMENT, and the id sequence starts above every archived id.
+
+PostgreSQL sequences never go back, so there is nothing to do there.
+"""
+from sqlalchemy import (
+    JSON, BigInteger, Column, DateTime, Index, Integer, MetaData, String, Table, Text, inspect, text,
+)
+from sqlalchemy.sql import func
+
+
+def _quizzes(name: str) -> Table:
+    """Snapshot of the quizzes table at this version - not the live model"""
+    return Table(
+        name, MetaData(),
+        Column("id", Integer, primary_key=True),
+        Column("url", String, nullable=False),
+        Column("language", String(16), nullable=False, server_default="en"),
+        Column("title", String, nullable=False),
+        Column("summary", Text, nullable=False),
+        Column("key_entities", JSON, nullable=True),
+        Column("sections", JSON, nullable=True),
+        Column("related_topics", JSON, nullable=True),
+        Column("quiz", JSON, nullable=False),
+        Column("raw_html", Text, nullable=True),
+        Column("revision_id", BigInteger, nullable=True),
+        Column("section_hashes", JSON, nullable=True),
+        Column("created_at", DateTime(timezone=True), server_default=func.now()),
+        Column("updated_at", DateTime(timezone=True)),
+        Column("last_read_at", DateTime(timezone=True), nullable=True),
+        sqlite_autoincrement=True,
+    )
+
+
+def upgrade(conn):
+    if conn.dialect.name != "sqlite":
+        return
+    table = conn.execute(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'quizzes'")).scalar()
+    if table is None or "AUTOINCREMENT" in table.upper():
+        return
+
+    rebuilt = _quizzes("quizzes_new")
+    existing = {c["name"] for c in inspect(conn).get_columns("quizzes")}
+    columns = ", ".join(c.name for c in rebuilt.columns if c.name in existing)
+
+    conn.execute(text("DROP TABLE IF EXISTS quizzes_new"))
+    rebuilt.create(conn)
+    conn.execute(text(f"INSERT INTO quizzes_new ({columns}) SELECT {columns} FROM quizzes"))
+    # Foreign keys aren't enforced (no PRAGMA foreign_keys), so the child
+    # tables keep pointing at "quizzes" and pick up the new table
+    conn.execute(text("DROP TABLE quizzes"))
+    conn.execute(text("ALTER TABLE quizzes_new RENAME TO quizzes"))
+
+    quizzes = _quizzes("quizzes")
+    Index("ix_quizzes_id", quizzes.c.id).create(conn)
+    Index("ix_quizzes_url", quizzes.c.url, unique=True).create(conn)
+    Index("ix_quizzes_created_at", quizzes.c.created_at).create(conn)
+
+    top = conn.execute(text(
+        "SELECT MAX(COALESCE((SELECT MAX(id) FROM quizzes), 0), "
+        "COALESCE((SELECT MAX(id) FROM archived_quizzes), 0))"
+    )).scalar()
+    conn.execute(text("DELETE FROM sqlite_sequence WHERE name = 'quizzes'"))
+    if top:
+        conn.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES ('quizzes', :top)"), {"top": top})
@@ -0,0 +1,85 @@
+"""
+Stop stemming non-English quizzes as English in the search index.
+
+SQLite: a second FTS5 table without the Porter stemmer, and the index
+entries of every non-English quiz moved into it (FTS5 stores the text, so
+nothing is recomputed). PostgreSQL: the tsvector of every non-English
+quiz rebuilt with its language's text search config, or 'simple'.
+"""
+import json
+from collections import defaultdict
+
+from sqlalchemy import text
+
+BATCH_SIZE = 200
+
+# Configs by language at this version (search.POSTGRES_CONFIGS)
+POSTGRES_CONFIGS = {
+    "en": "english", "de": "german", "fr": "french", "es": "spanish", "it": "italian",
+    "pt": "portuguese", "nl": "dutch", "sv": "swedish", "ru": "russian", "ar": "arabic",
+}
+
+NON_ENGLISH = "SELECT id FROM quizzes WHERE language != 'en'"
+
+
+def _load(value):
+    return json.loads(value) if isinstance(value, str) else value
+
+
+def _upgrade_sqlite(conn):
+    conn.execute(text(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS quiz_search_unstemmed USING fts5("
+        "title, summary, questions, entities, tokenize='unicode61 remove_diacritics 2')"
+    ))
+    conn.execute(text(
+        "INSERT INTO quiz_search_unstemmed (rowid, title, summary, questions, entities) "
+        f"SELECT rowid, title, summary, questions, entities FROM quiz_search WHERE rowid IN ({NON_ENGLISH})"
+    ))
+    conn.execute(text(f"DELETE FROM quiz_search WHERE rowid IN ({NON_ENGLISH})"))
+
+
+def _upgrade_postgresql(conn):
+    last_id = 0
+    while True:
+        rows = conn.execute(text(
+            "SELECT id, language, title, summary, key_entities FROM quizzes "
+            "WHERE language != 'en' AND id > :last ORDER BY id LIMIT :limit"
+        ), {"last": last_id, "limit": BATCH_SIZE}).all()
+        if not rows:
+            break
+
+        questions = defaultdict(list)
+        for quiz_id, question, answer, explanation in conn.execute(text(
+            "SELECT q.quiz_id, b.question, b.answer, b.explanation "
+            "FROM questions q JOIN question_bank b ON b.id = q.bank_id "
+            "WHERE q.quiz_id > :last AND q.quiz_id <= :upto ORDER BY q.quiz_id, q.position"
+        ), {"last": last_id, "upto": rows[-1][0]}):
+            questions[quiz_id].append(" ".join([question or "", answer or "", explanation or ""]))
+
+        for quiz_id, language, title, summary, key_entities in rows:
+            entities = _load(key_entities) or {}
+            names = [name for group in ("people", "organizations", "locations")
+                     for name in entities.get(group) or [] if name]
+            conn.execute(text(
+                "UPDATE quiz_search SET document = "
+                "setweight(to_tsvector(CAST(:config AS regconfig), :title), 'A') || "
+                "setweight(to_tsvector(CAST(:config AS regconfig), :entities), 'B') || "
+                "setweight(to_tsvector(CAST(:config AS regconfig), :summary), 'C') || "
+                "setweight(to_tsvector(CAST(:config AS regconfig), :questions), 'D') "
+                "WHERE quiz_id = :id"
+            ), {
+                "id": quiz_id,
+                "config": POSTGRES_CONFIGS.get(language, "simple"),
+                "title": title or "",
+                "summary": summary or "",
+                "entities": " ".join(names),
+                "questions": " ".join(questions[quiz_id]),
+            })
+        last_id = rows[-1][0]
+
+
+def upgrade(conn):
+    if conn.dialect.name == "sqlite":
+        _upgrade_sqlite(conn)
+    elif conn.dialect.name == "postgresql":
+        _upgrade_postgresql(conn)
@@ -0,0 +1,3 @@
+"""
+Schema migrations, applied in order by migrate.py.
+"""
@@ -1,7 +1,8 @@
 """
 SQLAlchemy database models for WikiQuiz application.
 """
-from sqlalchemy import Column, Integer, String, Text, JSON, DateTime
+from sqlalchemy import Column, Integer, BigInteger, String, Text, JSON, DateTime, ForeignKey, Index, LargeBinary
+from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from database import Base
 
@@ -11,31 +12,379 @@ class Quiz(Base):
     Quiz model storing Wikipedia article data and generated quizzes.
     
     Stores:
-    - Article metadata (URL, title, summary)
+    - Article metadata (canonical URL, language edition, title, summary)
     - Extracted entities and sections
-    - Generated quiz questions
+    - Generated quiz questions (rows in the questions table)
     - Related topics
+    - Article revision and per-section content hashes
     - Raw HTML for reference (bonus feature)
     """
     __tablename__ = "quizzes"
+    # Ids are never reused, so an archived quiz can be restored under its
+    # own id (migration 0012 rebuilds older SQLite tables this way)
+    __table_args__ = {"sqlite_autoincrement": True}
 
     id = Column(Integer, primary_key=True, index=True)
     url = Column(String, unique=True, nullable=False, index=True)
+    # Wikipedia language edition ("en", "de", ...) - see languages.py
+    language = Column(String(16), nullable=False, default="en", server_default="en")
     title = Column(String, nullable=False)
     summary = Column(Text, nullable=False)
     
     # Structured data as JSON
     key_entities = Column(JSON, nullable=True)
     sections = Column(JSON, nullable=True)
-    quiz = Column(JSON, nullable=False)
     related_topics = Column(JSON, nullable=True)
     
+    # Pre-normalization storage for the questions. Migration 0003 moves
+    # these into the questions table and leaves an empty list behind.
+    legacy_quiz = Column("quiz", JSON, nullable=False, default=list)
+    
     # Bonus: Store raw HTML for reference
     raw_html = Column(Text, nullable=True)
     
+    # Article revision tracking - lets the refresh job spot stale quizzes
+    # and regenerate only the questions whose section changed
+    revision_id = Column(BigInteger, nullable=True)
+    section_hashes = Column(JSON, nullable=True)
+    
     # Timestamps
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    # Last served, give or take QUIZ_READ_TOUCH_SECONDS - quizzes unread
+    # for ARCHIVE_UNREAD_DAYS get archived (maintenance.py)
+    last_read_at = Column(DateTime(timezone=True), nullable=True)
+
+    questions = relationship(
+        "Question",
+        order_by="Question.position",
+        cascade="all, delete-orphan",
+        back_populates="quiz_ref",
+    )
+
+    @property
+    def quiz(self):
+        """Questions as plain dicts - the shape QuizResponse and the LLM use"""
+        return [q.to_dict() for q in self.questions]
+
+    @quiz.setter
+    def quiz(self, items):
+        """
+        Replace the question list. Existing rows are updated in place by
+        position so the (quiz_id, position) unique index never sees a clash.
+        """
+        items = [q for q in (items or []) if isinstance(q, dict)]
+        existing = list(self.questions)
+        for position, item in enumerate(items):
+            if position < len(existing):
+                existing[position].update_from_dict(item, position, self.language or "en")
+            else:
+                question = Question()
+                question.update_from_dict(item, position, self.language or "en")
+                self.questions.append(question)
+        del self.questions[len(items):]
 
     def __repr__(self):
         return f"<Quiz(id={self.id}, title='{self.title}', url='{self.url}')>"
+
+
+class Question(Base):
+    """
+    A question's place in a quiz.
+    
+    Normalized out of the quiz JSON so question-level work (filtering by
+    difficulty or section, counting, serving a subset) is plain indexed SQL.
+    The text itself lives in the question bank, shared by every quiz that
+    asks the same thing - see question_bank.py.
+    """
+    __tablename__ = "questions"
+
+    id = Column(Integer, primary_key=True)
+    quiz_id = Column(Integer, ForeignKey("quizzes.id", ondelete="CASCADE"), nullable=False)
+    position = Column(Integer, nullable=False)
+    difficulty = Column(String(16), nullable=False, default="medium")
+    section = Column(String, nullable=True)
+    bank_id = Column(Integer, ForeignKey("question_bank.id"), nullable=True)
+
+    quiz_ref = relationship("Quiz", back_populates="questions")
+    bank = relationship("QuestionBank", lazy="joined")
+
+    __table_args__ = (
+        Index("ix_questions_quiz_position", "quiz_id", "position", unique=True),
+        Index("ix_questions_difficulty", "difficulty"),
+        Index("ix_questions_section", "section"),
+        Index("ix_questions_bank", "bank_id"),
+    )
+
+    @property
+    def question(self) -> str:
+        return self.bank.question if self.bank else ""
+
+    @property
+    def options(self) -> list:
+        return list(self.bank.options or []) if self.bank else []
+
+    @property
+    def answer(self) -> str:
+        return self.bank.answer if self.bank else ""
+
+    @property
+    def explanation(self):
+        return self.bank.explanation if self.bank else None
+
+    def to_dict(self) -> dict:
+        return {
+            "question": self.question,
+            "options": self.options,
+            "answer": self.answer,
+            "difficulty": self.difficulty,
+            "explanation": self.explanation,
+            "section": self.section,
+        }
+
+    def update_from_dict(self, data: dict, position: int, language: str = "en") -> None:
+        """
+        Point this position at the question in data. data["bank"] is the
+        entry chosen by question_bank.link_questions(); without one, a new
+        entry is made unless the text is unchanged - bank entries may be
+        shared, so they are never edited in place.
+        """
+        self.position = position
+        self.difficulty = data.get("difficulty") or "medium"
+        self.section = data.get("section") or "General"
+        bank = data.get("bank")
+        if bank is None and not (self.bank is not None and self.bank.same_as(data)):
+            bank = QuestionBank.from_dict(data, language)
+        if bank is not None:
+            self.bank = bank
+
+    def __repr__(self):
+        return f"<Question(quiz_id={self.quiz_id}, position={self.position})>"
+
+
+class QuestionBank(Base):
+    """
+    One distinct question, shared by every quiz that asks it.
+    
+    signature is the question's MinHash and the band keys in
+    question_bank_bands are what near-duplicate lookups search;
+    question_bank_entities tags entries with the entities they are about.
+    """
+    __tablename__ = "question_bank"
+
+    id = Column(Integer, primary_key=True)
+    language = Column(String(16), nullable=False, default="en")
+    question = Column(Text, nullable=False)
+    options = Column(JSON, nullable=False)
+    answer = Column(Text, nullable=False)
+    explanation = Column(Text, nullable=True)
+    signature = Column(LargeBinary, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    bands = relationship("QuestionBankBand", cascade="all, delete-orphan")
+    entities = relationship("QuestionBankEntity", cascade="all, delete-orphan")
+
+    @classmethod
+    def from_dict(cls, data: dict, language: str = "en") -> "QuestionBank":
+        return cls(
+            language=language,
+            question=data.get("question", ""),
+            options=list(data.get("options") or []),
+            answer=data.get("answer", ""),
+            explanation=data.get("explanation"),
+        )
+
+    def same_as(self, data: dict) -> bool:
+        return (
+            self.question == data.get("question", "")
+            and list(self.options or []) == list(data.get("options") or [])
+            and self.answer == data.get("answer", "")
+            and self.explanation == data.get("explanation")
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            "question": self.question,
+            "options": list(self.options or []),
+            "answer": self.answer,
+            "explanation": self.explanation,
+        }
+
+    def __repr__(self):
+        return f"<QuestionBank(id={self.id}, question='{self.question[:40]}')>"
+
+
+class QuestionBankBand(Base):
+    """LSH band key of a bank entry's signature"""
+    __tablename__ = "question_bank_bands"
+
+    # The primary key is the whole row; on SQLite skip the rowid copy of it
+    __table_args__ = {"sqlite_with_rowid": False}
+
+    band = Column(BigInteger, primary_key=True)
+    bank_id = Column(Integer, ForeignKey("question_bank.id", ondelete="CASCADE"), primary_key=True)
+
+
+class QuestionBankEntity(Base):
+    """An entity (normalized name) a bank entry is about"""
+    __tablename__ = "question_bank_entities"
+
+    entity = Column(String(255), primary_key=True)
+    bank_id = Column(Integer, ForeignKey("question_bank.id", ondelete="CASCADE"), primary_key=True)
+
+
+class QuizFacet(Base):
+    """
+    Searchable facet values for a quiz (difficulty, section, entity).
+    
+    One row per distinct (quiz, facet, value) so search can filter and count
+    facets with plain indexed SQL instead of opening every quiz's JSON.
+    Kept in sync by search.index_quiz().
+    """
+    __tablename__ = "quiz_facets"
+
+    id = Column(Integer, primary_key=True)
+    quiz_id = Column(Integer, ForeignKey("quizzes.id", ondelete="CASCADE"), nullable=False)
+    facet = Column(String(32), nullable=False)
+    value = Column(String, nullable=False)
+
+    __table_args__ = (
+        # Filtering: facet value -> quizzes
+        Index("ix_quiz_facets_facet_value", "facet", "value", "quiz_id"),
+        # Counting: quiz -> facet values, answered from the index alone
+        Index("ix_quiz_facets_quiz", "quiz_id", "facet", "value"),
+    )
+
+    def __repr__(self):
+        return f"<QuizFacet(quiz_id={self.quiz_id}, {self.facet}='{self.value}')>"
+
+
+class LLMCall(Base):
+    """
+    Token usage and latency of one LLM call.
+    
+    Written for every call, including the ones whose generation failed
+    (quiz_id is then NULL), so daily spend and the token budget see
+    everything that was billed.
+    """
+    __tablename__ = "llm_calls"
+
+    id = Column(Integer, primary_key=True)
+    quiz_id = Column(Integer, ForeignKey("quizzes.id", ondelete="SET NULL"), nullable=True)
+    stage = Column(String(32), nullable=False)
+    model = Column(String(64), nullable=False)
+    input_tokens = Column(Integer, nullable=False, default=0)
+    output_tokens = Column(Integer, nullable=False, default=0)
+    latency_ms = Column(Integer, nullable=False, default=0)
+    # Prompt size sent, and how much article text was cut to fit the budget
+    prompt_chars = Column(Integer, nullable=False, default=0)
+    truncated_chars = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        Index("ix_llm_calls_created_at", "created_at"),
+        Index("ix_llm_calls_quiz", "quiz_id"),
+    )
+
+    def __repr__(self):
+        return f"<LLMCall(quiz_id={self.quiz_id}, stage='{self.stage}', tokens={self.input_tokens}+{self.output_tokens})>"
+
+
+class QuizAttempt(Base):
+    """
+    One scored attempt at a quiz.
+    
+    Written in batches by attempts.AttemptWriter, so a row appears a moment
+    after POST /api/quiz/{id}/attempts returns. Analytics read the
+    aggregate tables below instead of scanning these.
+    """
+    __tablename__ = "quiz_attempts"
+
+    id = Column(Integer, primary_key=True)
+    quiz_id = Column(Integer, ForeignKey("quizzes.id", ondelete="CASCADE"), nullable=False)
+    score = Column(Integer, nullable=False)
+    total = Column(Integer, nullable=False)
+    # The submitted answer per question position (null = skipped)
+    answers = Column(JSON, nullable=False)
+    duration_ms = Column(Integer, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        Index("ix_quiz_attempts_quiz_created", "quiz_id", "created_at"),
+    )
+
+    def __repr__(self):
+        return f"<QuizAttempt(quiz_id={self.quiz_id}, score={self.score}/{self.total})>"
+
+
+class QuestionStats(Base):
+    """
+    Running answer counts for one question, bumped by each attempt batch.
+    Reset when a refresh rewrites the question.
+    """
+    __tablename__ = "question_stats"
+
+    question_id = Column(Integer, ForeignKey("questions.id", ondelete="CASCADE"), primary_key=True)
+    quiz_id = Column(Integer, ForeignKey("quizzes.id", ondelete="CASCADE"), nullable=False)
+    attempts = Column(Integer, nullable=False, default=0)
+    correct = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        Index("ix_question_stats_quiz", "quiz_id"),
+    )
+
+    def __repr__(self):
+        return f"<QuestionStats(question_id={self.question_id}, {self.correct}/{self.attempts})>"
+
+
+class QuizAttemptStats(Base):
+    """Running attempt count and score total for one quiz"""
+    __tablename__ = "quiz_attempt_stats"
+
+    quiz_id = Column(Integer, ForeignKey("quizzes.id", ondelete="CASCADE"), primary_key=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    score_total = Column(Integer, nullable=False, default=0)
+    question_total = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<QuizAttemptStats(quiz_id={self.quiz_id}, attempts={self.attempts})>"
+
+
+class ArchivedQuiz(Base):
+    """
+    A quiz moved out of the hot tables by maintenance.py because nobody
+    read it for ARCHIVE_UNREAD_DAYS. payload is the whole quiz - questions,
+    raw_html if it was still kept, attempt counts - as compressed JSON.
+    It keeps its id and URL, and is restored on the next read of either.
+    """
+    __tablename__ = "archived_quizzes"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    url = Column(String, unique=True, nullable=False)
+    language = Column(String(16), nullable=False)
+    title = Column(String, nullable=False)
+    encoding = Column(String(8), nullable=False)  # zstd or gzip
+    payload = Column(LargeBinary, nullable=False)
+    original_bytes = Column(Integer, nullable=False)
+    archived_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    def __repr__(self):
+        return f"<ArchivedQuiz(id={self.id}, title='{self.title}', {len(self.payload or b'')} bytes)>"
+
+
+class RateLimitHit(Base):
+    """
+    Requests let through for one client against one rate limit budget in
+    one clock minute, summed over all workers. Only written with
+    RATE_LIMIT_SHARED; see rate_limit.py.
+    """
+    __tablename__ = "rate_limit_hits"
+
+    # Unix time of the minute's start - first, so old windows are cheap to delete
+    window_start = Column(Integer, primary_key=True)
+    budget = Column(String(16), primary_key=True)
+    client = Column(String(64), primary_key=True)
+    hits = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<RateLimitHit({self.budget} {self.client} @{self.window_start}: {self.hits})>"
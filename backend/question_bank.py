@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""
+Cross-quiz question bank with near-duplicate detection.
+
+Overlapping articles (Alan Turing, Enigma machine, Bletchley Park) make the
+LLM write the same questions again and again. Question text, options,
+answer and explanation live once in question_bank; a quiz's questions rows
+only link to a bank entry, with the per-quiz position, difficulty and
+section.
+
+Near-duplicates are found with MinHash + LSH over the question and answer
+text:
+
+- Text is case-folded, stripped of punctuation and cut into character
+  5-grams, which works for languages without spaces too.
+- The signature is a one-permutation MinHash: each shingle is hashed once
+  and the minimum is kept in one of SIGNATURE_SIZE bins (empty bins borrow
+  from their neighbour). The share of equal bins estimates the Jaccard
+  similarity of the two shingle sets. Bins keep 16 bits, so a signature
+  is 64 bytes.
+- The signature is cut into BANDS bands of ROWS values. Each band is hashed,
+  together with the language and answer, to a key and stored in question_bank_bands, so the candidates for
+  a new question are one indexed IN (...) lookup, whatever the bank size.
+  Candidates at QUESTION_BANK_SIMILARITY or above, in the same language
+  and with the same answer, are reused instead of stored again.
+
+link_questions() does this for a whole quiz at save time. Bank entries are
+also tagged with the entities they mention (question_bank_entities), and
+banked_questions_for() offers the quiz prompt existing questions about the
+article's subject to reuse.
+
+Entries written without link_questions() (or before this module existed)
+have no signature; index them with:
+    python question_bank.py --reindex
+    python question_bank.py --stats
+"""
+import argparse
+import logging
+import os
+import re
+import struct
+import sys
+import zlib
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+# Add backend directory to path
+sys.path.insert(0, os.path.dirname(__file__))
+
+from sqlalchemy import bindparam, func, select, text
+from sqlalchemy.orm import Session
+
+from config import settings
+from metrics import QUESTION_BANK_LINKS, stage
+from models import Question, QuestionBank, QuestionBankBand, QuestionBankEntity
+from search import entity_names
+
+logger = logging.getLogger(__name__)
+
+SHINGLE_SIZE = 5
+SIGNATURE_SIZE = 32
+BANDS = 8
+ROWS = SIGNATURE_SIZE // BANDS  # candidates from ~0.6 similarity, 94% recall at 0.75
+
+# 16 bits per bin: two different minima agree by chance 1 in 65536 times,
+# which doesn't move the estimate, and the signature stays at 64 bytes
+_BIN_MASK = 0xFFFF
+_MASK64 = (1 << 64) - 1
+_SIGNATURE_FORMAT = f"<{SIGNATURE_SIZE}H"
+
+# Entity names shorter than this match too much text to be useful tags
+MIN_ENTITY_LENGTH = 3
+
+
+def normalize(text: str) -> str:
+    """Case-folded words, no punctuation"""
+    return " ".join(re.findall(r"\w+", (text or "").casefold()))
+
+
+def shingles(text: str) -> Set[str]:
+    text = normalize(text)
+    if len(text) <= SHINGLE_SIZE:
+        return {text} if text else set()
+    return {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+
+def _hash64(data: bytes) -> int:
+    """crc32, spread over 64 bits by a multiplicative mix - stable across processes and fast"""
+    return (zlib.crc32(data) * 0x9E3779B97F4A7C15) & _MASK64
+
+
+def signature(question: str, answer: str = "") -> Optional[Tuple[int, ...]]:
+    """One-permutation MinHash of the question and answer; None if there's no text"""
+    grams = shingles(f"{question} {answer}")
+    if not grams:
+        return None
+    bins: List[Optional[int]] = [None] * SIGNATURE_SIZE
+    for gram in grams:
+        h = _hash64(gram.encode("utf-8"))
+        slot, value = (h >> 32) % SIGNATURE_SIZE, h & 0xFFFFFFFF
+        if bins[slot] is None or value < bins[slot]:
+            bins[slot] = value
+    # Densify: an empty bin takes the next filled bin's value, mixed with
+    # the distance so that two empty bins don't look alike by accident
+    filled = [(i, v) for i, v in enumerate(bins) if v is not None]
+    out = []
+    for i, value in enumerate(bins):
+        if value is None:
+            j, source = next(((j, v) for j, v in filled if j > i), filled[0])
+            value = source * 0x9E3779B1 + (j - i) % SIGNATURE_SIZE
+        out.append(value & _BIN_MASK)
+    return tuple(out)
+
+
+def similarity(a: Sequence[int], b: Sequence[int]) -> float:
+    """Estimated Jaccard similarity of two signatures"""
+    return sum(x == y for x, y in zip(a, b)) / SIGNATURE_SIZE
+
+
+def pack_signature(sig: Sequence[int]) -> bytes:
+    return struct.pack(_SIGNATURE_FORMAT, *sig)
+
+
+def unpack_signature(data: bytes) -> Tuple[int, ...]:
+    return struct.unpack(_SIGNATURE_FORMAT, data)
+
+
+def band_keys(sig: Sequence[int], language: str, answer: str) -> List[int]:
+    """
+    One signed 32-bit key per band. Only questions in the same language with
+    the same answer can match, so those go into the key as well: questions
+    built the same way ("What year did ...") then don't pile up under the
+    same band as the bank grows. A chance collision only adds a candidate
+    that the signature comparison drops, and small keys keep the rows small.
+    """
+    scope = f"{language}\0{normalize(answer)}".encode("utf-8")
+    keys = []
+    for band in range(BANDS):
+        chunk = sig[band * ROWS:(band + 1) * ROWS]
+        key = zlib.crc32(scope, zlib.crc32(struct.pack(f"<B{ROWS}H", band, *chunk)))
+        keys.append(key - (1 << 32) if key >= 1 << 31 else key)
+    return keys
+
+
+_CANDIDATES = text(
+    "SELECT DISTINCT b.bank_id, q.language, q.answer, q.signature "
+    "FROM question_bank_bands b JOIN question_bank q ON q.id = b.bank_id "
+    "WHERE b.band IN :bands"
+).bindparams(bindparam("bands", expanding=True))
+
+
+def find_similar(conn, items: List[Tuple[Optional[Tuple[int, ...]], str, str]],
+                 threshold: Optional[float] = None) -> List[Optional[int]]:
+    """
+    For each (signature, language, answer), the id of the most similar
+    banked question at or above the threshold with the same answer, or
+    None. One query for the lot. Works on a Session or a Connection and
+    uses no ORM models, so migrations can call it too.
+    """
+    if threshold is None:
+        threshold = settings.QUESTION_BANK_SIMILARITY
+    keys = {key for sig, language, answer in items if sig for key in band_keys(sig, language, answer)}
+    if not keys:
+        return [None] * len(items)
+    candidates = [
+        (row[0], row[1], normalize(row[2]), unpack_signature(row[3]))
+        for row in conn.execute(_CANDIDATES, {"bands": sorted(keys)})
+        if row[3]
+    ]
+    matches = []
+    for sig, language, answer in items:
+        best, best_score = None, threshold
+        if sig:
+            answer = normalize(answer)
+            for bank_id, bank_language, bank_answer, bank_sig in candidates:
+                # Same wording but another answer is a different question
+                if bank_language != language or bank_answer != answer:
+                    continue
+                score = similarity(sig, bank_sig)
+                if score >= best_score:
+                    best, best_score = bank_id, score
+        matches.append(best)
+    return matches
+
+
+def entity_tags(text: str, title: str, entities: Iterable[str]) -> Set[str]:
+    """The article's subject, plus the extracted entities the text mentions"""
+    folded = normalize(text)
+    tags = {normalize(title)}
+    for entity in entities:
+        name = normalize(entity)
+        if len(name) >= MIN_ENTITY_LENGTH and f" {name} " in f" {folded} ":
+            tags.add(name)
+    return {tag[:255] for tag in tags if tag}
+
+
+def _new_entry(item: dict, language: str, sig, tags: Set[str]) -> QuestionBank:
+    entry = QuestionBank.from_dict(item, language)
+    if sig:
+        entry.signature = pack_signature(sig)
+        entry.bands = [QuestionBankBand(band=key) for key in set(band_keys(sig, language, entry.answer))]
+    entry.entities = [QuestionBankEntity(entity=tag) for tag in tags]
+    return entry
+
+
+def link_questions(db: Session, questions: List[dict], language: str, title: str,
+                   key_entities: Optional[Dict] = None) -> List[dict]:
+    """
+    Match a quiz's questions against the bank. Returns copies of the dicts
+    with "bank" set to the existing entry for near-duplicates, or to a new
+    (indexed, tagged) entry - Quiz.quiz links them instead of copying.
+    Near-duplicates within the same quiz share one entry too.
+    """
+    if not settings.QUESTION_BANK_ENABLED:
+        return questions
+    entities = entity_names(key_entities)
+    items = [q for q in questions if isinstance(q, dict)]
+    sigs = [signature(q.get("question", ""), q.get("answer", "")) for q in items]
+    with stage("bank_lookup"):
+        matches = find_similar(db, [(sig, language, q.get("answer", "")) for sig, q in zip(sigs, items)])
+        existing = {
+            entry.id: entry
+            for entry in db.query(QuestionBank).filter(QuestionBank.id.in_([m for m in matches if m]))
+        } if any(matches) else {}
+
+    linked, pending = [], []
+    for item, sig, match in zip(items, sigs, matches):
+        entry = existing.get(match) if match else None
+        if entry is None and sig:
+            answer = normalize(item.get("answer", ""))
+            threshold = settings.QUESTION_BANK_SIMILARITY
+            entry = next((e for s, a, e in pending if a == answer and similarity(sig, s) >= threshold), None)
+        if entry is None:
+            blob = f"{item.get('question', '')} {item.get('answer', '')}"
+            entry = _new_entry(item, language, sig, entity_tags(blob, title, entities))
+            db.add(entry)
+            if sig:
+                pending.append((sig, normalize(item.get("answer", "")), entry))
+            QUESTION_BANK_LINKS.inc(result="new")
+        else:
+            QUESTION_BANK_LINKS.inc(result="reused")
+        linked.append({**item, "bank": entry})
+    return linked
+
+
+def banked_questions_for(db: Session, title: str, language: str, limit: Optional[int] = None) -> List[dict]:
+    """Banked questions about an article's subject, newest first"""
+    if limit is None:
+        limit = settings.QUESTION_BANK_REUSE_MAX
+    if not settings.QUESTION_BANK_ENABLED or limit <= 0:
+        return []
+    entries = (
+        db.query(QuestionBank)
+        .join(QuestionBankEntity, QuestionBankEntity.bank_id == QuestionBank.id)
+        .filter(QuestionBankEntity.entity == normalize(title)[:255], QuestionBank.language == language)
+        .order_by(QuestionBank.id.desc())
+        .limit(limit)
+        .all()
+    )
+    return [entry.to_dict() for entry in entries]
+
+
+def reindex(db: Session, batch_size: int = 500) -> int:
+    """Give signatures and band keys to entries that don't have them yet"""
+    done = 0
+    last_id = 0
+    while True:
+        entries = (
+            db.query(QuestionBank)
+            .filter(QuestionBank.signature.is_(None), QuestionBank.id > last_id)
+            .order_by(QuestionBank.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not entries:
+            return done
+        for entry in entries:
+            sig = signature(entry.question, entry.answer)
+            if sig:
+                entry.signature = pack_signature(sig)
+                entry.bands = [QuestionBankBand(band=key)
+                               for key in set(band_keys(sig, entry.language, entry.answer))]
+            else:
+                entry.signature = b""
+        db.commit()
+        done += len(entries)
+        last_id = entries[-1].id
+
+
+def bank_stats(db: Session) -> Dict:
+    """How much the bank saves: linked questions vs. stored entries"""
+    questions = db.query(func.count(Question.id)).scalar() or 0
+    entries = db.query(func.count(QuestionBank.id)).scalar() or 0
+    shared = db.execute(select(func.count()).select_from(
+        select(Question.bank_id).group_by(Question.bank_id).having(func.count() > 1).subquery()
+    )).scalar() or 0
+    return {
+        "questions": questions,
+        "bank_entries": entries,
+        "shared_entries": shared,
+        "copies_saved": max(0, questions - entries),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the question bank")
+    parser.add_argument("--reindex", action="store_true", help="Index entries without a signature")
+    parser.add_argument("--stats", action="store_true", help="Show how many copies the bank saves")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    from database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        if args.reindex:
+            print(f"Indexed {reindex(db)} bank entries")
+        if args.stats or not args.reindex:
+            for key, value in bank_stats(db).items():
+                print(f"{key:>15}: {value}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""
+Validation of LLM-written quiz questions.
+
+Each question is checked against the QuizQuestion schema and the article
+it was written from, after fixing the slips that have one safe answer
+(answer in a different case than its option, difficulty in capitals,
+extra distractors next to the right answer). What is left over can't be
+fixed without the LLM: llm.py sends only those questions back in a small
+repair call and keeps the rest as they are.
+
+Problems are short codes (also the metric label); PROBLEMS has the
+wording used in the repair prompt. SOFT_PROBLEMS only flag a question
+unless the caller asks for strict checking.
+"""
+import re
+from typing import Dict, List, Optional, Set, Tuple
+
+from pydantic import ValidationError
+
+from schemas import QuizQuestion
+
+OPTION_COUNT = 4
+DIFFICULTIES = ("easy", "medium", "hard")
+
+# Share of an answer's words that must appear in the article
+MIN_ANSWER_SUPPORT = 0.5
+
+PROBLEMS = {
+    "not_an_object": "is not a JSON object",
+    "missing_question": "has no question text",
+    "option_count": f"needs exactly {OPTION_COUNT} distinct options",
+    "answer_not_in_options": "its answer is not one of the options",
+    "missing_explanation": "has no explanation",
+    "answer_not_in_article": "its answer is not supported by the article text",
+    "schema": "does not match the question schema",
+}
+
+# Article support is a word-overlap heuristic: a paraphrased or reformatted
+# answer ("1.5 million", "June 1944") fails it without being wrong
+SOFT_PROBLEMS = {"answer_not_in_article"}
+
+_WORD = re.compile(r"\w+")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def _words(text: str) -> List[str]:
+    return _WORD.findall(text.lower())
+
+
+def _significant(text: str) -> Set[str]:
+    """Words that say something - long ones and anything with a digit"""
+    return {w for w in _words(text) if len(w) >= 4 or any(c.isdigit() for c in w)}
+
+
+def _text(value) -> str:
+    return value.strip() if isinstance(value, str) else ""
+
+
+class ArticleText:
+    """An article's text, tokenized once for every question checked against it"""
+
+    def __init__(self, content: str, passage_chars: int = 400):
+        self.content = content or ""
+        self.words = set(_words(self.content))
+        self.passages = self._passages(passage_chars)
+
+    def _passages(self, size: int) -> List[str]:
+        passages, current = [], ""
+        for sentence in _SENTENCE_END.split(self.content):
+            if current and len(current) + len(sentence) > size:
+                passages.append(current)
+                current = ""
+            current = f"{current} {sentence}" if current else sentence
+        if current:
+            passages.append(current)
+        return passages
+
+    def supports(self, answer: str) -> bool:
+        wanted = _significant(answer)
+        if not wanted:
+            # Nothing to look for ("Yes", "1", single letters)
+            return True
+        return len(wanted & self.words) / len(wanted) >= MIN_ANSWER_SUPPORT
+
+    def evidence(self, questions: List[dict], limit: int) -> str:
+        """The passages that best match the questions, in article order, up to limit chars"""
+        if not questions or not self.passages:
+            return self.content[:limit]
+        budget = max(1, limit // len(questions))
+        picked: Set[int] = set()
+        for q in questions:
+            about = _significant(" ".join(
+                [_text(q.get("question")), _text(q.get("answer"))]
+                + [_text(o) for o in q.get("options") or [] if isinstance(o, str)]
+            )) if isinstance(q, dict) else set()
+            ranked = sorted(range(len(self.passages)),
+                            key=lambda i: -len(about & _significant(self.passages[i])))
+            used = 0
+            for i in ranked:
+                if used + len(self.passages[i]) > budget and used:
+                    break
+                picked.add(i)
+                used += len(self.passages[i])
+        text = " ... ".join(self.passages[i] for i in sorted(picked))
+        return text[:limit]
+
+
+def _fix_options(options: list, answer: str) -> Tuple[List[str], str]:
+    """Distinct non-empty options, the answer spelled like its option, extra distractors dropped"""
+    seen, distinct = set(), []
+    for option in options:
+        option = _text(option)
+        if option and option.lower() not in seen:
+            seen.add(option.lower())
+            distinct.append(option)
+    match = next((o for o in distinct if o.lower() == answer.lower()), None)
+    if match is None:
+        return distinct, answer
+    if len(distinct) > OPTION_COUNT:
+        others = [o for o in distinct if o is not match][:OPTION_COUNT - 1]
+        distinct = [o for o in distinct if o is match or o in others]
+    return distinct, match
+
+
+def check_question(q, article: ArticleText) -> Tuple[Optional[dict], List[str]]:
+    """
+    The question with the safe fixes applied, and its remaining problems
+    (empty when it is good to save). Not a dict gives (None, problems).
+    """
+    if not isinstance(q, dict):
+        return None, ["not_an_object"]
+
+    fixed = dict(q)
+    problems = []
+    fixed["question"] = _text(q.get("question"))
+    if not fixed["question"]:
+        problems.append("missing_question")
+
+    answer = _text(q.get("answer"))
+    options = q.get("options") if isinstance(q.get("options"), list) else []
+    fixed["options"], fixed["answer"] = _fix_options(options, answer)
+    if len(fixed["options"]) != OPTION_COUNT:
+        problems.append("option_count")
+    if not answer or fixed["answer"] not in fixed["options"]:
+        problems.append("answer_not_in_options")
+    elif not article.supports(fixed["answer"]):
+        problems.append("answer_not_in_article")
+
+    difficulty = _text(q.get("difficulty")).lower()
+    fixed["difficulty"] = difficulty if difficulty in DIFFICULTIES else "medium"
+    fixed["explanation"] = _text(q.get("explanation"))
+    if not fixed["explanation"]:
+        problems.append("missing_explanation")
+    fixed["section"] = _text(q.get("section")) or "General"
+
+    if not problems:
+        # Whatever else the response schema insists on
+        try:
+            QuizQuestion.model_validate(fixed)
+        except ValidationError:
+            problems.append("schema")
+    return fixed, problems
+
+
+def describe(problems: List[str]) -> str:
+    return "; ".join(PROBLEMS.get(p, p) for p in problems)
+
+
+def blocking(problems: List[str], strict: bool = False) -> List[str]:
+    """The problems that keep a question from being saved"""
+    return list(problems) if strict else [p for p in problems if p not in SOFT_PROBLEMS]
+
+
+def split_questions(questions: list, article: ArticleText, strict: bool = False
+                    ) -> Tuple[List[Optional[dict]], Dict[int, Tuple[dict, List[str]]], Dict[int, List[str]]]:
+    """
+    (the questions with valid ones fixed up and invalid ones as None,
+    {position: (invalid question, its problems)},
+    {position: soft problems of a question kept anyway})
+    """
+    kept: List[Optional[dict]] = []
+    invalid: Dict[int, Tuple[dict, List[str]]] = {}
+    flagged: Dict[int, List[str]] = {}
+    for position, q in enumerate(questions):
+        fixed, problems = check_question(q, article)
+        if blocking(problems, strict):
+            kept.append(None)
+            invalid[position] = (fixed if fixed is not None else {}, problems)
+        else:
+            kept.append(fixed)
+            if problems:
+                flagged[position] = problems
+    return kept, invalid, flagged
@@ -0,0 +1,349 @@
+"""
+Per-client rate limits on the endpoints that spend LLM tokens.
+
+Two budgets, each a token bucket per client - a rate per minute plus a
+burst:
+
+- generate: every POST /api/generate, checked by RateLimitMiddleware
+  before the request is even parsed. Most of these are answered from a
+  stored quiz, so the budget is generous.
+- cold: generations that miss the caches and go to Wikipedia and the LLM
+  (charged by the endpoint once it knows), and POST /api/quiz/{id}/refresh.
+  This is the one that protects the shared Gemini quota and threadpool.
+
+A client is the API key it sends in X-API-Key if that key is listed in
+RATE_LIMIT_API_KEYS, otherwise its IP address (IPv6 by /64, IPv4-mapped
+IPv6 as the IPv4 address). Unlisted keys are ignored - a new key per request would otherwise be a fresh
+budget per request. Behind a proxy set SERVER_FORWARDED_ALLOW_IPS so
+uvicorn takes the address from X-Forwarded-For.
+
+Buckets live in memory per worker, so checking one is a dict lookup and
+some arithmetic under a lock. With several workers each has its own
+buckets and a client gets up to N times the rate. RATE_LIMIT_SHARED adds
+a count per client, budget and clock minute in the rate_limit_hits table:
+a background thread adds the worker's hits every RATE_LIMIT_SYNC_SECONDS
+and reads back which clients are over rate + burst for the minute across
+all workers; those are refused until the minute ends. The database is
+never on the request path, so the shared limit can be overshot by what
+gets through in one sync interval.
+"""
+import atexit
+import contextvars
+import hashlib
+import ipaddress
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from sqlalchemy import and_, delete, or_, select
+from sqlalchemy.exc import SQLAlchemyError
+from starlette.responses import JSONResponse
+
+from config import settings
+from metrics import RATE_LIMIT_CLIENTS, RATE_LIMITED, stage
+from models import RateLimitHit
+
+logger = logging.getLogger(__name__)
+
+WINDOW_SECONDS = 60
+
+# The client of the current request, set by RateLimitMiddleware on the
+# limited endpoints so the endpoint can charge further budgets
+client_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("rate_limit_client", default=None)
+
+
+class RateLimited(RuntimeError):
+    """A client has used up one of its budgets"""
+
+    def __init__(self, budget: str, client: str, retry_after: float):
+        super().__init__(f"Rate limit '{budget}' reached for {client}")
+        self.budget = budget
+        self.client = client
+        self.retry_after = max(1, math.ceil(retry_after))
+
+    @property
+    def detail(self) -> str:
+        if self.budget == "cold":
+            what = "new quizzes"
+        else:
+            what = "quiz requests"
+        return f"Too many {what} from this client. Please try again in {self.retry_after} seconds."
+
+
+class Budget(NamedTuple):
+    name: str
+    per_minute: float
+    burst: int
+
+    @property
+    def rate(self) -> float:
+        """Tokens added per second"""
+        return self.per_minute / 60
+
+    @property
+    def capacity(self) -> int:
+        return max(1, self.burst)
+
+    @property
+    def window_limit(self) -> int:
+        """Hits allowed per clock minute across workers - what one worker's bucket lets through"""
+        return math.ceil(self.per_minute) + self.capacity
+
+
+def _add_hits(conn, window: int, hits: Dict[Tuple[str, str], int]) -> None:
+    """Add hits to the stored counts of the window, inserting missing rows"""
+    table = RateLimitHit.__table__
+    # Same order in every worker, so concurrent syncs can't deadlock
+    rows = [{"window_start": window, "budget": budget, "client": client, "hits": count}
+            for (budget, client), count in sorted(hits.items())]
+    dialect = conn.dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        stmt = insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["window_start", "budget", "client"],
+            set_={"hits": table.c.hits + stmt.excluded.hits},
+        )
+        conn.execute(stmt, rows)
+        return
+    # Other databases: update, then insert what wasn't there
+    for row in rows:
+        updated = conn.execute(
+            table.update()
+            .where(table.c.window_start == window, table.c.budget == row["budget"],
+                   table.c.client == row["client"])
+            .values(hits=table.c.hits + row["hits"])
+        )
+        if updated.rowcount == 0:
+            conn.execute(table.insert(), [row])
+
+
+class RateLimiter:
+    """
+    Token buckets per (budget, client), plus the shared per-minute counts
+    when shared is on. The sync thread starts with the first hit.
+    """
+
+    def __init__(self, budgets: Dict[str, Budget], max_clients: int, api_keys=(),
+                 enabled: bool = True, shared: bool = False, sync_seconds: float = 1.0, bind=None):
+        self.budgets = budgets
+        self.max_clients = max(1, max_clients)
+        self.enabled = enabled
+        self.shared = shared
+        self.sync_seconds = sync_seconds
+        self._bind = bind
+        # Clients are named by a digest of their key, so keys don't end up in the database
+        self.api_keys = {key: "key:" + hashlib.sha256(key.encode("utf-8")).hexdigest()[:16] for key in api_keys}
+        # (budget, client) -> [tokens, monotonic time of the last refill]
+        self._buckets: "OrderedDict[Tuple[str, str], list]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Shared mode: hits not synced yet, and clients refused until (monotonic)
+        self._unsynced: Dict[Tuple[str, str], int] = defaultdict(int)
+        self._blocked: Dict[Tuple[str, str], float] = {}
+        self._pruned_window = 0
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._stop = threading.Event()
+
+    @property
+    def size(self) -> int:
+        return len(self._buckets)
+
+    def client_for(self, scope) -> str:
+        """The client an ASGI request is counted against"""
+        if self.api_keys:
+            for name, value in scope["headers"]:
+                if name == b"x-api-key":
+                    client = self.api_keys.get(value.decode("latin-1"))
+                    if client is not None:
+                        return client
+                    break
+        address = scope.get("client")
+        if not address:
+            return "ip:unknown"
+        host = address[0]
+        try:
+            ip = ipaddress.ip_address(host)
+        except ValueError:
+            return f"ip:{host}"
+        if ip.version == 6:
+            # IPv4 clients of a dual-stack (::) bind arrive as ::ffff:a.b.c.d
+            if ip.ipv4_mapped is not None:
+                return f"ip:{ip.ipv4_mapped}"
+            # One IPv6 subscriber usually has a whole /64 to pick from
+            return f"ip:{ipaddress.IPv6Network(f'{ip}/64', strict=False)}"
+        return f"ip:{ip}"
+
+    def hit(self, budget_name: str, client: Optional[str] = None) -> None:
+        """
+        Take one request from the client's budget (the current request's
+        client by default).
+
+        Raises:
+            RateLimited: If the budget is used up
+        """
+        budget = self.budgets.get(budget_name)
+        if not self.enabled or budget is None or budget.per_minute <= 0:
+            return
+        client = client or client_var.get()
+        if client is None:
+            return
+        key = (budget_name, client)
+        now = time.monotonic()
+        wait = 0.0
+        with self._lock:
+            until = self._blocked.get(key) if self.shared else None
+            if until is not None and until > now:
+                wait = until - now
+            else:
+                bucket = self._buckets.get(key)
+                if bucket is None:
+                    bucket = self._buckets[key] = [float(budget.capacity), now]
+                    if len(self._buckets) > self.max_clients:
+                        self._buckets.popitem(last=False)
+                else:
+                    self._buckets.move_to_end(key)
+                    bucket[0] = min(budget.capacity, bucket[0] + (now - bucket[1]) * budget.rate)
+                    bucket[1] = now
+                if bucket[0] >= 1:
+                    bucket[0] -= 1
+                    if self.shared:
+                        self._unsynced[key] += 1
+                else:
+                    wait = (1 - bucket[0]) / budget.rate
+        if self.shared:
+            self._ensure_started()
+        if wait:
+            RATE_LIMITED.inc(budget=budget_name)
+            raise RateLimited(budget_name, client, wait)
+
+    def reset(self) -> None:
+        """Forget every bucket and block (tests and benchmarks)"""
+        with self._lock:
+            self._buckets.clear()
+            self._unsynced.clear()
+            self._blocked.clear()
+
+    def sync(self) -> None:
+        """Add this worker's hits to the shared counts and pick up who is over the limit"""
+        with self._lock:
+            hits, self._unsynced = self._unsynced, defaultdict(int)
+        if self._bind is None:
+            from database import engine
+            self._bind = engine
+        limits = [and_(RateLimitHit.budget == budget.name, RateLimitHit.hits >= budget.window_limit)
+                  for budget in self.budgets.values() if budget.per_minute > 0]
+        if not limits:
+            return
+        wall = time.time()
+        window = int(wall // WINDOW_SECONDS) * WINDOW_SECONDS
+        try:
+            with stage("rate_limit_sync"):
+                with self._bind.begin() as conn:
+                    if hits:
+                        _add_hits(conn, window, hits)
+                    blocked = conn.execute(
+                        select(RateLimitHit.budget, RateLimitHit.client)
+                        .where(RateLimitHit.window_start == window, or_(*limits))
+                    ).all()
+                    if window != self._pruned_window:
+                        conn.execute(delete(RateLimitHit).where(RateLimitHit.window_start < window))
+                        self._pruned_window = window
+        except SQLAlchemyError as e:
+            # Counts are best effort - the local buckets still apply
+            logger.error(f"Failed to sync rate limit counts ({len(hits)} clients): {e}")
+            return
+        until = time.monotonic() + (window + WINDOW_SECONDS - wall)
+        with self._lock:
+            self._blocked = {(budget, client): until for budget, client in blocked}
+
+    def shutdown(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            self._stop.set()
+            self._thread.join(timeout=10)
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                thread = threading.Thread(target=self._run, name="rate-limit-sync", daemon=True)
+                thread.start()
+                atexit.register(self.shutdown)
+                self._thread = thread
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.sync_seconds):
+            self.sync()
+        # Hand the last hits over for the other workers
+        self.sync()
+
+
+def budget_for(method: str, path: str) -> Optional[str]:
+    """The budget a request is charged to on arrival, if any"""
+    if method != "POST":
+        return None
+    if path == "/api/generate":
+        return "generate"
+    if path.startswith("/api/quiz/") and path.endswith("/refresh"):
+        return "cold"
+    return None
+
+
+class RateLimitMiddleware:
+    """
+    ASGI middleware that charges requests to the limited endpoints against
+    the client's budget, answering 429 with Retry-After once it is used up.
+    Other requests pass straight through.
+    """
+
+    def __init__(self, app, limiter: Optional[RateLimiter] = None):
+        self.app = app
+        self.limiter = limiter or rate_limiter
+
+    async def __call__(self, scope, receive, send):
+        budget = None
+        if scope["type"] == "http" and self.limiter.enabled:
+            budget = budget_for(scope["method"], scope["path"])
+        if budget is None:
+            await self.app(scope, receive, send)
+            return
+
+        client = self.limiter.client_for(scope)
+        try:
+            self.limiter.hit(budget, client)
+        except RateLimited as e:
+            logger.debug(str(e))
+            response = JSONResponse(
+                status_code=429,
+                content={"detail": e.detail},
+                headers={"Retry-After": str(e.retry_after)},
+            )
+            await response(scope, receive, send)
+            return
+
+        token = client_var.set(client)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            client_var.reset(token)
+
+
+rate_limiter = RateLimiter(
+    {
+        "generate": Budget("generate", settings.RATE_LIMIT_GENERATE_PER_MINUTE, settings.RATE_LIMIT_GENERATE_BURST),
+        "cold": Budget("cold", settings.RATE_LIMIT_COLD_PER_MINUTE, settings.RATE_LIMIT_COLD_BURST),
+    },
+    settings.RATE_LIMIT_MAX_CLIENTS,
+    api_keys=settings.rate_limit_api_keys,
+    enabled=settings.RATE_LIMIT_ENABLED,
+    shared=settings.RATE_LIMIT_SHARED,
+    sync_seconds=settings.RATE_LIMIT_SYNC_SECONDS,
+)
+RATE_LIMIT_CLIENTS.set_function(lambda: rate_limiter.size)
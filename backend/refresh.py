@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+Revision-aware refresh of stale quizzes.
+
+Quizzes are cached by URL forever, so once the Wikipedia article moves on
+the quiz slowly goes out of date. Instead of deleting and regenerating the
+whole thing, this job:
+
+1. Asks the MediaWiki API for the latest revision of many articles at once
+   (one cheap request per 50 titles, no page downloads)
+2. Re-scrapes only the articles whose revision moved
+3. Hashes each section and regenerates just the questions whose section
+   text actually changed - everything else is kept as-is
+
+Run it from cron or after a deploy:
+    python refresh.py --limit 200
+"""
+import argparse
+import hashlib
+import logging
+import os
+import sys
+from collections import defaultdict, deque
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import requests
+
+# Add backend directory to path
+sys.path.insert(0, os.path.dirname(__file__))
+
+from sqlalchemy.orm import Session
+
+from models import Quiz
+from adaptive import question_indexes
+from attempts import answer_keys, reset_question_stats
+from cache import quiz_cache
+from languages import canonicalize_url
+from metrics import stage
+from question_bank import link_questions
+from scraper import WikipediaScraper
+from search import index_quiz
+from usage import TokenBudgetExceeded, check_budget, clear_usage, collect_usage, save_usage
+
+logger = logging.getLogger(__name__)
+
+# MediaWiki caps plain clients at 50 titles per query
+REVISION_BATCH_SIZE = 50
+
+# Questions that don't name a known section belong to the article lead
+DEFAULT_SECTION = "General"
+
+
+def hash_sections(section_content: Dict[str, str]) -> Dict[str, str]:
+    """Short content hash per section - whitespace differences don't count"""
+    hashes = {}
+    for section, text in (section_content or {}).items():
+        normalized = " ".join(text.split())
+        hashes[section] = hashlib.sha256(normalized.encode("utf-8")).hexdigest()[:16]
+    return hashes
+
+
+def _split_url(url: str) -> Tuple[str, str]:
+    """
+    Turn an article URL into (api host, article title) - the host of its
+    language edition. Raises ValueError for non-article URLs.
+    """
+    article = canonicalize_url(url)
+    return article.api_host, article.title.replace("_", " ")
+
+
+def fetch_latest_revisions(urls: Iterable[str], timeout: int = 10) -> Dict[str, int]:
+    """
+    Look up the current revision id for each article URL.
+
+    Batches titles per Wikipedia host so hundreds of quizzes cost only a
+    handful of small API calls. URLs whose article is missing (or whose
+    batch failed) are left out of the result.
+    """
+    by_host: Dict[str, Dict[str, List[str]]] = defaultdict(lambda: defaultdict(list))
+    for url in urls:
+        try:
+            host, title = _split_url(url)
+        except ValueError as e:
+            logger.warning(f"Skipping revision lookup for {url}: {e}")
+            continue
+        by_host[host][title].append(url)
+
+    headers = WikipediaScraper().headers
+    revisions: Dict[str, int] = {}
+
+    for host, titles in by_host.items():
+        title_list = list(titles)
+        for start in range(0, len(title_list), REVISION_BATCH_SIZE):
+            batch = title_list[start:start + REVISION_BATCH_SIZE]
+            try:
+                response = requests.get(
+                    f"https://{host}/w/api.php",
+                    params={
+                        "action": "query",
+                        "prop": "info",
+                        "redirects": 1,
+                        "titles": "|".join(batch),
+                        "format": "json",
+                        "formatversion": 2,
+                    },
+                    headers=headers,
+                    timeout=timeout,
+                )
+                response.raise_for_status()
+                data = response.json().get("query", {})
+            except (requests.exceptions.RequestException, ValueError) as e:
+                logger.warning(f"Revision lookup failed for {len(batch)} titles on {host}: {e}")
+                continue
+
+            # Follow title normalization and redirects back to what we asked for
+            renamed = {}
+            for mapping in data.get("normalized", []) + data.get("redirects", []):
+                renamed[mapping["from"]] = mapping["to"]
+
+            latest = {
+                page["title"]: page["lastrevid"]
+                for page in data.get("pages", [])
+                if not page.get("missing") and "lastrevid" in page
+            }
+
+            for title in batch:
+                resolved = title
+                # normalized then redirect - at most two hops
+                for _ in range(2):
+                    resolved = renamed.get(resolved, resolved)
+                if resolved in latest:
+                    for url in titles[title]:
+                        revisions[url] = latest[resolved]
+
+    return revisions
+
+
+def plan_refresh(questions: List[dict], old_hashes: Dict[str, str],
+                 new_hashes: Dict[str, str]) -> Tuple[List[Optional[dict]], Dict[str, int]]:
+    """
+    Decide which questions survive an article update.
+
+    Returns the question list with stale questions replaced by None (so the
+    original order can be restored later), and how many new questions each
+    changed section needs.
+    """
+    changed = {s for s in set(old_hashes) | set(new_hashes) if old_hashes.get(s) != new_hashes.get(s)}
+    # Sections that still exist and have new content can absorb the
+    # questions of sections that were removed from the article
+    targets = [s for s in new_hashes if s in changed] or list(new_hashes)[:1] or [DEFAULT_SECTION]
+
+    kept: List[Optional[dict]] = []
+    counts: Dict[str, int] = defaultdict(int)
+    orphans = 0
+    for q in questions:
+        section = q.get("section") or DEFAULT_SECTION
+        if section not in old_hashes:
+            section = DEFAULT_SECTION
+        if section not in changed:
+            kept.append(q)
+            continue
+        kept.append(None)
+        if section in new_hashes:
+            counts[section] += 1
+        else:
+            orphans += 1
+
+    for i in range(orphans):
+        counts[targets[i % len(targets)]] += 1
+
+    return kept, dict(counts)
+
+
+def merge_questions(questions: List[dict], kept: List[Optional[dict]],
+                    replacements: List[dict]) -> List[dict]:
+    """
+    Slot regenerated questions back into the gaps left by stale ones. When
+    the LLM returns too few, the remaining gaps keep their stale question,
+    so a refresh never makes the quiz shorter.
+    """
+    pending = deque(replacements)
+    merged = []
+    for old, q in zip(questions, kept):
+        if q is not None:
+            merged.append(q)
+        elif pending:
+            merged.append(pending.popleft())
+        else:
+            merged.append(old)
+    # The LLM occasionally returns more than we asked for - drop the extras
+    return merged
+
+
+def refresh_quiz(db: Session, quiz: Quiz, scraped_data: Optional[Dict] = None) -> bool:
+    """
+    Bring a single quiz up to date with its article.
+
+    Returns True if the quiz was modified. Raises the same errors as the
+    scraper and LLM layers so callers can map them to HTTP errors.
+    """
+    with collect_usage() as calls:
+        try:
+            return _apply_refresh(db, quiz, scraped_data)
+        except Exception:
+            if calls:
+                # Failed after the LLM was already billed - keep the record
+                db.rollback()
+                save_usage(db, calls=calls)
+                db.commit()
+            raise
+
+
+def _apply_refresh(db: Session, quiz: Quiz, scraped_data: Optional[Dict]) -> bool:
+    from llm import regenerate_questions_for_sections
+
+    if scraped_data is None:
+        scraped_data = WikipediaScraper().scrape(quiz.url)
+
+    new_revision = scraped_data.get("revision_id")
+    if new_revision is not None and quiz.revision_id == new_revision:
+        return False
+
+    new_hashes = hash_sections(scraped_data.get("section_content", {}))
+    old_hashes = quiz.section_hashes or {}
+
+    if not old_hashes:
+        # Quizzes from before revision tracking: we can't tell which
+        # questions are stale, so just record a baseline for next time
+        logger.info(f"Recording revision baseline for quiz {quiz.id}: {quiz.title}")
+        kept_questions = list(quiz.quiz)
+    else:
+        kept, counts = plan_refresh(list(quiz.quiz), old_hashes, new_hashes)
+        if counts:
+            logger.info(f"Regenerating {sum(counts.values())} of {len(kept)} questions for quiz {quiz.id}: {quiz.title}")
+            replacements = regenerate_questions_for_sections(
+                title=scraped_data["title"],
+                section_content=scraped_data.get("section_content", {}),
+                counts=counts,
+                language=scraped_data.get("language", quiz.language),
+            )
+            wanted = sum(counts.values())
+            if len(replacements) < wanted:
+                logger.warning(f"Got {len(replacements)} of {wanted} new questions for quiz {quiz.id}, "
+                               f"keeping {wanted - len(replacements)} stale question(s)")
+            kept_questions = merge_questions(list(quiz.quiz), kept, replacements)
+        else:
+            kept_questions = [q for q in kept if q is not None]
+
+    # Unchanged questions find their own bank entry again
+    kept_questions = link_questions(db, kept_questions, quiz.language,
+                                    scraped_data["title"], quiz.key_entities)
+    # Rows are updated in place by position, so a rewritten question keeps
+    # its id - its answer counts belong to the old text and are reset
+    before = {q.id: (q.question, q.answer) for q in quiz.questions}
+    # Assign new objects so SQLAlchemy notices the JSON columns changed
+    quiz.quiz = kept_questions
+    reset_question_stats(db, [
+        q.id for q in quiz.questions
+        if q.id in before and before[q.id] != (q.question, q.answer)
+    ])
+    quiz.title = scraped_data["title"]
+    quiz.summary = scraped_data["summary"]
+    quiz.sections = scraped_data["sections"]
+    quiz.raw_html = scraped_data.get("raw_html")
+    quiz.revision_id = new_revision
+    quiz.section_hashes = new_hashes
+    save_usage(db, quiz.id)
+    with stage("db_write"):
+        index_quiz(db, quiz, commit=False)
+        db.commit()
+        clear_usage()
+        db.refresh(quiz)
+    quiz_cache.invalidate(quiz.id, quiz.url)
+    answer_keys.forget(quiz.id)
+    question_indexes.forget(quiz.id)
+    return True
+
+
+def refresh_stale_quizzes(db: Session, limit: Optional[int] = None) -> Dict[str, int]:
+    """
+    Check every stored quiz against Wikipedia and refresh the stale ones.
+    Returns counters for reporting.
+    """
+    query = db.query(Quiz).order_by(Quiz.id)
+    if limit:
+        query = query.limit(limit)
+    quizzes = query.all()
+
+    stats = {"checked": len(quizzes), "stale": 0, "refreshed": 0, "failed": 0}
+    latest = fetch_latest_revisions(q.url for q in quizzes)
+
+    for quiz in quizzes:
+        revision = latest.get(quiz.url)
+        if revision is None or revision == quiz.revision_id:
+            continue
+        stats["stale"] += 1
+        try:
+            check_budget(db)
+        except TokenBudgetExceeded as e:
+            logger.warning(f"{e} - stopping, the rest waits for the next run")
+            break
+        try:
+            if refresh_quiz(db, quiz):
+                stats["refreshed"] += 1
+        except Exception as e:
+            db.rollback()
+            stats["failed"] += 1
+            logger.error(f"Failed to refresh quiz {quiz.id} ({quiz.url}): {e}")
+
+    return stats
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Refresh quizzes whose Wikipedia article changed")
+    parser.add_argument("--limit", type=int, default=None, help="Only check the first N quizzes")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        stats = refresh_stale_quizzes(db, limit=args.limit)
+    finally:
+        db.close()
+
+    print(f"Checked {stats['checked']} quizzes: {stats['stale']} stale, "
+          f"{stats['refreshed']} refreshed, {stats['failed']} failed")
@@ -39,6 +39,7 @@ class QuizResponse(BaseModel):
     """Response schema for quiz data."""
     id: int
     url: str
+    language: str = "en"
     title: str
     summary: str
     key_entities: Optional[KeyEntities] = None
@@ -55,6 +56,7 @@ class QuizHistoryItem(BaseModel):
     """Schema for quiz history list item."""
     id: int
     url: str
+    language: str = "en"
     title: str
     created_at: Optional[datetime] = None
     
@@ -62,6 +64,89 @@ class QuizHistoryItem(BaseModel):
         from_attributes = True
 
 
+class SearchResult(BaseModel):
+    """Schema for a single search hit."""
+    id: int
+    url: str
+    title: str
+    summary: str
+    score: float = 0.0
+    created_at: Optional[datetime] = None
+
+
+class FacetCount(BaseModel):
+    """How many matching quizzes share a facet value."""
+    value: str
+    count: int
+
+
+class SearchResponse(BaseModel):
+    """Response schema for quiz search."""
+    total: int
+    page: int
+    page_size: int
+    results: List[SearchResult]
+    facets: Dict[str, List[FacetCount]]
+
+
+class AttemptSubmit(BaseModel):
+    """Answers to a quiz, one per question in order (null = skipped)."""
+    answers: List[Optional[str]] = Field(..., max_length=100)
+    duration_ms: Optional[int] = Field(None, ge=0)
+
+
+class AttemptQuestionResult(BaseModel):
+    """How one answer was scored."""
+    position: int
+    correct: bool
+    answer: str
+
+
+class AttemptResult(BaseModel):
+    """Score of a submitted attempt."""
+    quiz_id: int
+    score: int
+    total: int
+    results: List[AttemptQuestionResult]
+
+
+class QuestionStatsItem(BaseModel):
+    """Answer counts for one question."""
+    position: int
+    question: str
+    difficulty: str
+    attempts: int
+    correct: int
+    correct_rate: Optional[float] = None
+
+
+class DifficultyStats(BaseModel):
+    """Answer counts for all questions of one difficulty."""
+    attempts: int
+    correct: int
+    correct_rate: Optional[float] = None
+
+
+class QuizAttemptStatsResponse(BaseModel):
+    """Aggregated attempts for a quiz."""
+    quiz_id: int
+    attempts: int
+    mean_score: Optional[float] = None
+    questions: List[QuestionStatsItem]
+    difficulty: Dict[str, DifficultyStats]
+
+
+class NextQuestionResponse(BaseModel):
+    """The next question of an adaptive session (question is null when done)."""
+    quiz_id: int
+    position: Optional[int] = None
+    level: str
+    remaining: int
+    question: Optional[QuizQuestion] = None
+    attempts: int = 0
+    correct_rate: Optional[float] = None
+
+
 class ErrorResponse(BaseModel):
     """Schema for error responses."""
     detail: str
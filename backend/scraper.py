@@ -1,21 +1,104 @@
 """
 Wikipedia scraper using BeautifulSoup
 No API calls - just good old HTML parsing
+
+Works on every language edition; what counts as boilerplate per language
+lives in languages.py.
+
+Pages are streamed rather than read whole. ArticleEndScanner watches the
+chunks as they arrive and reading stops where the article body ends -
+before the navboxes, categories, footer and trailing scripts - or at
+SCRAPE_MAX_BYTES for the odd giant list article. Only that prefix is
+decoded, parsed and (with SCRAPE_KEEP_RAW_HTML) stored.
 """
+import codecs
 import requests
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
 from typing import Dict, List, Optional
 import re
 import logging
 
+from config import settings
+from languages import PROFILES, ArticleRef, LanguageProfile, canonicalize_url, profile_for
+from metrics import SCRAPE_STOPS, stage
+
 logger = logging.getLogger(__name__)
 
+_DIV_TAG = re.compile(r"<(/?)div\b([^>]*)>", re.IGNORECASE)
+_CLASS_ATTR = re.compile(r"""\bclass\s*=\s*["']([^"']*)["']""", re.IGNORECASE)
+_CONTENT_ROOT_ID = re.compile(r"""\bid\s*=\s*["']mw-content-text["']""", re.IGNORECASE)
+
+
+def _article_part(name: str, attrs: Dict) -> bool:
+    """The elements parse() builds a tree for: the title heading and the content root"""
+    if name == "h1":
+        return True
+    if name != "div":
+        return False
+    classes = attrs.get("class") or ""
+    if isinstance(classes, str):
+        classes = classes.split()
+    return attrs.get("id") == "mw-content-text" or "mw-parser-output" in classes
+
+
+# Head, menus and footer are skipped while parsing, not built and then ignored
+_ARTICLE_PARTS = SoupStrainer(_article_part)
+
+
+class ArticleEndScanner:
+    """
+    Finds where the article ends in a page fed a chunk at a time: at the
+    close of div#mw-content-text, or at the first navbox directly inside
+    the parser output, whichever comes first. Only <div> tags are counted -
+    MediaWiki always closes those - so a chunk costs a regex scan, not a
+    parse. Tags cut in two by a chunk boundary are carried to the next one.
+    """
+
+    def __init__(self):
+        self.reason: Optional[str] = None
+        self._carry = ""
+        self._seen = 0
+        # One entry per open div inside the content root: is it a parser output?
+        self._stack: Optional[List[bool]] = None
+
+    def feed(self, chunk: str) -> Optional[int]:
+        """Offset in the page where the article ends, once a chunk reaches it"""
+        data = self._carry + chunk
+        base = self._seen - len(self._carry)
+        self._seen += len(chunk)
+        scanned = 0
+        for match in _DIV_TAG.finditer(data):
+            scanned = match.end()
+            closing, attrs = match.groups()
+            if self._stack is None:
+                if not closing and _CONTENT_ROOT_ID.search(attrs):
+                    self._stack = [False]
+                continue
+            if closing:
+                self._stack.pop()
+                if not self._stack:
+                    self.reason = "article_end"
+                    return base + match.end()
+                continue
+            found = _CLASS_ATTR.search(attrs)
+            classes = found.group(1).split() if found else ()
+            if self._stack[-1] and "navbox" in classes:
+                self.reason = "navbox"
+                return base + match.start()
+            self._stack.append("mw-parser-output" in classes)
+        tag_start = data.rfind("<", scanned)
+        self._carry = data[tag_start:] if tag_start != -1 and ">" not in data[tag_start:] else ""
+        return None
+
 
 class WikipediaScraper:
     """Handles scraping Wikipedia articles"""
     
-    def __init__(self, timeout: int = 10):
+    def __init__(self, timeout: int = 10, max_bytes: Optional[int] = None,
+                 keep_raw_html: Optional[bool] = None):
         self.timeout = timeout
+        self.max_bytes = settings.SCRAPE_MAX_BYTES if max_bytes is None else max_bytes
+        self.keep_raw_html = settings.SCRAPE_KEEP_RAW_HTML if keep_raw_html is None else keep_raw_html
         # Pretend to be a browser so Wikipedia doesn't block us
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
@@ -26,11 +109,16 @@ class WikipediaScraper:
         Scrape a Wikipedia article and pull out the good stuff.
         
         Returns a dict with:
+        - url: Canonical article URL
+        - language: Wikipedia language edition ("en", "de", ...)
         - title: Article title
         - summary: First few paragraphs
         - sections: All the section headings
         - full_content: Complete article text
-        - raw_html: Original HTML (just in case we need it later)
+        - section_content: Text of each section, keyed by heading ("General" for the lead)
+        - revision_id: Wikipedia revision the page was rendered from (if found)
+        - raw_html: Original HTML up to the end of the article (just in case
+          we need it later), or None without SCRAPE_KEEP_RAW_HTML
         
         Raises:
             ValueError: If URL is invalid
@@ -43,14 +131,18 @@ class WikipediaScraper:
         if not url or not url.strip():
             raise ValueError("URL cannot be empty")
             
-        if not self._is_valid_wikipedia_url(url):
-            raise ValueError("Invalid Wikipedia URL. Must be a Wikipedia article URL (e.g., https://en.wikipedia.org/wiki/Article_Name)")
+        try:
+            article = canonicalize_url(url)
+        except ValueError as e:
+            raise ValueError(f"Invalid Wikipedia URL ({e}). Must be a Wikipedia article URL "
+                             f"(e.g., https://en.wikipedia.org/wiki/Article_Name)")
+        url = article.url
         
         try:
             # Grab the page
             logger.info(f"Fetching Wikipedia page: {url}")
-            response = requests.get(url, headers=self.headers, timeout=self.timeout)
-            response.raise_for_status()
+            with stage("scrape_fetch"):
+                html = self._fetch(url)
             
         except requests.exceptions.Timeout:
             logger.error(f"Timeout fetching {url}")
@@ -70,42 +162,118 @@ class WikipediaScraper:
             logger.error(f"Request error fetching {url}: {e}")
             raise
         
+        return self.parse(html, article)
+    
+    def _fetch(self, url: str) -> str:
+        """
+        Stream the page and return its HTML up to the end of the article.
+        The rest is never downloaded: the connection is closed as soon as
+        the scanner has seen the end, or after max_bytes.
+        """
+        with requests.get(url, headers=self.headers, timeout=self.timeout, stream=True) as response:
+            response.raise_for_status()
+            decoder = codecs.getincrementaldecoder(response.encoding or "utf-8")(errors="replace")
+            scanner = ArticleEndScanner()
+            parts: List[str] = []
+            read = 0
+            end = None
+            reason = "page_end"
+            for chunk in response.iter_content(chunk_size=settings.SCRAPE_CHUNK_BYTES):
+                read += len(chunk)
+                text = decoder.decode(chunk)
+                parts.append(text)
+                end = scanner.feed(text)
+                if end is not None:
+                    reason = scanner.reason
+                    break
+                if self.max_bytes and read >= self.max_bytes:
+                    reason = "max_bytes"
+                    logger.warning(f"Stopped reading {url} at {read:,} bytes (SCRAPE_MAX_BYTES) "
+                                   f"before the article ended")
+                    break
+            else:
+                parts.append(decoder.decode(b"", final=True))
+        
+        if end is not None:
+            # Drop what came after the end before joining, not with a copy after
+            excess = sum(len(part) for part in parts) - end
+            while excess > 0:
+                last = parts.pop()
+                if len(last) > excess:
+                    parts.append(last[:len(last) - excess])
+                excess -= len(last)
+        SCRAPE_STOPS.inc(reason=reason)
+        logger.debug(f"Read {read:,} bytes of {url}, stopped at {reason}")
+        return "".join(parts)
+    
+    def parse(self, html: str, article: ArticleRef) -> Dict:
+        """
+        Pull the article apart from HTML we already have - a fetched page or
+        a page from an HTML dump. Returns the same dict as scrape().
+        
+        Raises:
+            ValueError: If the HTML isn't a usable article
+        """
+        url = article.url
+        profile = profile_for(article.language)
         try:
-            # Parse it
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # Extract all the parts we need
-            title = self._extract_title(soup)
-            if not title or title == "Unknown Title":
-                raise ValueError("Could not extract article title. The page might not be a valid Wikipedia article.")
-            
-            summary = self._extract_summary(soup)
-            if not summary:
-                logger.warning(f"No summary found for {url}")
-            
-            sections = self._extract_sections(soup)
-            full_content = self._extract_full_content(soup)
-            
-            if not full_content:
-                raise ValueError("Could not extract article content. The page might be empty or malformed.")
-            
-            logger.info(f"Successfully scraped: {title}")
-            return {
-                "title": title,
-                "summary": summary,
-                "sections": sections,
-                "full_content": full_content,
-                "raw_html": response.text
-            }
-            
+            with stage("html_parse"):
+                # Parse it
+                soup = BeautifulSoup(html, 'html.parser', parse_only=_ARTICLE_PARTS)
+                try:
+                    return self._extract(soup, html, article, profile)
+                finally:
+                    # The tree is one big reference cycle; without this it
+                    # stays in memory until the next garbage collection.
+                    # (soup.decompose() alone only clears the root.)
+                    for tag in soup.find_all(recursive=False):
+                        tag.decompose()
+                
         except Exception as e:
             logger.error(f"Error parsing Wikipedia page {url}: {e}")
             raise ValueError(f"Failed to parse Wikipedia article: {str(e)}")
     
+    def _extract(self, soup: BeautifulSoup, html: str, article: ArticleRef, profile: LanguageProfile) -> Dict:
+        """The scraper dict from a parsed page"""
+        url = article.url
+        # Extract all the parts we need
+        title = self._extract_title(soup)
+        if not title or title == "Unknown Title":
+            raise ValueError("Could not extract article title. The page might not be a valid Wikipedia article.")
+        
+        summary = self._extract_summary(soup, profile)
+        if not summary:
+            logger.warning(f"No summary found for {url}")
+        
+        sections = self._extract_sections(soup, profile)
+        full_content = self._extract_full_content(soup)
+        
+        if not full_content:
+            raise ValueError("Could not extract article content. The page might be empty or malformed.")
+        
+        # Done after full_content so reference markers are already stripped
+        section_content = self._extract_section_content(soup)
+        
+        logger.info(f"Successfully scraped: {title}")
+        return {
+            "url": url,
+            "language": article.language,
+            "title": title,
+            "summary": summary,
+            "sections": sections,
+            "full_content": full_content,
+            "section_content": section_content,
+            "revision_id": self._extract_revision_id(html),
+            "raw_html": html if self.keep_raw_html else None
+        }
+    
     def _is_valid_wikipedia_url(self, url: str) -> bool:
-        """Quick check to make sure it's a Wikipedia article"""
-        pattern = r'^https?://(en\.)?wikipedia\.org/wiki/[^:]+$'
-        return bool(re.match(pattern, url))
+        """Quick check to make sure it's an article on some Wikipedia language edition"""
+        try:
+            canonicalize_url(url)
+        except ValueError:
+            return False
+        return True
     
     def _extract_title(self, soup: BeautifulSoup) -> str:
         """Get the article title"""
@@ -132,7 +300,7 @@ class WikipediaScraper:
         # Pick the one with the most paragraphs - this avoids small meta boxes
         return max(candidates, key=lambda d: len(d.find_all('p')))
     
-    def _extract_summary(self, soup: BeautifulSoup) -> str:
+    def _extract_summary(self, soup: BeautifulSoup, profile: LanguageProfile = PROFILES["en"]) -> str:
         """
         Grab the intro paragraphs before the table of contents.
         This is usually the best summary of what the article is about.
@@ -149,7 +317,7 @@ class WikipediaScraper:
             if element.name == 'p':
                 text = element.get_text().strip()
                 # Skip empty ones and coordinate stuff
-                if text and not text.startswith('Coordinates:'):
+                if text and not profile.is_summary_noise(text):
                     paragraphs.append(text)
                     # Usually 3-5 paragraphs is enough for a good summary
                     if len(paragraphs) >= 5:
@@ -160,7 +328,7 @@ class WikipediaScraper:
         
         return ' '.join(paragraphs)
     
-    def _extract_sections(self, soup: BeautifulSoup) -> List[str]:
+    def _extract_sections(self, soup: BeautifulSoup, profile: LanguageProfile = PROFILES["en"]) -> List[str]:
         """Pull out all the section headings from the main content"""
         sections = []
         content = self._get_content_wrapper(soup)
@@ -176,8 +344,7 @@ class WikipediaScraper:
                 section_text = heading.get_text().strip()
                 
             # Skip the boring meta sections
-            if section_text and section_text not in ['Contents', 'References', 'External links', 
-                                                   'Notes', 'See also', 'Further reading']:
+            if section_text and not profile.is_boilerplate(section_text):
                 sections.append(section_text)
         
         return sections
@@ -203,6 +370,38 @@ class WikipediaScraper:
                 paragraphs.append(text)
         
         return ' '.join(paragraphs)
+    
+    def _extract_section_content(self, soup: BeautifulSoup) -> Dict[str, str]:
+        """
+        Split the article text by top-level section.
+        Paragraphs before the first heading go under "General" - the same
+        fallback section name the quiz questions use.
+        """
+        content = self._get_content_wrapper(soup)
+        if not content:
+            return {}
+        
+        section_content: Dict[str, List[str]] = {}
+        current = "General"
+        # find_all walks the tree in document order, so headings and
+        # paragraphs come out interleaved the way they appear on the page
+        for element in content.find_all(['h2', 'p']):
+            if element.name == 'h2':
+                span = element.find('span', class_='mw-headline')
+                current = (span or element).get_text().strip() or current
+                continue
+            text = element.get_text().strip()
+            if text:
+                section_content.setdefault(current, []).append(text)
+        
+        return {section: ' '.join(texts) for section, texts in section_content.items()}
+    
+    def _extract_revision_id(self, html: str) -> Optional[int]:
+        """Wikipedia embeds the page's revision id in its inline JS config"""
+        match = re.search(r'"wgRevisionId"\s*:\s*(\d+)', html)
+        if match:
+            return int(match.group(1))
+        return None
 
 
 def scrape_wikipedia(url: str) -> Dict:
@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+Full-text and facet search over generated quizzes.
+
+The text index lives next to the quizzes table and uses whatever the
+database is good at:
+- PostgreSQL: a weighted tsvector per quiz with a GIN index, built with the
+  text search config of the quiz's language ('simple' if there is none)
+- SQLite: FTS5 virtual tables ranked with bm25() - English quizzes in one
+  with the Porter stemmer, every other language in one without stemming
+- Anything else: a plain LIKE scan over title and summary (slow, but works)
+
+Facets (difficulty, section, entity) live in the quiz_facets table so they
+can be filtered and counted with indexed SQL.
+
+The index structures are created by migrate.py. Rebuild the whole index
+(e.g. after restoring a backup):
+    python search.py --rebuild
+"""
+import argparse
+import logging
+import os
+import re
+import sys
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Add backend directory to path
+sys.path.insert(0, os.path.dirname(__file__))
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from models import Quiz, QuizFacet
+
+logger = logging.getLogger(__name__)
+
+FACETS = ("difficulty", "section", "entity")
+
+# How many values to report per facet
+FACET_LIMIT = 10
+
+# Facets are counted over the best N hits only - counting every match of a
+# common word across a huge table costs more than the search itself
+FACET_SAMPLE = 1000
+
+# Title matches matter most, then entities, summary, and question text
+SQLITE_WEIGHTS = "10.0, 2.0, 1.0, 5.0"  # title, summary, questions, entities
+
+# FTS5 tokenizes a whole table one way, and Porter stemming only suits
+# English - other languages go into a table without it
+SQLITE_TABLES = {
+    "quiz_search": "porter unicode61",
+    "quiz_search_unstemmed": "unicode61 remove_diacritics 2",
+}
+
+# PostgreSQL text search configs by Wikipedia language, 'simple' (no
+# stemming) for the rest. A query is matched in all of them, so it finds a
+# quiz whatever language it was indexed in.
+POSTGRES_CONFIGS = {
+    "en": "english", "de": "german", "fr": "french", "es": "spanish", "it": "italian",
+    "pt": "portuguese", "nl": "dutch", "sv": "swedish", "ru": "russian", "ar": "arabic",
+}
+_POSTGRES_QUERY = "(" + " || ".join(
+    f"websearch_to_tsquery('{config}', :query)"
+    for config in sorted(set(POSTGRES_CONFIGS.values()) | {"simple"})
+) + ")"
+
+
+def _sqlite_table(language: Optional[str]) -> str:
+    return "quiz_search" if (language or "en") == "en" else "quiz_search_unstemmed"
+
+
+def postgres_config(language: Optional[str]) -> str:
+    return POSTGRES_CONFIGS.get(language or "en", "simple")
+
+
+def _dialect(bind) -> str:
+    """Dialect name for an Engine, Connection or Session"""
+    if hasattr(bind, "dialect"):
+        return bind.dialect.name
+    return bind.get_bind().dialect.name
+
+
+def ensure_search_index(conn: Connection) -> None:
+    """Create the full-text index structures if they don't exist yet"""
+    dialect = _dialect(conn)
+    if dialect == "sqlite":
+        for table, tokenizer in SQLITE_TABLES.items():
+            conn.execute(text(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5("
+                f"title, summary, questions, entities, tokenize='{tokenizer}')"
+            ))
+    elif dialect == "postgresql":
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS quiz_search ("
+            "quiz_id INTEGER PRIMARY KEY REFERENCES quizzes(id) ON DELETE CASCADE, "
+            "document TSVECTOR NOT NULL)"
+        ))
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_quiz_search_document "
+            "ON quiz_search USING GIN (document)"
+        ))
+    else:
+        logger.warning(f"No full-text index for {dialect}, search will fall back to LIKE")
+
+
+def entity_names(key_entities: Optional[Dict]) -> List[str]:
+    names = []
+    for group in ("people", "organizations", "locations"):
+        names.extend((key_entities or {}).get(group) or [])
+    return [name for name in names if name]
+
+
+def _facet_values(questions: List[dict], entities: List[str]) -> Iterable[Tuple[str, str]]:
+    seen = set()
+    for q in questions:
+        if q.get("difficulty"):
+            seen.add(("difficulty", q["difficulty"]))
+        seen.add(("section", q.get("section") or "General"))
+    for name in entities:
+        seen.add(("entity", name))
+    return seen
+
+
+def write_index_entry(conn, quiz_id: int, title: str, summary: str,
+                      key_entities: Optional[Dict], questions: List[dict], language: str = "en") -> None:
+    """
+    (Re)index one quiz from plain values. Works on a Session or a Connection
+    and doesn't touch the ORM models, so migrations can use it too.
+    """
+    remove_from_index(conn, quiz_id, commit=False)
+
+    questions = [q for q in (questions or []) if isinstance(q, dict)]
+    entities = entity_names(key_entities)
+    fields = {
+        "id": quiz_id,
+        "title": title or "",
+        "summary": summary or "",
+        "questions": " ".join(
+            " ".join([q.get("question") or "", q.get("answer") or "", q.get("explanation") or ""])
+            for q in questions
+        ),
+        "entities": " ".join(entities),
+        "config": postgres_config(language),
+    }
+
+    dialect = _dialect(conn)
+    if dialect == "sqlite":
+        conn.execute(text(
+            f"INSERT INTO {_sqlite_table(language)} (rowid, title, summary, questions, entities) "
+            "VALUES (:id, :title, :summary, :questions, :entities)"
+        ), fields)
+    elif dialect == "postgresql":
+        conn.execute(text(
+            "INSERT INTO quiz_search (quiz_id, document) VALUES (:id, "
+            "setweight(to_tsvector(CAST(:config AS regconfig), :title), 'A') || "
+            "setweight(to_tsvector(CAST(:config AS regconfig), :entities), 'B') || "
+            "setweight(to_tsvector(CAST(:config AS regconfig), :summary), 'C') || "
+            "setweight(to_tsvector(CAST(:config AS regconfig), :questions), 'D'))"
+        ), fields)
+
+    facets = [
+        {"quiz_id": quiz_id, "facet": facet, "value": value}
+        for facet, value in _facet_values(questions, entities)
+    ]
+    if facets:
+        conn.execute(QuizFacet.__table__.insert(), facets)
+
+
+def index_quiz(db: Session, quiz: Quiz, commit: bool = True) -> None:
+    """
+    (Re)index a single quiz. The quiz needs an id, so flush a new one first.
+    Pass commit=False to index it in the same transaction as the quiz
+    itself, or to batch many quizzes into one transaction.
+    """
+    write_index_entry(db, quiz.id, quiz.title, quiz.summary, quiz.key_entities, quiz.quiz, quiz.language)
+    if commit:
+        db.commit()
+
+
+def remove_from_index(conn, quiz_id: int, commit: bool = True) -> None:
+    """Drop a quiz from the search index (both text and facets)"""
+    dialect = _dialect(conn)
+    if dialect == "sqlite":
+        for table in SQLITE_TABLES:
+            conn.execute(text(f"DELETE FROM {table} WHERE rowid = :id"), {"id": quiz_id})
+    elif dialect == "postgresql":
+        conn.execute(text("DELETE FROM quiz_search WHERE quiz_id = :id"), {"id": quiz_id})
+    conn.execute(text("DELETE FROM quiz_facets WHERE quiz_id = :id"), {"id": quiz_id})
+    if commit:
+        conn.commit()
+
+
+def rebuild_index(db: Session, batch_size: int = 500) -> int:
+    """Reindex every quiz. Returns the number of quizzes indexed."""
+    count = 0
+    last_id = 0
+    while True:
+        batch = (
+            db.query(Quiz)
+            .filter(Quiz.id > last_id)
+            .order_by(Quiz.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not batch:
+            break
+        for quiz in batch:
+            index_quiz(db, quiz, commit=False)
+            count += 1
+        db.commit()
+        last_id = batch[-1].id
+        db.expunge_all()
+    return count
+
+
+def _sqlite_match(query: str) -> str:
+    """
+    Turn free text into a safe FTS5 query: every word must match, and the
+    last one may be a prefix so search-as-you-type works.
+    """
+    words = re.findall(r"\w+", query, re.UNICODE)
+    if not words:
+        return ""
+    terms = [f'"{w}"' for w in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+def search_quizzes(
+    db: Session,
+    query: str = "",
+    filters: Optional[Dict[str, str]] = None,
+    page: int = 1,
+    page_size: int = 20,
+) -> Dict:
+    """
+    Search quizzes by text and facet filters.
+
+    Returns a dict with the total hit count, the requested page of results
+    (best match first, or newest first when there's no text query) and
+    facet counts over the top FACET_SAMPLE hits.
+    """
+    dialect = _dialect(db.get_bind())
+    query = (query or "").strip()
+    params: Dict = {}
+
+    # Build "FROM ... WHERE ..." plus a rank expression for this dialect
+    if query and dialect == "sqlite":
+        match = _sqlite_match(query)
+        if not match:
+            query = ""
+        else:
+            params["match"] = match
+            hits = " UNION ALL ".join(
+                f"SELECT rowid AS quiz_id, -bm25({table}, {SQLITE_WEIGHTS}) AS rank "
+                f"FROM {table} WHERE {table} MATCH :match"
+                for table in SQLITE_TABLES
+            )
+            source = f"({hits}) hits JOIN quizzes q ON q.id = hits.quiz_id"
+            where = []
+            rank = "hits.rank"
+    elif query and dialect == "postgresql":
+        params["query"] = query
+        source = "quiz_search JOIN quizzes q ON q.id = quiz_search.quiz_id"
+        where = [f"quiz_search.document @@ {_POSTGRES_QUERY}"]
+        rank = f"ts_rank_cd(quiz_search.document, {_POSTGRES_QUERY})"
+    elif query:
+        params["like"] = f"%{query}%"
+        source = "quizzes q"
+        where = ["(q.title LIKE :like OR q.summary LIKE :like)"]
+        rank = "0"
+
+    if not query:
+        source = "quizzes q"
+        where = []
+        rank = "0"
+
+    for i, (facet, value) in enumerate((filters or {}).items()):
+        params[f"facet{i}"] = facet
+        params[f"value{i}"] = value
+        where.append(
+            f"q.id IN (SELECT quiz_id FROM quiz_facets "
+            f"WHERE facet = :facet{i} AND value = :value{i})"
+        )
+
+    where_sql = f"WHERE {' AND '.join(where)}" if where else ""
+    order_sql = f"{rank} DESC, q.id DESC" if query else "q.created_at DESC, q.id DESC"
+
+    total = db.execute(text(f"SELECT COUNT(*) FROM {source} {where_sql}"), params).scalar()
+
+    page_params = dict(params, limit=page_size, offset=(page - 1) * page_size)
+    rows = db.execute(text(
+        f"SELECT q.id, q.url, q.title, q.summary, q.created_at, {rank} AS score "
+        f"FROM {source} {where_sql} ORDER BY {order_sql} "
+        f"LIMIT :limit OFFSET :offset"
+    ), page_params).mappings().all()
+
+    facet_rows = db.execute(text(
+        f"SELECT facet, value, COUNT(*) AS count FROM quiz_facets "
+        f"WHERE quiz_id IN (SELECT q.id FROM {source} {where_sql} "
+        f"ORDER BY {order_sql} LIMIT :sample) "
+        f"GROUP BY facet, value"
+    ), dict(params, sample=FACET_SAMPLE)).mappings().all()
+
+    facets: Dict[str, List[Dict]] = {name: [] for name in FACETS}
+    for row in facet_rows:
+        facets.setdefault(row["facet"], []).append({"value": row["value"], "count": row["count"]})
+    for name in facets:
+        facets[name] = sorted(facets[name], key=lambda f: (-f["count"], f["value"]))[:FACET_LIMIT]
+
+    return {
+        "total": total,
+        "page": page,
+        "page_size": page_size,
+        "results": [dict(row) for row in rows],
+        "facets": facets,
+    }
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Manage the quiz search index")
+    parser.add_argument("--rebuild", action="store_true", help="Reindex every quiz")
+    args = parser.parse_args()
+
+    if args.rebuild:
+        db = SessionLocal()
+        try:
+            print(f"Indexed {rebuild_index(db)} quizzes")
+        finally:
+            db.close()
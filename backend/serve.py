@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Production server: several uvicorn workers behind one supervisor process.
+
+    python serve.py
+    python serve.py --workers 4 --port 8080
+
+Everything is configured through config.Settings (the SERVER_* entries);
+the flags only override them. The supervisor binds the socket once and
+spawns the workers - each a fresh interpreter that imports main, runs its
+own uvloop event loop with the httptools parser and accepts from the
+shared socket. It restarts workers that exit, which is what makes
+recycling work:
+
+- After SERVER_MAX_REQUESTS requests (plus a random share of the jitter,
+  so workers don't all restart at once) a worker stops accepting, drains
+  and exits, and the supervisor starts a fresh one in its place. This
+  bounds memory growth from long-lived allocations such as the parsed
+  BeautifulSoup trees of large articles.
+- SIGTERM or SIGINT to the supervisor drains every worker: listeners are
+  closed, idle keep-alive connections dropped and in-flight requests -
+  generations waiting on the LLM included - get up to
+  SERVER_GRACEFUL_SHUTDOWN_SECONDS to finish. SIGHUP restarts the workers
+  one at a time the same way (a rolling restart), SIGTTIN/SIGTTOU add or
+  remove a worker.
+
+Run `python migrate.py` first; workers refuse to start on an old schema.
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+
+import uvicorn
+from uvicorn.supervisors import Multiprocess
+
+# Add backend directory to path
+sys.path.insert(0, os.path.dirname(__file__))
+
+from config import settings
+
+
+def worker_count() -> int:
+    """SERVER_WORKERS, or one per core this process may run on"""
+    if settings.SERVER_WORKERS > 0:
+        return settings.SERVER_WORKERS
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+class WorkerServer(uvicorn.Server):
+    """uvicorn's server with a per-worker request limit, so recycling is staggered"""
+
+    def run(self, sockets=None) -> None:
+        # Runs in the worker process, once per worker started
+        if self.config.limit_max_requests and settings.SERVER_MAX_REQUESTS_JITTER > 0:
+            self.config.limit_max_requests += random.randint(0, settings.SERVER_MAX_REQUESTS_JITTER)
+        return super().run(sockets=sockets)
+
+
+def build_config(host: str, port: int, workers: int) -> uvicorn.Config:
+    return uvicorn.Config(
+        "main:app",
+        host=host,
+        port=port,
+        workers=workers,
+        loop=settings.SERVER_LOOP,
+        http=settings.SERVER_HTTP,
+        backlog=settings.SERVER_BACKLOG,
+        timeout_keep_alive=settings.SERVER_KEEP_ALIVE_SECONDS,
+        limit_max_requests=settings.SERVER_MAX_REQUESTS or None,
+        timeout_graceful_shutdown=settings.SERVER_GRACEFUL_SHUTDOWN_SECONDS,
+        # The client address the rate limits key on, from X-Forwarded-For behind these proxies
+        forwarded_allow_ips=settings.SERVER_FORWARDED_ALLOW_IPS,
+        log_level=settings.LOG_LEVEL.lower(),
+    )
+
+
+def serve(host: str, port: int, workers: int) -> None:
+    config = build_config(host, port, workers)
+    server = WorkerServer(config)
+    # The supervisor even for one worker - it is what replaces recycled workers
+    sock = config.bind_socket()
+    logging.getLogger("uvicorn.error").info(
+        f"Serving on {host}:{port} with {workers} worker(s), "
+        f"recycling after {settings.SERVER_MAX_REQUESTS or 'unlimited'} requests"
+    )
+    Multiprocess(config, target=server.run, sockets=[sock]).run()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the API with several workers")
+    parser.add_argument("--host", default=settings.SERVER_HOST)
+    parser.add_argument("--port", type=int, default=settings.SERVER_PORT)
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Worker processes (default SERVER_WORKERS, 0 = one per core)")
+    args = parser.parse_args()
+
+    if args.workers is not None:
+        settings.SERVER_WORKERS = args.workers
+    serve(args.host, args.port, worker_count())
+
+
+if __name__ == "__main__":
+    main()
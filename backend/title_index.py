@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+"""
+Local index of Wikipedia article titles, to check the LLM's related_topics.
+
+related_topics are the model's guesses, and plenty of them are not
+article titles, so the links 404. Each language's index is built once from
+the all-titles dump (e.g. enwiki-latest-all-titles-in-ns0.gz from
+https://dumps.wikimedia.org/enwiki/latest/, about 17M titles for English,
+redirects included - a redirect is a fine link). It is written to
+TITLE_INDEX_DIR/<language>.titles as:
+
+- a bloom filter over the folded titles, so most misses cost one hash and
+  no search
+- the titles sorted by their folded form (case, accents, punctuation and
+  underscores ignored): an offset array plus one blob
+
+Workers mmap the file read-only. Opening it reads nothing up front, and all
+workers share one copy through the page cache. At save time each topic
+resolves to the first of these that exists:
+
+1. the title as given, normalized the way MediaWiki does
+2. a title with the same folded form ("alan turing" -> "Alan Turing")
+3. the same without a trailing "(...)" qualifier
+4. the closest neighbour in sorted order, if its SequenceMatcher ratio
+   is at least TITLE_INDEX_FUZZY_CUTOFF. This catches typos and small
+   spelling differences near the end.
+
+Topics that match nothing are dropped (unless TITLE_INDEX_KEEP_UNKNOWN), as
+are duplicates and the article itself. Languages without an index keep
+their topics unchecked.
+
+    python title_index.py build enwiki-latest-all-titles-in-ns0.gz --language en
+    python title_index.py lookup --language en "alan turing" "Enigma machines"
+
+Building sorts every title in memory - a few GB for English.
+"""
+import argparse
+import gzip
+import hashlib
+import logging
+import math
+import mmap
+import os
+import re
+import struct
+import sys
+import threading
+import time
+import unicodedata
+from array import array
+from difflib import SequenceMatcher
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Add backend directory to path
+sys.path.insert(0, os.path.dirname(__file__))
+
+from config import settings
+from metrics import RELATED_TOPICS
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"WQTITLE1"
+# magic, bloom hash count, offset width (4 or 8), title count, bloom bytes
+HEADER = struct.Struct("<8sIIQQ")
+SEPARATOR = b"\x1f"  # sorts below every folded character, so records sort by key
+BLOOM_FALSE_POSITIVES = 0.01
+# Neighbours either side of a miss compared for the fuzzy match
+FUZZY_WINDOW = 4
+
+_NON_WORD = re.compile(r"[\W_]+")
+_QUALIFIER = re.compile(r"\s*\([^()]*\)$")
+
+
+def fold(title: str) -> str:
+    """Case-, accent- and punctuation-insensitive form titles are sorted and matched by"""
+    text = unicodedata.normalize("NFKD", title)
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return _NON_WORD.sub(" ", text.casefold()).strip()
+
+
+def normalize_title(title: str) -> str:
+    """Spaces for underscores, runs of whitespace collapsed, first letter upper-cased"""
+    title = " ".join(str(title).replace("_", " ").split())
+    if title:
+        first = title[0].upper()
+        if len(first) == 1:
+            title = first + title[1:]
+    return title
+
+
+def _bloom_positions(key: bytes, k: int, bits: int) -> Iterator[int]:
+    digest = hashlib.blake2b(key, digest_size=16).digest()
+    h1 = int.from_bytes(digest[:8], "little")
+    h2 = int.from_bytes(digest[8:], "little") | 1
+    for i in range(k):
+        yield (h1 + i * h2) % bits
+
+
+def _record(title: str) -> bytes:
+    return fold(title).encode("utf-8") + SEPARATOR + title.encode("utf-8")
+
+
+def build_index(titles: Iterable[str], path: str) -> int:
+    """
+    Write an index of the titles to path (replacing it atomically, so
+    workers that have the old one mapped keep reading it). Returns the
+    number of titles.
+    """
+    records = sorted({_record(title) for title in map(normalize_title, titles) if title and fold(title)})
+    count = len(records)
+    keys = {record.partition(SEPARATOR)[0] for record in records}
+    bits = max(64, math.ceil(-len(keys) * math.log(BLOOM_FALSE_POSITIVES) / math.log(2) ** 2))
+    k = max(1, round(bits / max(1, len(keys)) * math.log(2)))
+    bloom = bytearray((bits + 7) // 8)
+    bits = len(bloom) * 8
+    for key in keys:
+        for position in _bloom_positions(key, k, bits):
+            bloom[position >> 3] |= 1 << (position & 7)
+    del keys
+
+    total = sum(len(record) for record in records)
+    offsets = array("I" if total < 2 ** 32 else "Q")
+    offset = 0
+    offsets.append(0)
+    for record in records:
+        offset += len(record)
+        offsets.append(offset)
+
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(HEADER.pack(MAGIC, k, offsets.itemsize, count, len(bloom)))
+        f.write(bloom)
+        f.write(b"\0" * (-f.tell() % 8))
+        f.write(offsets.tobytes())
+        for start in range(0, count, 100000):
+            f.write(b"".join(records[start:start + 100000]))
+    os.replace(tmp, path)
+    return count
+
+
+class TitleIndex:
+    """One language's titles, memory-mapped from a file written by build_index()"""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self._k, width, self.count, bloom_bytes = HEADER.unpack_from(self._map)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a title index")
+        view = memoryview(self._map)
+        start = HEADER.size
+        self._bloom = view[start:start + bloom_bytes]
+        self._bits = bloom_bytes * 8
+        start += bloom_bytes
+        start += -start % 8
+        end = start + (self.count + 1) * width
+        self._offsets = view[start:end].cast("I" if width == 4 else "Q")
+        self._blob = end
+
+    def _at(self, i: int) -> Tuple[bytes, bytes]:
+        """(folded key, title) of the i-th record"""
+        record = self._map[self._blob + self._offsets[i]:self._blob + self._offsets[i + 1]]
+        key, _, title = record.partition(SEPARATOR)
+        return key, title
+
+    def might_contain(self, key: bytes) -> bool:
+        bloom = self._bloom
+        return all(bloom[p >> 3] & (1 << (p & 7)) for p in _bloom_positions(key, self._k, self._bits))
+
+    def _search(self, key: bytes) -> int:
+        """Position of the first record whose key is not below key"""
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self._at(middle)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def titles_for(self, key: str) -> List[str]:
+        """Every title with this folded form"""
+        encoded = key.encode("utf-8")
+        if not self.might_contain(encoded):
+            return []
+        titles = []
+        i = self._search(encoded)
+        while i < self.count:
+            found, title = self._at(i)
+            if found != encoded:
+                break
+            titles.append(title.decode("utf-8"))
+            i += 1
+        return titles
+
+    def closest(self, key: str, cutoff: float) -> Optional[str]:
+        """The title next to key in sorted order that is most like it, if one is close enough"""
+        encoded = key.encode("utf-8")
+        i = self._search(encoded)
+        # As difflib.get_close_matches: cheap upper bounds first, key analysed once
+        matcher = SequenceMatcher()
+        matcher.set_seq2(key)
+        best, best_ratio = None, cutoff
+        for j in range(max(0, i - FUZZY_WINDOW), min(self.count, i + FUZZY_WINDOW)):
+            found, title = self._at(j)
+            matcher.set_seq1(found.decode("utf-8"))
+            if (matcher.real_quick_ratio() >= best_ratio and matcher.quick_ratio() >= best_ratio
+                    and matcher.ratio() >= best_ratio):
+                best, best_ratio = title.decode("utf-8"), matcher.ratio()
+        return best
+
+    def close(self) -> None:
+        self._offsets.release()
+        self._bloom.release()
+        self._map.close()
+
+
+_indexes: Dict[str, Optional[TitleIndex]] = {}
+_indexes_lock = threading.Lock()
+
+
+def index_path(language: str, directory: Optional[str] = None) -> str:
+    directory = directory or settings.TITLE_INDEX_DIR
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), directory, f"{language}.titles")
+
+
+def index_for(language: str) -> Optional[TitleIndex]:
+    """The language's index, opened on first use; None if it has none"""
+    if language in _indexes:
+        return _indexes[language]
+    with _indexes_lock:
+        if language not in _indexes:
+            path = index_path(language)
+            index = None
+            if settings.TITLE_INDEX_DIR and os.path.exists(path):
+                try:
+                    index = TitleIndex(path)
+                    logger.info(f"Opened title index for {language}: {index.count:,} titles")
+                except (OSError, ValueError) as e:
+                    logger.error(f"Could not open title index {path}: {e}")
+            _indexes[language] = index
+    return _indexes[language]
+
+
+def _pick(titles: List[str], name: str) -> str:
+    """The title among those with the same folded form that is closest to what was asked for"""
+    if name in titles:
+        return name
+    lowered = name.casefold()
+    return next((title for title in titles if title.casefold() == lowered), titles[0])
+
+
+def resolve_title(topic: str, language: str) -> Tuple[Optional[str], str]:
+    """(article title or None, how it was found: exact, normalized, fuzzy, unknown or unchecked)"""
+    name = normalize_title(topic)
+    key = fold(name)
+    if not key:
+        return None, "unknown"
+    index = index_for(language)
+    if index is None:
+        return name, "unchecked"
+
+    titles = index.titles_for(key)
+    if titles:
+        title = _pick(titles, name)
+        return title, "exact" if title == name else "normalized"
+    unqualified = _QUALIFIER.sub("", name)
+    if unqualified != name and fold(unqualified):
+        titles = index.titles_for(fold(unqualified))
+        if titles:
+            return _pick(titles, unqualified), "normalized"
+    title = index.closest(key, settings.TITLE_INDEX_FUZZY_CUTOFF)
+    if title is not None:
+        return title, "fuzzy"
+    return None, "unknown"
+
+
+def resolve_topics(topics, language: str, article_title: Optional[str] = None) -> List[str]:
+    """
+    related_topics with each topic replaced by the article title it names.
+    Topics matching no title are dropped (kept as given with
+    TITLE_INDEX_KEEP_UNKNOWN), and so are duplicates and the article itself.
+    """
+    resolved = []
+    seen = {fold(article_title)} if article_title else set()
+    for topic in topics or []:
+        if not isinstance(topic, str):
+            continue
+        title, result = resolve_title(topic, language)
+        RELATED_TOPICS.inc(result=result)
+        if title is None:
+            logger.debug(f"Related topic {topic!r} is not a {language} Wikipedia article")
+            if not settings.TITLE_INDEX_KEEP_UNKNOWN:
+                continue
+            title = normalize_title(topic)
+        if title and fold(title) not in seen:
+            seen.add(fold(title))
+            resolved.append(title)
+    return resolved
+
+
+def read_titles(path: str) -> Iterator[str]:
+    """Article titles from an all-titles dump (gzip or plain; ns0-only or all namespaces)"""
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if "\t" in line:
+                namespace, _, line = line.partition("\t")
+                if namespace != "0":
+                    continue
+            if line and line not in ("page_title", "page_namespace"):
+                yield line
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Build or query the local Wikipedia title index")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="Build a language's index from an all-titles dump")
+    build.add_argument("titles", help="e.g. enwiki-latest-all-titles-in-ns0.gz")
+    build.add_argument("--language", required=True)
+    build.add_argument("--output-dir", default=None, help="Default: TITLE_INDEX_DIR")
+    lookup = commands.add_parser("lookup", help="Resolve topics against a language's index")
+    lookup.add_argument("topics", nargs="+")
+    lookup.add_argument("--language", default="en")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        path = index_path(args.language, args.output_dir)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        start = time.perf_counter()
+        count = build_index(read_titles(args.titles), path)
+        print(f"Indexed {count:,} titles in {time.perf_counter() - start:.0f}s: "
+              f"{path} ({os.path.getsize(path) / 1e6:,.1f} MB)")
+    else:
+        if index_for(args.language) is None:
+            parser.exit(1, f"No title index for {args.language} at {index_path(args.language)}\n")
+        for topic in args.topics:
+            start = time.perf_counter()
+            title, result = resolve_title(topic, args.language)
+            print(f"{topic!r:<40} -> {title!r} ({result}, {(time.perf_counter() - start) * 1e6:.0f} us)")
@@ -0,0 +1,209 @@
+"""
+Lightweight tracing with OpenTelemetry-compatible output.
+
+Each API request gets a trace (continued from an incoming W3C `traceparent`
+header if there is one), and every pipeline stage timed through
+metrics.stage() becomes a child span. Finished spans are batched on a
+background thread and exported as OTLP/JSON, either:
+
+- TRACE_EXPORTER=file - one ExportTraceServiceRequest per line in TRACE_FILE
+  (the same layout the OpenTelemetry Collector's file exporter writes)
+- TRACE_EXPORTER=otlp - POSTed to TRACE_OTLP_ENDPOINT/v1/traces
+- TRACE_EXPORTER=none - spans are not recorded at all (default)
+
+The current trace lives in a contextvar, so it follows the request into
+FastAPI's worker threads and the logging layer can stamp trace ids on
+every line.
+"""
+import atexit
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, NamedTuple, Optional
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = "wikiquiz-api"
+
+# OTLP enums
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+EXPORT_BATCH_SIZE = 512
+EXPORT_INTERVAL_SECONDS = 2.0
+
+
+class SpanContext(NamedTuple):
+    trace_id: str
+    span_id: str
+    sampled: bool
+
+
+_current: contextvars.ContextVar[Optional[SpanContext]] = contextvars.ContextVar("current_span", default=None)
+
+
+def _new_id(nbytes: int) -> str:
+    return os.urandom(nbytes).hex()
+
+
+def current_span() -> Optional[SpanContext]:
+    return _current.get()
+
+
+def parse_traceparent(header: Optional[str]) -> Optional[SpanContext]:
+    """Read a W3C traceparent header (version-traceid-spanid-flags)"""
+    if not header:
+        return None
+    parts = header.strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        int(parts[1], 16), int(parts[2], 16)
+        sampled = bool(int(parts[3], 16) & 1)
+    except ValueError:
+        return None
+    return SpanContext(parts[1], parts[2], sampled)
+
+
+def _attribute(key: str, value) -> Dict:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+class SpanExporter:
+    """Batches finished spans and ships them from a background thread"""
+
+    def __init__(self, mode: str, path: str = "", endpoint: str = ""):
+        self.mode = mode
+        self.path = path
+        self.endpoint = endpoint.rstrip("/")
+        self.dropped = 0
+        self._queue: "queue.Queue[Optional[Dict]]" = queue.Queue(maxsize=10000)
+        self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+        self._thread.start()
+        atexit.register(self.shutdown)
+
+    def submit(self, span: Dict) -> None:
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            # Never block a request on telemetry
+            self.dropped += 1
+
+    def shutdown(self) -> None:
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+
+    def _run(self) -> None:
+        batch: List[Dict] = []
+        deadline = time.monotonic() + EXPORT_INTERVAL_SECONDS
+        while True:
+            try:
+                item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                item = False
+            if item:
+                batch.append(item)
+            if item is None or len(batch) >= EXPORT_BATCH_SIZE or time.monotonic() >= deadline:
+                if batch:
+                    self._export(batch)
+                    batch = []
+                deadline = time.monotonic() + EXPORT_INTERVAL_SECONDS
+            if item is None:
+                return
+
+    def _export(self, spans: List[Dict]) -> None:
+        body = {
+            "resourceSpans": [{
+                "resource": {"attributes": [_attribute("service.name", SERVICE_NAME)]},
+                "scopeSpans": [{"scope": {"name": "wikiquiz"}, "spans": spans}],
+            }]
+        }
+        try:
+            if self.mode == "file":
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(body, separators=(",", ":")) + "\n")
+            elif self.mode == "otlp":
+                import requests
+                requests.post(f"{self.endpoint}/v1/traces", json=body, timeout=5)
+        except Exception as e:
+            logger.warning(f"Failed to export {len(spans)} spans: {e}")
+
+
+def _build_exporter() -> Optional[SpanExporter]:
+    mode = settings.TRACE_EXPORTER.lower()
+    if mode in ("", "none"):
+        return None
+    if mode not in ("file", "otlp"):
+        logger.warning(f"Unknown TRACE_EXPORTER {settings.TRACE_EXPORTER!r}, tracing disabled")
+        return None
+    return SpanExporter(mode, path=settings.TRACE_FILE, endpoint=settings.TRACE_OTLP_ENDPOINT)
+
+
+exporter = _build_exporter()
+
+
+class Span:
+    """A span in progress - the name and attributes can still change"""
+    __slots__ = ("name", "attributes")
+
+    def __init__(self, name: str, attributes: Optional[Dict] = None):
+        self.name = name
+        self.attributes = dict(attributes or {})
+
+
+@contextmanager
+def span(name: str, kind: int = SPAN_KIND_INTERNAL, parent: Optional[SpanContext] = None,
+         attributes: Optional[Dict] = None):
+    """
+    Record a span around the block. Without an active trace (e.g. in a CLI
+    job) the span starts a new one.
+    """
+    parent = parent or _current.get()
+    if parent is None:
+        sampled = exporter is not None and random.random() < settings.TRACE_SAMPLE_RATE
+        ctx = SpanContext(_new_id(16), _new_id(8), sampled)
+    else:
+        ctx = SpanContext(parent.trace_id, _new_id(8), parent.sampled and exporter is not None)
+
+    current = Span(name, attributes)
+    token = _current.set(ctx)
+    start = time.time_ns()
+    error: Optional[BaseException] = None
+    try:
+        yield current
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        _current.reset(token)
+        if ctx.sampled:
+            record = {
+                "traceId": ctx.trace_id,
+                "spanId": ctx.span_id,
+                "name": current.name,
+                "kind": kind,
+                "startTimeUnixNano": str(start),
+                "endTimeUnixNano": str(time.time_ns()),
+                "attributes": [_attribute(k, v) for k, v in current.attributes.items()],
+                "status": {"code": STATUS_ERROR, "message": str(error)[:200]} if error else {"code": STATUS_OK},
+            }
+            if parent is not None:
+                record["parentSpanId"] = parent.span_id
+            exporter.submit(record)
@@ -0,0 +1,246 @@
+"""
+Token and cost accounting for LLM calls.
+
+QuizGenerator reports every model call here with its token usage and
+latency. Calls are collected per request (collect_usage) and written to
+the llm_calls table together with the quiz they produced, or on their own
+if the generation failed - tokens were billed either way.
+
+The same table backs the daily token budget (LLM_DAILY_TOKEN_BUDGET) and
+the aggregates served by /api/stats.
+"""
+import contextvars
+import logging
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from config import settings
+from database import SessionLocal
+from metrics import LLM_TOKENS
+from models import LLMCall
+
+logger = logging.getLogger(__name__)
+
+# Calls made by the current request, waiting to be saved
+_pending: contextvars.ContextVar[Optional[List[dict]]] = contextvars.ContextVar("llm_usage", default=None)
+
+
+class TokenBudgetExceeded(RuntimeError):
+    """Today's LLM token budget is used up"""
+
+    def __init__(self, used: int, budget: int, retry_after: int):
+        super().__init__(f"Daily LLM token budget used up ({used} of {budget} tokens)")
+        self.used = used
+        self.budget = budget
+        self.retry_after = retry_after
+
+
+@contextmanager
+def collect_usage(calls: Optional[List[dict]] = None):
+    """
+    Collect the LLM calls made inside the block (also across worker
+    threads), into `calls` if given
+    """
+    if calls is None:
+        calls = []
+    token = _pending.set(calls)
+    try:
+        yield calls
+    finally:
+        _pending.reset(token)
+
+
+def record_call(stage: str, model: str, response, latency: float,
+                prompt_chars: int = 0, truncated_chars: int = 0) -> None:
+    """Note one finished LLM call. `response` is the LangChain message (or None)."""
+    usage = getattr(response, "usage_metadata", None) or {}
+    call = {
+        "stage": stage,
+        "model": model,
+        "input_tokens": int(usage.get("input_tokens") or 0),
+        "output_tokens": int(usage.get("output_tokens") or 0),
+        "latency_ms": int(latency * 1000),
+        "prompt_chars": prompt_chars,
+        "truncated_chars": truncated_chars,
+    }
+    LLM_TOKENS.inc(call["input_tokens"], stage=stage, kind="input")
+    LLM_TOKENS.inc(call["output_tokens"], stage=stage, kind="output")
+
+    calls = _pending.get()
+    if calls is not None:
+        calls.append(call)
+    else:
+        logger.debug(f"LLM call outside collect_usage(), not persisted: {call}")
+
+
+def add_calls(calls: List[dict]) -> None:
+    """Hand calls collected on their own (a finished hedge) to the current request"""
+    pending = _pending.get()
+    if pending is not None:
+        pending.extend(calls)
+    elif calls:
+        logger.debug(f"LLM calls outside collect_usage(), not persisted: {calls}")
+
+
+def save_usage(db: Session, quiz_id: Optional[int] = None, calls: Optional[List[dict]] = None) -> int:
+    """
+    Add the collected calls (the current request's by default) to the
+    session - the caller commits. Returns the tokens used.
+    """
+    if calls is None:
+        calls = _pending.get()
+    if not calls:
+        return 0
+    db.add_all(LLMCall(quiz_id=quiz_id, **call) for call in calls)
+    return sum(c["input_tokens"] + c["output_tokens"] for c in calls)
+
+
+def clear_usage() -> None:
+    """
+    Forget the current request's collected calls once they are committed,
+    so a later failure doesn't save them a second time as unattached.
+    """
+    calls = _pending.get()
+    if calls:
+        calls.clear()
+
+
+def save_unattached_usage(calls: List[dict]) -> None:
+    """
+    Write calls that no quiz will be saved with, in a session of their own:
+    those of a failed generation, or of a hedge that finished after the
+    request had already saved its usage.
+    """
+    if not calls:
+        return
+    db = SessionLocal()
+    try:
+        save_usage(db, calls=calls)
+        db.commit()
+    except SQLAlchemyError as e:
+        logger.error(f"Failed to record LLM usage: {e}")
+    finally:
+        db.close()
+
+
+def _start_of_day(now: datetime) -> datetime:
+    return now.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def tokens_used_today(db: Session) -> int:
+    """Tokens billed since midnight UTC"""
+    since = _start_of_day(datetime.now(timezone.utc))
+    used = db.query(func.sum(LLMCall.input_tokens + LLMCall.output_tokens)).filter(
+        LLMCall.created_at >= since
+    ).scalar()
+    return int(used or 0)
+
+
+def check_budget(db: Session) -> None:
+    """Raise TokenBudgetExceeded if today's budget is spent. 0 = no budget."""
+    budget = settings.LLM_DAILY_TOKEN_BUDGET
+    if budget <= 0:
+        return
+    used = tokens_used_today(db)
+    if used >= budget:
+        now = datetime.now(timezone.utc)
+        tomorrow = _start_of_day(now) + timedelta(days=1)
+        raise TokenBudgetExceeded(used, budget, int((tomorrow - now).total_seconds()) + 1)
+
+
+def quiz_usage(db: Session, quiz_id: int) -> Dict:
+    """Every LLM call billed to one quiz, oldest first"""
+    calls = db.query(LLMCall).filter(LLMCall.quiz_id == quiz_id).order_by(LLMCall.id).all()
+    return {
+        "quiz_id": quiz_id,
+        "input_tokens": sum(c.input_tokens for c in calls),
+        "output_tokens": sum(c.output_tokens for c in calls),
+        "calls": [
+            {"stage": c.stage, "model": c.model, "input_tokens": c.input_tokens,
+             "output_tokens": c.output_tokens, "latency_ms": c.latency_ms,
+             "truncated_chars": c.truncated_chars, "created_at": c.created_at}
+            for c in calls
+        ],
+    }
+
+
+def usage_stats(db: Session, days: int = 14, cache_hits: int = 0) -> Dict:
+    """
+    Aggregates for /api/stats.
+
+    Savings are estimates: truncation uses the measured tokens-per-char
+    ratio of all prompts, and cache savings assume every cache hit would
+    otherwise have cost an average generation.
+    """
+    tokens = LLMCall.input_tokens + LLMCall.output_tokens
+
+    totals = db.query(
+        func.count(LLMCall.id),
+        func.coalesce(func.sum(LLMCall.input_tokens), 0),
+        func.coalesce(func.sum(LLMCall.output_tokens), 0),
+        func.count(func.distinct(LLMCall.quiz_id)),
+        func.coalesce(func.sum(LLMCall.truncated_chars), 0),
+        func.coalesce(func.sum(LLMCall.prompt_chars), 0),
+    ).one()
+    calls, input_tokens, output_tokens, quizzes, truncated_chars, prompt_chars = totals
+
+    quiz_tokens = db.query(func.coalesce(func.sum(tokens), 0)).filter(LLMCall.quiz_id.isnot(None)).scalar()
+    avg_per_quiz = round(quiz_tokens / quizzes) if quizzes else 0
+
+    day = func.date(LLMCall.created_at)
+    since = _start_of_day(datetime.now(timezone.utc)) - timedelta(days=days - 1)
+    per_day = [
+        {"date": str(row.day), "calls": row.calls, "input_tokens": int(row.input_tokens or 0),
+         "output_tokens": int(row.output_tokens or 0), "quizzes": row.quizzes}
+        for row in db.query(
+            day.label("day"),
+            func.count(LLMCall.id).label("calls"),
+            func.sum(LLMCall.input_tokens).label("input_tokens"),
+            func.sum(LLMCall.output_tokens).label("output_tokens"),
+            func.count(func.distinct(LLMCall.quiz_id)).label("quizzes"),
+        ).filter(LLMCall.created_at >= since).group_by(day).order_by(day)
+    ]
+
+    per_stage = [
+        {"stage": row.stage, "calls": row.calls, "input_tokens": int(row.input_tokens or 0),
+         "output_tokens": int(row.output_tokens or 0), "avg_latency_ms": round(row.latency or 0)}
+        for row in db.query(
+            LLMCall.stage,
+            func.count(LLMCall.id).label("calls"),
+            func.sum(LLMCall.input_tokens).label("input_tokens"),
+            func.sum(LLMCall.output_tokens).label("output_tokens"),
+            func.avg(LLMCall.latency_ms).label("latency"),
+        ).group_by(LLMCall.stage).order_by(LLMCall.stage)
+    ]
+
+    tokens_per_char = input_tokens / prompt_chars if prompt_chars else 0.25
+    budget = settings.LLM_DAILY_TOKEN_BUDGET
+    used_today = tokens_used_today(db)
+
+    return {
+        "today": {
+            "tokens": used_today,
+            "budget": budget or None,
+            "remaining": max(0, budget - used_today) if budget else None,
+        },
+        "totals": {
+            "calls": calls,
+            "input_tokens": int(input_tokens),
+            "output_tokens": int(output_tokens),
+            "quizzes": quizzes,
+            "avg_tokens_per_quiz": avg_per_quiz,
+        },
+        "per_day": per_day,
+        "per_stage": per_stage,
+        "savings": {
+            "truncated_chars": int(truncated_chars),
+            "truncation_tokens_estimate": round(truncated_chars * tokens_per_char),
+            "cache_hits": cache_hits,
+            "cache_tokens_estimate": cache_hits * avg_per_quiz,
+        },
+    }
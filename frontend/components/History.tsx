@@ -1,10 +1,12 @@
 
 import React, { useState, useEffect } from 'react';
 import { WikiData } from '../types';
-import { getQuizHistory, getQuizById, deleteQuiz, QuizHistoryItem } from '../services/api';
+import { searchQuizzes, getQuizById, deleteQuiz, QuizHistoryItem } from '../services/api';
 import QuizModal from './QuizModal';
 import { useToast } from './ToastContext';
 
+const PAGE_SIZE = 20;
+
 interface HistoryProps {
   refreshTrigger?: number; // Used to refresh when new quiz is generated
 }
@@ -17,14 +19,28 @@ const History: React.FC<HistoryProps> = ({ refreshTrigger }) => {
   const [loadingQuizId, setLoadingQuizId] = useState<number | null>(null);
   const { showToast } = useToast();
   const [quizToDelete, setQuizToDelete] = useState<number | null>(null);
+  const [searchInput, setSearchInput] = useState('');
+  const [query, setQuery] = useState('');
+  const [page, setPage] = useState(1);
+  const [total, setTotal] = useState(0);
+
+  // Wait for the user to stop typing before hitting the backend
+  useEffect(() => {
+    const timer = setTimeout(() => {
+      setQuery(searchInput.trim());
+      setPage(1);
+    }, 300);
+    return () => clearTimeout(timer);
+  }, [searchInput]);
 
-  // Fetch history from the backend
+  // Fetch one page of history (or search results) from the backend
   useEffect(() => {
     const fetchHistory = async () => {
       try {
         setIsLoading(true);
-        const data = await getQuizHistory();
-        setHistory(data);
+        const data = await searchQuizzes(query, page, PAGE_SIZE);
+        setHistory(data.results);
+        setTotal(data.total);
         setError(null);
       } catch (err: any) {
         console.error('Error fetching history:', err);
@@ -36,7 +52,7 @@ const History: React.FC<HistoryProps> = ({ refreshTrigger }) => {
     };
 
     fetchHistory();
-  }, [refreshTrigger, showToast]); // Re-fetch when this changes
+  }, [refreshTrigger, query, page, showToast]); // Re-fetch when these change
 
   const handleViewDetails = async (id: number) => {
     try {
@@ -61,6 +77,7 @@ const History: React.FC<HistoryProps> = ({ refreshTrigger }) => {
     try {
       await deleteQuiz(quizToDelete);
       setHistory(history.filter(item => item.id !== quizToDelete));
+      setTotal(prev => Math.max(prev - 1, 0));
       showToast('Quiz deleted successfully', 'success');
     } catch (err: any) {
       console.error('Error deleting quiz:', err);
@@ -70,7 +87,8 @@ const History: React.FC<HistoryProps> = ({ refreshTrigger }) => {
     }
   };
 
-  if (isLoading) {
+  // Only take over the whole panel on the first load - not while searching
+  if (isLoading && history.length === 0 && !query) {
     return (
       <div className="text-center py-24 bg-white rounded-3xl border border-slate-100 shadow-sm">
         <div className="inline-block p-6 bg-slate-50 rounded-full mb-4">
@@ -93,7 +111,7 @@ const History: React.FC<HistoryProps> = ({ refreshTrigger }) => {
     );
   }
 
-  if (history.length === 0) {
+  if (history.length === 0 && !query) {
     return (
       <div className="text-center py-24 bg-white rounded-3xl border border-slate-100 shadow-sm animate-in fade-in zoom-in-95">
         <div className="inline-block p-6 bg-slate-50 rounded-full text-slate-300 mb-4">
@@ -127,11 +145,29 @@ const History: React.FC<HistoryProps> = ({ refreshTrigger }) => {
             <h2 className="text-2xl font-bold text-slate-800">Learning History</h2>
             <p className="text-slate-500 text-sm">A list of articles you've analyzed and quizzed yourself on.</p>
           </div>
-          <span className="bg-blue-50 text-blue-600 px-4 py-2 rounded-xl font-black text-sm uppercase tracking-widest">
-            {history.length} Saved
-          </span>
+          <div className="flex items-center space-x-4">
+            <div className="relative">
+              <i className="fas fa-search absolute left-4 top-1/2 -translate-y-1/2 text-slate-300"></i>
+              <input
+                type="text"
+                value={searchInput}
+                onChange={(e) => setSearchInput(e.target.value)}
+                placeholder="Search quizzes..."
+                className="pl-10 pr-4 py-2 rounded-xl border border-slate-200 text-sm focus:outline-none focus:ring-2 focus:ring-blue-500"
+              />
+            </div>
+            <span className="bg-blue-50 text-blue-600 px-4 py-2 rounded-xl font-black text-sm uppercase tracking-widest">
+              {total} {query ? 'Found' : 'Saved'}
+            </span>
+          </div>
         </div>
 
+        {query && history.length === 0 && !isLoading && (
+          <div className="p-8 text-center text-slate-500">
+            No quizzes match "{query}".
+          </div>
+        )}
+
         <div className="overflow-x-auto">
           <table className="w-full text-left">
             <thead className="bg-slate-50/50 text-slate-400 text-[10px] font-black uppercase tracking-[0.2em]">
@@ -205,6 +241,28 @@ const History: React.FC<HistoryProps> = ({ refreshTrigger }) => {
             </tbody>
           </table>
         </div>
+
+        {total > PAGE_SIZE && (
+          <div className="p-6 border-t border-slate-100 flex justify-between items-center">
+            <button
+              onClick={() => setPage(page - 1)}
+              disabled={page <= 1 || isLoading}
+              className="px-4 py-2 bg-slate-100 hover:bg-slate-200 text-slate-700 font-bold rounded-xl transition-colors disabled:opacity-50 disabled:cursor-not-allowed"
+            >
+              Previous
+            </button>
+            <span className="text-sm text-slate-500">
+              Page {page} of {Math.ceil(total / PAGE_SIZE)}
+            </span>
+            <button
+              onClick={() => setPage(page + 1)}
+              disabled={page * PAGE_SIZE >= total || isLoading}
+              className="px-4 py-2 bg-slate-100 hover:bg-slate-200 text-slate-700 font-bold rounded-xl transition-colors disabled:opacity-50 disabled:cursor-not-allowed"
+            >
+              Next
+            </button>
+          </div>
+        )}
       </div>
 
       {selectedQuiz && (
@@ -21,7 +21,7 @@ const QuizDisplay: React.FC<QuizDisplayProps> = ({ data }) => {
   }, [data.quiz]);
 
   if (mode === 'take') {
-    return <TakeQuiz quiz={data.quiz} title={data.title} onBack={() => setMode('details')} />;
+    return <TakeQuiz quizId={data.id} quiz={data.quiz} title={data.title} onBack={() => setMode('details')} />;
   }
 
   return (
@@ -150,7 +150,7 @@ const QuizDisplay: React.FC<QuizDisplayProps> = ({ data }) => {
           {data.related_topics.map((topic, i) => (
             <a
               key={i}
-              href={`https://en.wikipedia.org/wiki/${topic.replace(/\s+/g, '_')}`}
+              href={`https://${data.language || 'en'}.wikipedia.org/wiki/${encodeURIComponent(topic.replace(/\s+/g, '_'))}`}
               target="_blank"
               rel="noopener noreferrer"
               className="bg-slate-50 border border-slate-100 px-4 py-4 rounded-2xl text-slate-700 font-bold text-sm hover:bg-blue-600 hover:text-white hover:border-blue-600 hover:-translate-y-1 transition-all flex items-center justify-between group"
@@ -1,19 +1,23 @@
 
-import React, { useState } from 'react';
+import React, { useRef, useState } from 'react';
 import { QuizQuestion } from '../types';
+import { submitAttempt } from '../services/api';
 
 interface TakeQuizProps {
+  quizId: number;
   quiz: QuizQuestion[];
   title: string;
   onBack: () => void;
 }
 
-const TakeQuiz: React.FC<TakeQuizProps> = ({ quiz, title, onBack }) => {
+const TakeQuiz: React.FC<TakeQuizProps> = ({ quizId, quiz, title, onBack }) => {
   const [currentIdx, setCurrentIdx] = useState(0);
   const [selectedOption, setSelectedOption] = useState<string | null>(null);
   const [isSubmitted, setIsSubmitted] = useState(false);
   const [score, setScore] = useState(0);
   const [isFinished, setIsFinished] = useState(false);
+  const [answers, setAnswers] = useState<(string | null)[]>([]);
+  const startedAt = useRef(Date.now());
 
   const currentQuestion = quiz[currentIdx];
 
@@ -23,6 +27,7 @@ const TakeQuiz: React.FC<TakeQuizProps> = ({ quiz, title, onBack }) => {
     if (selectedOption === currentQuestion.answer) {
       setScore(prev => prev + 1);
     }
+    setAnswers(prev => [...prev, selectedOption]);
     setIsSubmitted(true);
   };
 
@@ -33,6 +38,10 @@ const TakeQuiz: React.FC<TakeQuizProps> = ({ quiz, title, onBack }) => {
       setIsSubmitted(false);
     } else {
       setIsFinished(true);
+      // Recorded for quiz stats; the score shown is already final
+      submitAttempt(quizId, answers, Date.now() - startedAt.current).catch(err =>
+        console.warn('Failed to record quiz attempt:', err)
+      );
     }
   };
 
@@ -75,6 +84,8 @@ const TakeQuiz: React.FC<TakeQuizProps> = ({ quiz, title, onBack }) => {
                 setIsSubmitted(false);
                 setScore(0);
                 setIsFinished(false);
+                setAnswers([]);
+                startedAt.current = Date.now();
               }}
               className="px-8 py-3 bg-white border border-slate-200 text-slate-700 font-bold rounded-xl hover:bg-slate-50 transition-colors"
             >
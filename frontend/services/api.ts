@@ -5,6 +5,13 @@
 
 const API_BASE_URL = `http://${window.location.hostname}:8000`;
 
+// The API is on another origin, so cookies only travel with credentials
+// included - the backend uses one to send a client's reads to the primary
+// database right after it wrote (read-your-writes)
+function apiFetch(path: string, init: RequestInit = {}): Promise<Response> {
+  return fetch(`${API_BASE_URL}${path}`, { ...init, credentials: 'include' });
+}
+
 export interface QuizQuestion {
   question: string;
   options: string[];
@@ -39,11 +46,48 @@ export interface QuizHistoryItem {
   created_at?: string;
 }
 
+export interface SearchResult extends QuizHistoryItem {
+  summary: string;
+  score: number;
+}
+
+export interface FacetCount {
+  value: string;
+  count: number;
+}
+
+export interface SearchResponse {
+  total: number;
+  page: number;
+  page_size: number;
+  results: SearchResult[];
+  facets: Record<string, FacetCount[]>;
+}
+
+export interface SearchFilters {
+  difficulty?: 'easy' | 'medium' | 'hard';
+  section?: string;
+  entity?: string;
+}
+
 export interface URLPreview {
   title: string;
   url: string;
 }
 
+export interface AttemptQuestionResult {
+  position: number;
+  correct: boolean;
+  answer: string;
+}
+
+export interface AttemptResult {
+  quiz_id: number;
+  score: number;
+  total: number;
+  results: AttemptQuestionResult[];
+}
+
 // Custom error class for better error handling
 export class APIError extends Error {
   constructor(
@@ -103,7 +147,7 @@ export async function generateQuiz(url: string): Promise<QuizData> {
   }
 
   try {
-    const response = await fetch(`${API_BASE_URL}/api/generate`, {
+    const response = await apiFetch('/api/generate', {
       method: 'POST',
       headers: {
         'Content-Type': 'application/json',
@@ -122,13 +166,39 @@ export async function generateQuiz(url: string): Promise<QuizData> {
  */
 export async function getQuizHistory(): Promise<QuizHistoryItem[]> {
   try {
-    const response = await fetch(`${API_BASE_URL}/api/history`);
+    const response = await apiFetch('/api/history');
     return await handleResponse<QuizHistoryItem[]>(response);
   } catch (error) {
     return handleNetworkError(error);
   }
 }
 
+/**
+ * Search quizzes by text and facets, one page at a time
+ */
+export async function searchQuizzes(
+  query: string,
+  page: number = 1,
+  pageSize: number = 20,
+  filters: SearchFilters = {}
+): Promise<SearchResponse> {
+  const params = new URLSearchParams({
+    q: query,
+    page: String(page),
+    page_size: String(pageSize),
+  });
+  Object.entries(filters).forEach(([key, value]) => {
+    if (value) params.set(key, value);
+  });
+
+  try {
+    const response = await apiFetch(`/api/search?${params.toString()}`);
+    return await handleResponse<SearchResponse>(response);
+  } catch (error) {
+    return handleNetworkError(error);
+  }
+}
+
 /**
  * Get specific quiz by ID
  */
@@ -138,13 +208,39 @@ export async function getQuizById(id: number): Promise<QuizData> {
   }
 
   try {
-    const response = await fetch(`${API_BASE_URL}/api/quiz/${id}`);
+    const response = await apiFetch(`/api/quiz/${id}`);
     return await handleResponse<QuizData>(response);
   } catch (error) {
     return handleNetworkError(error);
   }
 }
 
+/**
+ * Submit a finished quiz attempt for server-side scoring
+ */
+export async function submitAttempt(
+  id: number,
+  answers: (string | null)[],
+  durationMs?: number
+): Promise<AttemptResult> {
+  if (!id || id <= 0) {
+    throw new APIError('Invalid quiz ID', 400);
+  }
+
+  try {
+    const response = await apiFetch(`/api/quiz/${id}/attempts`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+      },
+      body: JSON.stringify({ answers, duration_ms: durationMs }),
+    });
+    return await handleResponse<AttemptResult>(response);
+  } catch (error) {
+    return handleNetworkError(error);
+  }
+}
+
 /**
  * Preview Wikipedia URL (bonus feature)
  */
@@ -154,8 +250,8 @@ export async function previewURL(url: string): Promise<URLPreview> {
   }
 
   try {
-    const response = await fetch(
-      `${API_BASE_URL}/api/preview?url=${encodeURIComponent(url)}`
+    const response = await apiFetch(
+      `/api/preview?url=${encodeURIComponent(url)}`
     );
     return await handleResponse<URLPreview>(response);
   } catch (error) {
@@ -172,7 +268,7 @@ export async function deleteQuiz(id: number): Promise<void> {
   }
 
   try {
-    const response = await fetch(`${API_BASE_URL}/api/quiz/${id}`, {
+    const response = await apiFetch(`/api/quiz/${id}`, {
       method: 'DELETE',
     });
     await handleResponse<{ message: string }>(response);
@@ -19,6 +19,7 @@ export interface KeyEntities {
 export interface WikiData {
   id: number;
   url: string;
+  language?: string;
   title: string;
   summary: string;
   key_entities?: KeyEntities;